@@ -10,6 +10,17 @@ Overview:
         - Defines a `build_exe` command that compiles the bundled C sources
           (cemhyd3d executables: genpartnew, distrib3d, disrealnew).
         - Handles both Linux (gcc) and Windows (CMake + Visual Studio) builds.
+        - Build profiles (`--profile`): `default` (historical flags), `debug`,
+          `release` (-O3 + LTO) and `pgo` (release, then re-compiled with a
+          profile recorded on the example workload; Linux only).
+        - `--verify` re-runs the example workload (fixed seeds, reduced
+          cycles) with a `default` build and the new build and fails unless
+          every output file is byte-identical.
+        - `--sizes=50,200` also builds the tools for other lattice sizes
+          (`-DSYSIZE=<n>`; `genpartnew_s50`, `libgenpartnew_s50.so`, ...),
+          selected at run time with `run_cemhyd3d(..., system_size=50)`.
+        - Records the profile in `cempy3d/build_profile.json`
+          (see `pycemhyd3d.utils.build_profile()`).
         - Copies compiled executables into the package tree
           (`src/pycemhyd3d/cempy3d/`) so they are shipped with the wheel/sdist.
         - Cleans up intermediate `bin/` and `build/` folders after compilation.
@@ -23,15 +34,81 @@ Overview:
 
 from setuptools import setup
 from setuptools import Command
+import json
 import os
 import subprocess
 import platform
 import shutil
+import sys
+
+EXECUTABLES = ["genpartnew", "distrib3d", "disrealnew"]
+# Shared libraries for the in-process bindings (engine.py), Linux only
+ENGINE_LIBS = [f"lib{exe}.so" for exe in EXECUTABLES]
+_ENGINE_FLAGS = "-DCEM_ENGINE -Dmain=cem_main -fPIC -shared -fvisibility=hidden"
+# Lattice edge length of the unsuffixed tools (SYSIZE in cempy3d/common.h)
+DEFAULT_SYSTEM_SIZE = 100
+
+# gcc flags per profile and executable. "release" keeps IEEE semantics
+# (no -ffast-math, no FMA contraction) so outputs stay byte-identical.
+_RELEASE = "-O3 -flto -ffp-contract=off -lm"
+BUILD_PROFILES = {
+    "default": {"genpartnew": "-lm", "distrib3d": "-lm", "disrealnew": "-lm -O2"},
+    "debug":   {exe: "-O0 -g -lm" for exe in EXECUTABLES},
+    "release": {exe: _RELEASE for exe in EXECUTABLES},
+    "pgo":     {exe: _RELEASE for exe in EXECUTABLES},
+}
+# disrealnew cycles of the PGO training run and of the --verify comparison
+PGO_TRAIN_CYCLES = 50
+VERIFY_CYCLES = 20
+
+
+def _workloads():
+    # the package is not installed yet: import it from the source tree
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+    from pycemhyd3d import workloads
+    return workloads
+
+
+def _sized(name, size):
+    '''Name of a tool (or library stem) built for a `size`^3 lattice.'''
+    return name if size == DEFAULT_SYSTEM_SIZE else f"{name}_s{size}"
+
+
+def _gcc(src, out, opts, compile_only=False):
+    print(f"[Linux] Compiling {src} -> {out} with flags: {opts}")
+    mode = "-c " if compile_only else ""
+    if subprocess.run(f"gcc {mode}{src} -o {out} {opts}", shell=True).returncode:
+        raise RuntimeError(f"❌ Failed to compile {src}")
+
 
 class BuildExecutables(Command):
-    user_options = []
-    def initialize_options(self): pass
-    def finalize_options(self): pass
+    description = "compile the native executables"
+    user_options = [
+        ('profile=', None, f"build profile: {', '.join(BUILD_PROFILES)} (default: default)"),
+        ('verify', None, "check that outputs are byte-identical to a default build"),
+        ('sizes=', None, "extra lattice sizes to build, e.g. 50,200 (SYSIZE <= 256)"),
+    ]
+    boolean_options = ['verify']
+
+    def initialize_options(self):
+        self.profile = "default"
+        self.verify = False
+        self.verified = False
+        self.sizes = ""
+
+    def finalize_options(self):
+        if self.profile not in BUILD_PROFILES:
+            raise RuntimeError(f"Unknown build profile {self.profile!r}; "
+                               f"choose one of {list(BUILD_PROFILES)}")
+        try:
+            sizes = [int(s) for s in str(self.sizes or "").split(",") if s.strip()]
+        except ValueError:
+            raise RuntimeError(f"--sizes must be comma-separated integers, got {self.sizes!r}")
+        if any(not 1 <= s <= 256 for s in sizes):
+            raise RuntimeError(f"--sizes must be between 1 and 256, got {sizes}")
+        # the default size is always built, without suffix
+        self.sizes = sorted(set(sizes) - {DEFAULT_SYSTEM_SIZE})
+
     def run(self):
         base_dir = os.path.dirname(os.path.abspath(__file__))
         src_dir = os.path.join(base_dir, 'src', 'pycemhyd3d', 'cempy3d')
@@ -44,32 +121,37 @@ class BuildExecutables(Command):
         is_windows = platform.system() == "Windows"
         is_linux   = platform.system() == "Linux"
 
-        executables = ["genpartnew", "distrib3d", "disrealnew"]
+        executables = EXECUTABLES
+        if not is_linux and (self.profile == "pgo" or self.verify):
+            raise RuntimeError("⚠️ --profile=pgo and --verify need Linux (gcc)")
+        flags = BUILD_PROFILES[self.profile]
 
         # ---------- L I N U X   B U I L D ----------
         if is_linux:
-            flags = {
-                "genpartnew":  "-lm",
-                "distrib3d":   "-lm",
-                "disrealnew":  "-lm -O2",
-            }
-            for exe in executables:
-                src  = os.path.join(src_dir, f"{exe}.c")
-                out  = os.path.join(bin_dir, exe)
-                opts = flags.get(exe, "")
-                print(f"[Linux] Compiling {src} -> {out} with flags: {opts}")
-                if subprocess.run(f"gcc {src} -o {out} {opts}", shell=True).returncode:
-                    raise RuntimeError(f"❌ Failed to compile {src}")
-            print("✅ All Linux executables compiled successfully.")
+            if self.profile == "pgo":
+                self._build_pgo(src_dir, bin_dir, flags)
+            else:
+                for exe in executables:
+                    _gcc(os.path.join(src_dir, f"{exe}.c"),
+                         os.path.join(bin_dir, exe), flags[exe])
+            self._build_sizes(src_dir, bin_dir)
+            self._build_engine(src_dir, bin_dir)
+            print(f"✅ All Linux executables compiled successfully ({self.profile}).")
+            if self.verify:
+                self._verify(src_dir, bin_dir)
 
         # ---------- W I N D O W S   B U I L D ----------
         elif is_windows:
             # give only disrealnew a larger stack (32 MiB)
             stack_flags = {"disrealnew": "/STACK:33554432"}   # 0x02000000 bytes
+            config = "Debug" if self.profile == "debug" else "Release"
 
-            for exe in executables:
+            targets = [(exe, exe, DEFAULT_SYSTEM_SIZE) for exe in executables]
+            targets += [(_sized(exe, size), exe, size)
+                        for size in self.sizes for exe in executables]
+            for target, exe, size in targets:
                 src_file  = os.path.join(src_dir, f"{exe}.c").replace("\\", "/")
-                build_dir = os.path.join(base_dir, f"build_{exe}")
+                build_dir = os.path.join(base_dir, f"build_{target}")
                 bin_cmake = bin_dir.replace("\\", "/")
 
                 if os.path.exists(build_dir):
@@ -81,33 +163,34 @@ class BuildExecutables(Command):
                 with open(os.path.join(build_dir, "CMakeLists.txt"), "w") as f:
                     f.write(f"""
 cmake_minimum_required(VERSION 3.10)
-project({exe} C)
+project({target} C)
 
-add_executable({exe} "{src_file}")
+add_executable({target} "{src_file}")
+target_compile_definitions({target} PRIVATE SYSIZE={size})
 
 # Ensure a larger stack when requested (compatible with old CMake)
-set_target_properties({exe} PROPERTIES
+set_target_properties({target} PROPERTIES
     LINK_FLAGS "{link_flag}"
     RUNTIME_OUTPUT_DIRECTORY "{bin_cmake}"
 )
 """)
 
-                print(f"[Windows] Configuring {exe} …")
+                print(f"[Windows] Configuring {target} …")
                 subprocess.run(
                     'cmake -G "Visual Studio 17 2022" -A x64 .',
                     cwd=build_dir, shell=True, check=True
                 )
-                print(f"[Windows] Building {exe} …")
+                print(f"[Windows] Building {target} …")
                 subprocess.run(
-                    'cmake --build . --config Release',
+                    f'cmake --build . --config {config}',
                     cwd=build_dir, shell=True, check=True
                 )
             # Group all individual build folders into one 'build' directory
             final_build_dir = os.path.join(base_dir, "build")
             os.makedirs(final_build_dir, exist_ok=True)
-            for exe in executables:
-                src = os.path.join(base_dir, f"build_{exe}")
-                dst = os.path.join(final_build_dir, f"build_{exe}")
+            for target, _, _ in targets:
+                src = os.path.join(base_dir, f"build_{target}")
+                dst = os.path.join(final_build_dir, f"build_{target}")
                 if os.path.exists(dst):
                     shutil.rmtree(dst)
                 shutil.move(src, dst)
@@ -122,7 +205,11 @@ set_target_properties({exe} PROPERTIES
             bin_dir_pkg = os.path.join(pkg_dir, 'cempy3d')
             os.makedirs(bin_dir_pkg, exist_ok=True)
 
-            for exe in executables:
+            built = executables + ENGINE_LIBS
+            for size in self.sizes:
+                built += [_sized(exe, size) for exe in executables]
+                built += [f"lib{_sized(exe, size)}.so" for exe in executables]
+            for exe in built:
                 compiled_path = os.path.join(bin_dir, exe)
                 if os.path.isfile(compiled_path):
                     shutil.copy(compiled_path, bin_dir_pkg)
@@ -136,7 +223,9 @@ set_target_properties({exe} PROPERTIES
                 dest_dir = os.path.join(bin_dir_pkg, rel_path) if rel_path != '.' else bin_dir_pkg
                 os.makedirs(dest_dir, exist_ok=True)
                 for f in files:
-                    shutil.copy(os.path.join(root, f), os.path.join(dest_dir, f))
+                    src_file, dst_file = os.path.join(root, f), os.path.join(dest_dir, f)
+                    if not (os.path.exists(dst_file) and os.path.samefile(src_file, dst_file)):
+                        shutil.copy(src_file, dst_file)
 
         # ---------- Copy compiled Windows executables into src/pycemhyd3d/cempy3d ----------
         if is_windows:
@@ -144,10 +233,11 @@ set_target_properties({exe} PROPERTIES
             bin_dir_pkg = os.path.join(pkg_dir, 'cempy3d')
             os.makedirs(bin_dir_pkg, exist_ok=True)
 
-            for exe in executables:
-                # check both bin\Release\exe.exe and bin\exe.exe
+            for exe in executables + [_sized(exe, size) for size in self.sizes
+                                      for exe in executables]:
+                # check both bin\<config>\exe.exe and bin\exe.exe
                 exe_name = exe + ".exe"
-                release_path = os.path.join(bin_dir, "Release", exe_name)
+                release_path = os.path.join(bin_dir, config, exe_name)
                 flat_path    = os.path.join(bin_dir, exe_name)
 
                 if os.path.isfile(release_path):
@@ -161,8 +251,109 @@ set_target_properties({exe} PROPERTIES
                 dest_dir = os.path.join(bin_dir_pkg, rel_path) if rel_path != '.' else bin_dir_pkg
                 os.makedirs(dest_dir, exist_ok=True)
                 for f in files:
-                    shutil.copy(os.path.join(root, f), os.path.join(dest_dir, f))
-
+                    src_file, dst_file = os.path.join(root, f), os.path.join(dest_dir, f)
+                    if not (os.path.exists(dst_file) and os.path.samefile(src_file, dst_file)):
+                        shutil.copy(src_file, dst_file)
+
+
+        self._record_profile(flags, is_windows)
+
+    def _build_sizes(self, src_dir, bin_dir):
+        '''Executables for the extra lattice sizes of `--sizes`.'''
+        # profile data was recorded on the default size: other sizes of a
+        # pgo build get the plain release flags
+        flags = BUILD_PROFILES["release" if self.profile == "pgo" else self.profile]
+        for size in self.sizes:
+            for exe in EXECUTABLES:
+                _gcc(os.path.join(src_dir, f"{exe}.c"),
+                     os.path.join(bin_dir, _sized(exe, size)),
+                     f"-DSYSIZE={size} {flags[exe]}")
+
+    def _build_engine(self, src_dir, bin_dir):
+        '''Shared libraries of the tools for the in-process bindings.'''
+        # profile data is recorded per executable: libraries of a pgo build
+        # get the plain release flags
+        flags = BUILD_PROFILES["release" if self.profile == "pgo" else self.profile]
+        engine_src = os.path.join(src_dir, "engine.c")
+        for size in [DEFAULT_SYSTEM_SIZE] + self.sizes:
+            for exe in EXECUTABLES:
+                _gcc(f"{os.path.join(src_dir, f'{exe}.c')} {engine_src}",
+                     os.path.join(bin_dir, f"lib{_sized(exe, size)}.so"),
+                     f"-DSYSIZE={size} {_ENGINE_FLAGS} {flags[exe]}")
+
+    def _build_pgo(self, src_dir, bin_dir, flags):
+        '''Instrumented build, training run, then profile-guided build.'''
+        prof_dir = os.path.join(bin_dir, "pgo-profile")
+        train_dir = os.path.join(bin_dir, "pgo-train")
+        for stage, extra in (("generate", f"-fprofile-generate={prof_dir}"),
+                             ("use", f"-fprofile-use={prof_dir} -fprofile-correction "
+                                     "-fprofile-partial-training -Wno-missing-profile")):
+            for exe in EXECUTABLES:
+                # compile and link separately: the profile file is named
+                # after the (stable) object path
+                obj = os.path.join(bin_dir, f"{exe}.o")
+                _gcc(os.path.join(src_dir, f"{exe}.c"), obj,
+                     f"{flags[exe]} {extra}", compile_only=True)
+                _gcc(obj, os.path.join(bin_dir, exe), f"{flags[exe]} {extra}")
+                os.remove(obj)
+            if stage == "generate":
+                print(f"[PGO] Training on the example workload ({PGO_TRAIN_CYCLES} cycles) …")
+                # a fresh folder, so a failed earlier build leaves nothing behind
+                shutil.rmtree(train_dir, ignore_errors=True)
+                try:
+                    _workloads().run_native(bin_dir, train_dir, cycles=PGO_TRAIN_CYCLES,
+                                            data_dir=src_dir)
+                finally:
+                    shutil.rmtree(train_dir, ignore_errors=True)
+        shutil.rmtree(prof_dir, ignore_errors=True)
+
+    def _verify(self, src_dir, bin_dir):
+        '''Fail unless the new build reproduces a default build byte for byte.'''
+        workloads = _workloads()
+        ref_bin = os.path.join(bin_dir, "verify-default")
+        runs = [("default", ref_bin, os.path.join(bin_dir, "verify-run-reference")),
+                (self.profile, bin_dir, os.path.join(bin_dir, f"verify-run-{self.profile}"))]
+        # start from fresh folders (a failed earlier verify may have left
+        # inputs and outputs behind) and remove them however the run ends
+        work_dirs = [ref_bin] + [run_dir for _, _, run_dir in runs]
+        for path in work_dirs:
+            shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.makedirs(ref_bin)
+            for exe in EXECUTABLES:
+                _gcc(os.path.join(src_dir, f"{exe}.c"), os.path.join(ref_bin, exe),
+                     BUILD_PROFILES["default"][exe])
+            for name, exe_dir, run_dir in runs:
+                print(f"[verify] Running the example workload ({VERIFY_CYCLES} cycles) "
+                      f"with the {name} build …")
+                workloads.run_native(exe_dir, run_dir,
+                                     cycles=VERIFY_CYCLES, data_dir=src_dir)
+            differ = workloads.compare_outputs(runs[0][2], runs[1][2])
+        finally:
+            for path in work_dirs:
+                shutil.rmtree(path, ignore_errors=True)
+        if differ:
+            raise RuntimeError(f"❌ {self.profile} build changes outputs: {differ}")
+        self.verified = True
+        print(f"✅ {self.profile} build verified: outputs byte-identical to default.")
+
+    def _record_profile(self, flags, is_windows):
+        '''Write cempy3d/build_profile.json describing this build.'''
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        record = {
+            "profile": self.profile,
+            "flags": flags if not is_windows else {},
+            "compiler": "msvc" if is_windows else subprocess.run(
+                "gcc --version", shell=True, capture_output=True, text=True
+            ).stdout.splitlines()[0],
+            "platform": platform.system(),
+            "verified": self.verified,
+            "sizes": [DEFAULT_SYSTEM_SIZE] + self.sizes,
+        }
+        path = os.path.join(base_dir, 'src', 'pycemhyd3d', 'cempy3d', 'build_profile.json')
+        with open(path, "w") as f:
+            json.dump(record, f, indent=2)
+        print(f"[build] Recorded build profile in {path}")
 
 setup(
     name        = "pycemhyd3d",
@@ -177,6 +368,14 @@ setup(
         'pycemhyd3d': ['cempy3d/*']
     },
     include_package_data=True,
+    extras_require={
+        'numpy': ['numpy>=1.23'],
+        'pandas': ['numpy>=1.23', 'pandas'],
+        'analysis': ['numpy>=1.23', 'scipy'],
+    },
+    entry_points={
+        'console_scripts': ['pycemhyd3d = pycemhyd3d.workqueue:main'],
+    },
     py_modules  = [],
 )
 
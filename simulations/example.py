@@ -59,7 +59,7 @@ gp_cfg = {
 
 
 # === Input for distrib3d ===
-# NOTE: use {RUN}/... because distrib3d runs with cwd=_BIN_DIR
+# NOTE: short names as well; distrib3d also runs with cwd=run_dir
 d3_cfg = {
     "seed": -99,
     "in_name":  "cem140w04floc_{ID}.img",      # short name; no path
@@ -71,11 +71,11 @@ d3_cfg = {
 
 
 # === Input for disrealnew ===
-# NOTE: again {RUN}/... because disrealnew runs with cwd=_BIN_DIR
+# NOTE: short names again; disrealnew also runs with cwd=run_dir
 dr_cfg = {
     "seed": -2794,
 
-    # Files (short names; module will prefix with {RUN}/ and format {ID})
+    # Files (short names; module will format {ID})
     "phase_file": "cement140w04flocf_{ID}.img",
     "part_file":  "pcem140w04floc_{ID}.img",
 
@@ -122,5 +122,8 @@ dr_cfg = {
 
 
 # Run the pipeline
+# (for many IDs, cem.run_cemhyd3d_batch([(i, gp_cfg, d3_cfg, dr_cfg) for i in id])
+#  runs them in parallel, one process per pipeline; Campaign("campaign.sqlite").run(...)
+#  from pycemhyd3d.campaign does the same and skips the IDs that already completed)
 for i in id:
     cem.run_cemhyd3d(i, gp_cfg, d3_cfg, dr_cfg)
@@ -0,0 +1,341 @@
+'''asyncio API for the pycemhyd3d pipeline.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    `run_cemhyd3d_async(...)` is the coroutine counterpart of
+    `cemhyd3d.run_cemhyd3d(...)` for services that drive many pipelines from
+    one event loop:
+
+        - the tools are started with `asyncio.create_subprocess_exec`, their
+          stdin is fed through a pipe and their output is streamed into the
+          `<tool>_<id>.out` logs (same `ProgressEvent`s and watchdog as
+          `progress.py`),
+        - sandbox creation, runtime staging, stage-cache lookups and result
+          mirroring run in worker threads (`asyncio.to_thread`), so the
+          loop never blocks on the filesystem,
+        - an optional `asyncio.Semaphore` (`limiter=`) bounds how many
+          pipelines run their tools at once,
+        - cancelling the task kills the running child executable, waits for
+          it and removes the sandbox before `CancelledError` propagates,
+        - every run writes the same `manifest.json` as the blocking API (and
+          appends it to `manifest_sink=`, fires `hooks=`).
+
+    `run_cemhyd3d_batch_async(...)` runs many jobs with a concurrency limit.
+
+Notes:
+    - Results, sandboxes and caches use the same layout as the blocking API,
+      so both can share folders and a `StageCache`.
+    - The manifest's `cpu_user`, `cpu_system` and `max_rss` stay None: the
+      children are reaped by asyncio's child watcher, so their own rusage is
+      not available, and process-wide counters would mix the stages of
+      concurrent pipelines. Stage hooks run on the event loop and must not
+      block.
+'''
+import asyncio
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+from .builders import _build_disrealnew_from_dict
+from .cemhyd3d import (_ORIG_BIN_DIR, _MicrostructureStages, _check_built,
+                       _exe_paths, _genpartnew_backend)
+from .executors import finalize_sandbox
+from .manifest import RunManifest, _exe_hash
+from .progress import FATAL_PATTERNS, StallError, _Parser, _command
+from .sandbox import create_sandbox, stage_runtime
+from .stagecache import StageCache
+from .utils import DEFAULT_SYSTEM_SIZE, caller_results_root
+
+
+async def _run_tool(exe: Path,
+                    stdin_text: str,
+                    log_path: Path,
+                    cwd: Path,
+                    stage: str,
+                    id: str,
+                    progress=None,
+                    stall_timeout: float | None = None,
+                    timeout: float | None = None):
+    '''Run one tool as an asyncio subprocess, streaming its output.
+
+    Raises:
+        StallError: if the watchdog limits were hit (child is killed).
+        subprocess.CalledProcessError: if the tool returned non-zero.
+        asyncio.CancelledError: after killing the child, if cancelled.
+    '''
+    start = time.monotonic()
+    parser = _Parser(stage, id, start)
+    fatal = FATAL_PATTERNS.get(stage, ())
+    cmd = _command(exe, line_buffered=True)
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT, cwd=cwd)
+    reason = None
+    try:
+        proc.stdin.write(stdin_text.encode("utf-8"))
+        await proc.stdin.drain()
+        proc.stdin.close()
+
+        last = start
+        with open(log_path, "wb") as flog:
+            while True:
+                now = time.monotonic()
+                limits = []
+                if stall_timeout is not None:
+                    limits.append((last + stall_timeout - now,
+                                   f"no progress for {stall_timeout:g} s"))
+                if timeout is not None:
+                    limits.append((start + timeout - now,
+                                   f"exceeded timeout of {timeout:g} s"))
+                wait, why = min(limits) if limits else (None, None)
+                try:
+                    raw = await asyncio.wait_for(
+                        proc.stdout.readline(),
+                        None if wait is None else max(0.0, wait))
+                except asyncio.TimeoutError:
+                    reason = why
+                    break
+                if not raw:
+                    break
+                flog.write(raw)
+                line = raw.decode("utf-8", "replace").rstrip("\r\n")
+                if any(p.search(line) for p in fatal):
+                    reason = f"fatal output: {line.strip()}"
+                    break
+                event = parser.feed(line)
+                if event is not None:
+                    last = time.monotonic()
+                    if progress is not None:
+                        progress(event)
+        if reason:
+            proc.kill()
+            await proc.wait()
+            raise StallError(f"[{stage}] killed by watchdog: {reason}")
+        returncode = await proc.wait()
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def _place_particles(id, cfg, run_dir, img_name, part_name, system_size):
+    '''genpartnew stage of the numpy backend: write its images into `run_dir`.'''
+    from . import placement
+    from .io import write_text
+    image, particles = placement.genpartnew(id, cfg, run_dir, system_size=system_size)
+    write_text(run_dir / img_name, image)
+    write_text(run_dir / part_name, particles)
+
+
+async def _cached_stage(stages: _MicrostructureStages, stage: str, run,
+                        record: dict):
+    '''Restore the outputs of `stage` from the cache (marking the manifest
+    `record` as cached) or await `run()` and store them.'''
+    if await asyncio.to_thread(stages.lookup, stage):
+        record["cached"] = True
+        return
+    await run()
+    await asyncio.to_thread(stages.store, stage)
+
+
+async def run_cemhyd3d_async(id: str,
+                             genpartnew_input: dict,
+                             distrib3d_input: dict,
+                             disrealnew_input: dict,
+                             limiter: asyncio.Semaphore | None = None,
+                             results_root: str | Path | None = None,
+                             sandbox_root: str | Path | None = None,
+                             cache_root: str | Path | None = None,
+                             stage_cache: StageCache | str | Path | None = None,
+                             progress=None,
+                             stall_timeout: float | None = None,
+                             timeout: float | None = None,
+                             hooks=None,
+                             manifest_sink: str | Path | None = None,
+                             system_size: int = DEFAULT_SYSTEM_SIZE) -> Path:
+    '''Run the full pipeline without blocking the event loop.
+
+    Args:
+        id: Short identifier used in filenames and result folder naming.
+        genpartnew_input: Dict config for `_build_genpartnew_from_dict`.
+        distrib3d_input: Dict config for `_build_distrib3d_from_dict`.
+        disrealnew_input: Dict config for `_build_disrealnew_from_dict`.
+        limiter: Optional semaphore shared by many calls; the pipeline holds
+            one slot while it runs.
+        results_root, sandbox_root, cache_root, stage_cache: As in
+            `cemhyd3d.run_cemhyd3d`.
+        progress: Optional callable receiving `progress.ProgressEvent`s; it
+            runs on the event loop and must not block.
+        stall_timeout: Kill a stage that makes no progress for this many
+            seconds and raise `progress.StallError`.
+        timeout: Kill a stage running longer than this many seconds.
+        hooks, manifest_sink: As in `cemhyd3d.run_cemhyd3d` (see the module
+            notes for the manifest's CPU/RSS fields).
+        system_size: Lattice edge length, see `cemhyd3d.run_cemhyd3d`.
+
+    Returns:
+        pathlib.Path: The results directory (with a `manifest.json`, also
+        written when the run failed or was cancelled).
+
+    Raises:
+        asyncio.CancelledError: if cancelled; the running tool is killed and
+            the sandbox removed first.
+        subprocess.CalledProcessError: if any executable returns non-zero.
+        progress.StallError: if the watchdog killed a stage.
+        FileNotFoundError: if no executables are built for `system_size`.
+    '''
+    _check_built(system_size)
+    if results_root is None:
+        results_root = caller_results_root()
+    results_root = Path(results_root).resolve()
+    sandbox_root = results_root if sandbox_root is None else Path(sandbox_root).resolve()
+    if isinstance(stage_cache, (str, Path)):
+        stage_cache = StageCache(stage_cache)
+
+    manifest = RunManifest(id, hooks)
+    if limiter is None:
+        return await _pipeline(id, genpartnew_input, distrib3d_input,
+                               disrealnew_input, results_root, sandbox_root,
+                               cache_root, stage_cache, progress,
+                               stall_timeout, timeout, system_size,
+                               manifest, manifest_sink)
+    async with limiter:
+        return await _pipeline(id, genpartnew_input, distrib3d_input,
+                               disrealnew_input, results_root, sandbox_root,
+                               cache_root, stage_cache, progress,
+                               stall_timeout, timeout, system_size,
+                               manifest, manifest_sink)
+
+
+async def _pipeline(id, genpartnew_input, distrib3d_input, disrealnew_input,
+                    results_root, sandbox_root, cache_root, stage_cache,
+                    progress, stall_timeout, timeout, system_size,
+                    manifest, manifest_sink) -> Path:
+    '''Body of `run_cemhyd3d_async` (after the limiter was acquired).'''
+    watch = {"progress": progress, "stall_timeout": stall_timeout,
+             "timeout": timeout}
+    results_dir = results_root / f"result_{id}"
+    await asyncio.to_thread(results_dir.mkdir, parents=True, exist_ok=True)
+    run_dir = await asyncio.to_thread(create_sandbox, sandbox_root, id)
+    error = None
+    try:
+        with manifest.stage("staging"):
+            staged = await asyncio.to_thread(stage_runtime, run_dir,
+                                             _ORIG_BIN_DIR, cache_root)
+        exe, exe2, exe3 = _exe_paths(run_dir, system_size)
+        # hash the executables off the loop (memoized for the stage records)
+        for path in (exe, exe2, exe3):
+            await asyncio.to_thread(_exe_hash, path)
+
+        stages = await asyncio.to_thread(
+            _MicrostructureStages, id, genpartnew_input, distrib3d_input,
+            run_dir, stage_cache, system_size)
+        img_name, part_name = stages.img_name, stages.part_name
+        phase_name = stages.phase_name
+        gp_text = stages.genpartnew_text.rstrip() + "\n"
+        d3_text = stages.distrib3d_text.rstrip() + "\n"
+        dr_text = _build_disrealnew_from_dict(id, "", disrealnew_input)
+
+        # genpartnew
+        numpy_backend = _genpartnew_backend(genpartnew_input) == "numpy"
+        if numpy_backend:
+            run_gp = lambda: asyncio.to_thread(
+                _place_particles, id, genpartnew_input, run_dir,
+                img_name, part_name, system_size)
+        else:
+            run_gp = lambda: _run_tool(exe, gp_text, stages.outputs["genpartnew"][-1],
+                                       run_dir, "genpartnew", id, **watch)
+        with manifest.stage("genpartnew", stages.genpartnew_text,
+                            None if numpy_backend else exe) as record:
+            await _cached_stage(stages, "genpartnew", run_gp, record)
+
+        # distrib3d
+        with manifest.stage("distrib3d", stages.distrib3d_text, exe2) as record:
+            await _cached_stage(
+                stages, "distrib3d", lambda: _run_tool(
+                    exe2, d3_text, stages.outputs["distrib3d"][-1], run_dir,
+                    "distrib3d", id, **watch), record)
+
+        # disrealnew
+        with manifest.stage("disrealnew", dr_text, exe3):
+            for name in (phase_name, part_name):
+                if not (run_dir / name).exists():
+                    raise FileNotFoundError(
+                        f"[disrealnew] Missing microstructure in sandbox: {run_dir / name}")
+            await _run_tool(exe3, dr_text, run_dir / f"disrealnew_{id}.out",
+                            run_dir, "disrealnew", id, **watch)
+            print(f"[disrealnew] Completed in sandbox: {run_dir}")
+
+            await asyncio.to_thread(finalize_sandbox, run_dir, results_dir, staged)
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        await asyncio.shield(asyncio.to_thread(shutil.rmtree, run_dir, True))
+        await asyncio.shield(asyncio.to_thread(
+            manifest.finish, results_dir, error, manifest_sink))
+    print(f"✅ Pipeline completed successfully. Results in: {results_dir}")
+    return results_dir
+
+
+async def run_cemhyd3d_batch_async(jobs,
+                                   max_concurrency: int | None = None,
+                                   results_root: str | Path | None = None,
+                                   **kwargs) -> list[Path]:
+    '''Run many pipelines concurrently on the current event loop.
+
+    Args:
+        jobs: Iterable of job dicts (keyword arguments of
+            `run_cemhyd3d_async`) or tuples `(id, gp_cfg, d3_cfg, dr_cfg)`.
+        max_concurrency: Pipelines running at once (default:
+            `os.cpu_count()`).
+        results_root: Folder receiving every `result_<id>/` (default:
+            `results/` next to the caller script).
+        **kwargs: Forwarded to every `run_cemhyd3d_async` call (e.g.
+            `stage_cache`, `progress`, `stall_timeout`); a job dict may
+            override them.
+
+    Returns:
+        list[pathlib.Path]: Results directories, in the order of `jobs`.
+
+    Raises:
+        ValueError: if two jobs share an `id`.
+        RuntimeError: if any job failed, after all jobs have finished.
+    '''
+    if results_root is None:
+        results_root = caller_results_root()
+    limiter = asyncio.Semaphore(max_concurrency or os.cpu_count() or 1)
+
+    job_list = []
+    for job in jobs:
+        if not isinstance(job, dict):
+            id_, gp, d3, dr = job
+            job = {"id": id_, "genpartnew_input": gp,
+                   "distrib3d_input": d3, "disrealnew_input": dr}
+        job_list.append({"results_root": results_root, "limiter": limiter,
+                         **kwargs, **job})
+    ids = [job["id"] for job in job_list]
+    dupes = sorted({i for i in ids if ids.count(i) > 1})
+    if dupes:
+        raise ValueError(f"Duplicate job ids in batch: {dupes}")
+
+    results = await asyncio.gather(
+        *(run_cemhyd3d_async(**job) for job in job_list),
+        return_exceptions=True)
+    failures = [(job["id"], r) for job, r in zip(job_list, results)
+                if isinstance(r, BaseException)]
+    for label, exc in failures:
+        print(f"❌ [async] Job {label} failed: {exc!r}")
+    if failures:
+        failed = ", ".join(str(label) for label, _ in failures)
+        raise RuntimeError(
+            f"{len(failures)} of {len(job_list)} jobs failed: {failed}"
+        ) from failures[0][1]
+    return list(results)
@@ -0,0 +1,306 @@
+'''Vectorized microstructure analytics for pycemhyd3d.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    NumPy/SciPy counterparts of the C helpers, working on `mic` arrays as
+    returned by `io.load` (`arr[a, b, c]` = disrealnew's `mic[a][b][c]`):
+
+        - `phase_counts(mic)`      volume count per phase id (`stat3d`,
+                                   `phcount` in distrib3d),
+        - `surface_counts(mic)`    pore-facing pixel faces per phase, with
+                                   periodic boundaries (`surfpix`, `stat3d`),
+        - `hydraulic_radius(...)`  `rhcalc` in distrib3d,
+        - `phase_percolation(...)` connectivity of a phase between two
+                                   opposite faces (`burn3d.c`),
+        - `set_percolation(...)`   connectivity of the solid framework
+                                   (set point, `burnset.c`).
+
+    Percolation uses connected-component labeling (`scipy.ndimage.label`,
+    `scipy.sparse.csgraph`) instead of burning fronts. Like the C routines,
+    the burn axis is non-periodic and the two other axes are periodic.
+
+    `analyze_results(folder)` runs the analysis on every saved `.ima`
+    snapshot of a results folder in parallel, so `burnfreq`/`setfreq` can
+    be raised (or burning disabled) inside disrealnew and connectivity
+    computed after the run.
+
+Notes:
+    - Axis `a` of the array corresponds to the C direction flags as
+      `burn3d(.., 1,0,0)` -> axis 0, `(0,1,0)` -> axis 2, `(0,0,1)` -> axis 1.
+    - Requires NumPy and SciPy (`pip install pycemhyd3d[analysis]`).
+'''
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from scipy import ndimage, sparse
+from scipy.sparse.csgraph import connected_components
+
+from . import io
+
+# Phase ids (see series.PHASE_NAMES)
+POROSITY, EMPTYP = 0, 45
+# Phases that start / carry the set-point burn (burnset.c)
+CLINKER_IDS = (1, 2, 3, 4, 8, 10, 11, 12)   # C3S C2S C3A C4AF POZZ SLAG ASG CAS2
+HYDRATE_IDS = (14, 15, 16, 17)              # CSH C3AH6 ETTR ETTRC4AF
+# Ids counted as pore space by stat3d (porosity and >44)
+STAT3D_PORE_IDS = (0, 45, 46, 47, 48, 49)
+
+_RE_SNAPSHOT = re.compile(r"\.ima\.(\d+)\.(-?\d+)\.(\d{3})$")
+
+
+@dataclass
+class Percolation:
+    '''Result of one percolation check (one burn direction).
+
+    Attributes:
+        axis: Burn axis of the array.
+        accessible: Pixels connected to the first face ("Number accessible
+            from first surface").
+        through: Pixels in clusters spanning both faces ("Number contained
+            in through pathways").
+        total: Pixels of the checked phases.
+    '''
+    axis: int
+    accessible: int
+    through: int
+    total: int
+
+    @property
+    def fraction(self) -> float:
+        '''Connected fraction `through / total` (`frac_conn` of .pps/.pts).'''
+        return self.through / self.total if self.total else 0.0
+
+    @property
+    def percolates(self) -> bool:
+        '''True if a cluster spans the system (C return flag).'''
+        return self.through > 0
+
+
+def phase_counts(mic: np.ndarray, nphases: int = 50) -> np.ndarray:
+    '''Return the pixel count of every phase id `0..nphases-1`.
+
+    Ids `>= nphases` are counted as porosity, as in `stat3d`. An empty
+    image gives all-zero counts.
+    '''
+    flat = np.asarray(mic).ravel().astype(np.intp, copy=False)
+    top = int(flat.max()) + 1 if flat.size else 0
+    counts = np.bincount(flat, minlength=max(nphases, top))
+    counts = counts.astype(np.int64)
+    counts[0] += counts[nphases:].sum()
+    return counts[:nphases]
+
+
+def phase_fractions(mic: np.ndarray, nphases: int = 50) -> np.ndarray:
+    '''Volume fraction of every phase id (see `phase_counts`).'''
+    counts = phase_counts(mic, nphases)
+    return counts / counts.sum()
+
+
+def surface_counts(mic: np.ndarray,
+                   pore_ids=(POROSITY,),
+                   nphases: int = 50) -> np.ndarray:
+    '''Count the pixel faces of each phase that touch pore space.
+
+    Every pixel looks at its six periodic neighbors; each neighbor in
+    `pore_ids` adds one face. `pore_ids=(0,)` reproduces `surfpix`,
+    `STAT3D_PORE_IDS` reproduces `stat3d` (which also skips pore pixels).
+
+    Returns:
+        numpy.ndarray: Face count per phase id `0..nphases-1`.
+    '''
+    mic = np.asarray(mic)
+    pore = np.isin(mic, pore_ids)
+    faces = np.zeros(mic.shape, dtype=np.uint8)
+    for axis in range(mic.ndim):
+        faces += np.roll(pore, 1, axis=axis)
+        faces += np.roll(pore, -1, axis=axis)
+    ids = mic.ravel().astype(np.intp, copy=False)
+    valid = ids < nphases
+    return np.bincount(ids[valid], weights=faces.ravel()[valid],
+                       minlength=nphases).astype(np.int64)[:nphases]
+
+
+def hydraulic_radius(mic: np.ndarray, phase: int = POROSITY) -> float:
+    '''Hydraulic radius of `phase` as in distrib3d's `rhcalc`.'''
+    mic = np.asarray(mic)
+    volume = int(np.count_nonzero(mic == phase))
+    surface = int(surface_counts(mic, (POROSITY,), max(50, phase + 1))[phase])
+    return volume * 6.0 / (4.0 * surface) if surface else float("inf")
+
+
+def _periodic_merge(labels: np.ndarray, n: int, axes) -> np.ndarray:
+    '''Merge labels that meet across the periodic faces of `axes`.'''
+    pairs = []
+    for ax in axes:
+        a = labels.take(0, axis=ax).ravel()
+        b = labels.take(-1, axis=ax).ravel()
+        both = (a > 0) & (b > 0)
+        pairs.append((a[both], b[both]))
+    rows = np.concatenate([p[0] for p in pairs])
+    cols = np.concatenate([p[1] for p in pairs])
+    graph = sparse.coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)),
+                              shape=(n + 1, n + 1))
+    _, comp = connected_components(graph, directed=False)
+    comp = comp + 1
+    comp[0] = 0
+    return comp[labels]
+
+
+def _percolation(labels: np.ndarray, total: int, axis: int) -> Percolation:
+    '''Count accessible / through pixels of labeled clusters (burn axis 0).'''
+    sizes = np.bincount(labels.ravel())
+    first, last = labels[0], labels[-1]
+    touching = np.unique(first[first > 0])
+    # as in burn3d/burnset: a cluster is "through" when it holds both ends
+    # of the same line along the burn axis
+    through = np.unique(first[(first == last) & (first > 0)])
+    return Percolation(axis, int(sizes[touching].sum()),
+                       int(sizes[through].sum()), total)
+
+
+def phase_percolation(mic: np.ndarray, phases=(POROSITY,), axis: int = 0) -> Percolation:
+    '''Percolation of `phases` along `axis` (pore space by default; `burn3d`).
+
+    Args:
+        mic: Microstructure.
+        phases: Phase id(s) forming the connected phase.
+        axis: Non-periodic burn axis; the two other axes are periodic.
+
+    Returns:
+        Percolation: Counts as written to the `.pps` file.
+    '''
+    mask = np.moveaxis(np.isin(mic, np.atleast_1d(phases)), axis, 0)
+    labels, n = ndimage.label(mask)
+    if n:
+        labels = _periodic_merge(labels, n, axes=(1, 2))
+    return _percolation(labels, int(mask.sum()), axis)
+
+
+def _neighbors(arr: np.ndarray, axis: int, periodic: bool):
+    '''Return `(arr, next pixel along axis)` aligned element by element.'''
+    if periodic:
+        return arr, np.roll(arr, -1, axis=axis)
+    lo = [slice(None)] * arr.ndim
+    hi = [slice(None)] * arr.ndim
+    lo[axis], hi[axis] = slice(None, -1), slice(1, None)
+    return arr[tuple(lo)], arr[tuple(hi)]
+
+
+def set_percolation(mic: np.ndarray, micpart: np.ndarray, axis: int = 0) -> Percolation:
+    '''Percolation of the solid framework along `axis` (`burnset`).
+
+    Neighboring solids are connected when either is a hydrate (CSH, C3AH6,
+    ETTR, ETTRC4AF) or both are clinker/slag/fly-ash pixels of the same
+    (non-zero) particle in `micpart`.
+
+    Args:
+        mic: Microstructure.
+        micpart: Particle-ID image of the initial microstructure.
+        axis: Non-periodic burn axis; the two other axes are periodic.
+
+    Returns:
+        Percolation: Counts as written to the `.pts` file. `total` counts
+        the solids of `mic` itself; burnset uses disrealnew's running
+        phase counters, which can lag the image by a few pixels.
+    '''
+    mic = np.moveaxis(np.asarray(mic), axis, 0)
+    part = np.moveaxis(np.asarray(micpart), axis, 0)
+    hyd = np.isin(mic, HYDRATE_IDS)
+    clk = np.isin(mic, CLINKER_IDS)
+    solid = hyd | clk
+    index = np.arange(mic.size, dtype=np.int32).reshape(mic.shape)
+
+    rows, cols = [], []
+    for ax in range(3):
+        periodic = ax != 0  # the burn axis is not periodic
+        ia, ib = _neighbors(index, ax, periodic)
+        ha, hb = _neighbors(hyd, ax, periodic)
+        ca, cb = _neighbors(clk, ax, periodic)
+        pa, pb = _neighbors(part, ax, periodic)
+        edge = ((ha | ca) & (hb | cb)
+                & (ha | hb | (ca & cb & (pa == pb) & (pa != 0))))
+        rows.append(ia[edge])
+        cols.append(ib[edge])
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    graph = sparse.coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)),
+                              shape=(mic.size, mic.size))
+    _, comp = connected_components(graph, directed=False)
+    labels = np.where(solid, comp.reshape(mic.shape) + 1, 0)
+    return _percolation(labels, int(solid.sum()), axis)
+
+
+def snapshot_cycle(path: str | Path) -> int | None:
+    '''Return the cycle of a `.ima.<cycle>.<T>.<flags>` snapshot name.
+
+    Binary copies written by `io.convert_results` (`.npy`/`.npz`) are
+    recognized too.
+    '''
+    name = Path(path).name.removesuffix(".npz").removesuffix(".npy")
+    m = _RE_SNAPSHOT.search(name)
+    return int(m.group(1)) if m else None
+
+
+def analyze(mic: np.ndarray,
+            micpart: np.ndarray | None = None,
+            axes=(0, 2, 1)) -> dict:
+    '''Phase counts, surfaces and percolation of one microstructure.
+
+    Args:
+        mic: Microstructure.
+        micpart: Particle-ID image; when given, the set point is checked too.
+        axes: Burn axes, by default in the order disrealnew checks them.
+
+    Returns:
+        dict: `counts`, `surface` (arrays per phase id), `pores` and
+        (with `micpart`) `solids`: lists of `Percolation`, one per axis.
+    '''
+    result = {
+        "counts": phase_counts(mic),
+        "surface": surface_counts(mic),
+        "pores": [phase_percolation(mic, POROSITY, ax) for ax in axes],
+    }
+    if micpart is not None:
+        result["solids"] = [set_percolation(mic, micpart, ax) for ax in axes]
+    return result
+
+
+def _analyze_file(job: tuple) -> dict:
+    '''Process-pool entry point: analyze one snapshot file.'''
+    path, part_path, axes = job
+    micpart = io.load(part_path) if part_path is not None else None
+    result = analyze(io.load(path), micpart, axes)
+    result.update(path=path, cycle=snapshot_cycle(path))
+    return result
+
+
+def analyze_results(folder: str | Path,
+                    part_image: str | Path | None = None,
+                    max_workers: int | None = None,
+                    axes=(0, 2, 1)) -> list[dict]:
+    '''Analyze every `.ima` snapshot of a results folder in parallel.
+
+    Args:
+        folder: Results folder (e.g. `results/result_01`).
+        part_image: Particle-ID image (genpartnew's `out_particle_ids`) for
+            the set-point check; omit to check pore percolation only.
+        max_workers: Worker processes (default: `os.cpu_count()`).
+        axes: Burn axes, see `analyze`.
+
+    Returns:
+        list[dict]: One `analyze` result per snapshot (plus `path` and
+        `cycle`), sorted by cycle.
+    '''
+    snapshots = [p for p in Path(folder).iterdir()
+                 if p.is_file() and snapshot_cycle(p) is not None]
+    snapshots.sort(key=snapshot_cycle)
+    if not snapshots:
+        return []
+    jobs = [(p, part_image, tuple(axes)) for p in snapshots]
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as pool:
+        return list(pool.map(_analyze_file, jobs))
@@ -0,0 +1,345 @@
+'''Benchmark suite: per-stage wall time, CPU time, peak memory and I/O volume.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    `run_benchmark(name)` runs one reference workload of `workloads.WORKLOADS`
+    ("small", "medium", "full") through the pipeline code of `run_cemhyd3d`
+    itself (sandbox staging, stage cache, the `executors.run_*` runners with
+    their output streaming and progress parsing, finalization and the run
+    manifest) and measures every stage separately through a stage hook:
+
+        - staging:    `stage_runtime` (runtime cache -> sandbox),
+        - genpartnew, distrib3d: the native tools,
+        - disrealnew: the native tool and `finalize_sandbox` (sandbox ->
+          results folder), as in the run manifest,
+        - total:      the whole run including the manifest (wall time only),
+          so overhead outside of the stages shows up too.
+
+    For each stage it records `wall` and `cpu` seconds, `peak_bytes` and
+    `bytes_written`, and returns a JSON-serializable record that also names
+    the git commit, the build profile of the executables (`setup.py
+    build_exe --profile=...`) and the host. `append_history` stores records
+    in a JSON-lines file and `compare` prints the relative change of every
+    metric between two of them, e.g. the last run on `main` and the current
+    tree.
+
+    Command line:
+        python -m pycemhyd3d.bench small medium --repeat 3
+        python -m pycemhyd3d.bench --compare          # last two per workload
+
+Notes:
+    - Tool CPU time and peak RSS are those the executors record for the
+      manifest: `os.wait4` of that very child and its `VmHWM` sampled from
+      /proc while it runs (see `progress.stream_process`). Where `os.wait4`
+      is missing (Windows) only wall time and bytes are recorded.
+    - For the Python steps `peak_bytes` is the `tracemalloc` peak of the
+      step, not a process RSS.
+    - `bytes_written` is the size of the files a stage created or modified
+      (new inode, size or mtime). Hard links and renames therefore count
+      as zero, copies count in full.
+    - With `repeat > 1` the stored metrics are per-stage medians; the raw
+      samples are kept under `samples`.
+    - With a `stage_cache`, the runs after the first one restore genpartnew
+      and distrib3d from it, so the cache lookup is what gets timed.
+'''
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .cemhyd3d import _ORIG_BIN_DIR, _run_pipeline
+from .manifest import RunManifest
+from .sandbox import create_sandbox, ensure_runtime_cache
+from .stagecache import StageCache
+from .utils import build_profile
+from .workloads import TOOLS, WORKLOADS, workload
+
+STAGES = ("staging",) + TOOLS + ("total",)
+METRICS = ("wall", "cpu", "peak_bytes", "bytes_written")
+
+
+def _snapshot(folder: Path) -> set[tuple]:
+    '''Return `(dev, ino, size, mtime_ns)` of every regular file below `folder`.'''
+    snap = set()
+    for path in Path(folder).rglob("*"):
+        st = path.lstat()
+        if path.is_file() and not path.is_symlink():
+            snap.add((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns))
+    return snap
+
+
+class _StageMeter:
+    '''Stage hook turning the manifest records of one run into bench stats.
+
+    Tool stages take `cpu` and `peak_bytes` from the child's own usage as
+    the executors record it; Python stages (staging, the NumPy placement)
+    use the process CPU time and the `tracemalloc` peak. `bytes_written`
+    covers the sandbox and the results folder.
+    '''
+
+    def __init__(self, folders: list[Path], entry: Path):
+        self.folders = folders
+        self.entry = entry
+        self.stages = {}
+        self._before = set()
+        self._cpu = 0.0
+
+    def _snapshot(self) -> set[tuple]:
+        snap = set()
+        for folder in self.folders:
+            snap |= _snapshot(folder)
+        return snap
+
+    def __call__(self, event):
+        record = event.record
+        python_step = record["exe"] is None
+        if event.kind == "start":
+            # links to the runtime cache are not written data
+            self._before = self._snapshot() | _snapshot(self.entry)
+            if python_step:
+                tracemalloc.start()
+            self._cpu = time.process_time()
+            return
+        cpu, peak = None, None
+        if python_step:
+            cpu = time.process_time() - self._cpu
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        elif record["cpu_user"] is not None:
+            cpu = record["cpu_user"] + record["cpu_system"]
+            peak = record["max_rss"]
+        self.stages[event.stage] = {
+            "wall": record["wall"], "cpu": cpu, "peak_bytes": peak,
+            "bytes_written": sum(e[2] for e in self._snapshot() - self._before),
+        }
+
+
+def _run_once(name: str, work_root: Path, cache_root: Path | None, id: str,
+              stage_cache: StageCache | None = None) -> dict:
+    '''Run the pipeline of workload `name` once; return per-stage stats.'''
+    gp, d3, dr = workload(name)
+    # populate the runtime cache outside of the measurement: staging is
+    # timed as it happens for every run after the first one on a machine
+    entry = ensure_runtime_cache(_ORIG_BIN_DIR, cache_root)
+    run_dir = create_sandbox(work_root, id)
+    results_dir = work_root / f"result_{id}"
+    results_dir.mkdir()
+    meter = _StageMeter([run_dir, results_dir], entry)
+    manifest = RunManifest(id, hooks=[meter])
+    try:
+        start = time.perf_counter()
+        try:
+            _run_pipeline(id, gp, d3, dr, run_dir, results_dir, cache_root,
+                          stage_cache, manifest=manifest)
+        finally:
+            manifest.finish(results_dir)
+        total = time.perf_counter() - start
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+        shutil.rmtree(results_dir, ignore_errors=True)
+    return {**meter.stages,
+            "total": {"wall": total, "cpu": None, "peak_bytes": None,
+                      "bytes_written": None}}
+
+
+def _median_stages(samples: list[dict]) -> dict:
+    '''Per-stage, per-metric median over `samples` (None stays None).'''
+    stages = {}
+    for stage in samples[0]:
+        stages[stage] = {}
+        for metric in METRICS:
+            values = [s[stage][metric] for s in samples if s[stage][metric] is not None]
+            if not values:
+                stages[stage][metric] = None
+            elif all(isinstance(v, int) for v in values):
+                stages[stage][metric] = statistics.median_low(values)
+            else:
+                stages[stage][metric] = statistics.median(values)
+    return stages
+
+
+def _git_commit() -> dict | None:
+    '''Commit (and dirty flag) of the source tree this module lives in.'''
+    cwd = Path(__file__).parent
+    try:
+        head = subprocess.run(["git", "rev-parse", "HEAD"], cwd=cwd, text=True,
+                              capture_output=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                cwd=cwd, text=True, capture_output=True,
+                                check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {"commit": head, "dirty": bool(status.strip())}
+
+
+def run_benchmark(name: str = "small",
+                  repeat: int = 1,
+                  work_root: str | Path | None = None,
+                  cache_root: str | Path | None = None,
+                  label: str = "",
+                  stage_cache: StageCache | str | Path | None = None) -> dict:
+    '''Run one reference workload and measure every pipeline stage.
+
+    Args:
+        name: Workload name (a key of `workloads.WORKLOADS`).
+        repeat: Number of runs; stored metrics are per-stage medians.
+        work_root: Folder for the temporary sandbox and results (default: a
+            fresh temporary directory, removed afterwards).
+        cache_root: Runtime cache folder (default:
+            `utils.default_cache_root()`).
+        label: Free text stored with the record (e.g. a branch name).
+        stage_cache: Optional `StageCache` (or its root folder) shared by the
+            runs, as in `run_cemhyd3d`.
+
+    Returns:
+        dict: JSON-serializable record with `workload`, `params`, `stages`
+        (`{stage: {metric: value}}`), `samples`, `git`, `build`, `host`,
+        `python`, `timestamp` and `label`.
+
+    Raises:
+        KeyError: if `name` is not a known workload.
+        subprocess.CalledProcessError: if a tool fails.
+    '''
+    if name not in WORKLOADS:
+        raise KeyError(f"Unknown workload {name!r}; choose one of {list(WORKLOADS)}")
+    tmp = None
+    if work_root is None:
+        work_root = tmp = tempfile.mkdtemp(prefix="pycemhyd3d-bench-")
+    work_root = Path(work_root).resolve()
+    work_root.mkdir(parents=True, exist_ok=True)
+    if isinstance(stage_cache, (str, Path)):
+        stage_cache = StageCache(stage_cache)
+    try:
+        samples = [_run_once(name, work_root, cache_root, f"bench{i}", stage_cache)
+                   for i in range(max(1, repeat))]
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        "workload": name,
+        "params": dict(WORKLOADS[name]),
+        "stages": _median_stages(samples),
+        "samples": samples,
+        "git": _git_commit(),
+        "build": build_profile(),
+        "host": {"name": socket.gethostname(), "machine": platform.machine(),
+                 "system": platform.system(), "cpus": os.cpu_count()},
+        "python": platform.python_version(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "label": label,
+    }
+
+
+def append_history(record: dict, path: str | Path) -> Path:
+    '''Append `record` as one JSON line to the history file `path`.'''
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+    return path
+
+
+def load_history(path: str | Path, workload: str | None = None) -> list[dict]:
+    '''Read the records of a history file, oldest first.
+
+    Args:
+        path: JSON-lines file written by `append_history`.
+        workload: Only return records of this workload.
+    '''
+    path = Path(path)
+    if not path.exists():
+        return []
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    if workload is not None:
+        records = [r for r in records if r["workload"] == workload]
+    return records
+
+
+def _describe(record: dict) -> str:
+    git = record.get("git") or {}
+    commit = git.get("commit", "unknown")[:10] + ("+" if git.get("dirty") else "")
+    profile = (record.get("build") or {}).get("profile", "default")
+    return f"{record['workload']} @ {commit} [{profile}] {record['timestamp']}"
+
+
+def compare(old: dict, new: dict) -> str:
+    '''Format the per-stage change of every metric from `old` to `new`.
+
+    Returns:
+        str: A text table with one row per stage and metric.
+    '''
+    lines = [f"old: {_describe(old)}", f"new: {_describe(new)}",
+             f"{'stage':<12}{'metric':<15}{'old':>14}{'new':>14}{'change':>10}"]
+    for stage in STAGES:
+        for metric in METRICS:
+            a = old["stages"].get(stage, {}).get(metric)
+            b = new["stages"].get(stage, {}).get(metric)
+            if a is None and b is None:
+                continue
+            change = f"{(b - a) / a:+.1%}" if a and b is not None else "n/a"
+            lines.append(f"{stage:<12}{metric:<15}{_fmt(a):>14}{_fmt(b):>14}{change:>10}")
+    return "\n".join(lines)
+
+
+def _fmt(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def main(argv=None) -> int:
+    '''Command line entry point (`python -m pycemhyd3d.bench`).'''
+    parser = argparse.ArgumentParser(
+        prog="python -m pycemhyd3d.bench",
+        description="Benchmark the pycemhyd3d pipeline stage by stage.")
+    parser.add_argument("workloads", nargs="*", default=["small"],
+                        help=f"workloads to run ({', '.join(WORKLOADS)})")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--history", default="bench_history.jsonl",
+                        help="JSON-lines file the records are appended to")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--work-root", default=None)
+    parser.add_argument("--stage-cache", default=None,
+                        help="stage cache folder shared by the runs")
+    parser.add_argument("--compare", action="store_true",
+                        help="only compare the last two records of each workload")
+    args = parser.parse_args(argv)
+
+    for name in args.workloads:
+        history = load_history(args.history, name)
+        if args.compare:
+            if len(history) < 2:
+                print(f"{name}: fewer than two records in {args.history}")
+                continue
+            print(compare(history[-2], history[-1]), end="\n\n")
+            continue
+        record = run_benchmark(name, args.repeat, args.work_root, label=args.label,
+                               stage_cache=args.stage_cache)
+        append_history(record, args.history)
+        if history:
+            print(compare(history[-1], record), end="\n\n")
+        else:
+            print(compare(record, record), end="\n\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -41,6 +41,8 @@ def _build_genpartnew_from_dict(id: str, cfg: dict) -> str:
             out_image (str, may contain {ID})
             out_particle_ids (str, may contain {ID})
             exit_menu (int, default 1)
+            backend (str, default "c"): not part of the payload; "numpy"
+                places the particles with `placement.py` instead.
 
     Returns:
         A newline-joined string ready to be piped to genpartnew's stdin.
@@ -75,7 +77,8 @@ def _build_distrib3d_from_dict(id: str, run_id: str, cfg: dict) -> str:
     Behavior:
         - `in_name` and `out_name` are formatted with `{ID}` and, unless given
           as absolute or already containing a path separator, are prefixed with
-          `{run_id}/` so files live inside the per-run sandbox.
+          `{run_id}/` so files live inside the per-run sandbox. An empty
+          `run_id` leaves them unprefixed (tool already runs in the sandbox).
 
     Args:
         id: Identifier substituted into filenames (via `{ID}`).
@@ -98,8 +101,9 @@ def _build_distrib3d_from_dict(id: str, run_id: str, cfg: dict) -> str:
 
     def _fmt_name(name: str) -> str:
         s = name.format(ID=id)
-        # Prefix with run_id unless absolute or already contains a path separator
-        if _P(s).is_absolute() or ("/" in s or "\\" in s):
+        # Prefix with run_id unless empty, absolute or already containing a
+        # path separator
+        if not run_id or _P(s).is_absolute() or ("/" in s or "\\" in s):
             return s
         return f"{run_id}/{s}"
 
@@ -124,7 +128,9 @@ def _build_disrealnew_from_dict(id: str, run_id: str, cfg: dict) -> str:
 
     Behavior:
         - `phase_file` and `part_file` are formatted with `{ID}` and, unless
-          absolute or already a path, are prefixed with `{run_id}/`.
+          absolute or already a path, are prefixed with `{run_id}/` (no prefix
+          for an empty `run_id`). disrealnew derives its output root from
+          the text before the first `.`, so names must not start with `./`.
         - Preserves the exact ordering required by disrealnew.
 
     Args:
@@ -143,6 +149,13 @@ def _build_disrealnew_from_dict(id: str, run_id: str, cfg: dict) -> str:
             thermal (list[4]), Ea (list[3])
             cycle_to_time (num), agg_vf (num)
             flags (list[8])
+            checkpoint_freq (int, optional): write a checkpoint every that
+                many cycles (0: none)
+            checkpoint_prefix (str, optional): checkpoint file prefix,
+                formatted like the image names (default `<root>.ckpt`)
+            restart_from (str, optional): checkpoint file to continue from
+            The three checkpoint entries are only written when one of them
+            is set, so older disrealnew inputs are unchanged.
 
     Returns:
         A newline-joined string for disrealnew's stdin (with trailing newline).
@@ -154,8 +167,9 @@ def _build_disrealnew_from_dict(id: str, run_id: str, cfg: dict) -> str:
 
     def _fmt_name(name: str) -> str:
         s = str(name).format(ID=id)
-        # Prefix with run_id unless absolute or already contains a path separator
-        if _P(s).is_absolute() or ("/" in s or "\\" in s):
+        # Prefix with run_id unless empty, absolute or already containing a
+        # path separator
+        if not run_id or _P(s).is_absolute() or ("/" in s or "\\" in s):
             return s
         return f"{run_id}/{s}"
 
@@ -225,6 +239,13 @@ def _build_disrealnew_from_dict(id: str, run_id: str, cfg: dict) -> str:
         raise ValueError("disrealnew.flags must have 8 entries.")
     lines += list(map(str, fl))
 
+    # optional checkpoint/restart entries
+    ckpt_keys = ("checkpoint_freq", "checkpoint_prefix", "restart_from")
+    if any(cfg.get(k) is not None for k in ckpt_keys):
+        lines.append(str(int(cfg.get("checkpoint_freq") or 0)))
+        for key in ckpt_keys[1:]:
+            lines.append(_fmt_name(cfg[key]) if cfg.get(key) else "none")
+
     text = "\n".join(lines)
     if not text.endswith("\n"):
         text += "\n"
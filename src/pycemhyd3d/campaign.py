@@ -0,0 +1,355 @@
+'''Resumable campaigns: a SQLite catalog of `run_cemhyd3d` jobs.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    `Campaign(path)` records every job of a campaign in a local SQLite file:
+    its parameter hash, status, attempts, timings, results folder and the key
+    scalar outputs of the run (final cycle, time, degree of hydration, heat
+    release and chemical shrinkage). `run(jobs)` executes the jobs on a
+    process pool and updates the catalog as each one finishes, so a campaign
+    interrupted by a reboot simply continues when the same loop is run again:
+
+        with Campaign("campaign.sqlite", results_root="results") as camp:
+            camp.run([(i, gp_cfg, d3_cfg, dr_cfg) for i in ids], max_workers=8)
+            camp.runs(status="done", order_by="final_heat DESC")
+            camp.query("SELECT id, final_alpha FROM runs WHERE final_heat > ?", (300,))
+
+    On every `run` call, jobs already `done` with the same parameters are
+    skipped; `failed` and `interrupted` jobs (and jobs left `running` by a
+    driver that died) are run again.
+
+Notes:
+    - Statuses: "pending", "running", "done", "failed", "interrupted".
+    - The parameter hash covers the stdin payloads rendered with the literal
+      `{ID}` token and `system_size`, so it does not depend on the id. A
+      `done` id that comes back with different parameters is an error rather
+      than a silent overwrite of its results folder; a job that did not
+      complete may change its parameters (e.g. to fix a failing input).
+    - Only the driver process writes to the catalog, and one driver per
+      catalog is assumed: `running` rows found by `run` are taken to be
+      left over from an interrupted driver.
+    - Timings (`started`, `finished`, `wall`) and errors come from the run's
+      `manifest.json`; the scalars from its `.heat` and `.chs` series.
+    - Only depends on the standard library.
+'''
+import hashlib
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .builders import (
+    _build_genpartnew_from_dict,
+    _build_distrib3d_from_dict,
+    _build_disrealnew_from_dict,
+)
+from .cemhyd3d import _run_batch_job
+from .manifest import MANIFEST_NAME
+from .utils import DEFAULT_SYSTEM_SIZE, caller_results_root
+
+STATUSES = ("pending", "running", "done", "failed", "interrupted")
+
+# Key scalars of a run: column -> (series extension, column index in the
+# last row of that series)
+SCALARS = {
+    "final_cycle": ("heat", 0),
+    "final_time_h": ("heat", 1),
+    "final_alpha": ("heat", 3),
+    "final_heat": ("heat", 4),
+    "chem_shrinkage": ("chs", 3),
+}
+
+_SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS runs (
+    id           TEXT PRIMARY KEY,
+    param_hash   TEXT NOT NULL,
+    params       TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    started      TEXT,
+    finished     TEXT,
+    wall         REAL,
+    results_dir  TEXT,
+    error        TEXT,
+    updated      TEXT NOT NULL,
+    {", ".join(f"{col} REAL" for col in SCALARS)}
+);
+CREATE INDEX IF NOT EXISTS runs_status ON runs (status);
+CREATE INDEX IF NOT EXISTS runs_param_hash ON runs (param_hash);
+CREATE INDEX IF NOT EXISTS runs_final_alpha ON runs (final_alpha);
+CREATE INDEX IF NOT EXISTS runs_final_heat ON runs (final_heat);
+'''
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def job_params(job: dict) -> dict:
+    '''Return the id-independent parameters of a job dict.
+
+    The stdin payloads are rendered with the literal `{ID}` token, as for
+    the stage cache keys.
+    '''
+    params = {
+        "genpartnew": _build_genpartnew_from_dict("{ID}", job["genpartnew_input"]),
+        "distrib3d": _build_distrib3d_from_dict("{ID}", "", job["distrib3d_input"]),
+        "disrealnew": _build_disrealnew_from_dict("{ID}", "", job["disrealnew_input"]),
+        "system_size": job.get("system_size", DEFAULT_SYSTEM_SIZE),
+    }
+    backend = job["genpartnew_input"].get("backend", "c")
+    if backend != "c":
+        # only recorded when set, so existing catalogs keep their hashes
+        params["genpartnew_backend"] = backend
+    return params
+
+
+def param_hash(params: dict) -> str:
+    '''Hex SHA-256 of `job_params(...)`.'''
+    text = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _last_row(path: Path) -> list[str]:
+    rows = [line.split() for line in path.read_text().splitlines() if line.strip()]
+    return rows[-1] if len(rows) > 1 else []
+
+
+def read_scalars(results_dir: str | Path) -> dict:
+    '''Return the key scalars of `SCALARS` from a results folder.
+
+    Values that cannot be found (missing series, run failed early) are None.
+    '''
+    values = dict.fromkeys(SCALARS)
+    rows = {}
+    for col, (ext, index) in SCALARS.items():
+        if ext not in rows:
+            paths = sorted(Path(results_dir).glob(f"*.{ext}.*"))
+            rows[ext] = _last_row(paths[0]) if paths else []
+        try:
+            values[col] = float(rows[ext][index])
+        except (IndexError, ValueError):
+            pass
+    return values
+
+
+def _read_manifest(results_dir: Path) -> dict:
+    try:
+        return json.loads((results_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+class Campaign:
+    '''SQLite catalog of a campaign, and the driver that keeps it current.
+
+    Args:
+        path: Catalog file (created on first use).
+        results_root: Folder receiving every `result_<id>/` (default:
+            `results/` next to the caller script).
+    '''
+
+    def __init__(self, path: str | Path, results_root: str | Path | None = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if results_root is None:
+            results_root = caller_results_root()
+        self.results_root = Path(results_root).resolve()
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            self.db.executescript(_SCHEMA)
+
+    def close(self):
+        '''Close the catalog.'''
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _update(self, id: str, **values):
+        values["updated"] = _now()
+        cols = ", ".join(f"{k} = ?" for k in values)
+        with self.db:
+            self.db.execute(f"UPDATE runs SET {cols} WHERE id = ?",
+                            (*values.values(), id))
+
+    def _register(self, job: dict, retry_failed: bool) -> bool:
+        '''Insert or check the catalog row of `job`; True if it must run.'''
+        params = job_params(job)
+        digest = param_hash(params)
+        row = self.db.execute("SELECT param_hash, status FROM runs WHERE id = ?",
+                              (job["id"],)).fetchone()
+        if row is None:
+            with self.db:
+                self.db.execute(
+                    "INSERT INTO runs (id, param_hash, params, status, updated) "
+                    "VALUES (?, ?, ?, 'pending', ?)",
+                    (job["id"], digest, json.dumps(params), _now()))
+            return True
+        if row["status"] == "done":
+            if row["param_hash"] != digest:
+                raise ValueError(f"Job {job['id']!r} is already done in {self.path} "
+                                 "with different parameters; use a new id")
+            return False
+        if row["param_hash"] != digest:
+            self._update(job["id"], param_hash=digest, params=json.dumps(params))
+        if row["status"] == "failed" and not retry_failed:
+            return False
+        return True
+
+    def run(self,
+            jobs,
+            max_workers: int | None = None,
+            retry_failed: bool = True,
+            **kwargs) -> dict:
+        '''Run the jobs that are not `done` yet and record their outcome.
+
+        Args:
+            jobs: Iterable of jobs, each either a dict with the keyword
+                arguments of `run_cemhyd3d` or a tuple
+                `(id, gp_cfg, d3_cfg, dr_cfg)`.
+            max_workers: Number of worker processes (default:
+                `os.cpu_count()`).
+            retry_failed: Also re-run jobs recorded as `failed` (interrupted
+                jobs are always resumed).
+            **kwargs: Forwarded to every `run_cemhyd3d` call (e.g.
+                `stage_cache`, `engine`, `system_size`); a job dict may
+                override them.
+
+        Returns:
+            dict[str, str]: Status of every job after this call.
+
+        Raises:
+            ValueError: if two jobs share an id, or an id is already done
+                in the catalog with different parameters.
+            RuntimeError: if any job failed, after all jobs have finished
+                and the catalog is up to date; the first failure is chained
+                as the cause.
+        '''
+        job_list = []
+        for job in jobs:
+            if not isinstance(job, dict):
+                id_, gp, d3, dr = job
+                job = {"id": id_, "genpartnew_input": gp,
+                       "distrib3d_input": d3, "disrealnew_input": dr}
+            job_list.append({"results_root": self.results_root, **kwargs, **job})
+
+        ids = [job["id"] for job in job_list]
+        dupes = sorted({i for i in ids if ids.count(i) > 1})
+        if dupes:
+            raise ValueError(f"Duplicate job ids in campaign: {dupes}")
+
+        # rows still `running` belong to a driver that did not finish
+        with self.db:
+            self.db.execute("UPDATE runs SET status = 'interrupted', updated = ? "
+                            "WHERE status = 'running'", (_now(),))
+        todo = [job for job in job_list if self._register(job, retry_failed)]
+        print(f"[campaign] {len(job_list) - len(todo)} of {len(job_list)} jobs "
+              f"already done in {self.path}; running {len(todo)}")
+
+        failures = []
+        if todo:
+            if max_workers is None:
+                max_workers = os.cpu_count() or 1
+            try:
+                with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                    futures = {}
+                    for job in todo:
+                        results_dir = Path(job["results_root"]) / f"result_{job['id']}"
+                        with self.db:
+                            self.db.execute(
+                                "UPDATE runs SET status = 'running', error = NULL, "
+                                "attempts = attempts + 1, results_dir = ?, updated = ? "
+                                "WHERE id = ?", (str(results_dir), _now(), job["id"]))
+                        futures[pool.submit(_run_batch_job, job)] = job
+                    for fut in as_completed(futures):
+                        job, error = futures[fut], None
+                        try:
+                            fut.result()
+                        except Exception as exc:
+                            error = exc
+                            failures.append((job["id"], exc))
+                            print(f"❌ [campaign] Job {job['id']} failed: {exc!r}")
+                        self._record(job, error)
+            except BaseException:
+                with self.db:
+                    self.db.execute("UPDATE runs SET status = 'interrupted', "
+                                    "updated = ? WHERE status = 'running'", (_now(),))
+                raise
+
+        statuses = {row["id"]: row["status"] for row in self.db.execute(
+            f"SELECT id, status FROM runs WHERE id IN ({', '.join('?' * len(ids))})",
+            ids)} if ids else {}
+        if failures:
+            failed = ", ".join(str(id_) for id_, _ in failures)
+            raise RuntimeError(
+                f"{len(failures)} of {len(todo)} jobs failed: {failed}"
+            ) from failures[0][1]
+        return {id_: statuses[id_] for id_ in ids}
+
+    def _record(self, job: dict, error: BaseException | None):
+        '''Store the outcome of a finished job.'''
+        results_dir = Path(job["results_root"]) / f"result_{job['id']}"
+        manifest = _read_manifest(results_dir)
+        stages = manifest.get("stages", [])
+        wall = sum(s["wall"] for s in stages if s.get("wall") is not None) or None
+        self._update(
+            job["id"],
+            status="done" if error is None else "failed",
+            started=manifest.get("started"),
+            finished=manifest.get("finished"),
+            wall=wall,
+            error=None if error is None else (manifest.get("error") or repr(error)),
+            **read_scalars(results_dir),
+        )
+
+    def status(self) -> dict:
+        '''Return `{status: number of jobs}` over the whole catalog.'''
+        counts = dict.fromkeys(STATUSES, 0)
+        for row in self.db.execute("SELECT status, COUNT(*) AS n FROM runs "
+                                   "GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        return counts
+
+    def runs(self, status: str | None = None, order_by: str = "id") -> list[dict]:
+        '''Return the catalog rows as dicts (without the `params` column).
+
+        Args:
+            status: Only rows with this status (default: all).
+            order_by: SQL ordering, e.g. "final_heat DESC".
+        '''
+        cols = ", ".join(c for c in self._columns() if c != "params")
+        sql = f"SELECT {cols} FROM runs"
+        args = ()
+        if status is not None:
+            if status not in STATUSES:
+                raise ValueError(f"Unknown status {status!r}; choose one of {STATUSES}")
+            sql += " WHERE status = ?"
+            args = (status,)
+        return [dict(row) for row in self.db.execute(f"{sql} ORDER BY {order_by}", args)]
+
+    def params(self, id: str) -> dict:
+        '''Return the rendered parameters recorded for job `id`.
+
+        Raises:
+            KeyError: if `id` is not in the catalog.
+        '''
+        row = self.db.execute("SELECT params FROM runs WHERE id = ?", (id,)).fetchone()
+        if row is None:
+            raise KeyError(id)
+        return json.loads(row["params"])
+
+    def query(self, sql: str, params=()) -> list[dict]:
+        '''Run a read query against the `runs` table; return rows as dicts.'''
+        return [dict(row) for row in self.db.execute(sql, params)]
+
+    def _columns(self) -> list[str]:
+        return [row["name"] for row in self.db.execute("PRAGMA table_info(runs)")]
@@ -5,21 +5,45 @@ Author:
 
 Overview:
     Provides a single entry point `run_cemhyd3d(...)` that:
-      1) Creates a per-run sandbox directory under a local `cempy3d/` copy,
+      1) Creates a per-run sandbox directory and links the cached
+         executables and runtime data files into it,
       2) Builds stdin payloads for `genpartnew`, `distrib3d`, `disrealnew`,
-      3) Executes the three native tools in sequence,
-      4) Mirrors all produced files into `./results/result_<ID>/`,
-      5) Cleans up the per-run sandbox and temporary local `cempy3d/`.
+      3) Executes the three native tools in sequence inside the sandbox,
+      4) Moves all produced files into `./results/result_<ID>/` (renames,
+         no copies, when sandbox and results share a filesystem),
+      5) Cleans up the per-run sandbox,
+      6) Writes `manifest.json` (inputs, executable hashes, per-stage timing
+         and resource usage, output sizes; see `manifest.py`) into the
+         results folder, also when the run failed.
+
+    `run_cemhyd3d_batch(...)` runs many such pipelines in parallel on a
+    process pool. Because every run owns its sandbox, runs never share a
+    working directory or files. `run_cemhyd3d_fanout(...)` builds one
+    microstructure and runs many `disrealnew` variants on it in parallel.
+
+    With `checkpoint_every=n`, disrealnew saves its complete state every n
+    cycles (`checkpoint.c`). `resume_cemhyd3d(...)` continues an
+    interrupted run from its latest checkpoint, and `branch_cemhyd3d(...)`
+    forks parallel variants (e.g. other curing conditions) from one.
 
 Notes:
-    - Executables are resolved from a package-shipped `cempy3d/` directory and
-      copied next to the caller if needed for the run.
+    - Executables and data files are staged once per machine from the
+      package-shipped `cempy3d/` directory into a content-hashed runtime
+      cache (see `sandbox.py`); each sandbox only links to it.
     - Windows vs. Linux executable names are handled (e.g., `.exe` suffix).
+    - `engine="lib"` (or "auto") runs the three tools in one worker process
+      through the shared libraries of `engine.py`, handing the images
+      between stages in memory. It only saves the formatting and parsing of
+      the intermediate images and two process start-ups (about 0.2 s a run),
+      not tool time; the executables remain the default and the fallback.
+    - `system_size=` selects the lattice edge length (pixels). The default
+      100 uses the historical executables; other sizes use the tools built
+      for them with `python setup.py build_exe --sizes=50,200`.
 
 '''
 import os
-import uuid
 import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 # local imports from your package
@@ -29,20 +53,45 @@ from .builders import (
     _build_disrealnew_from_dict,
 )
 from .executors import (
+    finalize_sandbox,
+    place_file,
     run_genpartnew,
     run_distrib3d,
     run_disrealnew,
 )
-from .utils import is_windows
+from .manifest import RunManifest
+from .sandbox import create_sandbox, ensure_runtime_cache, runtime_hash, stage_runtime
+from .stagecache import StageCache, file_hash, stage_key
+from .utils import DEFAULT_SYSTEM_SIZE, caller_results_root, is_windows, tool_name
 
-# Path to the original _bin inside the installed package (for initial copy)
+# Path to the original _bin inside the installed package (source for staging)
 _ORIG_BIN_DIR = Path(__file__).parent / "cempy3d"
 
+# Values of the `engine=` argument
+ENGINES = ("exe", "lib", "auto")
+# disrealnew checkpoints: <results_dir>/checkpoints/ckpt.<cycle>
+CHECKPOINT_DIR = "checkpoints"
+CHECKPOINT_PREFIX = "ckpt"
+# Values of the genpartnew config's `backend` key ("numpy": placement.py)
+GENPARTNEW_BACKENDS = ("c", "numpy")
+
 
 def run_cemhyd3d(id: str,
                  genpartnew_input: str | dict,
                  distrib3d_input: str | dict,
-                 disrealnew_input: str | dict):
+                 disrealnew_input: str | dict,
+                 results_root: str | Path | None = None,
+                 sandbox_root: str | Path | None = None,
+                 cache_root: str | Path | None = None,
+                 stage_cache: StageCache | str | Path | None = None,
+                 progress=None,
+                 stall_timeout: float | None = None,
+                 timeout: float | None = None,
+                 hooks=None,
+                 manifest_sink: str | Path | None = None,
+                 engine: str = "exe",
+                 system_size: int = DEFAULT_SYSTEM_SIZE,
+                 checkpoint_every: int | None = None):
 
     '''Run the full CEMHYD3D pipeline: genpartnew → distrib3d → disrealnew.
 
@@ -54,11 +103,45 @@ def run_cemhyd3d(id: str,
             consumable by `_build_distrib3d_from_dict`.
         disrealnew_input: Either a ready-made stdin string or a dict config
             consumable by `_build_disrealnew_from_dict`.
+        results_root: Folder receiving `result_<id>/`. Defaults to
+            `results/` next to the caller script.
+        sandbox_root: Folder in which the per-run sandbox is created.
+            Defaults to `results_root`, so that sandbox and results live on
+            the same filesystem.
+        cache_root: Machine-wide cache holding the staged executables and
+            data files (default: `utils.default_cache_root()`).
+        stage_cache: Optional `StageCache` (or its root folder). When given,
+            genpartnew and distrib3d outputs are reused from / stored into it
+            instead of always re-running those stages.
+        progress: Optional callable receiving `progress.ProgressEvent`s
+            from every stage (see `progress.iter_progress` for an iterator).
+        stall_timeout: Watchdog: kill a stage that makes no progress for this
+            many seconds (None: never) and raise `progress.StallError`.
+        timeout: Watchdog: kill a stage running longer than this many
+            seconds (None: never).
+        hooks: Optional callables receiving a `manifest.StageEvent` when a
+            stage starts and ends (in addition to `manifest.register_hook`).
+        manifest_sink: Optional JSON-lines file the run manifest is appended
+            to (e.g. one file for a whole campaign).
+        engine: "exe" runs the executables; "lib" runs the tools from the
+            shared libraries in one worker process (see `engine.py`; needs
+            NumPy and a Linux `setup.py build_exe`), passing the images
+            between stages in memory; "auto" uses "lib" when it is available
+            and no `progress`/watchdog is requested, else "exe".
+        system_size: Edge length of the cubic lattice in pixels (1 pixel =
+            1 um). Particle counts in `genpartnew_input` are absolute, so
+            scale them with the volume (see `workloads.example_workload`).
+        checkpoint_every: Let disrealnew write a checkpoint every this many
+            cycles into `result_<id>/checkpoints/` (see `resume_cemhyd3d`
+            and `branch_cemhyd3d`). Checkpoints are written straight into
+            the results folder, so they survive an interrupted run.
 
     Side effects:
-        - Creates `results/result_<id>/` next to the caller script.
-        - Copies a temporary `cempy3d/` folder next to the caller (removed at end).
-        - Creates a per-run sandbox inside that folder and deletes it after mirroring.
+        - Creates `<results_root>/result_<id>/` with a `manifest.json`.
+        - Stages the executables and data files once into
+          `<cache_root>/runtime/<hash>/` (reused by later runs).
+        - Creates a private sandbox `<sandbox_root>/.sandbox-<id>-*`, links
+          the cached runtime into it, and deletes it after mirroring.
 
     Returns:
         pathlib.Path: The path to the results directory.
@@ -67,106 +150,981 @@ def run_cemhyd3d(id: str,
         FileNotFoundError: if required intermediate files are missing before
             running `disrealnew` (checked inside executors).
         subprocess.CalledProcessError: if any executable returns non-zero.
+        progress.StallError: if the watchdog killed a stage.
+        ValueError: for an unknown `engine`, or `engine="lib"` combined with
+            `progress`, `stall_timeout` or `timeout`, or an invalid
+            `system_size`.
+        FileNotFoundError: if no executables are built for `system_size`.
+        engine.EngineError: if `engine="lib"` but the libraries are missing.
     '''
-    try:
-        import inspect
-        caller_file = Path(inspect.stack()[1].filename).resolve()
-        script_dir = caller_file.parent
-    except Exception:
-        script_dir = Path.cwd()
+    watch = {"progress": progress, "stall_timeout": stall_timeout,
+             "timeout": timeout}
+    in_process = _use_engine(engine, watch, system_size)
+    if not in_process:
+        _check_built(system_size)
+    if results_root is None:
+        results_root = caller_results_root()
+    results_root = Path(results_root).resolve()
+    sandbox_root = results_root if sandbox_root is None else Path(sandbox_root).resolve()
 
-    results_dir = script_dir / "results" / f"result_{id}"
+    results_dir = results_root / f"result_{id}"
     results_dir.mkdir(parents=True, exist_ok=True)
 
-    # --- ensure local cempy3d exists next to the caller script (idempotent) ---
-    local_bin = script_dir / "cempy3d"
-    marker = local_bin / ".ready"
+    if isinstance(stage_cache, (str, Path)):
+        stage_cache = StageCache(stage_cache)
+    disrealnew_input = _with_checkpoints(disrealnew_input, results_dir,
+                                         checkpoint_every)
+
+    # --- private sandbox: every tool runs with cwd=run_dir ---
+    manifest = RunManifest(id, hooks)
+    run_dir = create_sandbox(sandbox_root, id)
+    error = None
+    try:
+        _run_pipeline(id, genpartnew_input, distrib3d_input, disrealnew_input,
+                      run_dir, results_dir, cache_root, stage_cache, watch,
+                      manifest, in_process, system_size)
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+        manifest.finish(results_dir, error, manifest_sink)
+    print(f"✅ Pipeline completed successfully. Results in: {results_dir}")
+    return results_dir
+
 
-# If missing OR previous copy was interrupted (no marker), rebuild cleanly
-    if (not local_bin.exists()) or (not marker.exists()):
-        # remove any partial/old dir
-        shutil.rmtree(local_bin, ignore_errors=True)
+def _run_pipeline(id: str,
+                  genpartnew_input: dict,
+                  distrib3d_input: dict,
+                  disrealnew_input: dict,
+                  run_dir: Path,
+                  results_dir: Path,
+                  cache_root: str | Path | None = None,
+                  stage_cache: StageCache | None = None,
+                  watch: dict | None = None,
+                  manifest: RunManifest | None = None,
+                  in_process: bool = False,
+                  system_size: int = DEFAULT_SYSTEM_SIZE):
+    '''Stage the runtime into `run_dir` and execute the three tools there.
 
-        # copy into a temp dir, then move into place to avoid half-copies
-        tmp_dir = script_dir / f".cempy3d.tmp-{os.getpid()}-{uuid.uuid4().hex[:6]}"
-        shutil.copytree(_ORIG_BIN_DIR, tmp_dir)
+    `watch` holds the `progress`/`stall_timeout`/`timeout` executor kwargs;
+    every stage is recorded in `manifest`. With `in_process` the tools run
+    in one `engine.Worker` and their images stay in its memory between
+    stages (see `_InMemoryImages`). The tools built for `system_size` are
+    used.
+    '''
+    watch = watch or {}
+    manifest = manifest or RunManifest(id)
+    with manifest.stage("staging"):
+        staged = stage_runtime(run_dir, _ORIG_BIN_DIR, cache_root)
+    memory = None
+    if in_process:
+        from . import engine as cem_engine
+        exe, exe2, exe3 = _lib_paths(run_dir, system_size)
+        memory = _InMemoryImages(cem_engine.Worker(run_dir, system_size),
+                                 run_dir, results_dir)
+    else:
+        exe, exe2, exe3 = _exe_paths(run_dir, system_size)
 
-        # move temp -> final
-        # (shutil.move is fine here since we just removed local_bin)
-        shutil.move(str(tmp_dir), str(local_bin))
+    try:
+        phase_name, part_name = _run_microstructure(
+            id, genpartnew_input, distrib3d_input, run_dir, results_dir,
+            exe, exe2, stage_cache, watch, manifest, memory, system_size,
+        )
 
-        # write a marker to signal a complete copy
-        marker.write_text("ok", encoding="utf-8")
+        # Tools run with cwd=run_dir, so filenames in the payloads stay unprefixed
+        disrealnew_text = _build_disrealnew_from_dict(id, "", disrealnew_input)
 
-    bin_dir = local_bin.resolve()
-# --------------------------------------------------------------------------
+        # disrealnew (cwd=run_dir) + finalize (moves run_dir -> results_dir,
+        # leaving the staged executables and data files behind)
+        with manifest.stage("disrealnew", disrealnew_text, exe3) as record:
+            if memory is not None:
+                images = {
+                    **memory.source("phase", disrealnew_input["phase_file"].format(ID=id)),
+                    **memory.source("particles", disrealnew_input["part_file"].format(ID=id)),
+                }
+                memory.worker.run("disrealnew", disrealnew_text, run_dir,
+                                  run_dir / f"disrealnew_{id}.out", images)
+                print(f"[disrealnew] Completed in-process in sandbox: {run_dir}")
+            else:
+                run_disrealnew(
+                    id=id,
+                    disrealnew_input=disrealnew_text,
+                    exe3=exe3,
+                    run_dir=run_dir,
+                    results_dir=results_dir,
+                    phase_name=phase_name,
+                    part_name=part_name,
+                    exclude=staged,
+                    usage=record,
+                    **watch,
+                )
+    finally:
+        if memory is not None:
+            memory.finish()
+    if memory is not None:
+        finalize_sandbox(run_dir, results_dir, staged)
 
-    # ----------------------------------------------------------
 
-    run_id  = "gp_" + uuid.uuid4().hex[:6]
-    run_dir = bin_dir / run_id
-    run_dir.mkdir(parents=False, exist_ok=False)
+def _with_checkpoints(cfg: dict, results_dir: Path, every: int | None) -> dict:
+    '''Return `cfg` writing disrealnew checkpoints every `every` cycles into
+    `results_dir/checkpoints/` (unchanged for None).'''
+    if every is None:
+        return cfg
+    if not isinstance(every, int) or every <= 0:
+        raise ValueError(f"checkpoint_every must be a positive int, got {every!r}")
+    ckpt_dir = results_dir / CHECKPOINT_DIR
+    ckpt_dir.mkdir(parents=True, exist_ok=True)
+    return {**cfg, "checkpoint_freq": every,
+            "checkpoint_prefix": str(ckpt_dir / CHECKPOINT_PREFIX)}
 
-    # pick exe paths
-    if is_windows():
-        exe  = bin_dir / "genpartnew.exe"
-        exe2 = bin_dir / "distrib3d.exe"
-        exe3 = bin_dir / "disrealnew.exe"
-    else:
-        exe  = bin_dir / "genpartnew"
-        exe2 = bin_dir / "distrib3d"
-        exe3 = bin_dir / "disrealnew"
 
-    # ---- substitute tokens {ID} and {RUN} in the provided inputs ----
-    # genpartnew
-    
-    part_name = Path(genpartnew_input["out_particle_ids"].format(ID=id)).name
-    genpartnew_text = _build_genpartnew_from_dict(id, genpartnew_input)
+def find_checkpoints(results_dir: str | Path) -> dict[int, Path]:
+    '''Return the disrealnew checkpoints of a results folder.
+
+    Returns:
+        dict[int, pathlib.Path]: `{cycle: checkpoint file}`, by cycle.
+    '''
+    found = {}
+    for path in (Path(results_dir) / CHECKPOINT_DIR).glob(f"{CHECKPOINT_PREFIX}.*"):
+        cycle = path.name[len(CHECKPOINT_PREFIX) + 1:]
+        if cycle.isdigit():
+            found[int(cycle)] = path
+    return dict(sorted(found.items()))
+
+
+def _resolve_checkpoint(results_dir: Path, checkpoint) -> Path:
+    '''Checkpoint file of `results_dir` for a cycle, a path or None (latest).'''
+    if isinstance(checkpoint, (str, Path)):
+        path = Path(checkpoint).resolve()
+        if not path.is_file():
+            raise FileNotFoundError(f"Checkpoint not found: {path}")
+        return path
+    found = find_checkpoints(results_dir)
+    if not found:
+        raise FileNotFoundError(f"No checkpoints in {results_dir / CHECKPOINT_DIR}")
+    if checkpoint is None:
+        return found[max(found)]
+    if checkpoint not in found:
+        raise FileNotFoundError(
+            f"No checkpoint after cycle {checkpoint} in {results_dir}; "
+            f"available: {sorted(found)}")
+    return found[checkpoint]
+
+
+def _exe_paths(bin_dir: Path,
+               system_size: int = DEFAULT_SYSTEM_SIZE) -> tuple[Path, Path, Path]:
+    '''Return the genpartnew, distrib3d and disrealnew paths in `bin_dir`
+    (built for `system_size`).'''
+    suffix = ".exe" if is_windows() else ""
+    return (bin_dir / f"{tool_name('genpartnew', system_size)}{suffix}",
+            bin_dir / f"{tool_name('distrib3d', system_size)}{suffix}",
+            bin_dir / f"{tool_name('disrealnew', system_size)}{suffix}")
+
+
+def _lib_paths(bin_dir: Path,
+               system_size: int = DEFAULT_SYSTEM_SIZE) -> tuple[Path, Path, Path]:
+    '''Return the shared library paths of the three tools in `bin_dir`.'''
+    from . import engine as cem_engine
+    return tuple(cem_engine.lib_path(tool, bin_dir, system_size)
+                 for tool in cem_engine.TOOLS)
+
+
+def _check_built(system_size: int):
+    '''Raise FileNotFoundError unless the executables for `system_size`
+    are in the package.'''
+    missing = [p.name for p in _exe_paths(_ORIG_BIN_DIR, system_size) if not p.is_file()]
+    if missing:
+        raise FileNotFoundError(
+            f"No executables for system_size={system_size} ({', '.join(missing)}); "
+            f"run `python setup.py build_exe --sizes={system_size}`")
+
+
+def _use_engine(engine: str, watch: dict,
+                system_size: int = DEFAULT_SYSTEM_SIZE) -> bool:
+    '''Resolve the `engine=` argument: True to run the tools in-process.'''
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}; choose one of {ENGINES}")
+    if engine == "exe":
+        return False
+    watched = any(v is not None for v in watch.values())
+    if engine == "lib" and watched:
+        raise ValueError("engine='lib' has no progress events or watchdog; "
+                         "drop progress/stall_timeout/timeout or use the executables")
+    try:
+        from . import engine as cem_engine
+    except ImportError:  # NumPy missing
+        if engine == "lib":
+            raise
+        return False
+    if cem_engine.available(_ORIG_BIN_DIR, system_size=system_size):
+        return not watched
+    if engine == "lib":
+        raise cem_engine.EngineError(
+            f"Shared libraries for system_size={system_size} not built; run "
+            f"`python setup.py build_exe --sizes={system_size}` on Linux")
+    return False
+
+
+class _InMemoryImages:
+    '''Images of an in-process run (`engine="lib"`).
+
+    The three stages run in one `engine.Worker` and the images they hand
+    on stay in its shared slots. Their text files, which the results folder
+    and the stage cache keep, are written by a background thread
+    (`Worker.write_image` runs in C without the GIL) while the next stage
+    runs. `finish` stops the worker, waits for the files, links them and the
+    stage logs into `results_dir` and stores the finished stages in the
+    stage cache, once at the end of the run.
+    '''
+
+    def __init__(self, worker, run_dir: Path, results_dir: Path):
+        self.worker = worker
+        self.run_dir, self.results_dir = run_dir, results_dir
+        self.held: dict[str, str] = {}  # slot -> name of the file it holds
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._writes = {}               # file name -> future of its write
+        self._logs: list[str] = []
+        self._stages = []               # (stages, stage) to store at the end
+
+    def keep(self, slot: str, name: str, width: int = 0):
+        '''Record that `slot` holds the image of file `name`, and queue the
+        write of that file (field `width` as the tool writes it).'''
+        self.held[slot] = name
+        self._writes[name] = self._writer.submit(
+            self.worker.write_image, self.run_dir / name, slot, width)
+
+    def source(self, slot: str, read_name: str) -> dict:
+        '''`{read_name: slot}` if the next tool reads the file held in
+        `slot`, else `{}` (the tool reads the file).'''
+        if self.held.get(slot) != Path(read_name).name:
+            return {}
+        return {read_name: slot}
+
+    def written(self, name: str):
+        '''Wait for the file `name` (e.g. before a cache key hashes it).'''
+        future = self._writes.get(name)
+        if future is not None:
+            future.result()
+
+    def finished(self, log_name: str, stages=None, stage: str | None = None):
+        '''Record a completed stage: its log, and its cache entry.'''
+        self._logs.append(log_name)
+        if stages is not None:
+            self._stages.append((stages, stage))
 
-   
-    phase_name = Path(distrib3d_input["out_name"].format(ID=id)).name
-    distrib3d_text = _build_distrib3d_from_dict(id, run_id, distrib3d_input)
+    def finish(self):
+        '''Stop the worker, then place the files and store the stages.'''
+        self.worker.close()
+        self._writer.shutdown(wait=True)
+        for future in self._writes.values():
+            future.result()
+        for name in list(self._writes) + self._logs:
+            place_file(self.run_dir / name, self.results_dir / name, mode="link")
+        for stages, stage in self._stages:
+            stages.store(stage)
 
-    # disrealnew
-    disrealnew_text = _build_disrealnew_from_dict(id, run_id, disrealnew_input)
-    # ----------------------------------------------------------------
 
-    # === execute steps via executors ===
+def _keep_images(run_dir: Path, results_dir: Path, images: dict, log_name: str):
+    '''Write the NumPy backend's images in the tools' text format and link
+    them (and the stage log) into `results_dir`, as the executors do.
+
+    `images` maps file names to `(array, field width)`.
+    '''
+    from .io import write_text
+    for name, (arr, width) in images.items():
+        write_text(run_dir / name, arr, width=width)
+    for name in list(images) + [log_name]:
+        place_file(run_dir / name, results_dir / name, mode="link")
+
+
+def _genpartnew_backend(cfg: dict) -> str:
+    '''Return the genpartnew backend selected by `cfg["backend"]`.'''
+    backend = cfg.get("backend", "c")
+    if backend not in GENPARTNEW_BACKENDS:
+        raise ValueError(f"Unknown genpartnew backend {backend!r}; "
+                         f"choose from {GENPARTNEW_BACKENDS}")
+    return backend
+
+
+def _genpartnew_stage(cfg: dict, system_size: int = DEFAULT_SYSTEM_SIZE) -> str:
+    '''Stage-cache name of genpartnew; each backend has its own entries.
+
+    The NumPy backend's name carries a hash of `placement.py` (the C
+    backend's executable is covered by the runtime hash), so cached
+    microstructures are not reused after the placement code changes.
+    '''
+    name = tool_name("genpartnew", system_size)
+    backend = _genpartnew_backend(cfg)
+    if backend == "c":
+        return name
+    source = file_hash(Path(__file__).parent / "placement.py")[:16]
+    return f"{name}:{backend}:{source}"
+
+
+class _MicrostructureStages:
+    '''File names, payloads and stage-cache entries of the genpartnew and
+    distrib3d stages of one run.
+
+    Shared by `_run_microstructure` and `aio._pipeline`, which only differ
+    in how they run the tools. Cache keys are built from the payloads
+    rendered with the literal `{ID}` token (and the tools' `system_size`),
+    so runs that only differ by id share entries; distrib3d's key also
+    hashes the image it reads, so it is computed once genpartnew has run.
+    '''
+
+    def __init__(self, id: str, genpartnew_input: dict, distrib3d_input: dict,
+                 run_dir: Path, stage_cache: StageCache | None = None,
+                 system_size: int = DEFAULT_SYSTEM_SIZE):
+        self.genpartnew_input = genpartnew_input
+        self.distrib3d_input = distrib3d_input
+        self.stage_cache = stage_cache
+        self.system_size = system_size
+        # ---- substitute tokens {ID} in the provided inputs ----
+        self.img_name = Path(genpartnew_input.get("out_image", "cem140w04floc_{ID}.img")
+                             .format(ID=id)).name
+        self.part_name = Path(genpartnew_input["out_particle_ids"].format(ID=id)).name
+        self.genpartnew_text = _build_genpartnew_from_dict(id, genpartnew_input)
+
+        self.phase_name = Path(distrib3d_input["out_name"].format(ID=id)).name
+        self.distrib3d_text = _build_distrib3d_from_dict(id, "", distrib3d_input)
+        self.in_name = distrib3d_input["in_name"].format(ID=id)
+        # ----------------------------------------------------------------
+        self.run_dir = run_dir
+        self.outputs = {
+            "genpartnew": [run_dir / self.img_name, run_dir / self.part_name,
+                           run_dir / f"genpartnew_{id}.out"],
+            "distrib3d": [run_dir / self.phase_name, run_dir / f"distrib3d_{id}.out"],
+        }
+        self.rt_hash = runtime_hash(_ORIG_BIN_DIR) if stage_cache is not None else ""
+        self.keys: dict[str, str] = {}
+
+    def key(self, stage: str) -> str | None:
+        '''Stage-cache key of `stage`, or None without a cache.'''
+        if self.stage_cache is None:
+            return None
+        if stage == "genpartnew":
+            return stage_key(_genpartnew_stage(self.genpartnew_input, self.system_size),
+                             _build_genpartnew_from_dict("{ID}", self.genpartnew_input),
+                             runtime_hash=self.rt_hash)
+        return stage_key(tool_name("distrib3d", self.system_size),
+                         _build_distrib3d_from_dict("{ID}", "", self.distrib3d_input),
+                         input_files=[self.run_dir / self.in_name],
+                         runtime_hash=self.rt_hash)
+
+    def lookup(self, stage: str) -> bool:
+        '''Restore the outputs of `stage` from the cache; True on a hit.'''
+        key = self.keys[stage] = self.key(stage)
+        if key and self.stage_cache.lookup(key, self.outputs[stage]):
+            print(f"[{stage}] Cache hit {key[:12]}: restored into {self.run_dir}")
+            return True
+        return False
+
+    def store(self, stage: str):
+        '''Store the outputs of `stage` under the key of its `lookup`.'''
+        key = self.keys.get(stage)
+        if key:
+            self.stage_cache.store(key, self.outputs[stage])
+
+
+def _run_microstructure(id: str,
+                        genpartnew_input: dict,
+                        distrib3d_input: dict,
+                        run_dir: Path,
+                        results_dir: Path,
+                        exe: Path,
+                        exe2: Path,
+                        stage_cache: StageCache | None = None,
+                        watch: dict | None = None,
+                        manifest: RunManifest | None = None,
+                        memory: "_InMemoryImages | None" = None,
+                        system_size: int = DEFAULT_SYSTEM_SIZE) -> tuple[str, str]:
+    '''Run (or restore from `stage_cache`) genpartnew and distrib3d.
+
+    Cache entries are shared with the asyncio pipeline (see
+    `_MicrostructureStages`). Both stages are
+    recorded in `manifest` (cache hits with `cached=True`). With `memory`
+    the tools run in its worker (`exe`/`exe2` are then the libraries) and
+    their images stay in its slots. With `"backend": "numpy"` in
+    `genpartnew_input` the particles are placed by `placement.genpartnew`.
+
+    Returns:
+        tuple[str, str]: `(phase_name, part_name)` inside `run_dir`.
+    '''
+    watch = watch or {}
+    manifest = manifest or RunManifest(id)
+    stages = _MicrostructureStages(id, genpartnew_input, distrib3d_input,
+                                   run_dir, stage_cache, system_size)
+    img_name, part_name = stages.img_name, stages.part_name
+    phase_name, in_name = stages.phase_name, stages.in_name
 
     # genpartnew (cwd=run_dir)
-    run_genpartnew(
-        id=id,
-        genpartnew_input=genpartnew_text,
-        exe=exe,
-        run_dir=run_dir,
-        results_dir=results_dir,
-        part_name=part_name,
-    )
-
-    # distrib3d (cwd=bin_dir)
-    run_distrib3d(
-        id=id,
-        distrib3d_input=distrib3d_text,
-        exe2=exe2,
-        bin_dir=bin_dir,
-        run_dir=run_dir,
-        results_dir=results_dir,
-        phase_name=phase_name,
-    )
-
-    # disrealnew (cwd=bin_dir) + finalize (mirrors and cleanup)
-    # NOTE: this function mirrors run_dir -> results_dir and removes run_dir,
-    # just like your original long pipeline did at the end.
-    run_disrealnew(
-        id=id,
-        disrealnew_input=disrealnew_text,
-        exe3=exe3,
-        bin_dir=bin_dir,
-        run_dir=run_dir,
-        results_dir=results_dir,
-        phase_name=phase_name,
-        part_name=part_name,
-    )
-    shutil.rmtree(local_bin, ignore_errors=True)
-    print(f"✅ Pipeline completed successfully. Results in: {results_dir}")
+    numpy_backend = _genpartnew_backend(genpartnew_input) == "numpy"
+    with manifest.stage("genpartnew", stages.genpartnew_text,
+                        None if numpy_backend else exe) as record:
+        if stages.lookup("genpartnew"):
+            record["cached"] = True
+        else:
+            if numpy_backend:
+                from . import placement
+                image, particles = placement.genpartnew(id, genpartnew_input, run_dir,
+                                                        system_size=system_size)
+                if memory is None:
+                    _keep_images(run_dir, results_dir,
+                                 {img_name: (image, 0), part_name: (particles, 0)},
+                                 f"genpartnew_{id}.out")
+                else:
+                    memory.worker.image("image")[...] = image
+                    memory.worker.image("particles")[...] = particles
+                print(f"[genpartnew] Placed particles with the numpy backend in {run_dir}")
+            elif memory is not None:
+                out_image = genpartnew_input.get("out_image", "cem140w04floc_{ID}.img")
+                memory.worker.run(
+                    "genpartnew", stages.genpartnew_text.rstrip() + "\n", run_dir,
+                    run_dir / f"genpartnew_{id}.out",
+                    {out_image.format(ID=id): "image",
+                     genpartnew_input["out_particle_ids"].format(ID=id): "particles"})
+            else:
+                run_genpartnew(
+                    id=id,
+                    genpartnew_input=stages.genpartnew_text,
+                    exe=exe,
+                    run_dir=run_dir,
+                    results_dir=results_dir,
+                    part_name=part_name,
+                    usage=record,
+                    **watch,
+                )
+            if memory is None:
+                stages.store("genpartnew")
+            else:
+                memory.keep("image", img_name)
+                memory.keep("particles", part_name)
+                memory.finished(f"genpartnew_{id}.out", stages, "genpartnew")
+
+    # distrib3d (cwd=run_dir)
+    with manifest.stage("distrib3d", stages.distrib3d_text, exe2) as record:
+        if memory is not None and stage_cache is not None:
+            # the cache key hashes the image distrib3d reads
+            memory.written(Path(in_name).name)
+        if stages.lookup("distrib3d"):
+            record["cached"] = True
+        else:
+            if memory is not None:
+                memory.worker.run(
+                    "distrib3d", stages.distrib3d_text.rstrip() + "\n", run_dir,
+                    run_dir / f"distrib3d_{id}.out",
+                    {**memory.source("image", in_name),
+                     distrib3d_input["out_name"].format(ID=id): "phase"})
+                # %2d, as written by distrib3d itself
+                memory.keep("phase", phase_name, 2)
+                memory.finished(f"distrib3d_{id}.out", stages, "distrib3d")
+            else:
+                run_distrib3d(
+                    id=id,
+                    distrib3d_input=stages.distrib3d_text,
+                    exe2=exe2,
+                    run_dir=run_dir,
+                    results_dir=results_dir,
+                    phase_name=phase_name,
+                    usage=record,
+                    **watch,
+                )
+                stages.store("distrib3d")
+    return phase_name, part_name
+
+
+def _run_on_pool(fn, labeled_jobs: list, max_workers: int) -> list:
+    '''Run `fn(job)` for every `(label, job)` on a process pool.
+
+    Returns:
+        list: Results in the order of `labeled_jobs`.
+
+    Raises:
+        RuntimeError: if any job failed, after all jobs have finished; the
+            first failure is chained as the cause.
+    '''
+    results, failures = [], []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(fn, job) for _, job in labeled_jobs]
+        for (label, _), fut in zip(labeled_jobs, futures):
+            try:
+                results.append(fut.result())
+            except Exception as exc:
+                results.append(None)
+                failures.append((label, exc))
+                print(f"❌ [pool] Job {label} failed: {exc!r}")
+
+    if failures:
+        failed = ", ".join(str(label) for label, _ in failures)
+        raise RuntimeError(
+            f"{len(failures)} of {len(labeled_jobs)} jobs failed: {failed}"
+        ) from failures[0][1]
+    return results
+
+
+def _run_batch_job(job: dict) -> Path:
+    '''Process-pool entry point: run one job dict via `run_cemhyd3d`.'''
+    return run_cemhyd3d(**job)
+
+
+def run_cemhyd3d_batch(jobs,
+                       max_workers: int | None = None,
+                       results_root: str | Path | None = None,
+                       sandbox_root: str | Path | None = None,
+                       cache_root: str | Path | None = None,
+                       stage_cache: StageCache | str | Path | None = None,
+                       progress=None,
+                       stall_timeout: float | None = None,
+                       timeout: float | None = None,
+                       hooks=None,
+                       manifest_sink: str | Path | None = None,
+                       engine: str = "exe",
+                       system_size: int = DEFAULT_SYSTEM_SIZE,
+                       checkpoint_every: int | None = None) -> list[Path]:
+    '''Run many independent pipelines in parallel on a process pool.
+
+    Args:
+        jobs: Iterable of jobs, each either a dict with the keyword arguments
+            of `run_cemhyd3d` (`id`, `genpartnew_input`, `distrib3d_input`,
+            `disrealnew_input`) or a tuple `(id, gp_cfg, d3_cfg, dr_cfg)`.
+        max_workers: Number of worker processes (default: `os.cpu_count()`).
+        results_root: Folder receiving every `result_<id>/`. Defaults to
+            `results/` next to the caller script. A job dict may override it.
+        sandbox_root: Parent of the per-run sandboxes (default:
+            `results_root`). A job dict may override it.
+        cache_root: Runtime cache folder (default:
+            `utils.default_cache_root()`).
+        stage_cache: Optional `StageCache` (or its root folder) shared by all
+            jobs, so identical genpartnew/distrib3d stages run only once
+            per distinct configuration (concurrent first runs may both
+            compute it).
+        progress: Optional picklable callable (e.g. a module-level
+            function) receiving `progress.ProgressEvent`s inside the worker
+            processes; `event.id` tells the jobs apart.
+        stall_timeout: Per-stage watchdog, see `run_cemhyd3d`.
+        timeout: Per-stage time limit, see `run_cemhyd3d`.
+        hooks: Optional picklable stage hooks, called inside the workers
+            (see `run_cemhyd3d`).
+        manifest_sink: Optional JSON-lines file receiving the manifest of
+            every job.
+        engine: "exe", "lib" or "auto", see `run_cemhyd3d` (each worker
+            process loads its own copy of the libraries).
+        system_size: Lattice edge length of every job, see `run_cemhyd3d`.
+            A job dict may override it.
+        checkpoint_every: disrealnew checkpoint interval of every job, see
+            `run_cemhyd3d`. A job dict may override it.
+
+    Returns:
+        list[pathlib.Path]: Results directories, in the order of `jobs`.
+
+    Raises:
+        ValueError: if two jobs share an `id` (they would share a results
+            folder).
+        RuntimeError: if any job failed. All other jobs are still run to
+            completion first; the first failure is chained as the cause.
+    '''
+    if results_root is None:
+        results_root = caller_results_root()
+    results_root = Path(results_root).resolve()
+
+    job_list = []
+    for job in jobs:
+        if not isinstance(job, dict):
+            id_, gp, d3, dr = job
+            job = {"id": id_, "genpartnew_input": gp,
+                   "distrib3d_input": d3, "disrealnew_input": dr}
+        job = {"results_root": results_root, "sandbox_root": sandbox_root,
+               "cache_root": cache_root, "stage_cache": stage_cache,
+               "progress": progress, "stall_timeout": stall_timeout,
+               "timeout": timeout, "hooks": hooks,
+               "manifest_sink": manifest_sink, "engine": engine,
+               "system_size": system_size,
+               "checkpoint_every": checkpoint_every, **job}
+        job_list.append(job)
+
+    ids = [job["id"] for job in job_list]
+    dupes = sorted({i for i in ids if ids.count(i) > 1})
+    if dupes:
+        raise ValueError(f"Duplicate job ids in batch: {dupes}")
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    # stage the shared runtime once, before the workers race for it
+    ensure_runtime_cache(_ORIG_BIN_DIR, cache_root)
+
+    results = _run_on_pool(_run_batch_job,
+                           [(job["id"], job) for job in job_list],
+                           max_workers)
+    print(f"✅ Batch completed: {len(job_list)} pipelines in {results_root}")
+    return results
+
+
+def _run_variant(job: dict) -> Path:
+    '''Process-pool entry point: run one disrealnew variant of a fan-out
+    (or a run continued from a checkpoint), recorded under `job["label"]`.'''
+    id, label = job["id"], job["label"]
+    results_dir = job["results_dir"]
+    results_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest = RunManifest(label, job["hooks"])
+    run_dir = create_sandbox(job["sandbox_root"], label)
+    error = None
+    try:
+        with manifest.stage("staging"):
+            staged = stage_runtime(run_dir, _ORIG_BIN_DIR, job["cache_root"])
+        inputs = set()
+        for src in job["inputs"]:
+            dst = run_dir / src.name
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copy2(src, dst)
+            inputs.add(src.name)
+        phase_name, part_name = job["phase_name"], job["part_name"]
+        disrealnew_text = _build_disrealnew_from_dict(id, "", job["cfg"])
+        exe3 = _exe_paths(run_dir, job["system_size"])[2]
+        with manifest.stage("disrealnew", disrealnew_text, exe3) as record:
+            run_disrealnew(
+                id=id,
+                disrealnew_input=disrealnew_text,
+                exe3=exe3,
+                run_dir=run_dir,
+                results_dir=results_dir,
+                phase_name=phase_name,
+                part_name=part_name,
+                exclude=staged | inputs,
+                usage=record,
+                **job["watch"],
+            )
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+        manifest.finish(results_dir, error, job["manifest_sink"])
     return results_dir
+
+
+def _named_variants(variants) -> list[tuple[str, dict]]:
+    '''`[(name, overrides)]` of a variants dict or list (named `v0`, ...).'''
+    if isinstance(variants, dict):
+        named = [(str(name), v) for name, v in variants.items()]
+    else:
+        named = [(f"v{i}", v) for i, v in enumerate(variants)]
+    names = [name for name, _ in named]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate variant names: {names}")
+    return named
+
+
+def run_cemhyd3d_fanout(id: str,
+                        genpartnew_input: dict,
+                        distrib3d_input: dict,
+                        disrealnew_input: dict,
+                        variants,
+                        max_workers: int | None = None,
+                        results_root: str | Path | None = None,
+                        sandbox_root: str | Path | None = None,
+                        cache_root: str | Path | None = None,
+                        stage_cache: StageCache | str | Path | None = None,
+                        progress=None,
+                        stall_timeout: float | None = None,
+                        timeout: float | None = None,
+                        hooks=None,
+                        manifest_sink: str | Path | None = None,
+                        system_size: int = DEFAULT_SYSTEM_SIZE) -> dict:
+    '''Build one microstructure, then run many disrealnew variants on it.
+
+    genpartnew and distrib3d run once (or are restored from `stage_cache`).
+    Each variant then runs disrealnew in its own sandbox, in parallel on a
+    process pool, with the two input images hard-linked in.
+
+    Args:
+        id: Identifier used in filenames and result folder naming.
+        genpartnew_input: Dict config for `_build_genpartnew_from_dict`.
+        distrib3d_input: Dict config for `_build_distrib3d_from_dict`.
+        disrealnew_input: Base dict config for `_build_disrealnew_from_dict`.
+        variants: Either a dict `{name: overrides}` or a list of overrides
+            (named `v0`, `v1`, ...). Each `overrides` dict is merged over
+            `disrealnew_input`, e.g. `{"thermal": [...], "sat_flag": "1"}`.
+        max_workers: Number of worker processes (default: `os.cpu_count()`).
+        results_root: Parent of all result folders. Defaults to `results/`
+            next to the caller script.
+        sandbox_root: Parent of the sandboxes (default: `results_root`).
+        cache_root: Runtime cache folder (default:
+            `utils.default_cache_root()`).
+        stage_cache: Optional `StageCache` (or its root folder) for the
+            genpartnew/distrib3d stages.
+        progress: Optional picklable callable receiving
+            `progress.ProgressEvent`s (variants report from their worker
+            processes).
+        stall_timeout: Per-stage watchdog, see `run_cemhyd3d`.
+        timeout: Per-stage time limit, see `run_cemhyd3d`.
+        hooks: Optional picklable stage hooks (see `run_cemhyd3d`).
+        manifest_sink: Optional JSON-lines file receiving the manifests of
+            the microstructure and of every variant.
+        system_size: Lattice edge length, see `run_cemhyd3d`.
+
+    Side effects:
+        - `<results_root>/result_<id>/` receives the microstructure images
+          and the genpartnew/distrib3d logs.
+        - `<results_root>/result_<id>_<name>/` receives the disrealnew
+          outputs of each variant (the input images are not duplicated).
+        - Each of these folders gets its own `manifest.json`.
+
+    Returns:
+        dict[str, pathlib.Path]: Results directory of each variant.
+
+    Raises:
+        ValueError: if variant names are duplicated.
+        FileNotFoundError: if no executables are built for `system_size`.
+        RuntimeError: if any variant failed (after all have finished).
+        subprocess.CalledProcessError: if genpartnew or distrib3d fails.
+    '''
+    if results_root is None:
+        results_root = caller_results_root()
+    results_root = Path(results_root).resolve()
+    sandbox_root = results_root if sandbox_root is None else Path(sandbox_root).resolve()
+    if isinstance(stage_cache, (str, Path)):
+        stage_cache = StageCache(stage_cache)
+
+    named = _named_variants(variants)
+    names = [name for name, _ in named]
+    _check_built(system_size)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    watch = {"progress": progress, "stall_timeout": stall_timeout,
+             "timeout": timeout}
+    base_results = results_root / f"result_{id}"
+    base_results.mkdir(parents=True, exist_ok=True)
+    base_dir = create_sandbox(sandbox_root, id)
+    manifest = RunManifest(id, hooks)
+    try:
+        try:
+            with manifest.stage("staging"):
+                staged = stage_runtime(base_dir, _ORIG_BIN_DIR, cache_root)
+            exe, exe2, _ = _exe_paths(base_dir, system_size)
+            phase_name, part_name = _run_microstructure(
+                id, genpartnew_input, distrib3d_input, base_dir, base_results,
+                exe, exe2, stage_cache, watch, manifest, None, system_size,
+            )
+            for item in base_dir.iterdir():
+                if item.name not in staged:
+                    place_file(item, base_results / item.name, mode="link")
+        except BaseException as exc:
+            manifest.finish(base_results, exc, manifest_sink)
+            raise
+        manifest.finish(base_results, None, manifest_sink)
+
+        jobs = []
+        for name, overrides in named:
+            jobs.append((name, {
+                "id": id,
+                "label": f"{id}_{name}",
+                "cfg": {**disrealnew_input, **overrides},
+                "inputs": [base_dir / phase_name, base_dir / part_name],
+                "phase_name": phase_name,
+                "part_name": part_name,
+                "results_dir": results_root / f"result_{id}_{name}",
+                "sandbox_root": sandbox_root,
+                "cache_root": cache_root,
+                "watch": watch,
+                "hooks": hooks,
+                "manifest_sink": manifest_sink,
+                "system_size": system_size,
+            }))
+        paths = _run_on_pool(_run_variant, jobs, max_workers)
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+    print(f"✅ Fan-out completed: {len(jobs)} disrealnew variants of {id} "
+          f"in {results_root}")
+    return dict(zip(names, paths))
+
+
+def _restart_job(id: str, label: str, cfg: dict, source_dir: Path,
+                 results_dir: Path, checkpoint: Path,
+                 checkpoint_every: int | None, common: dict) -> dict:
+    '''`_run_variant` job continuing `cfg` from `checkpoint`, with the input
+    images of the run in `source_dir`.'''
+    phase_name = cfg["phase_file"].format(ID=id)
+    part_name = cfg["part_file"].format(ID=id)
+    inputs = [source_dir / phase_name, source_dir / part_name]
+    for path in inputs:
+        if not path.is_file():
+            raise FileNotFoundError(f"Input image of {id} not found: {path}")
+    cfg = _with_checkpoints(cfg, results_dir, checkpoint_every)
+    return {"id": id, "label": label,
+            "cfg": {**cfg, "restart_from": str(checkpoint)},
+            "inputs": inputs, "phase_name": phase_name, "part_name": part_name,
+            "results_dir": results_dir, **common}
+
+
+def resume_cemhyd3d(id: str,
+                    disrealnew_input: dict,
+                    checkpoint: int | str | Path | None = None,
+                    results_root: str | Path | None = None,
+                    sandbox_root: str | Path | None = None,
+                    cache_root: str | Path | None = None,
+                    progress=None,
+                    stall_timeout: float | None = None,
+                    timeout: float | None = None,
+                    hooks=None,
+                    manifest_sink: str | Path | None = None,
+                    system_size: int = DEFAULT_SYSTEM_SIZE,
+                    checkpoint_every: int | None = None) -> Path:
+    '''Continue the disrealnew stage of `result_<id>` from a checkpoint.
+
+    The run must have been started with `run_cemhyd3d(...,
+    checkpoint_every=n)`. disrealnew restarts after the checkpointed cycle
+    with the state and time series saved in it; with the same
+    `disrealnew_input` the outputs are identical to those of an
+    uninterrupted run. Changing `cycles` extends (or shortens) the run.
+
+    Args:
+        id: Identifier of the run to continue.
+        disrealnew_input: Dict config of the run (as given to
+            `run_cemhyd3d`).
+        checkpoint: Cycle number or path of the checkpoint (default: the
+            latest one in `result_<id>/checkpoints/`).
+        results_root: Parent of `result_<id>/`. Defaults to `results/`
+            next to the caller script.
+        sandbox_root: Parent of the sandbox (default: `results_root`).
+        cache_root: Runtime cache folder (default:
+            `utils.default_cache_root()`).
+        progress: Optional callable receiving `progress.ProgressEvent`s.
+        stall_timeout: Watchdog, see `run_cemhyd3d`.
+        timeout: Time limit, see `run_cemhyd3d`.
+        hooks: Optional stage hooks (see `run_cemhyd3d`).
+        manifest_sink: Optional JSON-lines file the manifest is appended to.
+        system_size: Lattice edge length of the run, see `run_cemhyd3d`.
+        checkpoint_every: Keep writing checkpoints every this many cycles.
+
+    Side effects:
+        - Replaces the disrealnew outputs and `manifest.json` (which then
+          records the continued stage only) of `result_<id>/`. Snapshots
+          written before the checkpoint (`.ima.<cycle>` files) are kept.
+
+    Returns:
+        pathlib.Path: The path to the results directory.
+
+    Raises:
+        FileNotFoundError: if the checkpoint or the input images are
+            missing, or no executables are built for `system_size`.
+        subprocess.CalledProcessError: if disrealnew fails (e.g. the
+            checkpoint was written by a build for another `system_size`).
+    '''
+    _check_built(system_size)
+    if results_root is None:
+        results_root = caller_results_root()
+    results_root = Path(results_root).resolve()
+    sandbox_root = results_root if sandbox_root is None else Path(sandbox_root).resolve()
+    results_dir = results_root / f"result_{id}"
+    ckpt = _resolve_checkpoint(results_dir, checkpoint)
+
+    common = {"sandbox_root": sandbox_root, "cache_root": cache_root,
+              "watch": {"progress": progress, "stall_timeout": stall_timeout,
+                        "timeout": timeout},
+              "hooks": hooks, "manifest_sink": manifest_sink,
+              "system_size": system_size}
+    out = _run_variant(_restart_job(id, id, disrealnew_input, results_dir,
+                                    results_dir, ckpt, checkpoint_every, common))
+    print(f"✅ Resumed {id} from {ckpt.name}. Results in: {out}")
+    return out
+
+
+def branch_cemhyd3d(id: str,
+                    disrealnew_input: dict,
+                    variants,
+                    checkpoint: int | str | Path | None = None,
+                    max_workers: int | None = None,
+                    results_root: str | Path | None = None,
+                    sandbox_root: str | Path | None = None,
+                    cache_root: str | Path | None = None,
+                    progress=None,
+                    stall_timeout: float | None = None,
+                    timeout: float | None = None,
+                    hooks=None,
+                    manifest_sink: str | Path | None = None,
+                    system_size: int = DEFAULT_SYSTEM_SIZE,
+                    checkpoint_every: int | None = None) -> dict:
+    '''Fork many disrealnew variants from one checkpoint of `result_<id>`.
+
+    Like `run_cemhyd3d_fanout`, but the variants share the hydration
+    history up to the checkpoint instead of only the microstructure: each
+    continues from it in parallel, with its overrides applied from the next
+    cycle on. The curing conditions (`sat_flag`, the initial temperature of
+    `thermal`, `flags[0]` adiabatic/isothermal and the activation energies
+    `Ea`) take effect when they differ from those of the original run; the
+    remaining settings always come from the variant.
+
+    Args:
+        id: Identifier of the run holding the checkpoint.
+        disrealnew_input: Base dict config (that of the original run).
+        variants: Either a dict `{name: overrides}` or a list of overrides
+            (named `v0`, `v1`, ...), merged over `disrealnew_input`.
+        checkpoint: Cycle number or path of the checkpoint (default: the
+            latest one in `result_<id>/checkpoints/`).
+        max_workers: Number of worker processes (default: `os.cpu_count()`).
+        results_root: Parent of all result folders. Defaults to `results/`
+            next to the caller script.
+        sandbox_root: Parent of the sandboxes (default: `results_root`).
+        cache_root: Runtime cache folder (default:
+            `utils.default_cache_root()`).
+        progress: Optional picklable callable receiving
+            `progress.ProgressEvent`s from the worker processes.
+        stall_timeout: Per-stage watchdog, see `run_cemhyd3d`.
+        timeout: Per-stage time limit, see `run_cemhyd3d`.
+        hooks: Optional picklable stage hooks (see `run_cemhyd3d`).
+        manifest_sink: Optional JSON-lines file receiving the manifest of
+            every variant.
+        system_size: Lattice edge length of the run, see `run_cemhyd3d`.
+        checkpoint_every: Let every variant write checkpoints into its own
+            `result_<id>_<name>/checkpoints/`.
+
+    Side effects:
+        - `<results_root>/result_<id>_<name>/` receives the disrealnew
+          outputs of each variant, with the series up to the checkpoint
+          copied from it, and its own `manifest.json`.
+
+    Returns:
+        dict[str, pathlib.Path]: Results directory of each variant.
+
+    Raises:
+        ValueError: if variant names are duplicated.
+        FileNotFoundError: if the checkpoint or the input images are
+            missing, or no executables are built for `system_size`.
+        RuntimeError: if any variant failed (after all have finished).
+    '''
+    named = _named_variants(variants)
+    _check_built(system_size)
+    if results_root is None:
+        results_root = caller_results_root()
+    results_root = Path(results_root).resolve()
+    sandbox_root = results_root if sandbox_root is None else Path(sandbox_root).resolve()
+    source_dir = results_root / f"result_{id}"
+    ckpt = _resolve_checkpoint(source_dir, checkpoint)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    common = {"sandbox_root": sandbox_root, "cache_root": cache_root,
+              "watch": {"progress": progress, "stall_timeout": stall_timeout,
+                        "timeout": timeout},
+              "hooks": hooks, "manifest_sink": manifest_sink,
+              "system_size": system_size}
+    jobs = [(name, _restart_job(id, f"{id}_{name}",
+                                {**disrealnew_input, **overrides}, source_dir,
+                                results_root / f"result_{id}_{name}", ckpt,
+                                checkpoint_every, common))
+            for name, overrides in named]
+
+    # stage the shared runtime once, before the workers race for it
+    ensure_runtime_cache(_ORIG_BIN_DIR, cache_root)
+    paths = _run_on_pool(_run_variant, jobs, max_workers)
+    print(f"✅ Branched {len(jobs)} disrealnew variants of {id} from "
+          f"{ckpt.name} in {results_root}")
+    return dict(zip((name for name, _ in named), paths))
@@ -36,7 +36,9 @@ extern double time_cur;  // Current time in hydration
 extern double beta;  // Calibration factor
 extern double krate;  // Hydration rate
 
+#ifndef SYSIZE
 #define SYSIZE 100
+#endif
 #define BURNT 70    /* label for burnt pixels */
 #define SIZESET 100000
 /* Transformation functions for changing direction of burn propagation */
@@ -0,0 +1,235 @@
+/************************************************************************/
+/*                                                                      */
+/*      checkpoint.c - checkpoint/restart of disrealnew.                */
+/*                                                                      */
+/*      Included by disrealnew.c. ckpt_save() writes the complete       */
+/*      hydration state after a cycle to a binary file: the lattices    */
+/*      (mic, micpart, micorig, cshage, faces), every counter and       */
+/*      thermal/chemical state variable, the diffusing species list,    */
+/*      the ran1 generator state and the time series written so far.   */
+/*      ckpt_restore() loads such a file after the inputs were read,    */
+/*      writes the stored time series under the file names of the       */
+/*      current run and returns the cycle to continue after.            */
+/*                                                                      */
+/*      Run parameters (cycles, frequencies, thermal and curing         */
+/*      settings, ...) always come from the current input, so a         */
+/*      checkpoint can be continued with different curing conditions.   */
+/*      A checkpoint is only valid for a disrealnew built with the      */
+/*      same SYSIZE and checkpoint layout.                              */
+/*                                                                      */
+/************************************************************************/
+#include <string.h>
+
+#define CKPT_MAGIC "CEMCKPT"
+#define CKPT_VERSION 1
+#define CKPT_NFILES 10
+#define CKPT_NAMELEN 512
+
+/* Inputs of the run that wrote a checkpoint; a restart compares them */
+/* with its own inputs to decide which state to re-derive */
+struct ckptparams{
+        int sealed,adiaflag;
+        double temp_0,E_act;
+        float E_act_pozz,E_act_slag;
+};
+
+/* State variables saved and restored, in file order (run parameters */
+/* read from the input are deliberately absent) */
+#define CKPT_STATE(X) \
+        X(mic) X(micpart) X(micorig) X(cshage) X(faces) \
+        X(discount) X(count) X(ncshplategrow) X(ncshplateinit) \
+        X(npr) X(nfill) X(ncsbar) X(netbar) X(porinit) X(nasr) X(nslagr) \
+        X(slagemptyp) X(c3sinit) X(c2sinit) X(c3ainit) X(c4afinit) \
+        X(anhinit) X(heminit) X(chold) X(chnew) X(nmade) X(ngoing) \
+        X(gypready) X(poregone) X(poretodo) X(countpore) X(countkeep) \
+        X(water_left) X(water_off) X(pore_off) X(cyccnt) X(cubesize) \
+        X(sealed) X(setflag) X(sf1) X(sf2) X(sf3) \
+        X(porefl1) X(porefl2) X(porefl3) \
+        X(temp_0) X(temp_cur) X(time_step) X(time_cur) X(heat_cf) X(w_to_c) X(s_to_c) \
+        X(krate) X(totfract) X(tfractw04) X(fractwithfill) X(tfractw05) \
+        X(surffract) X(pfract) X(pfractw05) X(sulf_conc) \
+        X(scntcement) X(scnttotal) X(alpha_cur) X(heat_old) X(heat_new) \
+        X(cemmass) X(mass_water) X(mass_fill) X(Cp_now) X(alpha) \
+        X(CH_mass) X(mass_CH) X(mass_fill_pozz) X(chs_new) X(cemmasswgyp) \
+        X(flyashmass) X(alpha_fa_cur) X(molarvcsh) X(watercsh) X(heatsum) \
+        X(molesh2o) X(saturation) X(disprob) X(disbase) X(gypabsprob) \
+        X(ppozz) X(specgrav) X(molarv) X(heatf) X(waterc) X(soluble) \
+        X(creates) X(cs_acc) X(ca_acc) X(dismin_c3a) X(dismin_c4af) \
+        X(gsratio2) X(p1slag) X(p2slag) X(p3slag) X(p4slag) X(p5slag) \
+        X(slagcasi) X(slaghydcasi) X(slagh2osi) X(slagc3a) X(siperslag) \
+        X(slagreact) X(DIFFCHdeficit) X(slaginit) X(slagcum) X(chgone) \
+        X(nch_slag) X(sulf_cur) X(sulf_solid) X(pH_cur) X(totsodium) \
+        X(totpotassium) X(rssodium) X(rspotassium) X(pHeffect) X(pHfactor) \
+        X(conccaplus) X(moles_syn_precip) X(concsulfate) X(cshboxsize) \
+        X(ran1_iv) X(ran1_iy)
+
+#define CKPT_SIZE(v) +(long)sizeof(v)
+#define CKPT_WRITE(v) fwrite(&(v),sizeof(v),1,fp);
+#define CKPT_READ(v) nread+=fread(&(v),sizeof(v),1,fp);
+#define CKPT_COUNT(v) +1
+
+/* Total size of the saved state: identifies the layout of a build */
+static long ckpt_layout()
+{
+        return 0L CKPT_STATE(CKPT_SIZE);
+}
+
+/* Time series of the current run, in file order */
+static void ckpt_files(char *names[CKPT_NFILES])
+{
+        static char disprobname[]="disprob.out";
+
+        names[0]=heatname; names[1]=chshrname; names[2]=adianame;
+        names[3]=phname; names[4]=ppsname; names[5]=ptsname;
+        names[6]=pHname; names[7]=phrname; names[8]=moviename;
+        names[9]=disprobname;
+}
+
+static void ckpt_fail(const char *what,const char *name)
+{
+        printf("Checkpoint error: %s %s \n",what,name);
+        fflush(stdout);
+        exit(1);
+}
+
+/* Read a file name answer into buf (CKPT_NAMELEN chars); "none" */
+/* or a missing answer leave buf empty */
+void ckpt_readname(char *buf)
+{
+        size_t n;
+
+        buf[0]='\0';
+        if(scanf(" %511[^\n]",buf)!=1){buf[0]='\0';}
+        n=strlen(buf);
+        while((n>0)&&((buf[n-1]==' ')||(buf[n-1]=='\r')||(buf[n-1]=='\t'))){buf[--n]='\0';}
+        if(strcmp(buf,"none")==0){buf[0]='\0';}
+}
+
+/* Write the state after cycle ncycle to <prefix>.<ncycle> */
+void ckpt_save(const char *prefix,int ncycle,struct ckptparams *params)
+{
+        FILE *fp,*src;
+        char name[CKPT_NAMELEN+20],tmpname[CKPT_NAMELEN+30];
+        char *files[CKPT_NFILES];
+        struct ants *curant;
+        long nants,layout,flen;
+        int version=CKPT_VERSION,sysize=SYSIZE,i,c;
+
+        snprintf(name,sizeof(name),"%s.%d",prefix,ncycle);
+        snprintf(tmpname,sizeof(tmpname),"%s.tmp",name);
+        fp=fopen(tmpname,"wb");
+        if(fp==NULL){ckpt_fail("cannot write",tmpname);}
+
+        layout=ckpt_layout();
+        fwrite(CKPT_MAGIC,1,sizeof(CKPT_MAGIC),fp);
+        fwrite(&version,sizeof(int),1,fp);
+        fwrite(&sysize,sizeof(int),1,fp);
+        fwrite(&layout,sizeof(long),1,fp);
+        fwrite(&ncycle,sizeof(int),1,fp);
+        fwrite(params,sizeof(struct ckptparams),1,fp);
+        CKPT_STATE(CKPT_WRITE)
+        fwrite(seed,sizeof(int),1,fp);
+
+        /* Diffusing species, head first */
+        nants=0;
+        for(curant=headant;curant!=NULL;curant=curant->nextant){nants++;}
+        fwrite(&nants,sizeof(long),1,fp);
+        for(curant=headant;curant!=NULL;curant=curant->nextant){
+                fwrite(&curant->x,1,1,fp);
+                fwrite(&curant->y,1,1,fp);
+                fwrite(&curant->z,1,1,fp);
+                fwrite(&curant->id,1,1,fp);
+                fwrite(&curant->cycbirth,sizeof(int),1,fp);
+        }
+
+        /* Time series so far (length -1: file not written yet) */
+        ckpt_files(files);
+        fflush(NULL);
+        for(i=0;i<CKPT_NFILES;i++){
+                src=fopen(files[i],"rb");
+                flen=-1;
+                if(src!=NULL){
+                        fseek(src,0L,SEEK_END);
+                        flen=ftell(src);
+                        rewind(src);
+                }
+                fwrite(&flen,sizeof(long),1,fp);
+                if(src!=NULL){
+                        while((c=getc(src))!=EOF){putc(c,fp);}
+                        fclose(src);
+                }
+        }
+        if(fclose(fp)!=0){ckpt_fail("cannot write",tmpname);}
+        if(rename(tmpname,name)!=0){ckpt_fail("cannot rename",tmpname);}
+        printf("Wrote checkpoint %s after cycle %d \n",name,ncycle);
+        fflush(stdout);
+}
+
+/* Load the state of checkpoint `name` into the current run; the */
+/* inputs of the run that wrote it are returned in `params`.     */
+/* Returns the cycle the checkpoint was written after.           */
+int ckpt_restore(const char *name,struct ckptparams *params)
+{
+        FILE *fp,*dst;
+        char magic[sizeof(CKPT_MAGIC)];
+        char *files[CKPT_NFILES];
+        struct ants *curant,*antnew;
+        long nants,layout,flen,ia,nread=0;
+        int version,sysize,ncycle,i;
+
+        fp=fopen(name,"rb");
+        if(fp==NULL){ckpt_fail("cannot read",name);}
+        if((fread(magic,1,sizeof(magic),fp)!=sizeof(magic))
+                ||(memcmp(magic,CKPT_MAGIC,sizeof(magic))!=0)){
+                ckpt_fail("not a checkpoint:",name);
+        }
+        fread(&version,sizeof(int),1,fp);
+        fread(&sysize,sizeof(int),1,fp);
+        fread(&layout,sizeof(long),1,fp);
+        if((version!=CKPT_VERSION)||(sysize!=SYSIZE)||(layout!=ckpt_layout())){
+                ckpt_fail("written by an incompatible build (SYSIZE or version):",name);
+        }
+        fread(&ncycle,sizeof(int),1,fp);
+        fread(params,sizeof(struct ckptparams),1,fp);
+        CKPT_STATE(CKPT_READ)
+        nread+=fread(seed,sizeof(int),1,fp);
+        if(nread!=(0 CKPT_STATE(CKPT_COUNT))+1){ckpt_fail("truncated",name);}
+
+        /* Rebuild the diffusing species list */
+        while(headant!=NULL){
+                curant=headant->nextant;
+                free(headant);
+                headant=curant;
+        }
+        tailant=NULL;
+        fread(&nants,sizeof(long),1,fp);
+        for(ia=0;ia<nants;ia++){
+                antnew=(struct ants *)malloc(sizeof(struct ants));
+                fread(&antnew->x,1,1,fp);
+                fread(&antnew->y,1,1,fp);
+                fread(&antnew->z,1,1,fp);
+                fread(&antnew->id,1,1,fp);
+                fread(&antnew->cycbirth,sizeof(int),1,fp);
+                antnew->nextant=NULL;
+                antnew->prevant=tailant;
+                if(tailant==NULL){headant=antnew;}
+                else{tailant->nextant=antnew;}
+                tailant=antnew;
+        }
+
+        /* Time series, under this run's file names */
+        ckpt_files(files);
+        for(i=0;i<CKPT_NFILES;i++){
+                if(fread(&flen,sizeof(long),1,fp)!=1){ckpt_fail("truncated",name);}
+                if(flen<0){continue;}
+                dst=fopen(files[i],"wb");
+                if(dst==NULL){ckpt_fail("cannot write",files[i]);}
+                for(ia=0;ia<flen;ia++){putc(getc(fp),dst);}
+                fclose(dst);
+        }
+        if(feof(fp)){ckpt_fail("truncated",name);}
+        fclose(fp);
+        printf("Restarted from checkpoint %s after cycle %d \n",name,ncycle);
+        fflush(stdout);
+        return(ncycle);
+}
@@ -1,4 +1,7 @@
+/* System size in pixels per dimension; other sizes are built with -DSYSIZE=<n> */
+#ifndef SYSIZE
 #define SYSIZE 100
+#endif
 extern char mic[SYSIZE][SYSIZE][SYSIZE];
 extern short int micpart[SYSIZE][SYSIZE][SYSIZE];
 extern char micorig[SYSIZE][SYSIZE][SYSIZE];
@@ -9,3 +12,14 @@ extern double time_cur;
 extern double krate;
 extern double beta;
 extern double alpha_cur;
+
+/* In-process engine build (shared library, see engine.c): image files */
+/* registered by the caller are read from / written to memory and */
+/* exit() returns to the caller instead of ending the process. */
+#ifdef CEM_ENGINE
+int *cem_image(const char *name);
+void cem_exit(int status);
+#define exit(status) cem_exit(status)
+#else
+#define cem_image(name) ((int *)0)
+#endif
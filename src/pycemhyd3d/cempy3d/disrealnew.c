@@ -72,8 +72,10 @@
 			/* For hydration under sealed conditions: */
 #define CUBEMAX 7      /* Maximum cube size for checking pore size */
 #define CUBEMIN 3      /* Minimum cube size for checking pore size */
+#ifndef SYSIZE
 #define SYSIZE 100    /* System size in pixels per dimension */
-#define SYSIZEM1 99    /* System size -1 */
+#endif
+#define SYSIZEM1 (SYSIZE-1)    /* System size -1 */
 #define DISBIAS 30.0  /* Dissolution bias- to change all dissolution rates */
 #define DISMIN 0.001  /* Minimum dissolution for C3S dissolution */
 #define DISMIN2 0.00025  /* Minimum dissolution for C2S dissolution */
@@ -178,6 +180,9 @@
 /* Added 11/94 */
 /* Note that if SYSIZE exceeds 256, need to change x, y, and z to */
 /* int variables */
+#if SYSIZE > 256
+#error "SYSIZE > 256 needs int ant coordinates"
+#endif
 
 char mic[SYSIZE][SYSIZE][SYSIZE];
 short int micpart[SYSIZE][SYSIZE][SYSIZE];
@@ -207,6 +212,20 @@ struct togo{
 // static short int micpart [SYSIZE] [SYSIZE] [SYSIZE];
 static short int cshage [SYSIZE] [SYSIZE] [SYSIZE];
 static short int faces [SYSIZE] [SYSIZE] [SYSIZE];
+/* Surface index kept in step with mic by SETMIC (built by surfbuild): */
+/* pixel count of every phase ID, bitmaps (in scan order) of the CSH */
+/* pixels, of the solid pixels in contact with porosity and of the */
+/* pixels whose porosity state changed since the last porupdate, the */
+/* number of porosity neighbors of each pixel as of that call and the */
+/* porosity state it was computed from */
+#define NPIX ((long int)SYSIZE*SYSIZE*SYSIZE)
+#define NWORDS ((NPIX+63)/64)
+#define PIXID(x,y,z) (((long int)(x)*SYSIZE+(y))*SYSIZE+(z))
+static long int phcount[128];
+static unsigned long long cshbits[NWORDS],surfbits[NWORDS],porbits[NWORDS];
+static char porseen [SYSIZE] [SYSIZE] [SYSIZE];
+static char pornbr [SYSIZE] [SYSIZE] [SYSIZE];
+static int surfready=0;
 /* counts for dissolved and solid species */
 int discount[EMPTYP+1], count[EMPTYP+1];
 long int ncshplategrow=0,ncshplateinit=0;
@@ -280,6 +299,30 @@ double conccaplus=0.0,moles_syn_precip=0.0,concsulfate=0.0;
 int primevalues[6]={2,3,5,7,11,13};
 int cshboxsize;		/* Box size for addition of extra diffusing C-S-H */
 
+/* Set pixel (xs,ys,zs) of mic, or pixel pix in scan order, to phase */
+/* phnew. Every change of mic goes through these macros so that the */
+/* surface index stays in step; only burn3d and burnset, which restore */
+/* the pixels they relabel, and ckpt_restore, which precedes the first */
+/* pass, write mic directly. A change of porosity state is only */
+/* flagged: porupdate settles the neighbor counts once per pass */
+#define MICPIX(pix) (((char *)mic)[pix])
+#define SETPIX(pix,phnew) do{ \
+        long int pix_=(pix); \
+        int phold_=MICPIX(pix_),phnew_=(phnew); \
+        MICPIX(pix_)=phnew_; \
+        if(surfready!=0){ \
+                phcount[phold_]-=1; \
+                phcount[phnew_]+=1; \
+                if((phold_==CSH)!=(phnew_==CSH)){ \
+                        cshbits[pix_>>6]^=(1ULL<<(pix_&63)); \
+                } \
+                if((phold_==POROSITY)!=(phnew_==POROSITY)){ \
+                        porbits[pix_>>6]|=(1ULL<<(pix_&63)); \
+                } \
+        } \
+}while(0)
+#define SETMIC(xs,ys,zs,phnew) SETPIX(PIXID(xs,ys,zs),phnew)
+
 /* Supplementary programs */
 #include "ran1.c"		/* random number generation */
 #include "burn3d.c"		/* percolation of porosity assessment */
@@ -287,6 +330,8 @@ int cshboxsize;		/* Box size for addition of extra diffusing C-S-H */
 #include "parthyd.c"		/* particle hydration assessment */
 #include "hydrealnew.c"		/* hydration execution */
 #include "pHpred.c"             /* pore solution pH prediction */
+#include "checkpoint.c"         /* checkpoint/restart of a run */
+#include "percol.c"             /* percolation by cluster labeling */
 
 /* routine to initialize values for solubilities, molar volumes, etc. */
 /* Called by main program */
@@ -625,112 +670,209 @@ void init()
         }
 }
 
-/* routine to check if a pixel located at (xck,yck,zck) is on an edge */
-/* (in contact with pore space) in 3-D system */
-/* Called by passone */
+/* routine to return the position of the lowest set bit of word w (w>0) */
+/* Called by porupdate and passone */
 /* Calls no other routines */
-int chckedge(xck,yck,zck)
-        int xck,yck,zck;
+int lowbit(w)
+        unsigned long long w;
 {
-        int edgeback,x2,y2,z2;
-        int ip;
+#if defined(__GNUC__)
+        return(__builtin_ctzll(w));
+#else
+        int b;
+
+        for(b=0;(w&1ULL)==0;b++){w>>=1;}
+        return(b);
+#endif
+}
 
-        edgeback=0;
+/* routine to put pixel (xs,ys,zs) into or take it out of the bitmap of */
+/* solid pixels in contact with porosity, the edge test of the original */
+/* chckedge routine */
+/* Called by porupdate and surfbuild */
+/* Calls no other routines */
+void surfmark(xs,ys,zs)
+        int xs,ys,zs;
+{
+        long int pix;
 
-        /* Check all six neighboring pixels */
-	/* with periodic boundary conditions */
-        for(ip=0;((ip<NEIGHBORS)&&(edgeback==0));ip++){
+        pix=PIXID(xs,ys,zs);
+        if((mic[xs][ys][zs]!=POROSITY)&&(pornbr[xs][ys][zs]>0)){
+                surfbits[pix>>6]|=(1ULL<<(pix&63));
+        }
+        else{
+                surfbits[pix>>6]&=~(1ULL<<(pix&63));
+        }
+}
 
-                x2=xck+xoff[ip];
-                y2=yck+yoff[ip];
-                z2=zck+zoff[ip];
-                if(x2>=SYSIZE){x2=0;}
-                if(x2<0){x2=SYSIZEM1;}
-                if(y2>=SYSIZE){y2=0;}
-                if(y2<0){y2=SYSIZEM1;}
-                if(z2>=SYSIZE){z2=0;}
-                if(z2<0){z2=SYSIZEM1;}
-                if(mic [x2] [y2] [z2]==POROSITY){
-                        edgeback=1;
+/* routine to build the surface index from scratch for the current mic */
+/* Called by passone */
+/* Calls surfmark */
+void surfbuild()
+{
+        int xid,yid,zid,x2,y2,z2,ip,phread;
+        long int pix;
+
+        for(ip=0;ip<128;ip++){
+                phcount[ip]=0;
+        }
+        for(pix=0;pix<NWORDS;pix++){
+                cshbits[pix]=surfbits[pix]=porbits[pix]=0;
+        }
+        for(xid=0;xid<SYSIZE;xid++){
+        for(yid=0;yid<SYSIZE;yid++){
+        for(zid=0;zid<SYSIZE;zid++){
+                phread=mic[xid][yid][zid];
+                phcount[phread]+=1;
+                if(phread==CSH){
+                        pix=PIXID(xid,yid,zid);
+                        cshbits[pix>>6]|=(1ULL<<(pix&63));
+                }
+                porseen[xid][yid][zid]=(phread==POROSITY);
+                pornbr[xid][yid][zid]=0;
+                /* with periodic boundary conditions */
+                for(ip=0;ip<NEIGHBORS;ip++){
+                        x2=(xid+xoff[ip]+SYSIZE)%SYSIZE;
+                        y2=(yid+yoff[ip]+SYSIZE)%SYSIZE;
+                        z2=(zid+zoff[ip]+SYSIZE)%SYSIZE;
+                        if(mic[x2][y2][z2]==POROSITY){
+                                pornbr[xid][yid][zid]+=1;
+                        }
                 }
         }
-        return(edgeback);
+        }
+        }
+        for(xid=0;xid<SYSIZE;xid++){
+        for(yid=0;yid<SYSIZE;yid++){
+        for(zid=0;zid<SYSIZE;zid++){
+                surfmark(xid,yid,zid);
+        }
+        }
+        }
+        surfready=1;
+}
+
+/* routine to bring the pore neighbor counts (pornbr) and the surface */
+/* bitmap up to date with mic: only the pixels flagged by SETMIC whose */
+/* porosity state differs from the last call update their neighbors, */
+/* so the work scales with the pore surface that moved */
+/* Called by passone */
+/* Calls lowbit and surfmark */
+void porupdate()
+{
+        int xid,yid,zid,x2,y2,z2,ip,pnow,delta;
+        long int iw,pix;
+        unsigned long long w;
+
+        for(iw=0;iw<NWORDS;iw++){
+        for(w=porbits[iw];w!=0;w&=(w-1)){
+                pix=(iw<<6)+lowbit(w);
+                xid=(int)(pix/((long int)SYSIZE*SYSIZE));
+                yid=(int)((pix/SYSIZE)%SYSIZE);
+                zid=(int)(pix%SYSIZE);
+                pnow=(mic[xid][yid][zid]==POROSITY);
+                if(pnow==porseen[xid][yid][zid]){continue;}
+                porseen[xid][yid][zid]=pnow;
+                delta=(pnow==1)?1:(-1);
+                /* (x2,y2,z2) has this pixel at offset ip */
+                /* with periodic boundary conditions */
+                for(ip=0;ip<NEIGHBORS;ip++){
+                        x2=xid-xoff[ip];
+                        y2=yid-yoff[ip];
+                        z2=zid-zoff[ip];
+                        if(x2>=SYSIZE){x2-=SYSIZE;}
+                        if(x2<0){x2+=SYSIZE;}
+                        if(y2>=SYSIZE){y2-=SYSIZE;}
+                        if(y2<0){y2+=SYSIZE;}
+                        if(z2>=SYSIZE){z2-=SYSIZE;}
+                        if(z2<0){z2+=SYSIZE;}
+                        pornbr[x2][y2][z2]+=delta;
+                        /* contact with porosity starts or ends */
+                        if(pornbr[x2][y2][z2]==(delta+1)/2){
+                                surfmark(x2,y2,z2);
+                        }
+                }
+                surfmark(xid,yid,zid);
+        }
+        porbits[iw]=0;
+        }
 }
 
 /* routine for first pass through microstructure during dissolution */
 /* low and high indicate phase ID range to check for surface sites */
+/* Phase counts come from the surface index; only the CSH pixels (for */
+/* the heat and water sums, in scan order) and the solid pixels in */
+/* contact with porosity are visited */
 /* Called by dissolve */
-/* Calls chckedge */
+/* Calls surfbuild, porupdate and lowbit */
 void passone(low,high,cycid,cshexflag)
         int low,high,cycid,cshexflag;
 {
-        int i,xid,yid,zid,phid,iph,edgef,phread,cshcyc;
+        int i,phread,cshcyc;
+        long int iw,pix;
+        unsigned long long w;
+        long int *initcnt[EMPTYP+1];
 
+        if(surfready==0){
+                surfbuild();
+        }
         /* gypready used to determine if any soluble gypsum remains */
         if((low<=GYPSUM)&&(GYPSUM<=high)){
                 gypready=0;
         }
-	/* Zero out count for the relevant phases */
+        /* If first cycle, then accumulate initial counts */
+        for(i=0;i<=EMPTYP;i++){
+                initcnt[i]=NULL;
+        }
+        if((cycid==1)||((cycid==0)&&(ncyc==0))){
+                initcnt[POROSITY]=&porinit;
+                initcnt[C3S]=&c3sinit;
+                initcnt[C2S]=&c2sinit;
+                initcnt[C3A]=&c3ainit;
+                initcnt[C4AF]=&c4afinit;
+                initcnt[GYPSUM]=&ncsbar;
+                initcnt[GYPSUMS]=&ncsbar;
+                initcnt[ANHYDRITE]=&anhinit;
+                initcnt[HEMIHYD]=&heminit;
+                initcnt[POZZ]=&nfill;
+                initcnt[SLAG]=&slaginit;
+                initcnt[ETTR]=&netbar;
+                initcnt[ETTRC4AF]=&netbar;
+        }
+        /* Identify phase and update count */
 	for(i=low;i<=high;i++){
-		count[i]=0;
+		count[i]=phcount[i];
+                if((i==GYPSUM)||(i==GYPSUMS)){
+                        gypready+=phcount[i];
+                }
+                if(initcnt[i]!=NULL){
+                        *initcnt[i]+=phcount[i];
+                }
 	}
-        /* Scan the entire 3-D microstructure */
-        for(xid=0;xid<SYSIZE;xid++){
-        for(yid=0;yid<SYSIZE;yid++){
-        for(zid=0;zid<SYSIZE;zid++){
-
-	phread=mic[xid][yid][zid];
 	/* Update heat data and water consumed for solid CSH */
-	if((cshexflag==1)&&(phread==CSH)){
-		cshcyc=cshage[xid][yid][zid];
-		heatsum+=heatf[CSH]/molarvcsh[cshcyc];
-		molesh2o+=watercsh[cshcyc]/molarvcsh[cshcyc];
-	}
-        /* Identify phase and update count */
-        phid=60;
-        for(i=low;((i<=high)&&(phid==60));i++){
-
-                if(mic [xid][yid][zid]==i){
-                        phid=i;
-                        /* Update count for this phase */
-                        count[i]+=1;
-                        if((i==GYPSUM)||(i==GYPSUMS)){
-                                gypready+=1;
-                        }
-                        /* If first cycle, then accumulate initial counts */
-                        if((cycid==1)||((cycid==0)&&(ncyc==0))){
-                                if(i==POROSITY){porinit+=1;}
-				/* Ordered in terms of likely volume fractions */
-				/* (largest to smallest) to speed execution */
-                                else if(i==C3S){c3sinit+=1;}
-                                else if(i==C2S){c2sinit+=1;}
-                                else if(i==C3A){c3ainit+=1;}
-                                else if(i==C4AF){c4afinit+=1;}
-                                else if(i==GYPSUM){ncsbar+=1;}
-                                else if(i==GYPSUMS){ncsbar+=1;}
-                                else if(i==ANHYDRITE){anhinit+=1;}
-                                else if(i==HEMIHYD){heminit+=1;}
-                                else if(i==POZZ){nfill+=1;}
-                                else if(i==SLAG){slaginit+=1;}
-                                else if(i==ETTR){netbar+=1;}
-                                else if(i==ETTRC4AF){netbar+=1;}
-                        }
+        if(cshexflag==1){
+        for(iw=0;iw<NWORDS;iw++){
+                for(w=cshbits[iw];w!=0;w&=(w-1)){
+                        pix=(iw<<6)+lowbit(w);
+		        cshcyc=((short int *)cshage)[pix];
+		        heatsum+=heatf[CSH]/molarvcsh[cshcyc];
+		        molesh2o+=watercsh[cshcyc]/molarvcsh[cshcyc];
                 }
         }
+        }
+        if(cycid==0){return;}
 
-        if(phid!=60){
-                /* If phase is soluble, see if it is in contact with porosity */
-                if((cycid!=0)&&(soluble[phid]==1)){
-                        edgef=chckedge(xid,yid,zid);
-                        if(edgef==1){
+        /* If phase is soluble, see if it is in contact with porosity */
+        porupdate();
+        for(iw=0;iw<NWORDS;iw++){
+                for(w=surfbits[iw];w!=0;w&=(w-1)){
+                        pix=(iw<<6)+lowbit(w);
+                        phread=MICPIX(pix);
+                        if((phread<low)||(phread>high)||(soluble[phread]!=1)){continue;}
 /* Surface eligible species has an ID OFFSET greater than its original value */
-                                mic [xid][yid][zid]+=OFFSET;
-                        }
+                        SETPIX(pix,phread+OFFSET);
                 }
         }
-        }  /* end of zid */
-        }  /* end of yid */
-        }  /* end of xid */
 }
 
 /* routine to locate a diffusing CSH species near dissolution source */
@@ -767,7 +909,7 @@ int loccsh(xcur,ycur,zcur,extent)
 
                 if(mic[xmod][ymod][zmod]==POROSITY){
                         effort=1;
-                        mic[xmod][ymod][zmod]=DIFFCSH;
+                        SETMIC(xmod,ymod,zmod,DIFFCSH);
                         nmade+=1;
                         ngoing+=1;
                         /* Add this diffusing species to the linked list */
@@ -789,7 +931,7 @@ int loccsh(xcur,ycur,zcur,extent)
 
 /* routine to count number of pore pixels in a cube of size boxsize */
 /* centered at (qx,qy,qz) */
-/* Called by makeinert */
+/* Called by dissolve and countboxsat */
 /* Calls no other routines */
 int countbox(boxsize,qx,qy,qz)
         int boxsize,qx,qy,qz;
@@ -873,10 +1015,82 @@ int countboxc(boxsize,qx,qy,qz)
         return(nfound);
 }
 
+/* Summed-volume table of the pixels counted by countbox, over the */
+/* system padded on every side by SATPAD pixels of its periodic images, */
+/* so that any cube of up to CUBEMAX pixels is eight table lookups */
+#define SATPAD (CUBEMAX/2)
+#define SATDIM (SYSIZE+2*SATPAD+1)
+#define SATIDX(u,v,w) ((((long int)(u))*SATDIM+(v))*SATDIM+(w))
+static int *boxsat=NULL;
+
+/* routine to fill the summed-volume table boxsat from mic */
+/* The table is allocated here and freed by the caller (makeinert) */
+/* Called by makeinert */
+/* Calls no other routines */
+void boxsatfill()
+{
+        int u,v,w,hx,hy,hz,inbox;
+
+        if(boxsat==NULL){
+                boxsat=(int *)malloc((long int)SATDIM*SATDIM*SATDIM*sizeof(int));
+                if(boxsat==NULL){
+                        printf("Could not allocate summed-volume table \n");
+                        exit(1);
+                }
+        }
+        /* Entry (u,v,w) holds the count over padded pixels below it */
+        /* on every axis; padded pixel u-1 is system pixel u-1-SATPAD */
+        for(u=0;u<SATDIM;u++){
+                hx=((u-1-SATPAD)%SYSIZE+SYSIZE)%SYSIZE;
+        for(v=0;v<SATDIM;v++){
+                hy=((v-1-SATPAD)%SYSIZE+SYSIZE)%SYSIZE;
+        for(w=0;w<SATDIM;w++){
+                if((u==0)||(v==0)||(w==0)){
+                        boxsat[SATIDX(u,v,w)]=0;
+                        continue;
+                }
+                hz=((w-1-SATPAD)%SYSIZE+SYSIZE)%SYSIZE;
+                /* Count if porosity, diffusing species, or empty porosity */
+                inbox=((mic[hx][hy][hz]<C3S)||(mic[hx][hy][hz]>ABSGYP));
+                boxsat[SATIDX(u,v,w)]=inbox+boxsat[SATIDX(u-1,v,w)]
+                        +boxsat[SATIDX(u,v-1,w)]+boxsat[SATIDX(u,v,w-1)]
+                        -boxsat[SATIDX(u-1,v-1,w)]-boxsat[SATIDX(u-1,v,w-1)]
+                        -boxsat[SATIDX(u,v-1,w-1)]+boxsat[SATIDX(u-1,v-1,w-1)];
+        }
+        }
+        }
+}
+
+/* routine to count the same pixels as countbox in a cube of size */
+/* boxsize centered at (qx,qy,qz), from the table filled by boxsatfill */
+/* Only valid as long as mic has not changed since the table was filled */
+/* Called by makeinert */
+/* Calls countbox */
+int countboxsat(boxsize,qx,qy,qz)
+        int boxsize,qx,qy,qz;
+{
+        int boxhalf,x0,x1,y0,y1,z0,z1;
+
+        boxhalf=boxsize/2;
+        if(boxhalf>SATPAD){
+                return(countbox(boxsize,qx,qy,qz));
+        }
+        x0=qx-boxhalf+SATPAD;
+        x1=qx+boxhalf+SATPAD+1;
+        y0=qy-boxhalf+SATPAD;
+        y1=qy+boxhalf+SATPAD+1;
+        z0=qz-boxhalf+SATPAD;
+        z1=qz+boxhalf+SATPAD+1;
+        return(boxsat[SATIDX(x1,y1,z1)]-boxsat[SATIDX(x0,y1,z1)]
+                -boxsat[SATIDX(x1,y0,z1)]-boxsat[SATIDX(x1,y1,z0)]
+                +boxsat[SATIDX(x0,y0,z1)]+boxsat[SATIDX(x0,y1,z0)]
+                +boxsat[SATIDX(x1,y0,z0)]-boxsat[SATIDX(x0,y0,z0)]);
+}
+
 /* routine to create ndesire pixels of empty pore space to simulate */
 /* self-desiccation */
 /* Called by dissolve */
-/* Calls countbox */
+/* Calls boxsatfill and countboxsat */
 void makeinert(ndesire)
         long int ndesire;
 {
@@ -906,11 +1120,14 @@ void makeinert(ndesire)
         }
 
         /* Now scan the microstructure and rank the sites */
+        /* mic is not changed before all sites are ranked, so the pore */
+        /* counts of the cubes are read from one summed-volume table */
+        boxsatfill();
         for(px=0;px<SYSIZE;px++){
         for(py=0;py<SYSIZE;py++){
         for(pz=0;pz<SYSIZE;pz++){
                 if(mic[px][py][pz]==POROSITY){
-                        cntpore=countbox(cubesize,px,py,pz);
+                        cntpore=countboxsat(cubesize,px,py,pz);
                         if(cntpore>cntmax){cntmax=cntpore;}
                         /* Store this site value at appropriate place in */
                         /* sorted linked list */
@@ -960,6 +1177,10 @@ void makeinert(ndesire)
         }
         }
 
+        /* The table is only valid for this ranking */
+        free(boxsat);
+        boxsat=NULL;
+
         /* Now remove the sites */
         /* starting at the head of the list */
         /* and deallocate all of the used memory */
@@ -968,7 +1189,7 @@ void makeinert(ndesire)
                 py=headtogo->y;
                 pz=headtogo->z;
                 if(px!=(-1)){
-                        mic [px] [py] [pz]=EMPTYP;
+                        SETMIC(px,py,pz,EMPTYP);
                         count[POROSITY]-=1;
                        	count[EMPTYP]+=1;
                 }
@@ -1032,7 +1253,7 @@ void extslagcsh(xpres,ypres,zpres)
                 /* if neighbor is porosity, locate the SLAG CSH there */
                 if(check==POROSITY){
 			if((faces[xpres][ypres][zpres]==0)||(mstest==faces[xpres][ypres][zpres])||(mstest2==faces[xpres][ypres][zpres])){
-	                        mic[xchr][ychr][zchr]=SLAGCSH;
+	                        SETMIC(xchr,ychr,zchr,SLAGCSH);
        		                faces[xchr][ychr][zchr]=faces[xpres][ypres][zpres];
 				count[SLAGCSH]+=1;
 				count[POROSITY]-=1;
@@ -1060,7 +1281,7 @@ void extslagcsh(xpres,ypres,zpres)
                         /* Be sure that one neighboring species is CSH or */
                         /* SLAG material */
                         if((tries>5000)||(numnear<26)){
-                                mic[xchr][ychr][zchr]=SLAGCSH;
+                                SETMIC(xchr,ychr,zchr,SLAGCSH);
 				count[SLAGCSH]+=1;
 				count[POROSITY]-=1;
                                 fchr=1;
@@ -1556,9 +1777,9 @@ void dissolve(cycle)
                 }
 /* Adjust C3AH6 solubility based on potential gypsum which will dissolve */
                 if(maxsulfate<(int)((float)gypready*disprob[GYPSUM]*
-                (float)count[POROSITY]/1000000.)){
+                (float)count[POROSITY]/((double)SYSIZE*SYSIZE*SYSIZE))){
                         maxsulfate=(int)((float)gypready*disprob[GYPSUM]*
-                        (float)count[POROSITY]/1000000.);
+                        (float)count[POROSITY]/((double)SYSIZE*SYSIZE*SYSIZE));
                 }
                 if(maxsulfate>0){
                       disprob[C3AH6]=disbase[C3AH6]*(float)maxsulfate/C3AH6CRIT;
@@ -1841,7 +2062,7 @@ void dissolve(cycle)
                                 discount[phid]+=1;
                                 cread=creates[phid];
 				count[phid]-=1;
-                                mic[xloop][yloop][zloop]=POROSITY;
+                                SETMIC(xloop,yloop,zloop,POROSITY);
                                 if(phid==C3AH6){nhgd+=1;}
                                 /* Special dissolution for C4AF */
                                 if(phid==C4AF){
@@ -1863,7 +2084,7 @@ void dissolve(cycle)
                                         ngoing+=1;
                                         phnew=cread;
                                         count[phnew]+=1;
-                                        mic[xc][yc][zc]=phnew;
+                                        SETMIC(xc,yc,zc,phnew);
                             antadd=(struct ants *)malloc(sizeof(struct ants));
                                         antadd->x=xc;
                                         antadd->y=yc;
@@ -1910,7 +2131,7 @@ void dissolve(cycle)
                                  }
                         }
                         else{
-                                 mic[xloop][yloop][zloop]-=OFFSET;
+                                 SETMIC(xloop,yloop,zloop,mic[xloop][yloop][zloop]-OFFSET);
                         }
 
                 } /* end of if edge loop */
@@ -1918,7 +2139,7 @@ void dissolve(cycle)
 		/* Only if CH is less than 15% in volume */
 		/* Only if CSH is in contact with at least one porosity */
 		/* and user wishes to use this option */
-		if((count[POZZ]>=13000)&&(chnew<(0.15*SYSIZE*SYSIZE*SYSIZE))&&(csh2flag==1)){
+		if((count[POZZ]>=13*SYSIZE*SYSIZE*SYSIZE/1000)&&(chnew<(0.15*SYSIZE*SYSIZE*SYSIZE))&&(csh2flag==1)){
 			if(mic[xloop][yloop][zloop]==CSH){
 			if((countbox(3,xloop,yloop,zloop))>=1){
 				pconvert=ran1(seed);
@@ -1940,11 +2161,11 @@ void dissolve(cycle)
 					}
 
 					if(plfh3<=calcy){
-						mic[xloop][yloop][zloop]=POZZCSH;
+						SETMIC(xloop,yloop,zloop,POZZCSH);
 						count[POZZCSH]+=1;
 					}
 					else{
-						mic[xloop][yloop][zloop]=DIFFCH;
+						SETMIC(xloop,yloop,zloop,DIFFCH);
                                         	nmade+=1;
 						ncshgo+=1;
  	                                        ngoing+=1;
@@ -1998,7 +2219,7 @@ CSH species??? */
                                      /* Convert slag to reaction products */
                                      plfh3=ran1(seed);
                                      if(plfh3<p1slag){
-                                       mic[xloop][yloop][zloop]=SLAGCSH;
+                                       SETMIC(xloop,yloop,zloop,SLAGCSH);
 					/* Assign a plate axes identifier to this slag C-S-H voxel */
 					msface=(int)(3.*ran1(seed)+1.);
 					if(msface>3){msface=1;}
@@ -2009,11 +2230,11 @@ CSH species??? */
 					if(sealed==1){
                                         /* Create empty porosity at slag site */
 						slagemptyp+=1;
-						mic[xloop][yloop][zloop]=EMPTYP;
+						SETMIC(xloop,yloop,zloop,EMPTYP);
                                                 count[EMPTYP]+=1;
 					}
 					else{
-						mic[xloop][yloop][zloop]=POROSITY;
+						SETMIC(xloop,yloop,zloop,POROSITY);
                                                 count[POROSITY]+=1;
 					}
                                      }
@@ -2146,7 +2367,7 @@ CSH species??? */
 			else if(xext>nsum3){phid=DIFFC4A;}
                         else if(xext>nsum2){phid=DIFFC3A;}
                         else if(xext>nchext){phid=DIFFCSH;}
-                        mic[xc][yc][zc]=phid;
+                        SETMIC(xc,yc,zc,phid);
                         nmade+=1;
                         ngoing+=1;
                         antadd=(struct ants *)malloc(sizeof(struct ants));
@@ -2216,14 +2437,14 @@ void addrand(randid,nneed)
                         if(iz==SYSIZE){iz=0;}
                         if(mic[ix][iy][iz]==POROSITY){
                             if((randid!=CACO3)&&(randid!=INERT)){
-                                mic[ix][iy][iz]=randid;
+                                SETMIC(ix,iy,iz,randid);
 				micorig[ix][iy][iz]=randid;
                                 success=1;
 			    }
                             else{
 				cpores=countboxc(3,ix,iy,iz);
                                 if(cpores>=26){
-                                	mic[ix][iy][iz]=randid;
+                                	SETMIC(ix,iy,iz,randid);
 					micorig[ix][iy][iz]=randid;
        		                        success=1;
 				}
@@ -2310,7 +2531,7 @@ void resaturate()
 	for(sy=0;sy<SYSIZE;sy++){
 	for(sz=0;sz<SYSIZE;sz++){
 		if(mic[sx][sy][sz]==EMPTYP){
-			mic[sx][sy][sz]=POROSITY;
+			SETMIC(sx,sy,sz,POROSITY);
 			nresat++;
 		}
 	}
@@ -2330,6 +2551,7 @@ int main()
         int cycflag,ix,iy,iz,phtodo;
         int iseed,phydfreq,oflag;
         long int nadd;
+        int pflag[3];   /* percolation flags of the three directions */
         int xpl,xph,ypl,yph,fidc3s,fidc2s,fidc3a,fidc4af,fidgyp,fidagg,ffac3a;
 	int fidhem,fidanh,fidcaco3,nlen,pixtmp;
         float pnucch,pscalech,pnuchg,pscalehg,pnucfh3,pscalefh3;
@@ -2338,6 +2560,10 @@ int main()
         float mass_cement,mass_cem_now,mass_cur,kpozz,kslag;
         FILE *infile,*outfile,*adiafile,*thfile;
         char filei[80],fileo[80],filetemp[80];
+        int *imgbuf;    /* in-memory images (engine build only) */
+        int ckptfreq=0,icycstart=0;
+        char ckptprefix[CKPT_NAMELEN],restartfile[CKPT_NAMELEN];
+        struct ckptparams ckptin,ckptold;
 
         ngoing=0;
 	porefl1=porefl2=porefl3=1;
@@ -2375,65 +2601,71 @@ int main()
        printf("%d\n",ffac3a);
         fflush(stdout);
 
-        infile=fopen(filei,"r");
+        imgbuf=cem_image(filei);
+        if(imgbuf==NULL){infile=fopen(filei,"r");}
+        /* the surface index is built by the first pass */
+        surfready=0;
 
         for(ix=0;ix<SYSIZE;ix++){
         for(iy=0;iy<SYSIZE;iy++){
         for(iz=0;iz<SYSIZE;iz++){
 		cshage[ix][iy][iz]=0;
 		faces[ix][iy][iz]=0;
-                fscanf(infile,"%d",&valin);
-                mic[ix][iy][iz]=valin;
+                if(imgbuf!=NULL){valin=*imgbuf++;}
+                else{fscanf(infile,"%d",&valin);}
+                SETMIC(ix,iy,iz,valin);
                 if(valin==fidc3s){
-                        mic[ix][iy][iz]=C3S;
+                        SETMIC(ix,iy,iz,C3S);
                 }
                 else if(valin==fidc2s){
-                        mic[ix][iy][iz]=C2S;
+                        SETMIC(ix,iy,iz,C2S);
                 }
                 else if((valin==fidc3a)||(valin==ffac3a)){
-                        mic[ix][iy][iz]=C3A;
+                        SETMIC(ix,iy,iz,C3A);
                 }
                 else if(valin==fidc4af){
-                        mic[ix][iy][iz]=C4AF;
+                        SETMIC(ix,iy,iz,C4AF);
                 }
                 else if(valin==fidgyp){
-                        mic[ix][iy][iz]=GYPSUM;
+                        SETMIC(ix,iy,iz,GYPSUM);
                 }
                 else if(valin==fidanh){
-                        mic[ix][iy][iz]=ANHYDRITE;
+                        SETMIC(ix,iy,iz,ANHYDRITE);
                 }
                 else if(valin==fidhem){
-                        mic[ix][iy][iz]=HEMIHYD;
+                        SETMIC(ix,iy,iz,HEMIHYD);
                 }
                 else if(valin==fidcaco3){
-                        mic[ix][iy][iz]=CACO3;
+                        SETMIC(ix,iy,iz,CACO3);
                 }
                 else if(valin==fidagg){
-                        mic[ix][iy][iz]=INERTAGG;
+                        SETMIC(ix,iy,iz,INERTAGG);
                 }
 		micorig[ix][iy][iz]=mic[ix][iy][iz];
         }
         }
         }
-        fclose(infile);
+        if(imgbuf==NULL){fclose(infile);}
         fflush(stdout);
 
         /* Now read in particle IDs from file */
         printf("Enter name of file to read particle IDs from \n");
         scanf("%s",filei);
         printf("%s\n",filei);
-        infile=fopen(filei,"r");
+        imgbuf=cem_image(filei);
+        if(imgbuf==NULL){infile=fopen(filei,"r");}
 
         for(ix=0;ix<SYSIZE;ix++){
         for(iy=0;iy<SYSIZE;iy++){
         for(iz=0;iz<SYSIZE;iz++){
-                fscanf(infile,"%d",&valin);
+                if(imgbuf!=NULL){valin=*imgbuf++;}
+                else{fscanf(infile,"%d",&valin);}
                 micpart[ix][iy][iz]=valin;
         }
         }
         }
 	
-        fclose(infile);
+        if(imgbuf==NULL){fclose(infile);}
         fflush(stdout);   
 
         /* Initialize counters, etc. */
@@ -2601,6 +2833,18 @@ int main()
         printf("Does pH influence hydration kinetics 0) no or 1) yes \n");
         scanf("%d\n",&pHactive);
         printf("%d\n",pHactive);
+        /* Optional checkpoint/restart entries (absent from older inputs) */
+        ckptprefix[0]=restartfile[0]='\0';
+        if(scanf("%d",&ckptfreq)==1){
+                printf("Enter cycle frequency for writing checkpoints (0 for none) \n");
+                printf("%d\n",ckptfreq);
+                printf("Enter prefix of the checkpoint files (none for default) \n");
+                ckpt_readname(ckptprefix);
+                printf("%s\n",ckptprefix[0]?ckptprefix:"none");
+                printf("Enter checkpoint file to restart from (none to start afresh) \n");
+                ckpt_readname(restartfile);
+                printf("%s\n",restartfile[0]?restartfile:"none");
+        }
         fflush(stdout);
         snprintf(heatname,80,"%s.heat.%d.%d.%1d%1d%1d",fileroot,ncyc,(int)temp_0,csh2flag,adiaflag,sealed);
         snprintf(moviename,80,"%s.mov.%d.%d.%1d%1d%1d",fileroot,ncyc,(int)temp_0,csh2flag,adiaflag,sealed);
@@ -2652,7 +2896,45 @@ fprintf(adiafile,"Time(h) Temperature  Alpha  Krate   Cp_now  Mass_cem kpozz/khy
 	watercsh[0]=waterc[CSH];
 	/* Determine surface counts */
 	measuresurf();
-        for(icyc=1;icyc<=ncyc;icyc++){
+        /* Inputs of this run, stored with its checkpoints */
+        if(ckptprefix[0]=='\0'){snprintf(ckptprefix,CKPT_NAMELEN,"%s.ckpt",fileroot);}
+        memset(&ckptin,0,sizeof(ckptin));
+        ckptin.sealed=sealed;
+        ckptin.adiaflag=adiaflag;
+        ckptin.temp_0=temp_0;
+        ckptin.E_act=E_act;
+        ckptin.E_act_pozz=E_act_pozz;
+        ckptin.E_act_slag=E_act_slag;
+        if(restartfile[0]!='\0'){
+                /* Continue from a checkpoint; the series so far are */
+                /* copied from it into this run's files */
+                fclose(adiafile);
+                fclose(disprobfile);
+                icycstart=ckpt_restore(restartfile,&ckptold);
+                if(icycstart>=ncyc){
+                        printf("Checkpoint error: cycle %d is not before cycle %d \n",icycstart,ncyc);
+                        exit(1);
+                }
+                disprobfile=fopen("disprob.out","a");
+                adiafile=fopen(adianame,"a");
+                /* Changed curing conditions take over from the saved state */
+                if(ckptin.sealed!=ckptold.sealed){sealed=ckptin.sealed;}
+                if((ckptin.adiaflag!=ckptold.adiaflag)||(ckptin.temp_0!=ckptold.temp_0)){
+                        temp_0=temp_cur=ckptin.temp_0;
+                }
+                kpozz=exp(-(1000.*E_act_pozz/8.314)*((1./(temp_cur+273.15))-(1./298.15)));
+                kslag=exp(-(1000.*E_act_slag/8.314)*((1./(temp_cur+273.15))-(1./298.15)));
+                if((ckptin.adiaflag!=ckptold.adiaflag)||(ckptin.temp_0!=ckptold.temp_0)
+                        ||(ckptin.E_act!=ckptold.E_act)||(ckptin.E_act_pozz!=ckptold.E_act_pozz)
+                        ||(ckptin.E_act_slag!=ckptold.E_act_slag)){
+                        krate=exp(-(1000.*E_act/8.314)*((1./(temp_cur+273.15))-(1./298.15)));
+                        ppozz=PPOZZ*kpozz/krate;
+                        disprob[ASG]=disbase[ASG]*kpozz/krate;
+                        disprob[CAS2]=disbase[CAS2]*kpozz/krate;
+                        disprob[SLAG]=slagreact*disbase[SLAG]*kslag/krate;
+                }
+        }
+        for(icyc=icycstart+1;icyc<=ncyc;icyc++){
 		if((sealed==1)&&(icyc==(resatcyc+1))&&(resatcyc!=0)){
 			resaturate();
 			sealed=0;
@@ -2789,9 +3071,16 @@ printf("Number dissolved this pass- %ld total diffusing- %ld \n",nmade,ngoing);
 	/* Note that first variable passed corresponds to phase to check */
 	/* Could easily add calls to check for percolation of CH, CSH, etc. */
         if(((icyc%burnfreq)==0)&&((porefl1+porefl2+porefl3)!=0)){
+#ifndef BURN_FRONTIER
+               percpore(0,pflag);
+               porefl1=pflag[0];
+               porefl2=pflag[1];
+               porefl3=pflag[2];
+#else
                porefl1=burn3d(0,1,0,0);
                porefl2=burn3d(0,0,1,0);
                porefl3=burn3d(0,0,0,1);
+#endif
 		/* Switch to self-desiccating conditions when porosity */
 		/* disconnects */
 		if(((porefl1+porefl2+porefl3)==0)&&(sealed==0)){
@@ -2804,9 +3093,16 @@ printf("Number dissolved this pass- %ld total diffusing- %ld \n",nmade,ngoing);
         }
         /* Check percolation of solids (set point) */
         if(((icyc%setfreq)==0)&&(setflag==0)){
+#ifndef BURN_FRONTIER
+                percset(pflag);
+                sf1=pflag[0];
+                sf2=pflag[1];
+                sf3=pflag[2];
+#else
                 sf1=burnset(1,0,0);
                 sf2=burnset(0,1,0);
                 sf3=burnset(0,0,1);
+#endif
 		setflag=sf1*sf2*sf3;
         }
 
@@ -2826,7 +3122,7 @@ printf("Number dissolved this pass- %ld total diffusing- %ld \n",nmade,ngoing);
 
 			for(ix=0;ix<SYSIZE;ix++){
 			for(iy=0;iy<SYSIZE;iy++){
-    				fprintf(movfile,"%d\n",(int)mic[50][ix][iy]);
+    				fprintf(movfile,"%d\n",(int)mic[SYSIZE/2][ix][iy]);
 			}
 			}
 			fclose(movfile);
@@ -2885,6 +3181,10 @@ printf("Number dissolved this pass- %ld total diffusing- %ld \n",nmade,ngoing);
                         }
 			fclose(micfile);
 		}
+		/* Checkpoint the state after this cycle */
+		if((ckptfreq>0)&&((icyc%ckptfreq)==0)&&(icyc<ncyc)){
+			ckpt_save(ckptprefix,icyc,&ckptin);
+		}
 
         }
 	/* Last call to dissolve to terminate hydration */
@@ -2893,15 +3193,27 @@ printf("Number dissolved this pass- %ld total diffusing- %ld \n",nmade,ngoing);
 	/* Note that first variable passed corresponds to phase to check */
 	/* Could easily add calls to check for percolation of CH, CSH, etc. */
         if((burnfreq!=0)&&(burnfreq<=ncyc)&&((porefl1+porefl2+porefl3)!=0)){
+#ifndef BURN_FRONTIER
+               percpore(0,pflag);
+               porefl1=pflag[0];
+               porefl2=pflag[1];
+               porefl3=pflag[2];
+#else
                porefl1=burn3d(0,1,0,0);
                porefl2=burn3d(0,0,1,0);
                porefl3=burn3d(0,0,0,1);
+#endif
         }
         /* Check percolation of solids (set point) */
         if((setfreq!=0)&&(setfreq<=ncyc)){
+#ifndef BURN_FRONTIER
+                percset(pflag);
+                setflag=pflag[0]+pflag[1]+pflag[2];
+#else
                 setflag=burnset(1,0,0);
                 setflag+=burnset(0,1,0);
                 setflag+=burnset(0,0,1);
+#endif
         }
 
         /* Output last lines of heat and chemical shrinkage files */
@@ -2931,12 +3243,15 @@ printf("Number dissolved this pass- %ld total diffusing- %ld \n",nmade,ngoing);
 	printf("Final count for ncshplategrow is %ld \n",ncshplategrow);
 	printf("Final count for ncshplateinit is %ld \n",ncshplateinit);
         /* Output final microstructure if desired */
+        /* (the engine build can also capture it under the name "@final") */
+                imgbuf=cem_image("@final");
                 outfile=fopen(fileo,"w");
 
                 for(ix=0;ix<SYSIZE;ix++){
                 for(iy=0;iy<SYSIZE;iy++){
                 for(iz=0;iz<SYSIZE;iz++){
                         fprintf(outfile,"%d\n",(int)mic[ix][iy][iz]);
+                        if(imgbuf!=NULL){*imgbuf++=mic[ix][iy][iz];}
                 }
                 }
                 }
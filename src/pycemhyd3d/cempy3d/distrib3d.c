@@ -29,8 +29,10 @@
 #define MAX(a,b) (a>b)?a:b
 #define MIN(a,b) (a<b)?a:b
 #define PI 3.1415926
+#ifndef SYSIZE
 #define SYSIZE 100
-#define SYSSIZE 100
+#endif
+#define SYSSIZE SYSIZE
 #define MAXCYC 1000    /* maximum sintering cycles to use */
 #define MAXSPH 10000   /* maximum number of elements in a spherical template */
 #define C3S 1
@@ -44,6 +46,16 @@ static unsigned short int curvature [SYSSIZE+1] [SYSSIZE+1] [SYSSIZE+1];
 long int volume[50],surface[50];
 int nsph,xsph[MAXSPH],ysph[MAXSPH],zsph[MAXSPH];
 long int nsolid[1500],nair[1500];
+/* Sintering index: the phase 1 (solid) and phase 2 (air) pixels of each */
+/* curvature bin, as lattice indices ((x-1)*SYSSIZE+(y-1))*SYSSIZE+(z-1) */
+/* (the scan order of the original full-lattice loops) */
+struct pixbin{
+        int *pix;
+        long int n,cap;
+};
+struct pixbin solbin[1500],airbin[1500];
+/* phase 1 pixel and surface counts of rhcalc, kept up to date by movepix */
+long int rhporc,rhsurf;
 
 double ran1(idum)
 int *idum;
@@ -82,6 +94,8 @@ int *idum;
 #undef MAX
 #undef MIN
 
+#include "fft3d.c"		/* FFT correlation for rand3d */
+
 /* routine to create a template for the sphere of interest of radius size */
 /* to be used in curvature evaluation */
 /* Called by: runsint */
@@ -201,32 +215,41 @@ int surfpix(xin,yin,zin)
 /* routine to return the current hydraulic radius for phase phin */
 /* Calls surfpix */
 /* Called by runsint */
+/* Called by rhcalc and sinter3d */
+float rhvalue()
+{
+        float rhval;
+
+        printf("Phase area count is %ld \n",rhporc);
+        printf("Phase surface count is %ld \n",rhsurf);
+        rhval=(float)rhporc*6./(4.*(float)rhsurf);
+        printf("Hydraulic radius is %f \n",rhval);
+        return(rhval);
+}
+
+/* routine to count phase phin and its surface over the whole lattice; */
+/* movepix then keeps the counts current and sinter3d reads them with rhvalue */
+/* Calls surfpix and rhvalue */
+/* Called by sinter3d */
 float rhcalc(phin)
         int phin;
 {
         int ix,iy,iz;
-        long int porc,surfc;
-        float rhval;
 
-        porc=surfc=0;
+        rhporc=rhsurf=0;
 
         /* Check all pixels in the 3-D volume */
         for(ix=1;ix<=SYSSIZE;ix++){
         for(iy=1;iy<=SYSSIZE;iy++){
         for(iz=1;iz<=SYSSIZE;iz++){
                 if(mask [ix] [iy] [iz]==phin){
-                        porc+=1;
-                        surfc+=surfpix(ix,iy,iz);
+                        rhporc+=1;
+                        rhsurf+=surfpix(ix,iy,iz);
                 }
         }
         }
         }
-
-        printf("Phase area count is %ld \n",porc);
-        printf("Phase surface count is %ld \n",surfc);
-        rhval=(float)porc*6./(4.*(float)surfc);
-        printf("Hydraulic radius is %f \n",rhval);
-        return(rhval);
+        return(rhvalue());
 }
 
 /* routine to return count of pixels in a spherical template which are phase */
@@ -262,6 +285,66 @@ int countem(xp,yp,zp,phin)
         return(cumnum);
 }
 
+/* routine to add lattice index pix to a curvature bin */
+/* Calls no other routines */
+/* Called by sysinit, sysscan and movepix */
+void binadd(bin,pix)
+        struct pixbin *bin;
+        int pix;
+{
+        if(bin->n>=bin->cap){
+                bin->cap=(bin->cap>0)?2*bin->cap:64;
+                bin->pix=(int *)realloc(bin->pix,bin->cap*sizeof(int));
+                if(bin->pix==NULL){
+                        printf("Could not allocate sintering index \n");
+                        exit(1);
+                }
+        }
+        bin->pix[bin->n++]=pix;
+}
+
+/* routine to drop the pixels of a bin that are no longer phase phin */
+/* Calls no other routines */
+/* Called by movepix */
+void binkeep(bin,phin)
+        struct pixbin *bin;
+        int phin;
+{
+        long int i,nkeep;
+        int pix;
+
+        nkeep=0;
+        for(i=0;i<bin->n;i++){
+                pix=bin->pix[i];
+                if(mask[pix/(SYSSIZE*SYSSIZE)+1][(pix/SYSSIZE)%SYSSIZE+1][pix%SYSSIZE+1]==phin){
+                        bin->pix[nkeep++]=pix;
+                }
+        }
+        bin->n=nkeep;
+}
+
+/* routine to empty all curvature bins and free their storage */
+/* Calls no other routines */
+/* Called by sinter3d */
+void binreset()
+{
+        int i;
+
+        for(i=0;i<(int)(sizeof(solbin)/sizeof(solbin[0]));i++){
+                free(solbin[i].pix);
+                free(airbin[i].pix);
+                solbin[i].pix=airbin[i].pix=NULL;
+                solbin[i].n=solbin[i].cap=airbin[i].n=airbin[i].cap=0;
+        }
+}
+
+/* qsort comparison of lattice indices */
+int cmppix(a,b)
+        const void *a,*b;
+{
+        return((*(const int *)a>*(const int *)b)-(*(const int *)a<*(const int *)b));
+}
+
 /* routine to initialize system by determining local curvature */
 /* of all phase 1 and phase 2 pixels */
 /* Calls countem */
@@ -300,6 +383,7 @@ void sysinit(ph1,ph2)
                         curvature [xl] [yl] [zl]=count;
                        	/* update solid curvature histogram */
                        	nsolid[count]+=1;
+                        binadd(&solbin[count],((xl-1)*SYSSIZE+(yl-1))*SYSSIZE+(zl-1));
                 }
 			
                 /* case where we have a phase 2 surface pixel */
@@ -308,6 +392,7 @@ void sysinit(ph1,ph2)
                         curvature [xl] [yl] [zl]=count;
                         /* update air curvature histogram */
                        	nair[count]+=1;
+                        binadd(&airbin[count],((xl-1)*SYSSIZE+(yl-1))*SYSSIZE+(zl-1));
                 }
 
         }
@@ -333,9 +418,11 @@ void sysscan(ph1,ph2)
 	
                 if(mask [xd] [yd] [zd]==ph2){
                         nair[curvval]+=1;
+                        binadd(&airbin[curvval],((xd-1)*SYSSIZE+(yd-1))*SYSSIZE+(zd-1));
                 }
                 else if (mask [xd] [yd] [zd]==ph1){
                         nsolid[curvval]+=1;
+                        binadd(&solbin[curvval],((xd-1)*SYSSIZE+(yd-1))*SYSSIZE+(zd-1));
                 }
         }	
         }
@@ -396,13 +483,14 @@ int procair(nsearch)
 
 /* routine to move requested number of pixels (ntomove) from highest */
 /* curvature phase 1 (ph1) sites to lowest curvature phase 2 (ph2) sites */
-/* Calls procsol and procair */
+/* Calls procsol, procair, binadd, binkeep and surfpix */
 /* Called by runsint */
 int movepix(ntomove,ph1,ph2)
         int ntomove,ph1,ph2;
 {
-        int xloc[2100],yloc[2100],zloc[2100];
-        int count1,count2,ntot,countc,i,xp,yp,zp;
+        int count1,count2,ntot,countc,i,xp,yp,zp,pix;
+        int *cand;
+        long int ncand,ic;
         int cmin,cmax,cfg;
         int alldone;
         long int nsolc,nairc,nsum,nsolm,nairm,nst1,nst2,next1,next2;
@@ -458,10 +546,38 @@ int movepix(ntomove,ph1,ph2)
         nsolm=0;
         nairm=0;
 
-        /* Now process each pixel in turn */
-        for(xp=1;xp<=SYSSIZE;xp++){
-        for(yp=1;yp<=SYSSIZE;yp++){
-        for(zp=1;zp<=SYSSIZE;zp++){
+        /* Only phase 1 pixels with curvature >= count1 and phase 2 */
+        /* pixels with curvature <= count2 can move: take them from the */
+        /* curvature bins and process them in lattice scan order */
+        ncand=0;
+        for(i=count1;i<=nsph;i++){ncand+=solbin[i].n;}
+        for(i=0;i<=count2;i++){ncand+=airbin[i].n;}
+        cand=(int *)malloc((ncand>0?ncand:1)*sizeof(int));
+        if(cand==NULL){
+                printf("Could not allocate sintering candidates \n");
+                exit(1);
+        }
+        ncand=0;
+        for(i=count1;i<=nsph;i++){
+                if(solbin[i].n>0){
+                        memcpy(cand+ncand,solbin[i].pix,solbin[i].n*sizeof(int));
+                        ncand+=solbin[i].n;
+                }
+        }
+        for(i=0;i<=count2;i++){
+                if(airbin[i].n>0){
+                        memcpy(cand+ncand,airbin[i].pix,airbin[i].n*sizeof(int));
+                        ncand+=airbin[i].n;
+                }
+        }
+        qsort(cand,ncand,sizeof(int),cmppix);
+
+        /* Now process each candidate pixel in turn */
+        for(ic=0;ic<ncand;ic++){
+                pix=cand[ic];
+                xp=pix/(SYSSIZE*SYSSIZE)+1;
+                yp=(pix/SYSSIZE)%SYSSIZE+1;
+                zp=pix%SYSSIZE+1;
 		
                 countc=curvature [xp] [yp] [zp];
                 /* handle phase 1 case first */
@@ -473,11 +589,11 @@ int movepix(ntomove,ph1,ph2)
                                 /* update appropriate histogram cells */
                                 nsolid[countc]-=1;
                                 nair[countc]+=1;
-                                /* store the location of the modified pixel */
                                 ntot+=1;
-                                xloc[ntot]=xp;
-                                yloc[ntot]=yp;
-                                zloc[ntot]=zp;
+                                /* index the pixel under its new phase */
+                                binadd(&airbin[countc],pix);
+                                rhporc-=1;
+                                rhsurf-=surfpix(xp,yp,zp);
                         }
                         if(countc==count1){
                                 nsolm+=1;
@@ -493,11 +609,11 @@ int movepix(ntomove,ph1,ph2)
                                         /* update appropriate histogram cells */
                                         nsolid[count1]-=1;
                                         nair[count1]+=1;
-                                  /* store the location of the modified pixel */
                                         ntot+=1;
-                                        xloc[ntot]=xp;
-                                        yloc[ntot]=yp;
-                                        zloc[ntot]=zp;
+                                        /* index the pixel under its new phase */
+                                        binadd(&airbin[countc],pix);
+                                        rhporc-=1;
+                                        rhsurf-=surfpix(xp,yp,zp);
                                  }
                                  }
                         }
@@ -511,9 +627,9 @@ int movepix(ntomove,ph1,ph2)
                                         nsolid[countc]+=1;
                                         nair[countc]-=1;
                                         ntot+=1;
-                                        xloc[ntot]=xp;
-                                        yloc[ntot]=yp;
-                                        zloc[ntot]=zp;
+                                        binadd(&solbin[countc],pix);
+                                        rhporc+=1;
+                                        rhsurf+=surfpix(xp,yp,zp);
                                 }
                                 if(countc==count2){
                                         nairm+=1;
@@ -528,22 +644,25 @@ int movepix(ntomove,ph1,ph2)
                                                 nsolid[count2]+=1;
                                                 nair[count2]-=1;
                                                 ntot+=1;
-                                                xloc[ntot]=xp;
-                                                yloc[ntot]=yp;
-                                                zloc[ntot]=zp;
+                                                binadd(&solbin[countc],pix);
+                                                rhporc+=1;
+                                                rhsurf+=surfpix(xp,yp,zp);
                                         }
                                 }
                         }
 		
-        } /* end of zp loop */
-        } /* end of yp loop */
-       	} /* end of xloop */
+        } /* end of candidate loop */
+        free(cand);
+
+        /* drop the moved pixels from the bins they left */
+        for(i=count1;i<=nsph;i++){binkeep(&solbin[i],ph1);}
+        for(i=0;i<=count2;i++){binkeep(&airbin[i],ph2);}
         printf("ntot is %d \n",ntot);
        	return(alldone);
 }
 
 /* routine to execute user input number of cycles of sintering algorithm */
-/* Calls maketemp, rhcalc, sysinit, sysscan, and movepix */
+/* Calls maketemp, binreset, rhcalc, rhvalue, sysinit, sysscan, and movepix */
 /* Called by main routine */
 void sinter3d(ph1id,ph2id,rhtarget)
 	int ph1id,ph2id;
@@ -567,6 +686,7 @@ void sinter3d(ph1id,ph2id,rhtarget)
 
         nsph=maketemp(rade);
         printf("nsph is %d \n",nsph);
+        binreset();
         if(rflag==0){
                 sysinit(ph1id,ph2id);
         }
@@ -582,7 +702,7 @@ void sinter3d(ph1id,ph2id,rhtarget)
                 keepgo=movepix(natonce,ph1id,ph2id);
                 /* If equilibrium is reached, then return to calling routine */
                 if(keepgo==1){
-                        return;
+                        break;
                 }
                 curvsum1=0;
                 curvsum2=0;
@@ -599,8 +719,10 @@ void sinter3d(ph1id,ph2id,rhtarget)
                 avecurv2=(float)curvsum2/(float)pixsum2;
                 printf("Ave. solid curvature: %f \n",avecurv1);
                 printf("Ave. air curvature: %f \n",avecurv2);
-                rhnow=rhcalc(ph1id);
+                rhnow=rhvalue();
         } 
+        /* free the curvature bins before returning */
+        binreset();
 }
 
 void stat3d(){
@@ -723,6 +845,7 @@ void rand3d(phasein,phaseout,filecorr,xpt)
         float xtot,filval,radius,sect,sumtot,vcrit;
         int valin,r1,r2,i1,i2,i3,i,j,k,j1,k1;
         int ido,iii,jjj,ix,iy,iz,index;
+        float *flat,*filt;
 	FILE *corrfile;
 
 /* Create the Gaussian noise image */
@@ -795,6 +918,44 @@ void rand3d(phasein,phaseout,filecorr,xpt)
 /* Now filter the image maintaining periodic boundaries */
        resmax=0.0;
        resmin=1.0;
+#ifndef RAND3D_DIRECT
+/* periodic correlation by FFT (fft3d.c): same sums as the loop below */
+       flat=(float *)malloc((long)SYSIZE*SYSIZE*SYSIZE*sizeof(float));
+       filt=(float *)malloc(31*31*31*sizeof(float));
+       if((flat==NULL)||(filt==NULL)){
+            printf("Could not allocate filtering arrays \n");
+            exit(1);
+       }
+       for(i=1;i<=SYSIZE;i++){
+       for(j=1;j<=SYSIZE;j++){
+       for(k=1;k<=SYSIZE;k++){
+            flat[((long)(i-1)*SYSIZE+(j-1))*SYSIZE+(k-1)]=normm[i][j][k];
+       }
+       }
+       }
+       for(ix=1;ix<=31;ix++){
+       for(iy=1;iy<=31;iy++){
+       for(iz=1;iz<=31;iz++){
+            filt[((ix-1)*31+(iy-1))*31+(iz-1)]=filter[ix][iy][iz];
+       }
+       }
+       }
+       corr3d(flat,filt,31,flat,SYSIZE);
+       for(i=1;i<=SYSIZE;i++){
+       for(j=1;j<=SYSIZE;j++){
+       for(k=1;k<=SYSIZE;k++){
+            res[i][j][k]=0.0;
+            if((float)mask[i][j][k]==phasein){
+                  res[i][j][k]=flat[((long)(i-1)*SYSIZE+(j-1))*SYSIZE+(k-1)];
+                  if(res[i][j][k]>resmax){resmax=res[i][j][k];}
+                  if(res[i][j][k]<resmin){resmin=res[i][j][k];}
+            }
+       }
+       }
+       }
+       free(flat);
+       free(filt);
+#else
        for(i=1;i<=SYSIZE;i++){
        for(j=1;j<=SYSIZE;j++){
        for(k=1;k<=SYSIZE;k++){
@@ -822,6 +983,7 @@ void rand3d(phasein,phaseout,filecorr,xpt)
        }
        }
        }
+#endif
 
 /* Now threshold the image */
        sect=(resmax-resmin)/500.;
@@ -874,6 +1036,7 @@ int main(){
 	float volin,volf[5],surff[5],rhtest,rdesire;
 	char filen[80],fileout[80],filecem[80],filec3s[80],filesil[80],filealum[80];
 	FILE *infile,*outfile,*testfile;
+	int *imgbuf;	/* in-memory image (engine build only) */
 
 	/* Seed the random number generator */
         printf("Enter random number seed (negative integer) \n");
@@ -922,22 +1085,26 @@ int main(){
 	}
 
 /* Read in the original microstructure image file */
+        imgbuf=cem_image(filen);
+        if(imgbuf==NULL){
         infile=fopen(filen,"r");
         if (infile == NULL) {
                 perror("Error opening input file");
                 return 1;
         }
+        }
 
         for(k=1;k<=SYSIZE;k++){
         for(j=1;j<=SYSIZE;j++){
         for(i=1;i<=SYSIZE;i++){
-             fscanf(infile,"%d",&valin);
+             if(imgbuf!=NULL){valin=*imgbuf++;}
+             else{fscanf(infile,"%d",&valin);}
              mask[i][j][k]=valin;
 	     curvature[i][j][k]=0;
         }
         }
         }
-        fclose(infile);
+        if(imgbuf==NULL){fclose(infile);}
 
 	/* First filtering */
 	volin=volf[1]+volf[2];
@@ -1036,14 +1203,17 @@ int main(){
 	}
 
 	/* Output final microstructure */
-       outfile=fopen(fileout,"w");
+       imgbuf=cem_image(fileout);
+       if(imgbuf==NULL){outfile=fopen(fileout,"w");}
      
        for(k=1;k<=SYSIZE;k++){
        for(j=1;j<=SYSIZE;j++){
        for(i=1;i<=SYSIZE;i++){
-            fprintf(outfile,"%2d\n",mask[i][j][k]);
+            if(imgbuf!=NULL){*imgbuf++=mask[i][j][k];}
+            else{fprintf(outfile,"%2d\n",mask[i][j][k]);}
        }
        }
        }
+       if(imgbuf==NULL){fclose(outfile);}
 
 }
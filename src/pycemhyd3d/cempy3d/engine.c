@@ -0,0 +1,294 @@
+/************************************************************************/
+/*                                                                      */
+/*      engine.c - in-process entry point of the CEMHYD3D tools.        */
+/*                                                                      */
+/*      Each tool is compiled together with this file into a shared     */
+/*      library:                                                        */
+/*          gcc -DCEM_ENGINE -Dmain=cem_main -fPIC -shared              */
+/*              -fvisibility=hidden genpartnew.c engine.c               */
+/*              -o libgenpartnew.so -lm                                 */
+/*      cem_call() runs the tool in the calling process: it enters the  */
+/*      tool's directory, feeds its menu answers from memory, sends     */
+/*      file descriptors 1 and 2 (so also the output of commands the    */
+/*      tool runs with system()) to a log file and hands it caller-     */
+/*      owned images: every image file whose name is registered is      */
+/*      read from / written to an int array of SYSIZE^3 values (file    */
+/*      order) instead of disk. exit() calls of the tool return from    */
+/*      cem_call() with the status.                                     */
+/*                                                                      */
+/*      cem_worker_start() forks a worker process that serves requests  */
+/*      read from a pipe with the cem_call() entries of several tool    */
+/*      libraries, on images kept in a mapping shared with the caller.  */
+/*      One worker runs the stages of one pipeline run, each tool at    */
+/*      most once, so every tool starts from its globals as loaded (the */
+/*      calling process never runs the tools itself) and the images     */
+/*      never leave memory between stages. The caller's working         */
+/*      directory and file descriptors are never touched, and whatever  */
+/*      a tool leaves allocated or open goes away with the worker.      */
+/*                                                                      */
+/*      cem_write_image() writes an image in the tools' text format.    */
+/*                                                                      */
+/************************************************************************/
+#define _POSIX_C_SOURCE 200809L
+#define _DEFAULT_SOURCE
+#include <dirent.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <setjmp.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+
+#define CEM_MAX_IMAGES 8
+#define CEM_MAX_TOOLS 8
+#define CEM_PATH_MAX 4096
+#define CEM_NAME_MAX 256
+
+#define CEM_EXPORT __attribute__((visibility("default")))
+
+/* Request read by the worker (layout mirrored by engine.py) */
+struct cem_request{
+	int tool;			/* entry to run, -1 to stop the worker */
+	int nimages;
+	int slots[CEM_MAX_IMAGES];	/* image slot of each registered name */
+	size_t input_len;		/* length of the menu answers that follow */
+	char cwd[CEM_PATH_MAX];
+	char log_path[CEM_PATH_MAX];
+	char names[CEM_MAX_IMAGES][CEM_NAME_MAX];
+};
+
+typedef int (*cem_entry)(const char *,const char *,size_t,const char *,
+	int,const char **,int **);
+
+int cem_main();
+
+static const char *img_names[CEM_MAX_IMAGES];
+static int *img_data[CEM_MAX_IMAGES];
+static int n_images=0;
+static jmp_buf exit_env;
+static int exit_status=0;
+
+/* Return the buffer registered for file name, or NULL to use the file */
+int *cem_image(const char *name)
+{
+	int i;
+
+	for(i=0;i<n_images;i++){
+		if(strcmp(name,img_names[i])==0){
+			return(img_data[i]);
+		}
+	}
+	return(NULL);
+}
+
+/* Replacement of exit() inside the tools */
+void cem_exit(int status)
+{
+	exit_status=status;
+	longjmp(exit_env,1);
+}
+
+/* Run the tool once in this process, in directory cwd. Returns its */
+/* exit() status (0 when main returned), -1 when the input or log */
+/* could not be opened and -3 when cwd could not be entered. Meant for */
+/* a worker process: fds 1 and 2 stay on the log afterwards. */
+CEM_EXPORT
+int cem_call(const char *cwd,const char *input,size_t input_len,
+	const char *log_path,int nimages,const char **names,int **data)
+{
+	FILE *old_in,*in;
+	int i,fd;
+
+	if((nimages<0)||(nimages>CEM_MAX_IMAGES)||(input_len==0)){
+		return(-1);
+	}
+	if(chdir(cwd)!=0){
+		return(-3);
+	}
+	in=fmemopen((void *)input,input_len,"r");
+	if(in==NULL){
+		return(-1);
+	}
+	fd=open(log_path,O_WRONLY|O_CREAT|O_TRUNC,0666);
+	if(fd<0){
+		fclose(in);
+		return(-1);
+	}
+	fflush(NULL);
+	dup2(fd,1);
+	dup2(fd,2);
+	close(fd);
+	for(i=0;i<nimages;i++){
+		img_names[i]=names[i];
+		img_data[i]=data[i];
+	}
+	n_images=nimages;
+	exit_status=0;
+
+	old_in=stdin;
+	stdin=in;
+	if(setjmp(exit_env)==0){
+		cem_main();
+	}
+	fflush(NULL);
+	stdin=old_in;
+	fclose(in);
+	n_images=0;
+	return(exit_status);
+}
+
+/* Read exactly len bytes; 0 at end of file or on error */
+static int read_full(int fd,void *buf,size_t len)
+{
+	char *p=(char *)buf;
+	ssize_t got;
+
+	while(len>0){
+		got=read(fd,p,len);
+		if(got<0&&errno==EINTR){continue;}
+		if(got<=0){return(0);}
+		p+=got;
+		len-=(size_t)got;
+	}
+	return(1);
+}
+
+/* Close every inherited descriptor above 2 except keep1 and keep2, so */
+/* that the worker holds no end of another worker's pipes */
+static void close_inherited(int keep1,int keep2)
+{
+	DIR *dir;
+	struct dirent *ent;
+	int fd,dfd;
+	long maxfd;
+
+	dir=opendir("/proc/self/fd");
+	if(dir!=NULL){
+		dfd=dirfd(dir);
+		while((ent=readdir(dir))!=NULL){
+			fd=atoi(ent->d_name);
+			if((fd>2)&&(fd!=dfd)&&(fd!=keep1)&&(fd!=keep2)){
+				close(fd);
+			}
+		}
+		closedir(dir);
+		return;
+	}
+	maxfd=sysconf(_SC_OPEN_MAX);
+	if((maxfd<0)||(maxfd>65536)){maxfd=65536;}
+	for(fd=3;fd<maxfd;fd++){
+		if((fd!=keep1)&&(fd!=keep2)){
+			close(fd);
+		}
+	}
+}
+
+/* Worker loop: run the requests read from req_fd, answer each with */
+/* the status of cem_call() on resp_fd; stops at end of file or on a */
+/* request with tool -1 */
+static void serve(int req_fd,int resp_fd,cem_entry *entries,int nentries,
+	int *images,size_t image_len)
+{
+	struct cem_request req;
+	const char *names[CEM_MAX_IMAGES];
+	int *data[CEM_MAX_IMAGES];
+	char *input;
+	int i,status;
+
+	while(read_full(req_fd,&req,sizeof(req))){
+		if((req.tool<0)||(req.tool>=nentries)){
+			return;
+		}
+		input=(char *)malloc(req.input_len+1);
+		if((input==NULL)||!read_full(req_fd,input,req.input_len)){
+			return;
+		}
+		req.cwd[CEM_PATH_MAX-1]=req.log_path[CEM_PATH_MAX-1]='\0';
+		if((req.nimages<0)||(req.nimages>CEM_MAX_IMAGES)){
+			req.nimages=(-1);
+		}
+		for(i=0;i<req.nimages;i++){
+			req.names[i][CEM_NAME_MAX-1]='\0';
+			names[i]=req.names[i];
+			data[i]=images+(size_t)req.slots[i]*image_len;
+		}
+		status=entries[req.tool](req.cwd,input,req.input_len,
+			req.log_path,req.nimages,names,data);
+		free(input);
+		if(write(resp_fd,&status,sizeof(status))!=sizeof(status)){
+			return;
+		}
+	}
+}
+
+/* Fork a worker serving the nentries cem_call() entries (function */
+/* addresses of this or other tool libraries loaded in the caller) on */
+/* the image slots of image_len ints at images, which must be a shared */
+/* mapping. Stores the request and response descriptors and the pid; */
+/* returns 0, or -2 when the worker could not be started. */
+CEM_EXPORT
+int cem_worker_start(void **entries,int nentries,int *images,
+	size_t image_len,int *req_fd,int *resp_fd,int *pid)
+{
+	int req[2],resp[2];
+	pid_t child;
+
+	if((nentries<1)||(nentries>CEM_MAX_TOOLS)){
+		return(-2);
+	}
+	if(pipe(req)!=0){
+		return(-2);
+	}
+	if(pipe(resp)!=0){
+		close(req[0]);
+		close(req[1]);
+		return(-2);
+	}
+	fflush(NULL);
+	child=fork();
+	if(child<0){
+		close(req[0]);
+		close(req[1]);
+		close(resp[0]);
+		close(resp[1]);
+		return(-2);
+	}
+	if(child==0){
+		close_inherited(req[0],resp[1]);
+		serve(req[0],resp[1],(cem_entry *)entries,nentries,images,image_len);
+		_exit(0);
+	}
+	close(req[0]);
+	close(resp[1]);
+	fcntl(req[1],F_SETFD,FD_CLOEXEC);
+	fcntl(resp[0],F_SETFD,FD_CLOEXEC);
+	*req_fd=req[1];
+	*resp_fd=resp[0];
+	*pid=(int)child;
+	return(0);
+}
+
+/* Write n values of data to path, one per line with a minimum field */
+/* width (0: %d as genpartnew and disrealnew, 2: %2d as distrib3d). */
+/* Returns 0, or -1 when the file could not be written. */
+CEM_EXPORT
+int cem_write_image(const char *path,const int *data,size_t n,int width)
+{
+	FILE *out;
+	size_t i;
+	int bad;
+
+	out=fopen(path,"w");
+	if(out==NULL){
+		return(-1);
+	}
+	for(i=0;i<n;i++){
+		fprintf(out,"%*d\n",width,data[i]);
+	}
+	bad=ferror(out);
+	if(fclose(out)!=0){bad=1;}
+	return(bad?(-1):0);
+}
@@ -0,0 +1,190 @@
+/************************************************************************/
+/*                                                                      */
+/*      fft3d.c - periodic 3-D FFT correlation for distrib3d.           */
+/*                                                                      */
+/*      Included by distrib3d.c. corr3d() computes, for every pixel     */
+/*      x of a SYSIZE^3 periodic field n,                               */
+/*                                                                      */
+/*              res[x] = sum over d of n[x+d]*f[d]                      */
+/*                                                                      */
+/*      for a filter f given on offsets 0..nf-1 along each axis, as     */
+/*      rand3d's real-space loop does. Both real fields are packed      */
+/*      into one complex array (n + i f), transformed once, combined    */
+/*      as N(k)*conj(F(k)) and transformed back, so a single SYSIZE^3   */
+/*      complex buffer is needed.                                       */
+/*                                                                      */
+/*      The 1-D transforms are a recursive mixed-radix Cooley-Tukey     */
+/*      FFT for any length (radix 2 butterflies, direct DFT for the     */
+/*      other prime factors); no external library is needed.           */
+/*                                                                      */
+/************************************************************************/
+
+#define PI_D 3.14159265358979323846
+
+typedef struct{
+	double re,im;
+} fftcplx;
+
+/* smallest prime factor of n */
+static int fft_factor(n)
+	int n;
+{
+	int p;
+
+	if(n%2==0){return(2);}
+	for(p=3;p*p<=n;p+=2){
+		if(n%p==0){return(p);}
+	}
+	return(n);
+}
+
+/* out[0..n-1] = DFT of in[0],in[stride],...; tw holds the roots of */
+/* unity of the full length, twstep converts them to length n */
+static void fft_rec(out,in,n,stride,tw,twstep,scratch)
+	fftcplx *out,*tw,*scratch;
+	const fftcplx *in;
+	int n,stride,twstep;
+{
+	int p,m,q,k,s,e;
+	double re,im;
+	fftcplx w,x;
+
+	if(n==1){
+		out[0]=in[0];
+		return;
+	}
+	p=fft_factor(n);
+	m=n/p;
+	for(q=0;q<p;q++){
+		fft_rec(out+q*m,in+q*stride,m,stride*p,tw,twstep*p,scratch);
+	}
+	if(p==2){
+		for(k=0;k<m;k++){
+			w=tw[k*twstep];
+			x=out[m+k];
+			re=x.re*w.re-x.im*w.im;
+			im=x.re*w.im+x.im*w.re;
+			out[m+k].re=out[k].re-re;
+			out[m+k].im=out[k].im-im;
+			out[k].re+=re;
+			out[k].im+=im;
+		}
+		return;
+	}
+	for(k=0;k<m;k++){
+		for(s=0;s<p;s++){
+			re=im=0.0;
+			for(q=0;q<p;q++){
+				e=(q*(k+s*m))%n;
+				w=tw[e*twstep];
+				x=out[q*m+k];
+				re+=x.re*w.re-x.im*w.im;
+				im+=x.re*w.im+x.im*w.re;
+			}
+			scratch[s].re=re;
+			scratch[s].im=im;
+		}
+		for(s=0;s<p;s++){
+			out[k+s*m]=scratch[s];
+		}
+	}
+}
+
+/* In-place 3-D FFT of the n^3 array a (index (i*n+j)*n+k); sign<0 */
+/* is the forward transform, sign>0 the unscaled inverse */
+static void fft3d(a,n,sign)
+	fftcplx *a;
+	int n,sign;
+{
+	int axis,i,j,l;
+	long int base,step;
+	fftcplx *tw,*line,*spec,*scratch;
+
+	tw=(fftcplx *)malloc(n*sizeof(fftcplx));
+	line=(fftcplx *)malloc(n*sizeof(fftcplx));
+	spec=(fftcplx *)malloc(n*sizeof(fftcplx));
+	scratch=(fftcplx *)malloc(n*sizeof(fftcplx));
+	if((tw==NULL)||(line==NULL)||(spec==NULL)||(scratch==NULL)){
+		printf("Could not allocate FFT work arrays \n");
+		exit(1);
+	}
+	for(l=0;l<n;l++){
+		tw[l].re=cos(2.0*PI_D*(double)l/(double)n);
+		tw[l].im=(sign<0?-1.0:1.0)*sin(2.0*PI_D*(double)l/(double)n);
+	}
+	for(axis=0;axis<3;axis++){
+		step=(axis==0)?(long)n*n:((axis==1)?n:1);
+		for(i=0;i<n;i++){
+		for(j=0;j<n;j++){
+			/* first element of the line along axis */
+			if(axis==0){base=(long)i*n+j;}
+			else if(axis==1){base=(long)i*n*n+j;}
+			else{base=((long)i*n+j)*n;}
+			for(l=0;l<n;l++){line[l]=a[base+l*step];}
+			fft_rec(spec,line,n,1,tw,1,scratch);
+			for(l=0;l<n;l++){a[base+l*step]=spec[l];}
+		}
+		}
+	}
+	free(tw);
+	free(line);
+	free(spec);
+	free(scratch);
+}
+
+/* res = periodic correlation of the n^3 field noise with the nf^3 */
+/* filter filt (filt[(a*nf+b)*nf+c] is the weight of offset (a,b,c)) */
+static void corr3d(noise,filt,nf,res,n)
+	const float *noise,*filt;
+	float *res;
+	int nf,n;
+{
+	long int ntot,idx,midx,l;
+	int i,j,k,a,b,c;
+	double nre,nim,fre,fim,pre,pim,scale;
+	fftcplx *z;
+
+	ntot=(long)n*n*n;
+	z=(fftcplx *)calloc(ntot,sizeof(fftcplx));
+	if(z==NULL){
+		printf("Could not allocate FFT buffer for %ld pixels \n",ntot);
+		exit(1);
+	}
+	for(l=0;l<ntot;l++){z[l].re=noise[l];}
+	/* filter in the imaginary part, offsets wrapped periodically */
+	for(a=0;a<nf;a++){
+	for(b=0;b<nf;b++){
+	for(c=0;c<nf;c++){
+		idx=((long)(a%n)*n+(b%n))*n+(c%n);
+		z[idx].im+=filt[(a*nf+b)*nf+c];
+	}
+	}
+	}
+	fft3d(z,n,-1);
+
+	/* split Z into N and F via Z(-k), then P=N*conj(F) (Hermitian) */
+	for(i=0;i<n;i++){
+	for(j=0;j<n;j++){
+	for(k=0;k<n;k++){
+		idx=((long)i*n+j)*n+k;
+		midx=((long)((n-i)%n)*n+((n-j)%n))*n+((n-k)%n);
+		if(midx<idx){continue;}
+		nre=0.5*(z[idx].re+z[midx].re);
+		nim=0.5*(z[idx].im-z[midx].im);
+		fre=0.5*(z[idx].im+z[midx].im);
+		fim=-0.5*(z[idx].re-z[midx].re);
+		pre=nre*fre+nim*fim;
+		pim=nim*fre-nre*fim;
+		z[idx].re=pre;
+		z[idx].im=pim;
+		z[midx].re=pre;
+		z[midx].im=-pim;
+	}
+	}
+	}
+	fft3d(z,n,1);
+
+	scale=1.0/(double)ntot;
+	for(l=0;l<ntot;l++){res[l]=(float)(z[l].re*scale);}
+	free(z);
+}
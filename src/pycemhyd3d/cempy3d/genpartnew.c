@@ -41,7 +41,7 @@
 #include "common.h"
 
 
-#define SYSSIZE 100     /* system size in pixels per dimension */
+#define SYSSIZE SYSIZE  /* system size in pixels per dimension (common.h) */
 #define MAXTRIES 150000 /* maximum number of random tries for sphere placement */
 
 /* phase identifiers */
@@ -915,32 +915,37 @@ void outmic()
         FILE *outfile,*partfile;
         char filen[80],filepart[80];
         int ix,iy,iz,valout;
+        int *imgbuf,*partbuf;   /* in-memory images (engine build only) */
 
         printf("Enter name of file to save microstructure to \n");
         scanf("%s",filen);
         printf("%s\n",filen);
 
-        outfile=fopen(filen,"w");
+        imgbuf=cem_image(filen);
+        if(imgbuf==NULL){outfile=fopen(filen,"w");}
 
         printf("Enter name of file to save particle IDs to \n");
         scanf("%s",filepart);
         printf("%s\n",filepart);
 
-        partfile=fopen(filepart,"w");
+        partbuf=cem_image(filepart);
+        if(partbuf==NULL){partfile=fopen(filepart,"w");}
 
         for(iz=1;iz<=SYSSIZE;iz++){
         for(iy=1;iy<=SYSSIZE;iy++){
         for(ix=1;ix<=SYSSIZE;ix++){
                 valout=cemreal[ix][iy][iz];
-                fprintf(outfile,"%1d\n",valout);
+                if(imgbuf!=NULL){*imgbuf++=valout;}
+                else{fprintf(outfile,"%1d\n",valout);}
                 valout=cement[ix][iy][iz];
                 if(valout<0){valout=0;}
-                fprintf(partfile,"%d\n",valout);
+                if(partbuf!=NULL){*partbuf++=valout;}
+                else{fprintf(partfile,"%d\n",valout);}
         }
         }
         }
-        fclose(outfile);
-        fclose(partfile);
+        if(imgbuf==NULL){fclose(outfile);}
+        if(partbuf==NULL){fclose(partfile);}
 }
 
 int main(){
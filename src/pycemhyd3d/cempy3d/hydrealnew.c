@@ -168,7 +168,7 @@ void extcsh()
                         /* be sure that at least one neighboring pixel */
                         /* is C2S, C3S, or diffusing CSH */
                         if((numnear<26)||(tries>5000)){
-                                mic[xchr][ychr][zchr]=CSH;
+                                SETMIC(xchr,ychr,zchr,CSH);
 				count[CSH]+=1;
 				count[POROSITY]-=1;
 				cshage[xchr][ychr][zchr]=cyccnt;
@@ -234,7 +234,7 @@ int movecsh(xcur,ycur,zcur,finalstep,cycorig)
   		prtest=molarvcsh[cyccnt]/molarvcsh[cycorig];
                 prcsh1=ran1(seed);
 		if(prcsh1<=prtest){
-                   mic[xcur][ycur][zcur]=CSH;
+                   SETMIC(xcur,ycur,zcur,CSH);
 		   if(cshgeom==1){
 			   faces[xcur][ycur][zcur]=faces[xnew][ynew][znew];
 		           ncshplategrow+=1;
@@ -243,7 +243,7 @@ int movecsh(xcur,ycur,zcur,finalstep,cycorig)
                    count[CSH]+=1;
 		}
       		else{
-			mic[xcur][ycur][zcur]=POROSITY;
+			SETMIC(xcur,ycur,zcur,POROSITY);
 			count[POROSITY]+=1;
 		}
       /* May need extra solid CSH if temperature goes down with time */
@@ -267,7 +267,7 @@ int movecsh(xcur,ycur,zcur,finalstep,cycorig)
   		prtest=molarvcsh[cyccnt]/molarvcsh[cycorig];
                 prcsh1=ran1(seed);
 		if(prcsh1<=prtest){
-                   mic[xcur][ycur][zcur]=CSH;
+                   SETMIC(xcur,ycur,zcur,CSH);
          	   cshage[xcur][ycur][zcur]=cyccnt;
 		   if(cshgeom==1){
 		           msface=(int)(2.*ran1(seed)+1.);
@@ -283,7 +283,7 @@ int movecsh(xcur,ycur,zcur,finalstep,cycorig)
                    count[CSH]+=1;
 		}
       		else{
-			mic[xcur][ycur][zcur]=POROSITY;
+			SETMIC(xcur,ycur,zcur,POROSITY);
 			count[POROSITY]+=1;
 		}
       /* May need extra solid CSH if temperature goes down with time */
@@ -299,8 +299,8 @@ int movecsh(xcur,ycur,zcur,finalstep,cycorig)
         if(action!=0){
         /* if diffusion step is possible, perform it */
                 if(check==POROSITY){
-                        mic[xcur][ycur][zcur]=POROSITY;
-                       	mic[xnew][ynew][znew]=DIFFCSH;
+                        SETMIC(xcur,ycur,zcur,POROSITY);
+                       	SETMIC(xnew,ynew,znew,DIFFCSH);
               	 }
                 else{
                         /* indicate that diffusing CSH species remained */
@@ -341,7 +341,7 @@ void extfh3(xpres,ypres,zpres)
                	/* if neighbor is porosity   */
                 /* then locate the FH3 there */
                 if(check==POROSITY){
-                        mic[xchr][ychr][zchr]=FH3;
+                        SETMIC(xchr,ychr,zchr,FH3);
 			count[FH3]+=1;
 			count[POROSITY]-=1;
                        	fchr=1;
@@ -370,7 +370,7 @@ void extfh3(xpres,ypres,zpres)
                         /* be sure that at least one neighboring pixel */
                         /* is FH3 or diffusing FH3 */
                         if((numnear<26)||(tries>5000)){
-                                mic[xchr][ychr][zchr]=FH3;
+                                SETMIC(xchr,ychr,zchr,FH3);
 				count[FH3]+=1;
 				count[POROSITY]-=1;
                                	fchr=1;
@@ -441,11 +441,11 @@ int extettr(xpres,ypres,zpres,etype)
                         if(numsil<1){
                         if(pneigh>=ptest){
 				if(etype==0){
-	                                mic[xchr][ychr][zchr]=ETTR;
+	                                SETMIC(xchr,ychr,zchr,ETTR);
 					count[ETTR]+=1;
 				}
 				else{
-	                                mic[xchr][ychr][zchr]=ETTRC4AF;
+	                                SETMIC(xchr,ychr,zchr,ETTRC4AF);
 					count[ETTRC4AF]+=1;
 				}
                                 fchr=1;
@@ -485,11 +485,11 @@ int extettr(xpres,ypres,zpres,etype)
                         /* is ettringite, or aluminate clinker */
                         if((tries>5000)||((numnear<26)&&(numsil<1))){
 				if(etype==0){
-	                                mic[xchr][ychr][zchr]=ETTR;
+	                                SETMIC(xchr,ychr,zchr,ETTR);
 												count[ETTR]+=1;
 				}
 				else{
-	                                mic[xchr][ychr][zchr]=ETTRC4AF;
+	                                SETMIC(xchr,ychr,zchr,ETTRC4AF);
 												count[ETTRC4AF]+=1;
 				}
 											count[POROSITY]-=1;
@@ -530,7 +530,7 @@ void extch()
                         /* be sure that at least one neighboring pixel */
                         /* is CH or diffusing CH */
                         if((numnear<26)||(tries>5000)){
-                                mic[xchr][ychr][zchr]=CH;
+                                SETMIC(xchr,ychr,zchr,CH);
 				count[CH]+=1;
 				count[POROSITY]-=1;
                                	fchr=1;
@@ -568,7 +568,7 @@ void extgyps(xpres,ypres,zpres)
                	/* if neighbor is porosity   */
                 /* then locate the GYPSUMS there */
                 if(check==POROSITY){
-                        mic[xchr][ychr][zchr]=GYPSUMS;
+                        SETMIC(xchr,ychr,zchr,GYPSUMS);
 			count[GYPSUMS]+=1;
 			count[POROSITY]-=1;
                        	fchr=1;
@@ -597,7 +597,7 @@ void extgyps(xpres,ypres,zpres)
                         /* be sure that at least one neighboring pixel */
                         /* is Gypsum in some form */
                         if((numnear<26)||(tries>5000)){
-                                mic[xchr][ychr][zchr]=GYPSUMS;
+                                SETMIC(xchr,ychr,zchr,GYPSUMS);
 				count[GYPSUMS]+=1;
 				count[POROSITY]-=1;
                                	fchr=1;
@@ -626,7 +626,7 @@ int moveanh(xcur,ycur,zcur,finalstep,nucprgyp)
 	p2diff=ran1(seed);
         if((nucprgyp>=pgen)||(finalstep==1)){
                 action=0;
-                mic[xcur][ycur][zcur]=GYPSUMS;
+                SETMIC(xcur,ycur,zcur,GYPSUMS);
                 count[DIFFANH]-=1;
 		count[GYPSUMS]+=1;
                	pexp=ran1(seed);
@@ -648,7 +648,7 @@ int moveanh(xcur,ycur,zcur,finalstep,nucprgyp)
 /* if new location is solid GYPSUM(S) or diffusing GYPSUM, then convert */
 /* diffusing ANHYDRITE species to solid GYPSUM */
        	if((check==GYPSUM)||(check==GYPSUMS)||(check==DIFFGYP)){
-	                mic[xcur][ycur][zcur]=GYPSUMS;
+	                SETMIC(xcur,ycur,zcur,GYPSUMS);
         	        /* decrement count of diffusing ANHYDRITE species */
                		/* and increment count of solid GYPSUMS */
 	                count[DIFFANH]-=1;
@@ -665,10 +665,10 @@ int moveanh(xcur,ycur,zcur,finalstep,nucprgyp)
         else if(((check==C3A)&&(p2diff<SOLIDC3AGYP))||((check==DIFFC3A)&&(p2diff<C3AGYP))||((check==DIFFC4A)&&(p2diff<C3AGYP))){
         /* Convert diffusing gypsum to an ettringite pixel */
 		ettrtype=0;
-                mic[xcur][ycur][zcur]=ETTR;
+                SETMIC(xcur,ycur,zcur,ETTR);
 		if(check==DIFFC4A){
 			ettrtype=1;
-                	mic[xcur][ycur][zcur]=ETTRC4AF;
+                	SETMIC(xcur,ycur,zcur,ETTRC4AF);
 		}
                 action=0;
                 count[DIFFANH]-=1;
@@ -681,11 +681,11 @@ int moveanh(xcur,ycur,zcur,finalstep,nucprgyp)
                 nexp=3;
                 if(pexp<=0.569){
 			if(ettrtype==0){
-       		                mic[xnew][ynew][znew]=ETTR;
+       		                SETMIC(xnew,ynew,znew,ETTR);
 				count[ETTR]+=1;
 			}
 			else{
-       		                mic[xnew][ynew][znew]=ETTRC4AF;
+       		                SETMIC(xnew,ynew,znew,ETTRC4AF);
 				count[ETTRC4AF]+=1;
 			}
                         nexp=2;
@@ -694,17 +694,17 @@ int moveanh(xcur,ycur,zcur,finalstep,nucprgyp)
                         /* maybe someday, use a new FIXEDC3A here */
                         /* so it won't dissolve later */
                         if(check==C3A){
-                                mic[xnew][ynew][znew]=C3A;
+                                SETMIC(xnew,ynew,znew,C3A);
 				count[C3A]+=1;
                         }
                         else{
 				if(ettrtype==0){
 	                                count[DIFFC3A]+=1;
-       		                        mic[xnew][ynew][znew]=DIFFC3A;
+       		                        SETMIC(xnew,ynew,znew,DIFFC3A);
 				}
 				else{
 	                                count[DIFFC4A]+=1;
-       		                        mic[xnew][ynew][znew]=DIFFC4A;
+       		                        SETMIC(xnew,ynew,znew,DIFFC4A);
 				}
                         }
                         nexp=3;
@@ -759,7 +759,7 @@ int moveanh(xcur,ycur,zcur,finalstep,nucprgyp)
         /* if new location is C4AF execute conversion */
         /* to ettringite (including necessary volumetric expansion) */
         if((check==C4AF)&&(p2diff<SOLIDC4AFGYP)){
-                mic[xcur][ycur][zcur]=ETTRC4AF;
+                SETMIC(xcur,ycur,zcur,ETTRC4AF);
 		count[ETTRC4AF]+=1;
                 count[DIFFANH]-=1;
 
@@ -769,7 +769,7 @@ int moveanh(xcur,ycur,zcur,finalstep,nucprgyp)
                 pexp=ran1(seed);
                 nexp=3;
                 if(pexp<=0.8174){
-                        mic[xnew][ynew][znew]=ETTRC4AF;
+                        SETMIC(xnew,ynew,znew,ETTRC4AF);
 			count[ETTRC4AF]+=1;
 			count[C4AF]-=1;
                         nexp=2;
@@ -788,7 +788,7 @@ int moveanh(xcur,ycur,zcur,finalstep,nucprgyp)
                 else{
                         /* maybe someday, use a new FIXEDC4AF here */
                         /* so it won't dissolve later */
-                        mic[xnew][ynew][znew]=C4AF;
+                        SETMIC(xnew,ynew,znew,C4AF);
                         nexp=3;
                 }
 
@@ -843,8 +843,8 @@ int moveanh(xcur,ycur,zcur,finalstep,nucprgyp)
         if(action!=0){
         /* if diffusion step is possible, perform it */
                 if(check==POROSITY){
-                        mic[xcur][ycur][zcur]=POROSITY;
-                       	mic[xnew][ynew][znew]=DIFFANH;
+                        SETMIC(xcur,ycur,zcur,POROSITY);
+                       	SETMIC(xnew,ynew,znew,DIFFANH);
                	}
                 else{
                         /* indicate that diffusing ANHYDRITE species remained */
@@ -875,7 +875,7 @@ int movehem(xcur,ycur,zcur,finalstep,nucprgyp)
 	p2diff=ran1(seed);
         if((nucprgyp>=pgen)||(finalstep==1)){
                 action=0;
-                mic[xcur][ycur][zcur]=GYPSUMS;
+                SETMIC(xcur,ycur,zcur,GYPSUMS);
                 count[DIFFHEM]-=1;
 		count[GYPSUMS]+=1;
 		/* Add extra gypsum as necessary */
@@ -898,7 +898,7 @@ int movehem(xcur,ycur,zcur,finalstep,nucprgyp)
 /* if new location is solid GYPSUM(S) or diffusing GYPSUM, then convert */
 /* diffusing HEMIHYDRATE species to solid GYPSUM */
         	if((check==GYPSUM)||(check==GYPSUMS)||(check==DIFFGYP)){
-	                mic[xcur][ycur][zcur]=GYPSUMS;
+	                SETMIC(xcur,ycur,zcur,GYPSUMS);
        		        /* decrement count of diffusing HEMIHYDRATE species */
 	                /* and increment count of solid GYPSUMS */
 	                count[DIFFHEM]-=1;
@@ -915,10 +915,10 @@ int movehem(xcur,ycur,zcur,finalstep,nucprgyp)
         else if(((check==C3A)&&(p2diff<SOLIDC3AGYP))||((check==DIFFC3A)&&(p2diff<C3AGYP))||((check==DIFFC4A)&&(p2diff<C3AGYP))){
         /* Convert diffusing gypsum to an ettringite pixel */
 		ettrtype=0;
-                mic[xcur][ycur][zcur]=ETTR;
+                SETMIC(xcur,ycur,zcur,ETTR);
 		if(check==DIFFC4A){
 			ettrtype=1;
-                	mic[xcur][ycur][zcur]=ETTRC4AF;
+                	SETMIC(xcur,ycur,zcur,ETTRC4AF);
 		}
                 action=0;
                 count[DIFFHEM]-=1;
@@ -931,11 +931,11 @@ int movehem(xcur,ycur,zcur,finalstep,nucprgyp)
                 nexp=3;
                 if(pexp<=0.5583){
 			if(ettrtype==0){
-       		                mic[xnew][ynew][znew]=ETTR;
+       		                SETMIC(xnew,ynew,znew,ETTR);
 				count[ETTR]+=1;
 			}
 			else{
-       		                mic[xnew][ynew][znew]=ETTRC4AF;
+       		                SETMIC(xnew,ynew,znew,ETTRC4AF);
 				count[ETTRC4AF]+=1;
 			}
                         nexp=2;
@@ -944,17 +944,17 @@ int movehem(xcur,ycur,zcur,finalstep,nucprgyp)
                         /* maybe someday, use a new FIXEDC3A here */
                         /* so it won't dissolve later */
                         if(check==C3A){
-                                mic[xnew][ynew][znew]=C3A;
+                                SETMIC(xnew,ynew,znew,C3A);
 				count[C3A]+=1;
                         }
                         else{
 				if(ettrtype==0){
 	                                count[DIFFC3A]+=1;
-       		                        mic[xnew][ynew][znew]=DIFFC3A;
+       		                        SETMIC(xnew,ynew,znew,DIFFC3A);
 				}
 				else{
 	                                count[DIFFC4A]+=1;
-       		                        mic[xnew][ynew][znew]=DIFFC4A;
+       		                        SETMIC(xnew,ynew,znew,DIFFC4A);
 				}
                         }
                         nexp=3;
@@ -1009,7 +1009,7 @@ int movehem(xcur,ycur,zcur,finalstep,nucprgyp)
         /* if new location is C4AF execute conversion */
         /* to ettringite (including necessary volumetric expansion) */
         if((check==C4AF)&&(p2diff<SOLIDC4AFGYP)){
-                mic[xcur][ycur][zcur]=ETTRC4AF;
+                SETMIC(xcur,ycur,zcur,ETTRC4AF);
 		count[ETTRC4AF]+=1;
                 count[DIFFHEM]-=1;
 
@@ -1019,7 +1019,7 @@ int movehem(xcur,ycur,zcur,finalstep,nucprgyp)
                 pexp=ran1(seed);
                 nexp=3;
                 if(pexp<=0.802){
-                        mic[xnew][ynew][znew]=ETTRC4AF;
+                        SETMIC(xnew,ynew,znew,ETTRC4AF);
 			count[ETTRC4AF]+=1;
 			count[C4AF]-=1;
                         nexp=2;
@@ -1038,7 +1038,7 @@ int movehem(xcur,ycur,zcur,finalstep,nucprgyp)
                 else{
                         /* maybe someday, use a new FIXEDC4AF here */
                         /* so it won't dissolve later */
-                        mic[xnew][ynew][znew]=C4AF;
+                        SETMIC(xnew,ynew,znew,C4AF);
                         nexp=3;
                 }
 
@@ -1093,8 +1093,8 @@ int movehem(xcur,ycur,zcur,finalstep,nucprgyp)
         if(action!=0){
         /* if diffusion step is possible, perform it */
                 if(check==POROSITY){
-                        mic[xcur][ycur][zcur]=POROSITY;
-                       	mic[xnew][ynew][znew]=DIFFHEM;
+                        SETMIC(xcur,ycur,zcur,POROSITY);
+                       	SETMIC(xnew,ynew,znew,DIFFHEM);
                	}
                 else{
                         /* indicate that diffusing HEMIHYDRATE species */
@@ -1135,7 +1135,7 @@ int extfreidel(xpres,ypres,zpres)
                	/* if neighbor is porosity   */
                 /* then locate the freidel's salt there */
                 if(check==POROSITY){
-                        mic[xchr][ychr][zchr]=FREIDEL;
+                        SETMIC(xchr,ychr,zchr,FREIDEL);
 			count[FREIDEL]+=1;
 			count[POROSITY]-=1;
                        	fchr=1;
@@ -1165,7 +1165,7 @@ int extfreidel(xpres,ypres,zpres)
                         /* be sure that at least one neighboring pixel */
                         /* is FREIDEL or diffusing CACL2 */
                         if((numnear<26)||(tries>5000)){
-                                mic[xchr][ychr][zchr]=FREIDEL;
+                                SETMIC(xchr,ychr,zchr,FREIDEL);
 				count[FREIDEL]+=1;
 				count[POROSITY]-=1;
                                	fchr=1;
@@ -1206,7 +1206,7 @@ int extstrat(xpres,ypres,zpres)
                	/* if neighbor is porosity   */
                 /* then locate the stratlingite there */
                 if(check==POROSITY){
-                        mic[xchr][ychr][zchr]=STRAT;
+                        SETMIC(xchr,ychr,zchr,STRAT);
 			count[STRAT]+=1;
 			count[POROSITY]-=1;
                        	fchr=1;
@@ -1236,7 +1236,7 @@ int extstrat(xpres,ypres,zpres)
                         /* be sure that at least one neighboring pixel */
                         /* is STRAT, diffusing CAS2, or diffusing AS */
                         if((numnear<26)||(tries>5000)){
-                                mic[xchr][ychr][zchr]=STRAT;
+                                SETMIC(xchr,ychr,zchr,STRAT);
 				count[STRAT]+=1;
 				count[POROSITY]-=1;
                                	fchr=1;
@@ -1283,7 +1283,7 @@ int movegyp(xcur,ycur,zcur,finalstep)
                         /* update counts for absorbed and diffusing gypsum */
                         count[ABSGYP]+=1;
                         count[DIFFGYP]-=1;
-                        mic[xcur][ycur][zcur]=ABSGYP;
+                        SETMIC(xcur,ycur,zcur,ABSGYP);
                         action=0;
                 }
         }
@@ -1295,10 +1295,10 @@ int movegyp(xcur,ycur,zcur,finalstep)
         else if(((check==C3A)&&(p2diff<SOLIDC3AGYP))||((check==DIFFC3A)&&(p2diff<C3AGYP))||((check==DIFFC4A)&&(p2diff<C3AGYP))){
         /* Convert diffusing gypsum to an ettringite pixel */
 		ettrtype=0;
-                mic[xcur][ycur][zcur]=ETTR;
+                SETMIC(xcur,ycur,zcur,ETTR);
 		if(check==DIFFC4A){
 			ettrtype=1;
-                	mic[xcur][ycur][zcur]=ETTRC4AF;
+                	SETMIC(xcur,ycur,zcur,ETTRC4AF);
 		}
                 action=0;
                 count[DIFFGYP]-=1;
@@ -1311,11 +1311,11 @@ int movegyp(xcur,ycur,zcur,finalstep)
                 nexp=2;
                 if(pexp<=0.40){
 			if(ettrtype==0){
-       		                mic[xnew][ynew][znew]=ETTR;
+       		                SETMIC(xnew,ynew,znew,ETTR);
 				count[ETTR]+=1;
 			}
 			else{
-       		                mic[xnew][ynew][znew]=ETTRC4AF;
+       		                SETMIC(xnew,ynew,znew,ETTRC4AF);
 				count[ETTRC4AF]+=1;
 			}
                         nexp=1;
@@ -1324,17 +1324,17 @@ int movegyp(xcur,ycur,zcur,finalstep)
                         /* maybe someday, use a new FIXEDC3A here */
                         /* so it won't dissolve later */
                         if(check==C3A){
-                                mic[xnew][ynew][znew]=C3A;
+                                SETMIC(xnew,ynew,znew,C3A);
 				count[C3A]+=1;
                         }
                         else{
 				if(ettrtype==0){
 	                                count[DIFFC3A]+=1;
-       		                        mic[xnew][ynew][znew]=DIFFC3A;
+       		                        SETMIC(xnew,ynew,znew,DIFFC3A);
 				}
 				else{
 	                                count[DIFFC4A]+=1;
-       		                        mic[xnew][ynew][znew]=DIFFC4A;
+       		                        SETMIC(xnew,ynew,znew,DIFFC4A);
 				}
                         }
                         nexp=2;
@@ -1389,7 +1389,7 @@ int movegyp(xcur,ycur,zcur,finalstep)
         /* if new location is C4AF execute conversion */
         /* to ettringite (including necessary volumetric expansion) */
         if((check==C4AF)&&(p2diff<SOLIDC4AFGYP)){
-                mic[xcur][ycur][zcur]=ETTRC4AF;
+                SETMIC(xcur,ycur,zcur,ETTRC4AF);
 		count[ETTRC4AF]+=1;
                 count[DIFFGYP]-=1;
 
@@ -1399,7 +1399,7 @@ int movegyp(xcur,ycur,zcur,finalstep)
                 pexp=ran1(seed);
                 nexp=2;
                 if(pexp<=0.575){
-                        mic[xnew][ynew][znew]=ETTRC4AF;
+                        SETMIC(xnew,ynew,znew,ETTRC4AF);
 			count[ETTRC4AF]+=1;
 			count[C4AF]-=1;
                         nexp=1;
@@ -1418,7 +1418,7 @@ int movegyp(xcur,ycur,zcur,finalstep)
                 else{
                         /* maybe someday, use a new FIXEDC4AF here */
                         /* so it won't dissolve later */
-                        mic[xnew][ynew][znew]=C4AF;
+                        SETMIC(xnew,ynew,znew,C4AF);
                         nexp=2;
                 }
 
@@ -1475,14 +1475,14 @@ int movegyp(xcur,ycur,zcur,finalstep)
                 action=0;
                 count[DIFFGYP]-=1;
 		count[GYPSUM]+=1;
-                mic[xcur][ycur][zcur]=GYPSUM;
+                SETMIC(xcur,ycur,zcur,GYPSUM);
         }
 
         if(action!=0){
                 /* if diffusion is possible, execute it */
                 if(check==POROSITY){
-                        mic[xcur][ycur][zcur]=POROSITY;
-                        mic[xnew][ynew][znew]=DIFFGYP;
+                        SETMIC(xcur,ycur,zcur,POROSITY);
+                        SETMIC(xnew,ynew,znew,DIFFGYP);
                 }
                 else{
                         /* indicate that diffusing gypsum remained at */
@@ -1529,7 +1529,7 @@ int movecacl2(xcur,ycur,zcur,finalstep)
         if((check==C3A)||(check==DIFFC3A)||(check==DIFFC4A)){
         /* Convert diffusing C3A or C3A to a freidel's salt pixel */
                 action=0;
-                mic[xnew][ynew][znew]=FREIDEL;
+                SETMIC(xnew,ynew,znew,FREIDEL);
 		count[FREIDEL]+=1;
                 count[check]-=1;
 
@@ -1539,7 +1539,7 @@ int movecacl2(xcur,ycur,zcur,finalstep)
                 pexp=ran1(seed);
                 nexp=2;
                 if(pexp<=0.5793){
-                        mic[xcur][ycur][zcur]=FREIDEL;
+                        SETMIC(xcur,ycur,zcur,FREIDEL);
 			count[FREIDEL]+=1;
 			count[DIFFCACL2]-=1;
                         nexp=1;
@@ -1597,7 +1597,7 @@ int movecacl2(xcur,ycur,zcur,finalstep)
         /* if new location is C4AF execute conversion */
         /* to freidel's salt (including necessary volumetric expansion) */
         else if(check==C4AF){
-                mic[xnew][ynew][znew]=FREIDEL;
+                SETMIC(xnew,ynew,znew,FREIDEL);
 		count[FREIDEL]+=1;
                 count[C4AF]-=1;
 
@@ -1609,7 +1609,7 @@ int movecacl2(xcur,ycur,zcur,finalstep)
                 pexp=ran1(seed);
                 nexp=1;
                 if(pexp<=0.4033){
-                        mic[xcur][ycur][zcur]=FREIDEL;
+                        SETMIC(xcur,ycur,zcur,FREIDEL);
 			count[FREIDEL]+=1;
 			count[DIFFCACL2]-=1;
                         nexp=0;
@@ -1683,14 +1683,14 @@ int movecacl2(xcur,ycur,zcur,finalstep)
                 action=0;
                 count[DIFFCACL2]-=1;
 		count[CACL2]+=1;
-                mic[xcur][ycur][zcur]=CACL2;
+                SETMIC(xcur,ycur,zcur,CACL2);
         }
 
         if(action!=0){
                 /* if diffusion is possible, execute it */
                 if(check==POROSITY){
-                        mic[xcur][ycur][zcur]=POROSITY;
-                        mic[xnew][ynew][znew]=DIFFCACL2;
+                        SETMIC(xcur,ycur,zcur,POROSITY);
+                        SETMIC(xnew,ynew,znew,DIFFCACL2);
                 }
                 else{
                         /* indicate that diffusing CACL2 remained at */
@@ -1738,7 +1738,7 @@ int movecas2(xcur,ycur,zcur,finalstep)
         if((check==C3A)||(check==DIFFC3A)||(check==DIFFC4A)){
         /* Convert diffusing CAS2 to a stratlingite pixel */
                 action=0;
-                mic[xcur][ycur][zcur]=STRAT;
+                SETMIC(xcur,ycur,zcur,STRAT);
 		count[STRAT]+=1;
                 count[DIFFCAS2]-=1;
 
@@ -1748,7 +1748,7 @@ int movecas2(xcur,ycur,zcur,finalstep)
                 pexp=ran1(seed);
                 nexp=3;
                 if(pexp<=0.886){
-                        mic[xnew][ynew][znew]=STRAT;
+                        SETMIC(xnew,ynew,znew,STRAT);
 			count[STRAT]+=1;
 			count[check]-=1;
                         nexp=2;
@@ -1802,7 +1802,7 @@ int movecas2(xcur,ycur,zcur,finalstep)
         /* if new location is C4AF execute conversion */
         /* to stratlingite (including necessary volumetric expansion) */
         else if(check==C4AF){
-                mic[xnew][ynew][znew]=STRAT;
+                SETMIC(xnew,ynew,znew,STRAT);
 		count[STRAT]+=1;
                 count[C4AF]-=1;
 
@@ -1814,7 +1814,7 @@ int movecas2(xcur,ycur,zcur,finalstep)
                 pexp=ran1(seed);
                 nexp=2;
                 if(pexp<=0.786){
-                        mic[xcur][ycur][zcur]=STRAT;
+                        SETMIC(xcur,ycur,zcur,STRAT);
 			count[STRAT]+=1;
 			count[DIFFCAS2]-=1;
                         nexp=1;
@@ -1889,14 +1889,14 @@ int movecas2(xcur,ycur,zcur,finalstep)
                 action=0;
                 count[DIFFCAS2]-=1;
 		count[CAS2]+=1;
-                mic[xcur][ycur][zcur]=CAS2;
+                SETMIC(xcur,ycur,zcur,CAS2);
         }
 
         if(action!=0){
                 /* if diffusion is possible, execute it */
                 if(check==POROSITY){
-                        mic[xcur][ycur][zcur]=POROSITY;
-                        mic[xnew][ynew][znew]=DIFFCAS2;
+                        SETMIC(xcur,ycur,zcur,POROSITY);
+                        SETMIC(xnew,ynew,znew,DIFFCAS2);
                 }
                 else{
                         /* indicate that diffusing CAS2 remained at */
@@ -1944,7 +1944,7 @@ int moveas(xcur,ycur,zcur,finalstep)
         if((check==CH)||(check==DIFFCH)){
         /* Convert diffusing CH or CH to a stratlingite pixel */
                 action=0;
-                mic[xnew][ynew][znew]=STRAT;
+                SETMIC(xnew,ynew,znew,STRAT);
 		count[STRAT]+=1;
                 count[check]-=1;
 
@@ -1954,7 +1954,7 @@ int moveas(xcur,ycur,zcur,finalstep)
                 pexp=ran1(seed);
                 nexp=2;
                 if(pexp<=0.7538){
-                        mic[xcur][ycur][zcur]=STRAT;
+                        SETMIC(xcur,ycur,zcur,STRAT);
 			count[STRAT]+=1;
 			count[DIFFAS]-=1;
                         nexp=1;
@@ -2015,14 +2015,14 @@ int moveas(xcur,ycur,zcur,finalstep)
                 action=0;
                 count[DIFFAS]-=1;
 		count[ASG]+=1;
-                mic[xcur][ycur][zcur]=ASG;
+                SETMIC(xcur,ycur,zcur,ASG);
         }
 
         if(action!=0){
                 /* if diffusion is possible, execute it */
                 if(check==POROSITY){
-                        mic[xcur][ycur][zcur]=POROSITY;
-                        mic[xnew][ynew][znew]=DIFFAS;
+                        SETMIC(xcur,ycur,zcur,POROSITY);
+                        SETMIC(xnew,ynew,znew,DIFFAS);
                 }
                 else{
                         /* indicate that diffusing AS remained at */
@@ -2073,11 +2073,11 @@ int movecaco3(xcur,ycur,zcur,finalstep)
                 action=0;
                 pexp=ran1(seed);
                 if(pexp<=0.479192){
-                      mic[xnew][ynew][znew]=AFMC;
+                      SETMIC(xnew,ynew,znew,AFMC);
 		      count[AFMC]+=1;
                 }
                 else{
-                      mic[xnew][ynew][znew]=ETTR;
+                      SETMIC(xnew,ynew,znew,ETTR);
 		      count[ETTR]+=1;
                 }
                 count[check]-=1;
@@ -2087,7 +2087,7 @@ int movecaco3(xcur,ycur,zcur,finalstep)
                 /* and should form 0.55785 units of AFMC */
                 pexp=ran1(seed);
                 if(pexp<=0.078658){
-                        mic[xcur][ycur][zcur]=AFMC;
+                        SETMIC(xcur,ycur,zcur,AFMC);
 			count[AFMC]+=1;
 			count[DIFFCACO3]-=1;
                 }
@@ -2114,14 +2114,14 @@ int movecaco3(xcur,ycur,zcur,finalstep)
                 action=0;
                 count[DIFFCACO3]-=1;
 		count[CACO3]+=1;
-                mic[xcur][ycur][zcur]=CACO3;
+                SETMIC(xcur,ycur,zcur,CACO3);
         }
 
         if(action!=0){
                 /* if diffusion is possible, execute it */
                 if(check==POROSITY){
-                        mic[xcur][ycur][zcur]=POROSITY;
-                        mic[xnew][ynew][znew]=DIFFCACO3;
+                        SETMIC(xcur,ycur,zcur,POROSITY);
+                        SETMIC(xnew,ynew,znew,DIFFCACO3);
                 }
                 else{
                         /* indicate that diffusing CACO3 remained at */
@@ -2162,7 +2162,7 @@ void extafm(xpres,ypres,zpres)
 
                 /* if neighbor is porosity, locate the AFm phase there */
                 if(check==POROSITY){
-                        mic[xchr][ychr][zchr]=AFM;
+                        SETMIC(xchr,ychr,zchr,AFM);
 			count[AFM]+=1;
 			count[POROSITY]-=1;
                         fchr=1;
@@ -2189,7 +2189,7 @@ void extafm(xpres,ypres,zpres)
                         /* Be sure that at least one neighboring pixel is */
                         /* Afm phase, C3A, or C4AF */
                         if((tries>5000)||(numnear<26)){
-                                mic[xchr][ychr][zchr]=AFM;
+                                SETMIC(xchr,ychr,zchr,AFM);
 				count[AFM]+=1;
 				count[POROSITY]-=1;
                                 fchr=1;
@@ -2230,7 +2230,7 @@ int moveettr(xcur,ycur,zcur,finalstep)
         /* to AFM phase (including necessary volumetric expansion) */
         if(check==C4AF){
                 /* Convert diffusing ettringite to AFM phase */
-                mic[xcur][ycur][zcur]=AFM;
+                SETMIC(xcur,ycur,zcur,AFM);
 		count[AFM]+=1;
                 count[DIFFETTR]-=1;
 
@@ -2241,7 +2241,7 @@ int moveettr(xcur,ycur,zcur,finalstep)
                 pexp=ran1(seed);
 		
                 if(pexp<=0.278){
-                        mic[xnew][ynew][znew]=AFM;
+                        SETMIC(xnew,ynew,znew,AFM);
 			count[AFM]+=1;
 			count[C4AF]-=1;
                         pafm=ran1(seed);
@@ -2256,7 +2256,7 @@ int moveettr(xcur,ycur,zcur,finalstep)
                         }
                 }
                 else if (pexp<=0.348){
-                        mic[xnew][ynew][znew]=FH3;
+                        SETMIC(xnew,ynew,znew,FH3);
 			count[FH3]+=1;
 			count[C4AF]-=1;
                 }
@@ -2268,7 +2268,7 @@ int moveettr(xcur,ycur,zcur,finalstep)
         else if((check==C3A)||(check==DIFFC3A)){
                 /* Convert diffusing ettringite to AFM phase */
                 action=0;
-                mic[xcur][ycur][zcur]=AFM;
+                SETMIC(xcur,ycur,zcur,AFM);
                 count[DIFFETTR]-=1;
 		count[AFM]+=1;
 		count[check]-=1;	
@@ -2278,7 +2278,7 @@ int moveettr(xcur,ycur,zcur,finalstep)
                 /* and should form 1.278 units of AFm phase */
                 pexp=ran1(seed);
                 if(pexp<=0.2424){
-                        mic[xnew][ynew][znew]=AFM;
+                        SETMIC(xnew,ynew,znew,AFM);
 			count[AFM]+=1;
                         pafm=(-0.1);
                 }
@@ -2286,12 +2286,12 @@ int moveettr(xcur,ycur,zcur,finalstep)
                         /* maybe someday, use a new FIXEDC3A here */
                         /* so it won't dissolve later */
                         if(check==C3A){
-                                mic[xnew][ynew][znew]=C3A;
+                                SETMIC(xnew,ynew,znew,C3A);
 				count[C3A]+=1;
                         }
                         else{
                                 count[DIFFC3A]+=1;
-                                mic[xnew][ynew][znew]=DIFFC3A;
+                                SETMIC(xnew,ynew,znew,DIFFC3A);
                         }
 /*                      pafm=(0.278-0.2424)/(1.0-0.2424);  */
 			pafm=0.04699;
@@ -2308,7 +2308,7 @@ int moveettr(xcur,ycur,zcur,finalstep)
         else if(check==ETTR){
                 pgrow=ran1(seed);
                 if(pgrow<=ETTRGROW){
-                        mic[xcur] [ycur] [zcur]=ETTR;
+                        SETMIC(xcur,ycur,zcur,ETTR);
 			count[ETTR]+=1;
                         action=0;
                         count[DIFFETTR]-=1;
@@ -2321,14 +2321,14 @@ int moveettr(xcur,ycur,zcur,finalstep)
                 action=0;
                 count[DIFFETTR]-=1;
 		count[ETTR]+=1;
-                mic[xcur][ycur][zcur]=ETTR;
+                SETMIC(xcur,ycur,zcur,ETTR);
         }
 
         if(action!=0){
                 /* if diffusion is possible, execute it */
                 if(check==POROSITY){
-                        mic[xcur][ycur][zcur]=POROSITY;
-                        mic[xnew][ynew][znew]=DIFFETTR;
+                        SETMIC(xcur,ycur,zcur,POROSITY);
+                        SETMIC(xnew,ynew,znew,DIFFETTR);
                 }
                 else{
                         /* indicate that diffusing ettringite remained at */
@@ -2368,7 +2368,7 @@ void extpozz(xpres,ypres,zpres)
 
                 /* if neighbor is porosity, locate the pozzolanic CSH there */
                 if(check==POROSITY){
-                        mic[xchr][ychr][zchr]=POZZCSH;
+                        SETMIC(xchr,ychr,zchr,POZZCSH);
 			count[POZZCSH]+=1;
 			count[POROSITY]-=1;
                         fchr=1;
@@ -2394,7 +2394,7 @@ void extpozz(xpres,ypres,zpres)
                         /* Be sure that one neighboring species is CSH or */
                         /* pozzolanic material */
                         if((tries>5000)||(numnear<26)){
-                                mic[xchr][ychr][zchr]=POZZCSH;
+                                SETMIC(xchr,ychr,zchr,POZZCSH);
 				count[POZZCSH]+=1;
 				count[POROSITY]-=1;
                                 fchr=1;
@@ -2419,7 +2419,7 @@ int movefh3(xcur,ycur,zcur,finalstep,nucprob)
 
         if((nucprob>=pgen)||(finalstep==1)){
                 action=0;
-                mic[xcur][ycur][zcur]=FH3;
+                SETMIC(xcur,ycur,zcur,FH3);
 		count[FH3]+=1;
                 count[DIFFFH3]-=1;
         }
@@ -2437,7 +2437,7 @@ int movefh3(xcur,ycur,zcur,finalstep,nucprob)
 
                	/* check for growth of FH3 crystal */
                 if(check==FH3){
-                        mic[xcur][ycur][zcur]=FH3;
+                        SETMIC(xcur,ycur,zcur,FH3);
 			count[FH3]+=1;
                         count[DIFFFH3]-=1;
                         action=0;
@@ -2446,8 +2446,8 @@ int movefh3(xcur,ycur,zcur,finalstep,nucprob)
                 if(action!=0){
                         /* if diffusion is possible, execute it */
                         if(check==POROSITY){
-                                mic[xcur][ycur][zcur]=POROSITY;
-                                mic[xnew][ynew][znew]=DIFFFH3;
+                                SETMIC(xcur,ycur,zcur,POROSITY);
+                                SETMIC(xnew,ynew,znew,DIFFFH3);
                         }
                         else{
                                 /* indicate that diffusing FH3 species */
@@ -2474,7 +2474,7 @@ int movech(xcur,ycur,zcur,finalstep,nucprob)
         pgen=ran1(seed);
         if((nucprob>=pgen)||(finalstep==1)){
                 action=0;
-                mic[xcur][ycur][zcur]=CH;
+                SETMIC(xcur,ycur,zcur,CH);
                 count[DIFFCH]-=1;
 		count[CH]+=1;
         }
@@ -2492,7 +2492,7 @@ int movech(xcur,ycur,zcur,finalstep,nucprob)
 
                 /* check for growth of CH crystal */
                 if((check==CH)&&(pgen<=CHGROW)){
-                        mic[xcur][ycur][zcur]=CH;
+                        SETMIC(xcur,ycur,zcur,CH);
                         count[DIFFCH]-=1;
 			count[CH]+=1;
                         action=0;
@@ -2500,7 +2500,7 @@ int movech(xcur,ycur,zcur,finalstep,nucprob)
               /* check for growth of CH crystal on aggregate or CaCO3 surface */
                 /* re suggestion of Sidney Diamond */
                 else if(((check==INERTAGG)||(check==CACO3)||(check==INERT))&&(pgen<=CHGROWAGG)&&(chflag==1)){
-                        mic[xcur][ycur][zcur]=CH;
+                        SETMIC(xcur,ycur,zcur,CH);
                         count[DIFFCH]-=1;
 			count[CH]+=1;
                         action=0;
@@ -2510,7 +2510,7 @@ int movech(xcur,ycur,zcur,finalstep,nucprob)
 		/* 36.41 units CH can react with 27 units of S */
                 else if((pgen<=ppozz)&&(check==POZZ)&&(npr<=(int)((float)nfill*1.35))){
                         action=0;
-                        mic[xcur][ycur][zcur]=POZZCSH;
+                        SETMIC(xcur,ycur,zcur,POZZCSH);
 			count[POZZCSH]+=1;
                         /* update counter of number of diffusing CH */
                         /* which have reacted pozzolanically */
@@ -2519,7 +2519,7 @@ int movech(xcur,ycur,zcur,finalstep,nucprob)
                         /* Convert pozzolan to pozzolanic CSH as needed */
                         pfix=ran1(seed);
 			if(pfix<=(1./1.35)){
-				mic[xnew][ynew][znew]=POZZCSH;
+				SETMIC(xnew,ynew,znew,POZZCSH);
 				count[POZZ]-=1;
 				count[POZZCSH]+=1;
 			}
@@ -2535,7 +2535,7 @@ int movech(xcur,ycur,zcur,finalstep,nucprob)
                 }
 		else if(check==DIFFAS){
 			action=0;
-			mic[xcur][ycur][zcur]=STRAT;
+			SETMIC(xcur,ycur,zcur,STRAT);
 			count[STRAT]+=1;
 			/* update counter of number of diffusing CH */
 			/* which have reacted to form stratlingite */
@@ -2544,7 +2544,7 @@ int movech(xcur,ycur,zcur,finalstep,nucprob)
 			/* Convert DIFFAS to STRAT as needed */
 			pfix=ran1(seed);
 			if(pfix<=0.7538){
-				mic[xnew][ynew][znew]=STRAT;
+				SETMIC(xnew,ynew,znew,STRAT);
 				count[STRAT]+=1;
 				count[DIFFAS]-=1;
 			}
@@ -2560,8 +2560,8 @@ int movech(xcur,ycur,zcur,finalstep,nucprob)
 		if(action!=0){
                         /* if diffusion is possible, execute it */
                         if(check==POROSITY){
-                                mic[xcur][ycur][zcur]=POROSITY;
-                                mic[xnew][ynew][znew]=DIFFCH;
+                                SETMIC(xcur,ycur,zcur,POROSITY);
+                                SETMIC(xnew,ynew,znew,DIFFCH);
                         }
                         else{
                                 /* indicate that diffusing CH species */
@@ -2602,7 +2602,7 @@ void extc3ah6(xpres,ypres,zpres)
 
                 /* if neighbor is pore space, convert it to C3AH6 */
                 if(check==POROSITY){
-                        mic[xchr][ychr][zchr]=C3AH6;
+                        SETMIC(xchr,ychr,zchr,C3AH6);
 			count[C3AH6]+=1;
 			count[POROSITY]-=1;
                         fchr=1;
@@ -2626,7 +2626,7 @@ void extc3ah6(xpres,ypres,zpres)
                         /* Be sure that new C3AH6 is in contact with */
                         /* at least one C3AH6 or C3A */
                         if((tries>5000)||(numnear<26)){
-                                mic[xchr][ychr][zchr]=C3AH6;
+                                SETMIC(xchr,ychr,zchr,C3AH6);
 				count[C3AH6]+=1;
 				count[POROSITY]-=1;
                                 fchr=1;
@@ -2659,7 +2659,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
 
         if((nucprob>=pgen)||(finalstep==1)){
                 action=0;
-                mic[xcur][ycur][zcur]=C3AH6;
+                SETMIC(xcur,ycur,zcur,C3AH6);
 		count[C3AH6]+=1;
                 /* decrement count of diffusing C3A species */
                 count[DIFFC3A]-=1;
@@ -2687,7 +2687,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                         /* Try to slow down growth of C3AH6 crystals to */
                         /* promote ettringite and Afm formation */
                         if(pgrow<=C3AH6GROW){
-                                mic[xcur][ycur][zcur]=C3AH6;
+                                SETMIC(xcur,ycur,zcur,C3AH6);
 				count[C3AH6]+=1;
                                 count[DIFFC3A]-=1;
                                 action=0;
@@ -2704,7 +2704,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                 /* Only allow reaction with diffusing gypsum */
                 else if((check==DIFFGYP)&&(p2diff<C3AGYP)){
                         /* convert diffusing gypsum to ettringite */
-                        mic[xnew][ynew][znew]=ETTR;
+                        SETMIC(xnew,ynew,znew,ETTR);
 			count[ETTR]+=1;
                         /* decrement counts of diffusing gypsum */
                         count[DIFFGYP]-=1;
@@ -2714,7 +2714,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                         pexp=ran1(seed);
                         nexp=2;
                         if(pexp<=0.40){
-                                mic[xcur][ycur][zcur]=ETTR;
+                                SETMIC(xcur,ycur,zcur,ETTR);
 				count[ETTR]+=1;
 				count[DIFFC3A]-=1;
                                 nexp=1;
@@ -2774,7 +2774,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                 /* Only allow reaction with diffusing hemihydrate */
                 else if((check==DIFFHEM)&&(p2diff<C3AGYP)){
                         /* convert diffusing hemihydrate to ettringite */
-                        mic[xnew][ynew][znew]=ETTR;
+                        SETMIC(xnew,ynew,znew,ETTR);
 			count[ETTR]+=1;
                         /* decrement counts of diffusing hemihydrate */
                         count[DIFFHEM]-=1;
@@ -2784,7 +2784,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                         pexp=ran1(seed);
                         nexp=3;
                         if(pexp<=0.5583){
-                                mic[xcur][ycur][zcur]=ETTR;
+                                SETMIC(xcur,ycur,zcur,ETTR);
 				count[ETTR]+=1;
 				count[DIFFC3A]-=1;
                                 nexp=2;
@@ -2844,7 +2844,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                 /* Only allow reaction with diffusing anhydrite */
                 else if((check==DIFFANH)&&(p2diff<C3AGYP)){
                         /* convert diffusing anhydrite to ettringite */
-                        mic[xnew][ynew][znew]=ETTR;
+                        SETMIC(xnew,ynew,znew,ETTR);
 			count[ETTR]+=1;
                         /* decrement counts of diffusing anhydrite */
                         count[DIFFANH]-=1;
@@ -2854,7 +2854,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                         pexp=ran1(seed);
                         nexp=3;
                         if(pexp<=0.569){
-                                mic[xcur][ycur][zcur]=ETTR;
+                                SETMIC(xcur,ycur,zcur,ETTR);
 				count[ETTR]+=1;
 				count[DIFFC3A]-=1;
                                 nexp=2;
@@ -2914,7 +2914,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                 /* Only allow reaction with diffusing CaCl2 */
                 else if(check==DIFFCACL2){
                         /* convert diffusing C3A to Freidel's salt */
-                        mic[xcur][ycur][zcur]=FREIDEL;
+                        SETMIC(xcur,ycur,zcur,FREIDEL);
 			count[FREIDEL]+=1;
                         /* decrement counts of diffusing C3A and CaCl2 */
                         count[DIFFC3A]-=1;
@@ -2924,7 +2924,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                         pexp=ran1(seed);
                         nexp=2;
                         if(pexp<=0.5793){
-                                mic[xnew][ynew][znew]=FREIDEL;
+                                SETMIC(xnew,ynew,znew,FREIDEL);
 				count[FREIDEL]+=1;
 				count[DIFFCACL2]-=1;
                                 nexp=1;
@@ -2982,7 +2982,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                 /* Only allow reaction with diffusing (not solid) CAS2 */
                 else if(check==DIFFCAS2){
                         /* convert diffusing CAS2 to stratlingite */
-                        mic[xnew][ynew][znew]=STRAT;
+                        SETMIC(xnew,ynew,znew,STRAT);
 			count[STRAT]+=1;
                         /* decrement counts of diffusing C3A and CAS2 */
                         count[DIFFCAS2]-=1;
@@ -2992,7 +2992,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                         pexp=ran1(seed);
                         nexp=3;
                         if(pexp<=0.886){
-                                mic[xcur][ycur][zcur]=STRAT;
+                                SETMIC(xcur,ycur,zcur,STRAT);
 				count[STRAT]+=1;
 				count[DIFFC3A]-=1;
                                 nexp=2;
@@ -3054,7 +3054,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                 pgrow=ran1(seed);
    if((check==DIFFETTR)||((check==ETTR)&&(soluble[ETTR]==1)&&(pgrow<=C3AETTR))){
                 /* convert diffusing or solid ettringite to AFm */
-                mic[xnew][ynew][znew]=AFM;
+                SETMIC(xnew,ynew,znew,AFM);
 		count[AFM]+=1;
                 /* decrement count of ettringite */
 		count[check]-=1;
@@ -3063,7 +3063,7 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
                 /* convert diffusing C3A to AFm or leave as diffusing C3A */
                 pexp=ran1(seed);
                 if(pexp<=0.2424){
-                        mic[xcur][ycur][zcur]=AFM;
+                        SETMIC(xcur,ycur,zcur,AFM);
 			count[AFM]+=1;
 			count[DIFFC3A]-=1;
                         pafm=(-0.1);
@@ -3083,8 +3083,8 @@ int movec3a(xcur,ycur,zcur,finalstep,nucprob)
 
                 /* if diffusion is possible, execute it */
                 if(check==POROSITY){
-                        mic[xcur][ycur][zcur]=POROSITY;
-                        mic[xnew][ynew][znew]=DIFFC3A;
+                        SETMIC(xcur,ycur,zcur,POROSITY);
+                        SETMIC(xnew,ynew,znew,DIFFC3A);
                 }
                 else{
                         /* indicate that diffusing C3A remained */
@@ -3120,7 +3120,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
 
         if((nucprob>=pgen)||(finalstep==1)){
                 action=0;
-                mic[xcur][ycur][zcur]=C3AH6;
+                SETMIC(xcur,ycur,zcur,C3AH6);
 		count[C3AH6]+=1;
                 /* decrement count of diffusing C3A species */
                 count[DIFFC4A]-=1;
@@ -3148,7 +3148,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                         /* Try to slow down growth of C3AH6 crystals to */
                         /* promote ettringite and Afm formation */
                         if(pgrow<=C3AH6GROW){
-                                mic[xcur][ycur][zcur]=C3AH6;
+                                SETMIC(xcur,ycur,zcur,C3AH6);
 				count[C3AH6]+=1;
                                 count[DIFFC4A]-=1;
                                 action=0;
@@ -3165,7 +3165,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                 /* Only allow reaction with diffusing gypsum */
                 else if((check==DIFFGYP)&&(p2diff<C3AGYP)){
                         /* convert diffusing gypsum to ettringite */
-                        mic[xnew][ynew][znew]=ETTRC4AF;
+                        SETMIC(xnew,ynew,znew,ETTRC4AF);
 			count[ETTRC4AF]+=1;
                         /* decrement counts of diffusing gypsum */
                         count[DIFFGYP]-=1;
@@ -3175,7 +3175,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                         pexp=ran1(seed);
                         nexp=2;
                         if(pexp<=0.40){
-                                mic[xcur][ycur][zcur]=ETTRC4AF;
+                                SETMIC(xcur,ycur,zcur,ETTRC4AF);
 				count[ETTRC4AF]+=1;
 				count[DIFFC4A]-=1;
                                 nexp=1;
@@ -3235,7 +3235,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                 /* Only allow reaction with diffusing hemihydrate */
                 else if((check==DIFFHEM)&&(p2diff<C3AGYP)){
                         /* convert diffusing hemihydrate to ettringite */
-                        mic[xnew][ynew][znew]=ETTRC4AF;
+                        SETMIC(xnew,ynew,znew,ETTRC4AF);
 			count[ETTRC4AF]+=1;
                         /* decrement counts of diffusing hemihydrate */
                         count[DIFFHEM]-=1;
@@ -3245,7 +3245,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                         pexp=ran1(seed);
                         nexp=3;
                         if(pexp<=0.5583){
-                                mic[xcur][ycur][zcur]=ETTRC4AF;
+                                SETMIC(xcur,ycur,zcur,ETTRC4AF);
 				count[ETTRC4AF]+=1;
 				count[DIFFC4A]-=1;
                                 nexp=2;
@@ -3305,7 +3305,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                 /* Only allow reaction with diffusing anhydrite */
                 else if((check==DIFFANH)&&(p2diff<C3AGYP)){
                         /* convert diffusing anhydrite to ettringite */
-                        mic[xnew][ynew][znew]=ETTRC4AF;
+                        SETMIC(xnew,ynew,znew,ETTRC4AF);
 			count[ETTRC4AF]+=1;
                         /* decrement counts of diffusing anhydrite */
                         count[DIFFANH]-=1;
@@ -3315,7 +3315,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                         pexp=ran1(seed);
                         nexp=3;
                         if(pexp<=0.569){
-                                mic[xcur][ycur][zcur]=ETTRC4AF;
+                                SETMIC(xcur,ycur,zcur,ETTRC4AF);
 				count[ETTRC4AF]+=1;
 				count[DIFFC4A]-=1;
                                 nexp=2;
@@ -3375,7 +3375,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                 /* Only allow reaction with diffusing CaCl2 */
                 else if(check==DIFFCACL2){
                         /* convert diffusing C3A to Freidel's salt */
-                        mic[xcur][ycur][zcur]=FREIDEL;
+                        SETMIC(xcur,ycur,zcur,FREIDEL);
 			count[FREIDEL]+=1;
                         /* decrement counts of diffusing C3A and CaCl2 */
                         count[DIFFC4A]-=1;
@@ -3385,7 +3385,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                         pexp=ran1(seed);
                         nexp=2;
                         if(pexp<=0.5793){
-                                mic[xnew][ynew][znew]=FREIDEL;
+                                SETMIC(xnew,ynew,znew,FREIDEL);
 				count[FREIDEL]+=1;
 				count[DIFFCACL2]-=1;
                                 nexp=1;
@@ -3443,7 +3443,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                 /* Only allow reaction with diffusing (not solid) CAS2 */
                 else if(check==DIFFCAS2){
                         /* convert diffusing CAS2 to stratlingite */
-                        mic[xnew][ynew][znew]=STRAT;
+                        SETMIC(xnew,ynew,znew,STRAT);
 			count[STRAT]+=1;
                         /* decrement counts of diffusing CAS2 */
                         count[DIFFCAS2]-=1;
@@ -3453,7 +3453,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                         pexp=ran1(seed);
                         nexp=3;
                         if(pexp<=0.886){
-                                mic[xcur][ycur][zcur]=STRAT;
+                                SETMIC(xcur,ycur,zcur,STRAT);
 				count[STRAT]+=1;
 				count[DIFFC4A]-=1;
                                 nexp=2;
@@ -3515,7 +3515,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                 pgrow=ran1(seed);
    if((check==DIFFETTR)||((check==ETTR)&&(soluble[ETTR]==1)&&(pgrow<=C3AETTR))){
                 /* convert diffusing or solid ettringite to AFm */
-                mic[xnew][ynew][znew]=AFM;
+                SETMIC(xnew,ynew,znew,AFM);
 		count[AFM]+=1;
                 /* decrement count of ettringite */
 		count[check]-=1;
@@ -3524,7 +3524,7 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
                 /* convert diffusing C4A to AFm or leave as diffusing C4A */
                 pexp=ran1(seed);
                 if(pexp<=0.2424){
-                        mic[xcur][ycur][zcur]=AFM;
+                        SETMIC(xcur,ycur,zcur,AFM);
 			count[AFM]+=1;
 			count[DIFFC4A]-=1;
                         pafm=(-0.1);
@@ -3544,8 +3544,8 @@ int movec4a(xcur,ycur,zcur,finalstep,nucprob)
 
                 /* if diffusion is possible, execute it */
                 if(check==POROSITY){
-                        mic[xcur][ycur][zcur]=POROSITY;
-                        mic[xnew][ynew][znew]=DIFFC4A;
+                        SETMIC(xcur,ycur,zcur,POROSITY);
+                        SETMIC(xnew,ynew,znew,DIFFC4A);
                 }
                 else{
                         /* indicate that diffusing C4A remained */
@@ -0,0 +1,299 @@
+/************************************************************************/
+/*                                                                      */
+/*      percol.c - percolation of pore space and solids by labeling.    */
+/*                                                                      */
+/*      Included by disrealnew.c. percpore() and percset() give the     */
+/*      same counts and .pps/.pts lines as three calls of burn3d() or   */
+/*      burnset() (directions (1,0,0), (0,1,0), (0,0,1), in that        */
+/*      order), from a single labeling of the microstructure:           */
+/*                                                                      */
+/*      1) pixels are joined by union-find over the bonds that do not   */
+/*         cross a face of the system, and the clusters are numbered;   */
+/*      2) for each burn direction, clusters are joined over the bonds  */
+/*         across the two periodic faces (the burn axis is not          */
+/*         periodic), which only touches SYSIZE^2 pixel pairs per axis. */
+/*                                                                      */
+/*      A cluster is accessible if it holds a pixel of the first face   */
+/*      and "through" if it holds both ends of one line along the burn  */
+/*      axis, as in the burning routines. Bonds are symmetric: pixels   */
+/*      of the phase for burn3d; for burnset, solids joined when either */
+/*      is a hydrate (CSH, C3AH6, ETTR, ETTRC4AF) or both are clinker,  */
+/*      slag or fly ash pixels of the same (non-zero) initial particle. */
+/*                                                                      */
+/************************************************************************/
+
+#define PERCPORE 0    /* pixels of one phase */
+#define PERCSET 1     /* solid framework of burnset */
+
+/* pixel classes of the set-point burn */
+/* 1 = clinker, slag or fly ash, 2 = hydrate, 0 = not burnt */
+static int setclass(ph)
+	int ph;
+{
+	if((ph==C3S)||(ph==C2S)||(ph==C3A)||(ph==C4AF)||(ph==POZZ)||
+	(ph==SLAG)||(ph==ASG)||(ph==CAS2)){
+		return(1);
+	}
+	if((ph==CSH)||(ph==C3AH6)||(ph==ETTR)||(ph==ETTRC4AF)){
+		return(2);
+	}
+	return(0);
+}
+
+/* 1 if pixel a belongs to the class being labeled */
+static int percmember(mode,npix,a)
+	int mode,npix;
+	long int a;
+{
+	char *m;
+
+	m=&mic[0][0][0];
+	if(mode==PERCPORE){
+		return(m[a]==npix);
+	}
+	return(setclass(m[a])!=0);
+}
+
+/* 1 if member pixels a and b are connected */
+static int percbond(mode,a,b)
+	int mode;
+	long int a,b;
+{
+	char *m;
+	short int *part;
+	int ca,cb;
+
+	if(mode==PERCPORE){return(1);}
+	m=&mic[0][0][0];
+	part=&micpart[0][0][0];
+	ca=setclass(m[a]);
+	cb=setclass(m[b]);
+	if((ca==2)||(cb==2)){return(1);}
+	return((part[a]==part[b])&&(part[a]!=0));
+}
+
+/* root of x in the parent array par, with path halving */
+static int percfind(par,x)
+	int *par,x;
+{
+	while(par[x]!=x){
+		par[x]=par[par[x]];
+		x=par[x];
+	}
+	return(x);
+}
+
+static void percunion(par,x,y)
+	int *par,x,y;
+{
+	x=percfind(par,x);
+	y=percfind(par,y);
+	if(x<y){par[y]=x;}
+	else if(y<x){par[x]=y;}
+}
+
+/* routine to label the clusters of the class and count, for the three */
+/* burn directions, the pixels accessible from the first face (ntop) */
+/* and in through pathways (nthrough); returns the number of members */
+/* Called by percpore and percset */
+/* Calls percmember, percbond, percfind and percunion */
+long int perclabel(mode,npix,ntop,nthrough)
+	int mode,npix;
+	long int ntop[3],nthrough[3];
+{
+	long int a,nmem,lo,hi;
+	long int stride[3];
+	int x,y,z,d,axis,t1,t2,u,v,c,nclus,r;
+	/* burn axis of burn3d/burnset directions (1,0,0), (0,1,0), (0,0,1) */
+	static int burnaxis[3]={0,2,1};
+	/* work arrays, freed at the end of every pass so that nothing */
+	/* is left allocated when disrealnew returns */
+	int *percpar,*percid,*perccpar;
+	long int *percsize;
+	char *percflag;
+
+	a=(long int)SYSIZE*SYSIZE*SYSIZE;
+	percpar=(int *)malloc(a*sizeof(int));
+	percid=(int *)malloc(a*sizeof(int));
+	perccpar=(int *)malloc(a*sizeof(int));
+	percsize=(long int *)malloc(a*sizeof(long int));
+	percflag=(char *)malloc(a*sizeof(char));
+	if((percpar==NULL)||(percid==NULL)||(perccpar==NULL)||
+	(percsize==NULL)||(percflag==NULL)){
+		printf("Could not allocate percolation work arrays \n");
+		exit(1);
+	}
+	stride[0]=(long int)SYSIZE*SYSIZE;
+	stride[1]=SYSIZE;
+	stride[2]=1;
+
+	/* Union of the members over the bonds inside the box */
+	nmem=0;
+	a=0;
+	for(x=0;x<SYSIZE;x++){
+	for(y=0;y<SYSIZE;y++){
+	for(z=0;z<SYSIZE;z++){
+		if(percmember(mode,npix,a)){
+			percpar[a]=(int)a;
+			nmem+=1;
+			if((x>0)&&(percpar[a-stride[0]]>=0)&&percbond(mode,a,a-stride[0])){
+				percunion(percpar,(int)a,(int)(a-stride[0]));
+			}
+			if((y>0)&&(percpar[a-stride[1]]>=0)&&percbond(mode,a,a-stride[1])){
+				percunion(percpar,(int)a,(int)(a-stride[1]));
+			}
+			if((z>0)&&(percpar[a-1]>=0)&&percbond(mode,a,a-1)){
+				percunion(percpar,(int)a,(int)(a-1));
+			}
+		}
+		else{
+			percpar[a]=(-1);
+		}
+		a+=1;
+	}
+	}
+	}
+
+	/* Number the clusters and count their pixels */
+	nclus=0;
+	for(a=0;a<stride[0]*SYSIZE;a++){
+		if(percpar[a]<0){continue;}
+		/* a root is the lowest index of its cluster, so it is */
+		/* numbered before the other pixels of the cluster */
+		r=percfind(percpar,(int)a);
+		if(r==a){
+			percsize[nclus]=0;
+			nclus+=1;
+			percid[a]=nclus-1;
+		}
+		else{
+			percid[a]=percid[r];
+		}
+		percsize[percid[a]]+=1;
+	}
+
+	for(d=0;d<3;d++){
+		axis=burnaxis[d];
+		t1=(axis==0)?1:0;
+		t2=(axis==2)?1:2;
+		for(c=0;c<nclus;c++){
+			perccpar[c]=c;
+			percflag[c]=0;
+		}
+		/* Join clusters across the periodic faces of the two */
+		/* transverse axes */
+		for(u=0;u<SYSIZE;u++){
+		for(v=0;v<SYSIZE;v++){
+			lo=(long int)u*stride[axis]+(long int)v*stride[t2];
+			hi=lo+(long int)(SYSIZE-1)*stride[t1];
+			if((percpar[lo]>=0)&&(percpar[hi]>=0)&&percbond(mode,lo,hi)){
+				percunion(perccpar,percid[lo],percid[hi]);
+			}
+			lo=(long int)u*stride[axis]+(long int)v*stride[t1];
+			hi=lo+(long int)(SYSIZE-1)*stride[t2];
+			if((percpar[lo]>=0)&&(percpar[hi]>=0)&&percbond(mode,lo,hi)){
+				percunion(perccpar,percid[lo],percid[hi]);
+			}
+		}
+		}
+		/* Flag 1: holds a pixel of the first face */
+		/* Flag 2: also holds both ends of a line along the burn axis */
+		for(u=0;u<SYSIZE;u++){
+		for(v=0;v<SYSIZE;v++){
+			lo=(long int)u*stride[t1]+(long int)v*stride[t2];
+			if(percpar[lo]<0){continue;}
+			r=percfind(perccpar,percid[lo]);
+			if(percflag[r]==0){percflag[r]=1;}
+			hi=lo+(long int)(SYSIZE-1)*stride[axis];
+			if((percpar[hi]>=0)&&(percfind(perccpar,percid[hi])==r)){
+				percflag[r]=2;
+			}
+		}
+		}
+		ntop[d]=nthrough[d]=0;
+		for(c=0;c<nclus;c++){
+			r=percfind(perccpar,c);
+			if(percflag[r]>=1){ntop[d]+=percsize[c];}
+			if(percflag[r]==2){nthrough[d]+=percsize[c];}
+		}
+	}
+	free(percpar);
+	free(percid);
+	free(perccpar);
+	free(percsize);
+	free(percflag);
+	return(nmem);
+}
+
+/* routine to assess the percolation of phase npix in the three */
+/* directions and append the three lines of burn3d to the .pps file */
+/* pflag[d] is set to 1 if direction d percolates */
+/* Called by main program */
+/* Calls perclabel */
+void percpore(npix,pflag)
+	int npix;
+	int pflag[3];
+{
+	long int ntop[3],nthrough[3],nphc;
+	int d;
+	float mass_burn,alpha_burn,con_frac;
+	FILE *fileperc;
+
+	nphc=perclabel(PERCPORE,npix,ntop,nthrough);
+	for(d=0;d<3;d++){
+		printf("Phase ID= %d \n",npix);
+		printf("Number accessible from first surface = %ld \n",ntop[d]);
+		printf("Number contained in through pathways= %ld \n",nthrough[d]);
+		fileperc=fopen(ppsname,"a");
+		mass_burn=0.0;
+		mass_burn+=specgrav[C3S]*count[C3S];
+		mass_burn+=specgrav[C2S]*count[C2S];
+		mass_burn+=specgrav[C3A]*count[C3A];
+		mass_burn+=specgrav[C4AF]*count[C4AF];
+		alpha_burn=1.-(mass_burn/cemmass);
+		con_frac=0.0;
+		if(nphc>0){
+			con_frac=(float)nthrough[d]/(float)nphc;
+		}
+		fprintf(fileperc,"%d %f %f %ld %ld %f\n",cyccnt,time_cur+(2.*(float)(cyccnt)-1.0)*beta/krate,alpha_burn,nthrough[d],nphc,con_frac);
+		fclose(fileperc);
+		pflag[d]=(nthrough[d]>0)?1:0;
+	}
+}
+
+/* routine to assess the percolation of the solids (set point) in the */
+/* three directions and append the three lines of burnset to the .pts */
+/* file; sflag[d] is set to 1 if more than 98.5% of the solids are */
+/* connected in direction d */
+/* Called by main program */
+/* Calls perclabel */
+void percset(sflag)
+	int sflag[3];
+{
+	long int ntop[3],nthrough[3],count_solid;
+	int d;
+	float mass_burn,alpha_burn,con_frac;
+	FILE *percfile;
+
+	perclabel(PERCSET,0,ntop,nthrough);
+	for(d=0;d<3;d++){
+		printf("Phase ID= Solid Phases \n");
+		printf("Number accessible from first surface = %ld \n",ntop[d]);
+		printf("Number contained in through pathways= %ld \n",nthrough[d]);
+		percfile=fopen(ptsname,"a");
+		mass_burn=0.0;
+		mass_burn+=specgrav[C3S]*count[C3S];
+		mass_burn+=specgrav[C2S]*count[C2S];
+		mass_burn+=specgrav[C3A]*count[C3A];
+		mass_burn+=specgrav[C4AF]*count[C4AF];
+		alpha_burn=1.-(mass_burn/cemmass);
+		con_frac=0.0;
+		count_solid=count[C3S]+count[C2S]+count[C3A]+count[C4AF]+count[ETTR]+count[CSH]+count[C3AH6]+count[ETTRC4AF]+count[POZZ]+count[ASG]+count[SLAG]+count[CAS2];
+		if(count_solid>0){
+			con_frac=(float)nthrough[d]/(float)count_solid;
+		}
+		fprintf(percfile,"%d  %f %f  %ld %d %f\n",cyccnt,time_cur+(2.*(float)(cyccnt)-1.0)*beta/krate,alpha_burn,nthrough[d],count[C3S]+count[C2S]+count[C3A]+count[C4AF]+count[CAS2]+count[SLAG]+count[ASG]+count[POZZ]+count[ETTR]+count[C3AH6]+count[ETTRC4AF]+count[CSH],con_frac);
+		fclose(percfile);
+		sflag[d]=(con_frac>0.985)?1:0;
+	}
+}
@@ -7,33 +7,35 @@
 #define MAX(a,b) (a>b)?a:b
 #define MIN(a,b) (a<b)?a:b
 
+/* Shuffle table state, at file scope so that it can be checkpointed */
+static int ran1_iv[NTAB],ran1_iy=0;
+
 double ran1(idum)
 int *idum;
 {
         int j,k;
-	static int iv[NTAB],iy=0;
 	void nrerror();
         static double NDIV = 1.0/(1.0+(IM-1.0)/NTAB);
         static double RNMX = (1.0-EPS);
         static double AM = (1.0/IM);
 
-	if ((*idum <= 0) || (iy == 0)) {
+	if ((*idum <= 0) || (ran1_iy == 0)) {
 		*idum = MAX(-*idum,*idum);
                 for(j=NTAB+7;j>=0;j--) {
 			k = *idum/IQ;
 			*idum = IA*(*idum-k*IQ)-IR*k;
 			if(*idum < 0) *idum += IM;
-			if(j < NTAB) iv[j] = *idum;
+			if(j < NTAB) ran1_iv[j] = *idum;
 		}
-		iy = iv[0];
+		ran1_iy = ran1_iv[0];
 	}
 	k = *idum/IQ;
 	*idum = IA*(*idum-k*IQ)-IR*k;
 	if(*idum<0) *idum += IM;
-	j = iy*NDIV;
-	iy = iv[j];
-	iv[j] = *idum;
-	return MIN(AM*iy,RNMX);
+	j = ran1_iy*NDIV;
+	ran1_iy = ran1_iv[j];
+	ran1_iv[j] = *idum;
+	return MIN(AM*ran1_iy,RNMX);
 }
 #undef IA 
 #undef IM 
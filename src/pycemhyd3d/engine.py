@@ -0,0 +1,393 @@
+'''In-process engine bindings: run the tools from shared libraries.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    On Linux, `setup.py build_exe` also builds `libgenpartnew.so`,
+    `libdistrib3d.so` and `libdisrealnew.so` (the tool sources compiled with
+    `cempy3d/engine.c`). This module calls them through `ctypes`:
+
+        image, particles = genpartnew(id, gp_cfg, cwd)
+        phase = distrib3d(id, d3_cfg, image, cwd)
+        final = disrealnew(id, dr_cfg, phase, particles, cwd)
+
+    Configurations are the same dicts as for `run_cemhyd3d`. Images are
+    `int32` arrays of shape `(S, S, S)` in the layout of `io.read_text`, and
+    are handed to the tools in memory: no intermediate image is formatted or
+    parsed as text. Everything else the tools produce (logs, disrealnew's
+    series and snapshots, ...) is still written into `cwd`. A pipeline keeps
+    one `Worker` for its three stages:
+
+        with Worker(lib_dir, system_size) as worker:
+            worker.run("genpartnew", text, cwd, log, {img_name: "image", ...})
+            worker.image("image")          # shared view, no copy
+
+    `run_cemhyd3d(..., engine="lib")` uses a `Worker`; `engine="auto"` uses
+    one when `available()` and falls back to the executables.
+
+    Every function takes a `system_size` (default `SYSIZE`, 100); images are
+    then `(system_size,) * 3` arrays and the libraries built for that size
+    (`libgenpartnew_s50.so`, ..., see `utils.tool_name`) are used.
+
+Notes:
+    - The tools run in a worker process forked once by the library
+      (`cem_worker_start` in `engine.c`) and fed requests over a pipe; a
+      `Worker` serves every stage of one pipeline run, each tool at most
+      once, so every tool starts from the initial C globals (the library
+      code never runs in the Python process). The images live in slots of
+      an anonymous shared mapping (`Worker.image`): genpartnew writes into
+      a slot that distrib3d reads, and so on, without copies.
+    - The worker enters `cwd` (the tools open their data files by relative
+      name) and sends its file descriptors 1 and 2 to the log, so also the
+      output of the commands a tool runs with `system()`. The working
+      directory and streams of the Python process are never changed, and
+      whatever a tool leaves allocated or open goes away with the worker.
+    - `Worker.write_image` writes a slot in the tools' own text format from
+      C; it releases the GIL, so the text files can be written by a thread
+      while the next stage runs.
+    - `genpartnew`, `distrib3d`, `disrealnew` and `run_tool` start a worker
+      per call and copy the arrays in and out of its slots.
+    - There is no live progress or watchdog: the log is complete when the
+      call returns. A crash inside the tool (e.g. a segfault) is reported as
+      a `CalledProcessError` with the negative signal number, as for the
+      executables.
+    - Requires NumPy and a POSIX C library (`fmemopen`, `fork`, `dup2`).
+'''
+import ctypes
+import mmap
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from .builders import (
+    _build_genpartnew_from_dict,
+    _build_distrib3d_from_dict,
+    _build_disrealnew_from_dict,
+)
+from .utils import DEFAULT_SYSTEM_SIZE, is_windows, tool_name
+
+SYSIZE = DEFAULT_SYSTEM_SIZE
+TOOLS = ("genpartnew", "distrib3d", "disrealnew")
+# Name under which disrealnew hands back its final microstructure
+FINAL_IMAGE = "@final"
+# Image slots of a worker's shared mapping
+SLOTS = ("image", "particles", "phase", "final")
+
+_LIB_DIR = Path(__file__).parent / "cempy3d"
+_LOCK = threading.Lock()
+_LIBS: dict[str, ctypes.CDLL] = {}
+
+# Limits of `struct cem_request` in engine.c
+_MAX_IMAGES = 8
+_PATH_MAX = 4096
+_NAME_MAX = 256
+
+
+class EngineError(RuntimeError):
+    '''Raised when a shared library is missing or could not be run.'''
+
+
+class _Request(ctypes.Structure):
+    '''`struct cem_request` of engine.c; the menu answers follow it.'''
+    _fields_ = [("tool", ctypes.c_int),
+                ("nimages", ctypes.c_int),
+                ("slots", ctypes.c_int * _MAX_IMAGES),
+                ("input_len", ctypes.c_size_t),
+                ("cwd", ctypes.c_char * _PATH_MAX),
+                ("log_path", ctypes.c_char * _PATH_MAX),
+                ("names", (ctypes.c_char * _NAME_MAX) * _MAX_IMAGES)]
+
+
+def lib_path(tool: str, lib_dir: str | Path | None = None,
+             system_size: int = SYSIZE) -> Path:
+    '''Return the shared library path of `tool` (built for `system_size`)
+    in `lib_dir`.'''
+    suffix = ".dylib" if sys.platform == "darwin" else ".so"
+    return Path(lib_dir or _LIB_DIR) / f"lib{tool_name(tool, system_size)}{suffix}"
+
+
+def available(lib_dir: str | Path | None = None, tools=TOOLS,
+              system_size: int = SYSIZE) -> bool:
+    '''True if the libraries of all `tools` exist and can be used here.'''
+    if is_windows():
+        return False
+    return all(lib_path(tool, lib_dir, system_size).is_file() for tool in tools)
+
+
+def _library(tool: str, lib_dir: str | Path | None, system_size: int) -> ctypes.CDLL:
+    '''Return the library of `tool`, loading it on first use.'''
+    path = lib_path(tool, lib_dir, system_size)
+    if is_windows() or not path.is_file():
+        raise EngineError(f"[{tool}] Shared library not available: {path}")
+    key = str(path.resolve())
+    with _LOCK:
+        lib = _LIBS.get(key)
+        if lib is None:
+            lib = ctypes.CDLL(key)
+            start = lib.cem_worker_start
+            start.restype = ctypes.c_int
+            start.argtypes = [ctypes.POINTER(ctypes.c_void_p), ctypes.c_int,
+                              ctypes.c_void_p, ctypes.c_size_t,
+                              ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                              ctypes.POINTER(ctypes.c_int)]
+            write = lib.cem_write_image
+            write.restype = ctypes.c_int
+            write.argtypes = [ctypes.c_char_p, ctypes.c_void_p, ctypes.c_size_t,
+                              ctypes.c_int]
+            _LIBS[key] = lib
+    return lib
+
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+class Worker:
+    '''Worker process running the tools of one pipeline run.
+
+    Args:
+        lib_dir: Folder holding the libraries (default: the package's
+            `cempy3d/`).
+        system_size: Lattice edge length the libraries were built for.
+        tools: Tools the worker can run, each at most once.
+
+    Raises:
+        EngineError: if a library is missing or the worker could not start.
+
+    Use as a context manager, or call `close()`.
+    '''
+
+    def __init__(self, lib_dir: str | Path | None = None,
+                 system_size: int = SYSIZE, tools=TOOLS):
+        self.system_size = system_size
+        self.tools = tuple(tools)
+        self._libs = [_library(tool, lib_dir, system_size) for tool in self.tools]
+        self._paths = [str(lib_path(tool, lib_dir, system_size)) for tool in self.tools]
+        n = system_size ** 3
+        # anonymous and shared: the worker forked below sees the same pages
+        self._mapping = mmap.mmap(-1, len(SLOTS) * n * 4)
+        self._slots = np.frombuffer(self._mapping, dtype=np.int32).reshape(len(SLOTS), n)
+        entries = (ctypes.c_void_p * len(self._libs))(
+            *(ctypes.cast(lib.cem_call, ctypes.c_void_p).value for lib in self._libs))
+        req_fd, resp_fd, pid = ctypes.c_int(-1), ctypes.c_int(-1), ctypes.c_int(0)
+        status = self._libs[0].cem_worker_start(
+            entries, len(self._libs), self._slots.ctypes.data, n,
+            ctypes.byref(req_fd), ctypes.byref(resp_fd), ctypes.byref(pid))
+        if status:
+            raise EngineError("Could not start the worker process")
+        self._req_fd, self._resp_fd, self.pid = req_fd.value, resp_fd.value, pid.value
+        self._ran: set[str] = set()
+        self._lock = threading.Lock()
+
+    def image(self, slot: str) -> np.ndarray:
+        '''Shared `(S, S, S)` int32 view of the image `slot` (see `SLOTS`).'''
+        return self._slots[SLOTS.index(slot)].reshape((self.system_size,) * 3)
+
+    def run(self, tool: str, stdin_text: str, cwd: str | Path,
+            log_path: str | Path, images: dict | None = None):
+        '''Run `tool` in the worker.
+
+        Args:
+            tool: One of the worker's `tools`.
+            stdin_text: Menu answers, as built by `builders.py`.
+            cwd: Working directory of the tool.
+            log_path: File receiving the tool's standard output and error.
+            images: `{file name: slot}`. When the tool reads or writes an
+                image of that name (as given in `stdin_text`), it uses the
+                slot instead of the file.
+
+        Raises:
+            EngineError: if the tool already ran in this worker, or could
+                not start.
+            subprocess.CalledProcessError: if the tool called `exit()` with
+                a non-zero status, or was killed by a signal (negative
+                status).
+        '''
+        images = images or {}
+        if tool not in self.tools:
+            raise EngineError(f"[{tool}] Not served by this worker")
+        if tool in self._ran:
+            raise EngineError(f"[{tool}] Already ran in this worker")
+        cwd, log_path = Path(cwd).resolve(), Path(log_path).resolve()
+        if len(images) > _MAX_IMAGES \
+                or any(len(name.encode()) >= _NAME_MAX for name in images) \
+                or len(str(cwd).encode()) >= _PATH_MAX \
+                or len(str(log_path).encode()) >= _PATH_MAX:
+            raise ValueError(f"[{tool}] Too many or too long image names or paths")
+        payload = stdin_text.encode("utf-8")
+        req = _Request(tool=self.tools.index(tool), nimages=len(images),
+                       input_len=len(payload), cwd=str(cwd).encode(),
+                       log_path=str(log_path).encode())
+        for i, (name, slot) in enumerate(images.items()):
+            req.slots[i] = SLOTS.index(slot)
+            req.names[i].value = name.encode()
+
+        with self._lock:
+            self._ran.add(tool)
+            try:
+                _write_all(self._req_fd, bytes(req) + payload)
+                reply = os.read(self._resp_fd, 4)
+            except BrokenPipeError:
+                reply = b""
+        if len(reply) < 4:
+            self._died(tool)
+        status = int.from_bytes(reply, sys.byteorder, signed=True)
+        path = self._paths[self.tools.index(tool)]
+        if status == -1:
+            raise EngineError(f"[{tool}] Could not open the input or the log {log_path}")
+        if status == -3:
+            raise EngineError(f"[{tool}] Could not enter the working directory {cwd}")
+        if status:
+            raise subprocess.CalledProcessError(status, [path])
+
+    def _died(self, tool: str):
+        '''Reap a worker that stopped answering and raise.'''
+        _, wstatus = os.waitpid(self.pid, 0)
+        self.pid = 0
+        path = self._paths[self.tools.index(tool)]
+        if os.WIFSIGNALED(wstatus):
+            raise subprocess.CalledProcessError(-os.WTERMSIG(wstatus), [path])
+        raise EngineError(f"[{tool}] Worker process exited unexpectedly")
+
+    def write_image(self, path: str | Path, slot: str, width: int = 0):
+        '''Write the image `slot` to `path` in the tools' text format: one
+        value per line, with a minimum field `width` (distrib3d uses 2).
+
+        Runs in C without the GIL; safe to call from another thread while
+        the worker runs a stage that does not write `slot`.
+        '''
+        data = self._slots[SLOTS.index(slot)]
+        if self._libs[0].cem_write_image(str(path).encode(), data.ctypes.data,
+                                         data.size, width):
+            raise OSError(f"Could not write image {path}")
+
+    def close(self):
+        '''Stop the worker process and wait for it.'''
+        if self._req_fd >= 0:
+            os.close(self._req_fd)
+            os.close(self._resp_fd)
+            self._req_fd = self._resp_fd = -1
+        if self.pid:
+            os.waitpid(self.pid, 0)
+            self.pid = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_tool(tool: str,
+             stdin_text: str,
+             cwd: str | Path,
+             log_path: str | Path,
+             images: dict | None = None,
+             lib_dir: str | Path | None = None,
+             system_size: int = SYSIZE):
+    '''Run one tool from its shared library, in a worker of its own.
+
+    Args:
+        tool: "genpartnew", "distrib3d" or "disrealnew".
+        stdin_text: Menu answers, as built by `builders.py`.
+        cwd: Working directory of the tool.
+        log_path: File receiving the tool's standard output and error.
+        images: `{file name: int32 array of system_size^3 values}`. When the tool reads
+            or writes an image of that name (as given in `stdin_text`), it
+            uses the array instead of the file. Output arrays are filled in
+            place.
+        lib_dir: Folder holding the libraries (default: the package's
+            `cempy3d/`).
+        system_size: Lattice edge length the library was built for.
+
+    Raises:
+        EngineError: if the library is missing or the tool could not start.
+        subprocess.CalledProcessError: if the tool called `exit()` with a
+            non-zero status, or was killed by a signal (negative status).
+    '''
+    images = images or {}
+    if len(images) > len(SLOTS):
+        raise ValueError(f"[{tool}] At most {len(SLOTS)} images")
+    for name, arr in images.items():
+        if arr.dtype != np.int32 or not arr.flags.c_contiguous \
+                or arr.size != system_size ** 3:
+            raise ValueError(f"[{tool}] Image {name!r} must be a C-contiguous "
+                             f"int32 array of {system_size}^3 values")
+    slots = dict(zip(images, SLOTS))
+    with Worker(lib_dir, system_size, (tool,)) as worker:
+        for name, slot in slots.items():
+            worker.image(slot).reshape(-1)[:] = images[name]
+        worker.run(tool, stdin_text, cwd, log_path, slots)
+        for name, slot in slots.items():
+            images[name][:] = worker.image(slot).reshape(-1)
+
+
+def _new_image(system_size: int) -> np.ndarray:
+    return np.zeros(system_size ** 3, dtype=np.int32)
+
+
+def _as_image(arr) -> np.ndarray:
+    return np.ascontiguousarray(arr, dtype=np.int32).reshape(-1)
+
+
+def genpartnew(id: str, cfg: dict, cwd: str | Path,
+               lib_dir: str | Path | None = None,
+               system_size: int = SYSIZE) -> tuple[np.ndarray, np.ndarray]:
+    '''Place the particles; return `(image, particle_ids)` arrays.
+
+    The log goes to `<cwd>/genpartnew_<id>.out`; the two images are not
+    written to disk.
+    '''
+    image, particles = _new_image(system_size), _new_image(system_size)
+    images = {
+        cfg.get("out_image", "cem140w04floc_{ID}.img").format(ID=id): image,
+        cfg.get("out_particle_ids", "pcem140w04floc_{ID}.img").format(ID=id): particles,
+    }
+    run_tool("genpartnew", _build_genpartnew_from_dict(id, cfg).rstrip() + "\n",
+             cwd, Path(cwd) / f"genpartnew_{id}.out", images, lib_dir, system_size)
+    shape = (system_size,) * 3
+    return image.reshape(shape), particles.reshape(shape)
+
+
+def distrib3d(id: str, cfg: dict, image, cwd: str | Path,
+              lib_dir: str | Path | None = None,
+              system_size: int = SYSIZE) -> np.ndarray:
+    '''Distribute the clinker phases over `image`; return the phase image.
+
+    The correlation files are read from `cwd`; the log goes to
+    `<cwd>/distrib3d_<id>.out`.
+    '''
+    phase = _new_image(system_size)
+    images = {
+        cfg["in_name"].format(ID=id): _as_image(image),
+        cfg["out_name"].format(ID=id): phase,
+    }
+    run_tool("distrib3d", _build_distrib3d_from_dict(id, "", cfg).rstrip() + "\n",
+             cwd, Path(cwd) / f"distrib3d_{id}.out", images, lib_dir, system_size)
+    return phase.reshape((system_size,) * 3)
+
+
+def disrealnew(id: str, cfg: dict, phase, particles, cwd: str | Path,
+               lib_dir: str | Path | None = None,
+               system_size: int = SYSIZE) -> np.ndarray:
+    '''Hydrate `phase`/`particles`; return the final microstructure.
+
+    All disrealnew outputs (series, snapshots, final image) are written into
+    `cwd` as usual; the log goes to `<cwd>/disrealnew_<id>.out`.
+    '''
+    final = _new_image(system_size)
+    images = {
+        cfg["phase_file"].format(ID=id): _as_image(phase),
+        cfg["part_file"].format(ID=id): _as_image(particles),
+        FINAL_IMAGE: final,
+    }
+    run_tool("disrealnew", _build_disrealnew_from_dict(id, "", cfg),
+             cwd, Path(cwd) / f"disrealnew_{id}.out", images, lib_dir, system_size)
+    return final.reshape((system_size,) * 3)
@@ -0,0 +1,434 @@
+'''Seed ensembles: replicate runs reduced to streaming statistics.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    CEMHYD3D is stochastic: every tool draws from `ran1` seeded by the
+    `seed` of its config. `run_ensemble(id, gp_cfg, d3_cfg, dr_cfg, seeds)`
+    runs one replicate per seed on a process pool and folds the time series
+    of each replicate into an `EnsembleStats` as soon as it finishes, so
+    confidence bands are available without a separate reduction pass:
+
+        stats = run_ensemble("01", gp_cfg, d3_cfg, dr_cfg, seeds=50,
+                             max_workers=8, keep_replicates=False)
+        band = stats.summary("heat")
+        band["mean"][:, band["fields"].index("heat4_kJ_kg_solid")]
+
+    `EnsembleStats` keeps, per series (`.heat`, `.chs` and the phase
+    fractions of `.pha` by default) and per (cycle, column) cell, a running
+    mean and variance (`RunningStats`, Welford's update) and a quantile
+    sketch (`QuantileSketch`). With `keep_replicates=False` each replicate
+    folder is deleted once it has been folded in; the reduced statistics are
+    written to `<results_root>/ensemble_<id>/ensemble.npz`
+    (`load_ensemble`).
+
+Notes:
+    - `seeds=N` runs N replicates; replicate i uses the seeds of the base
+      configs, made negative, minus i (replicate 0 is the base run). An
+      explicit list of seeds sets the seed of every varied stage to
+      `-abs(seed)`; a `(gp, d3, dr)` tuple sets the three stages
+      separately. Seeds are always negative, as `ran1` needs to start; a
+      seed of 0 is rejected.
+    - `vary=` restricts the seeds to some stages, e.g.
+      `vary=("disrealnew",)` for hydration noise on one microstructure
+      (pass a `stage_cache` so it is built only once).
+    - Replicates are aligned by row (cycle); if one is shorter, the
+      statistics are truncated to the common length.
+    - Requires NumPy (`pip install pycemhyd3d[numpy]`).
+'''
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+from .cemhyd3d import _ORIG_BIN_DIR, _run_batch_job
+from .sandbox import ensure_runtime_cache
+from .series import find_series, read_series
+from .utils import caller_results_root
+
+# Stages whose config has a `seed`, in pipeline order
+SEEDED_STAGES = ("genpartnew", "distrib3d", "disrealnew")
+# Series reduced by default (`pha` is reduced to phase volume fractions)
+ENSEMBLE_SERIES = ("heat", "chs", "pha")
+DEFAULT_QUANTILES = (0.05, 0.5, 0.95)
+ENSEMBLE_NAME = "ensemble.npz"
+
+# Columns of `.pha` that are not phase counts
+_PHA_EXTRA = ("Cycle", "water_left")
+
+
+class RunningStats:
+    '''Element-wise running mean and variance of equally shaped arrays.'''
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self._m2 = None
+
+    def push(self, x):
+        '''Add one sample (Welford's update).'''
+        x = np.asarray(x, dtype=np.float64)
+        self.count += 1
+        if self.mean is None:
+            self.mean = x.copy()
+            self._m2 = np.zeros_like(x)
+            return
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    def variance(self, ddof: int = 1) -> np.ndarray:
+        '''Element-wise variance (NaN while `count <= ddof`).'''
+        if self.count <= ddof:
+            return np.full_like(self.mean, np.nan)
+        return self._m2 / (self.count - ddof)
+
+    def std(self, ddof: int = 1) -> np.ndarray:
+        '''Element-wise standard deviation.'''
+        return np.sqrt(self.variance(ddof))
+
+    def trim(self, n: int):
+        '''Keep the first `n` rows.'''
+        self.mean = self.mean[:n]
+        self._m2 = self._m2[:n]
+
+
+class QuantileSketch:
+    '''Element-wise quantile sketch of equally shaped arrays.
+
+    A KLL stack of compactors: level h holds samples of weight 2**h; when
+    a level reaches its capacity (`k` for the top level, shrinking by 2/3
+    per level below) it is sorted per element and every other sample
+    (random offset) moves up a level. Memory is about 3k samples; with
+    fewer than `k` samples the quantiles are exact.
+
+    Args:
+        k: Top compactor capacity; the rank error is about 1.5% of the
+            count for k=64 (each sample is a whole array, so memory is about
+            3k arrays).
+        seed: Seed of the compaction offsets.
+    '''
+
+    def __init__(self, k: int = 64, seed: int | None = 0):
+        if k < 2:
+            raise ValueError(f"k must be at least 2, got {k}")
+        self.k = k
+        self.count = 0
+        self._levels = []
+        self._rng = np.random.default_rng(seed)
+
+    def push(self, x):
+        '''Add one sample.'''
+        x = np.asarray(x, dtype=np.float64)[None]
+        self.count += 1
+        if not self._levels:
+            self._levels.append(x.copy())
+        else:
+            self._levels[0] = np.concatenate([self._levels[0], x])
+        h = 0
+        while h < len(self._levels) and len(self._levels[h]) >= self._capacity(h):
+            buf = np.sort(self._levels[h], axis=0)
+            even = len(buf) - len(buf) % 2
+            up = buf[self._rng.integers(2):even:2]
+            self._levels[h] = buf[even:]
+            if h + 1 == len(self._levels):
+                self._levels.append(up)
+            else:
+                self._levels[h + 1] = np.concatenate([self._levels[h + 1], up])
+            h += 1
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self._levels) - 1 - h
+        return max(2, int(self.k * (2 / 3) ** depth))
+
+    def quantile(self, q) -> np.ndarray:
+        '''Element-wise quantile(s) `q` in [0, 1] (inverse of the weighted
+        empirical CDF); a sequence of `q` adds a leading axis.'''
+        if not self.count:
+            raise ValueError("Empty sketch")
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h)
+                                  for h, level in enumerate(self._levels)])
+        order = np.argsort(items, axis=0)
+        items = np.take_along_axis(items, order, axis=0)
+        cum = np.cumsum(weights[order], axis=0)
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        out = np.empty((len(qs),) + items.shape[1:])
+        for i, qi in enumerate(qs):
+            idx = np.argmax(cum >= qi * cum[-1:], axis=0)
+            out[i] = np.take_along_axis(items, idx[None], axis=0)[0]
+        return out if np.ndim(q) else out[0]
+
+    def trim(self, n: int):
+        '''Keep the first `n` rows.'''
+        self._levels = [level[:, :n] for level in self._levels]
+
+
+def _values(ext: str, arr: np.ndarray) -> tuple[list[str], np.ndarray]:
+    '''Field names and `(rows, fields)` float matrix of a series (without
+    `Cycle`); `.pha` counts become volume fractions.'''
+    fields = [n for n in arr.dtype.names if n != "Cycle"]
+    if ext == "pha":
+        fields = [n for n in arr.dtype.names if n not in _PHA_EXTRA]
+    values = np.stack([arr[n].astype(np.float64) for n in fields], axis=1)
+    if ext == "pha":
+        total = values.sum(axis=1, keepdims=True)
+        values = np.divide(values, total, out=np.zeros_like(values),
+                           where=total > 0)
+    return fields, values
+
+
+class EnsembleStats:
+    '''Streaming statistics of the time series of many replicates.
+
+    Args:
+        series: Series extensions to reduce (see `series.SERIES_EXTS`).
+        quantiles: Quantiles reported by `summary`.
+        k: Capacity of the quantile sketches.
+        seed: Seed of the quantile sketches.
+    '''
+
+    def __init__(self, series=ENSEMBLE_SERIES, quantiles=DEFAULT_QUANTILES,
+                 k: int = 64, seed: int | None = 0):
+        self.series = tuple(series)
+        self.quantiles = tuple(quantiles)
+        self.k, self.seed = k, seed
+        self.count = 0
+        self._fields, self._cycles, self._stats, self._sketches = {}, {}, {}, {}
+
+    def add(self, results_dir: str | Path):
+        '''Fold the series of one replicate results folder in.
+
+        Raises:
+            FileNotFoundError: if a reduced series is missing.
+            ValueError: if its columns differ from those seen before.
+        '''
+        found = {info["ext"]: path for path, info in find_series(results_dir)}
+        missing = [ext for ext in self.series if ext not in found]
+        if missing:
+            raise FileNotFoundError(f"No {missing} series in {results_dir}")
+        for ext in self.series:
+            arr = read_series(found[ext])
+            fields, values = _values(ext, arr)
+            if ext not in self._fields:
+                self._fields[ext] = fields
+                self._cycles[ext] = arr["Cycle"].copy()
+                self._stats[ext] = RunningStats()
+                self._sketches[ext] = QuantileSketch(self.k, self.seed)
+            elif fields != self._fields[ext]:
+                raise ValueError(f"Columns of {found[ext]} differ from the "
+                                 f"ensemble's: {fields}")
+            n = min(len(values), len(self._cycles[ext]))
+            if n < len(self._cycles[ext]):
+                self._cycles[ext] = self._cycles[ext][:n]
+                self._stats[ext].trim(n)
+                self._sketches[ext].trim(n)
+            self._stats[ext].push(values[:n])
+            self._sketches[ext].push(values[:n])
+        self.count += 1
+
+    def summary(self, ext: str) -> dict:
+        '''Statistics of one series.
+
+        Returns:
+            dict: `fields` (column names), `cycle` (1D), `count`, `mean`,
+            `std` (`(cycles, fields)`), `quantiles` (the levels) and
+            `q` (`(len(quantiles), cycles, fields)`).
+
+        Raises:
+            KeyError: if no replicate was added for `ext`.
+        '''
+        stats = self._stats[ext]
+        return {
+            "fields": list(self._fields[ext]),
+            "cycle": self._cycles[ext],
+            "count": stats.count,
+            "mean": stats.mean,
+            "std": stats.std(),
+            "quantiles": np.asarray(self.quantiles),
+            "q": self._sketches[ext].quantile(self.quantiles),
+        }
+
+    def save(self, path: str | Path) -> Path:
+        '''Write every summary to one `.npz` file (see `load_ensemble`).'''
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {}
+        for ext in self._stats:
+            for key, value in self.summary(ext).items():
+                arrays[f"{ext}/{key}"] = np.asarray(value)
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+        return path
+
+
+def load_ensemble(path: str | Path) -> dict:
+    '''Read a file written by `EnsembleStats.save`.
+
+    Returns:
+        dict: `{ext: summary dict}` (see `EnsembleStats.summary`).
+    '''
+    out = {}
+    with np.load(path) as data:
+        for key in data.files:
+            ext, name = key.split("/", 1)
+            value = data[key]
+            if name == "fields":
+                value = value.tolist()
+            elif name == "count":
+                value = int(value)
+            out.setdefault(ext, {})[name] = value
+    return out
+
+
+def _negative_seed(seed) -> int:
+    '''Return `-abs(seed)`; raise ValueError for a seed of 0.'''
+    seed = int(seed)
+    if seed == 0:
+        raise ValueError("Seeds must be non-zero (ran1 starts from a negative seed)")
+    return -abs(seed)
+
+
+def replicate_seeds(seeds, base: dict, vary=SEEDED_STAGES) -> list[dict]:
+    '''Seeds of every replicate as `{stage: seed}` dicts.
+
+    Args:
+        seeds: Number of replicates, or a list of ints / `(gp, d3, dr)`
+            tuples (see the module notes).
+        base: `{stage: base config}` of the three stages.
+        vary: Stages whose seed changes between replicates.
+
+    Raises:
+        ValueError: for an unknown stage, no replicate, or a seed of 0.
+    '''
+    unknown = [s for s in vary if s not in SEEDED_STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stages {unknown}; choose from {SEEDED_STAGES}")
+    if isinstance(seeds, int):
+        if seeds < 1:
+            raise ValueError(f"Need at least one replicate, got {seeds}")
+        start = {s: _negative_seed(base[s].get("seed", -99)) for s in vary}
+        return [{s: start[s] - i for s in vary} for i in range(seeds)]
+    out = []
+    for seed in seeds:
+        if isinstance(seed, (tuple, list)):
+            if len(seed) != len(SEEDED_STAGES):
+                raise ValueError(f"Seed tuples need {len(SEEDED_STAGES)} entries, got {seed}")
+            per_stage = dict(zip(SEEDED_STAGES, seed))
+            out.append({s: _negative_seed(per_stage[s]) for s in vary})
+        else:
+            out.append({s: _negative_seed(seed) for s in vary})
+    if not out:
+        raise ValueError("Need at least one replicate")
+    return out
+
+
+def run_ensemble(id: str,
+                 genpartnew_input: dict,
+                 distrib3d_input: dict,
+                 disrealnew_input: dict,
+                 seeds,
+                 vary=SEEDED_STAGES,
+                 max_workers: int | None = None,
+                 keep_replicates: bool = True,
+                 results_root: str | Path | None = None,
+                 series=ENSEMBLE_SERIES,
+                 quantiles=DEFAULT_QUANTILES,
+                 sketch_k: int = 64,
+                 **kwargs) -> EnsembleStats:
+    '''Run seed replicates of one configuration and reduce them online.
+
+    Args:
+        id: Ensemble identifier; replicate i runs as `<id>_r<i>`.
+        genpartnew_input, distrib3d_input, disrealnew_input: Base dict
+            configs (as for `run_cemhyd3d`).
+        seeds: Number of replicates or list of seeds (see module notes).
+        vary: Stages whose seed changes between replicates.
+        max_workers: Number of worker processes (default: `os.cpu_count()`).
+        keep_replicates: Keep the `result_<id>_r<i>/` folders; if False,
+            each is deleted once folded into the statistics.
+        results_root: Parent of the replicate and ensemble folders (default:
+            `results/` next to the caller script).
+        series: Series extensions to reduce.
+        quantiles: Quantiles reported by the statistics.
+        sketch_k: Capacity of the quantile sketches.
+        **kwargs: Forwarded to every `run_cemhyd3d` call (e.g.
+            `stage_cache`, `engine`, `system_size`).
+
+    Side effects:
+        - Writes `<results_root>/ensemble_<id>/ensemble.npz` and
+          `replicates.json` (the seeds and status of every replicate),
+          updated as replicates finish.
+
+    Returns:
+        EnsembleStats: Statistics over the successful replicates.
+
+    Raises:
+        ValueError: if the seeds are invalid.
+        RuntimeError: if any replicate failed, after all have finished and
+            the statistics of the others are saved; the first failure is
+            chained as the cause. Failed replicate folders are kept.
+    '''
+    if results_root is None:
+        results_root = caller_results_root()
+    results_root = Path(results_root).resolve()
+    base = dict(zip(SEEDED_STAGES,
+                    (genpartnew_input, distrib3d_input, disrealnew_input)))
+    replicates = replicate_seeds(seeds, base, vary)
+    width = len(str(len(replicates) - 1))
+
+    jobs = []
+    for i, rep in enumerate(replicates):
+        cfgs = {s: {**cfg, "seed": rep[s]} if s in rep else cfg
+                for s, cfg in base.items()}
+        jobs.append({"results_root": results_root, **kwargs,
+                     "id": f"{id}_r{i:0{width}d}",
+                     "genpartnew_input": cfgs["genpartnew"],
+                     "distrib3d_input": cfgs["distrib3d"],
+                     "disrealnew_input": cfgs["disrealnew"]})
+
+    ens_dir = results_root / f"ensemble_{id}"
+    ens_dir.mkdir(parents=True, exist_ok=True)
+    record = {job["id"]: {"seeds": rep, "status": "pending"}
+              for job, rep in zip(jobs, replicates)}
+    stats = EnsembleStats(series, quantiles, sketch_k)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    # stage the shared runtime once, before the workers race for it
+    ensure_runtime_cache(_ORIG_BIN_DIR, kwargs.get("cache_root"))
+
+    failures = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_run_batch_job, job): job for job in jobs}
+        for fut in as_completed(futures):
+            job = futures[fut]
+            try:
+                results_dir = fut.result()
+                stats.add(results_dir)
+            except Exception as exc:
+                failures.append((job["id"], exc))
+                record[job["id"]]["status"] = "failed"
+                print(f"❌ [ensemble] Replicate {job['id']} failed: {exc!r}")
+                continue
+            record[job["id"]]["status"] = "done"
+            if not keep_replicates:
+                shutil.rmtree(results_dir, ignore_errors=True)
+            stats.save(ens_dir / ENSEMBLE_NAME)
+            (ens_dir / "replicates.json").write_text(json.dumps(record, indent=2))
+            print(f"[ensemble] {stats.count} of {len(jobs)} replicates of {id} reduced")
+
+    (ens_dir / "replicates.json").write_text(json.dumps(record, indent=2))
+    if failures:
+        failed = ", ".join(str(rid) for rid, _ in failures)
+        raise RuntimeError(
+            f"{len(failures)} of {len(jobs)} replicates failed: {failed}"
+        ) from failures[0][1]
+    print(f"✅ Ensemble completed: {stats.count} replicates of {id} in {ens_dir}")
+    return stats
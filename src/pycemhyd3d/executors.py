@@ -1,189 +1,273 @@
-'''Process execution helpers for pycemhyd3d.
-
-Author:
-    Omid Jahromi <omid.esmaeelipoor@gmail.com>
-
-Overview:
-    These functions encapsulate low-level details of invoking the native
-    executables (`genpartnew`, `distrib3d`, `disrealnew`), writing temporary
-    stdin files, choosing correct working directories, and mirroring outputs.
-
-Conventions:
-    - Each function accepts already-rendered stdin payloads (strings).
-    - Working directories:
-        * genpartnew: runs in the per-run sandbox (`cwd=run_dir`)
-        * distrib3d: runs in the executable folder (`cwd=bin_dir`)
-        * disrealnew: runs in the executable folder (`cwd=bin_dir`)
-    - Logs are written as `<tool>_<id>.out` inside the sandbox.
-'''
-import os
-import shutil
-import subprocess
-from pathlib import Path
-from tempfile import NamedTemporaryFile
-
-
-def run_genpartnew(id: str,
-                   genpartnew_input: str,
-                   exe: Path,
-                   run_dir: Path,
-                   results_dir: Path,
-                   part_name: str):
-    '''Run `genpartnew` with the given stdin payload.
-
-    Args:
-        id: Identifier used for log/IO filenames.
-        genpartnew_input: Text to send to stdin.
-        exe: Path to the genpartnew executable.
-        run_dir: Per-run sandbox directory (working directory).
-        results_dir: Destination where selected outputs are copied.
-        part_name: Expected name of the particle-ID image produced.
-
-    Effects:
-        - Writes a temp stdin file, captures combined stdout+stderr into
-          `genpartnew_<id>.out`, and copies key outputs into `results_dir`.
-        - Removes the temp stdin file on success/failure.
-
-    Returns:
-        str: `part_name` (for downstream use).
-    '''
-    with NamedTemporaryFile('w+', delete=False) as f:
-        f.write(genpartnew_input.rstrip() + "\n")
-        temp_in = f.name
-    log_path = run_dir / f"genpartnew_{id}.out"
-    with open(temp_in, "rb") as fin, open(log_path, "wb") as flog:
-        subprocess.run([str(exe)], stdin=fin, stdout=flog, stderr=subprocess.STDOUT,
-                       check=True, cwd=run_dir)
-    try:
-        os.remove(temp_in)
-    except OSError:
-        pass
-    for name in [f"cem140w04floc_{id}.img",
-                 f"pcem140w04floc_{id}.img",
-                 f"genpartnew_{id}.out"]:
-        src = run_dir / name
-        if src.exists():
-            shutil.copy2(src, results_dir / name)
-    print(f"[genpartnew] Per-run outputs in: {run_dir}")
-    print(f"[genpartnew] Copied to results folder: {results_dir}")
-    return part_name
-
-
-def run_distrib3d(id: str,
-                  distrib3d_input: str,
-                  exe2: Path,
-                  bin_dir: Path,
-                  run_dir: Path,
-                  results_dir: Path,
-                  phase_name: str):
-    '''Run `distrib3d` with the given stdin payload.
-
-    Args:
-        id: Identifier used for log/IO filenames.
-        distrib3d_input: Text to send to stdin.
-        exe2: Path to the distrib3d executable.
-        bin_dir: Folder containing the executables (working directory).
-        run_dir: Per-run sandbox directory (holds produced files).
-        results_dir: Destination where outputs are copied.
-        phase_name: Expected output phase image filename.
-
-    Effects:
-        - Writes a temp stdin file, logs to `distrib3d_<id>.out`, and copies
-          the phase image + log to `results_dir`.
-
-    Returns:
-        str: `phase_name` (for downstream use).
-    '''
-    with NamedTemporaryFile('w+', delete=False) as f:
-        f.write(distrib3d_input.rstrip() + "\n")
-        temp_in2 = f.name
-    log_path2 = run_dir / f"distrib3d_{id}.out"
-    with open(temp_in2, "rb") as fin, open(log_path2, "wb") as flog:
-        subprocess.run([str(exe2)], stdin=fin, stdout=flog, stderr=subprocess.STDOUT,
-                       check=True, cwd=bin_dir)
-    try:
-        os.remove(temp_in2)
-    except OSError:
-        pass
-    for name in [phase_name, f"distrib3d_{id}.out"]:
-        src = run_dir / name
-        if src.exists():
-            shutil.copy2(src, results_dir / name)
-    print(f"[distrib3d] Used sandbox: {run_dir}")
-    print(f"[distrib3d] Copied outputs to: {results_dir}")
-    return phase_name
-
-
-def run_disrealnew(id: str,
-                   disrealnew_input: str,
-                   exe3: Path,
-                   bin_dir: Path,
-                   run_dir: Path,
-                   results_dir: Path,
-                   phase_name: str,
-                   part_name: str):
-    '''Run `disrealnew` with the given stdin payload and finalize outputs.
-
-    Preconditions:
-        - `{run_dir}/{phase_name}` and `{run_dir}/{part_name}` must exist.
-
-    Args:
-        id: Identifier used for log/IO filenames.
-        disrealnew_input: Text to send to stdin.
-        exe3: Path to the disrealnew executable.
-        bin_dir: Folder containing the executables (working directory).
-        run_dir: Per-run sandbox directory (source for final mirroring).
-        results_dir: Final results directory (destination).
-        phase_name: Name of the phase microstructure file.
-        part_name: Name of the particle-ID microstructure file.
-
-    Effects:
-        - Runs disrealnew, moves any **new files** created in `bin_dir` into
-          `run_dir`, mirrors the entire sandbox into `results_dir`, then
-          removes the sandbox.
-
-    Returns:
-        pathlib.Path: The `results_dir` path.
-
-    Raises:
-        FileNotFoundError: if required inputs are missing in `run_dir`.
-    '''
-    phase_path = run_dir / phase_name
-    part_path = run_dir / part_name
-    if not phase_path.exists():
-        raise FileNotFoundError(f"[disrealnew] Missing phase microstructure in sandbox: {phase_path}")
-    if not part_path.exists():
-        raise FileNotFoundError(f"[disrealnew] Missing particle-ID microstructure in sandbox: {part_path}")
-
-    pre_files = {p.name for p in bin_dir.iterdir() if p.is_file()}
-    with NamedTemporaryFile('w+', delete=False) as f:
-        f.write(disrealnew_input)
-        temp_in3 = f.name
-    log_path3 = run_dir / f"disrealnew_{id}.out"
-    with open(temp_in3, "rb") as fin, open(log_path3, "wb") as flog:
-        subprocess.run([str(exe3)], stdin=fin, stdout=flog, stderr=subprocess.STDOUT,
-                       check=True, cwd=bin_dir)
-    try:
-        os.remove(temp_in3)
-    except OSError:
-        pass
-
-    post_files = {p.name for p in bin_dir.iterdir() if p.is_file()}
-    for name in sorted(post_files - pre_files):
-        if name in {phase_name, part_name}:
-            continue
-        shutil.move(str(bin_dir / name), str(run_dir / name))
-    print(f"[disrealnew] Completed in sandbox: {run_dir}")
-
-    # === finalize ===
-    for item in run_dir.iterdir():
-        dst = results_dir / item.name
-        if item.is_dir():
-            shutil.copytree(item, dst, dirs_exist_ok=True)
-        else:
-            shutil.copy2(item, dst)
-    shutil.rmtree(run_dir, ignore_errors=True)
-    print(f"[finalize] Copied all sandbox files to: {results_dir}")
-    print(f"[finalize] Removed sandbox: {run_dir}")
-
-    return results_dir
+'''Process execution helpers for pycemhyd3d.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    These functions encapsulate low-level details of invoking the native
+    executables (`genpartnew`, `distrib3d`, `disrealnew`), feeding their
+    stdin, choosing correct working directories, and mirroring outputs.
+
+Conventions:
+    - Each function accepts already-rendered stdin payloads (strings).
+    - Working directory: all three tools run in the per-run sandbox
+      (`cwd=run_dir`), which holds the staged executables and data files
+      (see `sandbox.py`). Nothing is ever written next to another run.
+    - Logs are written as `<tool>_<id>.out` inside the sandbox, line by line
+      while the tool runs (see `progress.py` for progress events and the
+      stall watchdog).
+    - Stdin payloads are written straight into a pipe; no temporary files.
+    - Outputs are never written twice: intermediate images are hard-linked
+      into `results_dir`, and `finalize_sandbox` renames the sandbox files
+      into place. A copy (kernel-side `copy_file_range`/`sendfile` where
+      available) is only made when the results folder lives on another
+      filesystem than the sandbox.
+'''
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable
+
+from .progress import stream_process
+
+# Modes of `place_file` / `finalize_sandbox`
+FINALIZE_MODES = ("move", "link", "copy")
+
+
+def run_genpartnew(id: str,
+                   genpartnew_input: str,
+                   exe: Path,
+                   run_dir: Path,
+                   results_dir: Path,
+                   part_name: str,
+                   progress=None,
+                   stall_timeout: float | None = None,
+                   timeout: float | None = None,
+                   usage: dict | None = None):
+    '''Run `genpartnew` with the given stdin payload.
+
+    Args:
+        id: Identifier used for log/IO filenames.
+        genpartnew_input: Text to send to stdin.
+        exe: Path to the genpartnew executable.
+        run_dir: Per-run sandbox directory (working directory).
+        results_dir: Destination where selected outputs are copied.
+        part_name: Expected name of the particle-ID image produced.
+        progress: Optional callable receiving `progress.ProgressEvent`s.
+        stall_timeout: Kill the tool after this many seconds without
+            progress (None: never).
+        timeout: Kill the tool after this many seconds in total.
+        usage: Optional dict receiving the tool's `cpu_user`, `cpu_system`
+            and `max_rss` (see `progress.stream_process`).
+
+    Effects:
+        - Pipes the payload into stdin, streams combined stdout+stderr into
+          `genpartnew_<id>.out`, and hard-links key outputs into
+          `results_dir` (copies across filesystems).
+
+    Returns:
+        str: `part_name` (for downstream use).
+
+    Raises:
+        progress.StallError: if the watchdog killed the tool.
+        subprocess.CalledProcessError: if the tool returned non-zero.
+    '''
+    log_path = run_dir / f"genpartnew_{id}.out"
+    stream_process(exe, genpartnew_input.rstrip() + "\n", log_path, run_dir,
+                   "genpartnew", id=id, progress=progress,
+                   stall_timeout=stall_timeout, timeout=timeout, usage=usage)
+    for name in [f"cem140w04floc_{id}.img",
+                 f"pcem140w04floc_{id}.img",
+                 f"genpartnew_{id}.out"]:
+        src = run_dir / name
+        if src.exists():
+            place_file(src, results_dir / name, mode="link")
+    print(f"[genpartnew] Per-run outputs in: {run_dir}")
+    print(f"[genpartnew] Linked into results folder: {results_dir}")
+    return part_name
+
+
+def run_distrib3d(id: str,
+                  distrib3d_input: str,
+                  exe2: Path,
+                  run_dir: Path,
+                  results_dir: Path,
+                  phase_name: str,
+                  progress=None,
+                  stall_timeout: float | None = None,
+                  timeout: float | None = None,
+                  usage: dict | None = None):
+    '''Run `distrib3d` with the given stdin payload.
+
+    Args:
+        id: Identifier used for log/IO filenames.
+        distrib3d_input: Text to send to stdin.
+        exe2: Path to the distrib3d executable.
+        run_dir: Per-run sandbox directory (working directory).
+        results_dir: Destination where outputs are copied.
+        phase_name: Expected output phase image filename.
+        progress: Optional callable receiving `progress.ProgressEvent`s.
+        stall_timeout: Kill the tool after this many seconds without
+            progress (None: never).
+        timeout: Kill the tool after this many seconds in total.
+        usage: Optional dict receiving the tool's `cpu_user`, `cpu_system`
+            and `max_rss` (see `progress.stream_process`).
+
+    Effects:
+        - Pipes the payload into stdin, logs to `distrib3d_<id>.out`, and
+          hard-links the phase image + log into `results_dir`.
+
+    Returns:
+        str: `phase_name` (for downstream use).
+
+    Raises:
+        progress.StallError: if the watchdog killed the tool.
+        subprocess.CalledProcessError: if the tool returned non-zero.
+    '''
+    log_path2 = run_dir / f"distrib3d_{id}.out"
+    stream_process(exe2, distrib3d_input.rstrip() + "\n", log_path2, run_dir,
+                   "distrib3d", id=id, progress=progress,
+                   stall_timeout=stall_timeout, timeout=timeout, usage=usage)
+    for name in [phase_name, f"distrib3d_{id}.out"]:
+        src = run_dir / name
+        if src.exists():
+            place_file(src, results_dir / name, mode="link")
+    print(f"[distrib3d] Used sandbox: {run_dir}")
+    print(f"[distrib3d] Linked outputs into: {results_dir}")
+    return phase_name
+
+
+def run_disrealnew(id: str,
+                   disrealnew_input: str,
+                   exe3: Path,
+                   run_dir: Path,
+                   results_dir: Path,
+                   phase_name: str,
+                   part_name: str,
+                   exclude: Iterable[str] = (),
+                   progress=None,
+                   stall_timeout: float | None = None,
+                   timeout: float | None = None,
+                   finalize: str = "move",
+                   usage: dict | None = None):
+    '''Run `disrealnew` with the given stdin payload and finalize outputs.
+
+    Preconditions:
+        - `{run_dir}/{phase_name}` and `{run_dir}/{part_name}` must exist.
+
+    Args:
+        id: Identifier used for log/IO filenames.
+        disrealnew_input: Text to send to stdin.
+        exe3: Path to the disrealnew executable.
+        run_dir: Per-run sandbox directory (working directory and source for
+            final mirroring).
+        results_dir: Final results directory (destination).
+        phase_name: Name of the phase microstructure file.
+        part_name: Name of the particle-ID microstructure file.
+        exclude: Names in `run_dir` that are not mirrored (e.g. the staged
+            executables and data files).
+        progress: Optional callable receiving `progress.ProgressEvent`s.
+        stall_timeout: Kill the tool after this many seconds without
+            progress (None: never).
+        timeout: Kill the tool after this many seconds in total.
+        finalize: How sandbox files reach `results_dir`, see
+            `finalize_sandbox`.
+        usage: Optional dict receiving the tool's `cpu_user`, `cpu_system`
+            and `max_rss` (see `progress.stream_process`).
+
+    Effects:
+        - Runs disrealnew inside `run_dir`, moves the sandbox contents into
+          `results_dir` (except `exclude`), then removes the sandbox.
+
+    Returns:
+        pathlib.Path: The `results_dir` path.
+
+    Raises:
+        FileNotFoundError: if required inputs are missing in `run_dir`.
+        progress.StallError: if the watchdog killed the tool.
+        subprocess.CalledProcessError: if the tool returned non-zero.
+    '''
+    phase_path = run_dir / phase_name
+    part_path = run_dir / part_name
+    if not phase_path.exists():
+        raise FileNotFoundError(f"[disrealnew] Missing phase microstructure in sandbox: {phase_path}")
+    if not part_path.exists():
+        raise FileNotFoundError(f"[disrealnew] Missing particle-ID microstructure in sandbox: {part_path}")
+
+    log_path3 = run_dir / f"disrealnew_{id}.out"
+    stream_process(exe3, disrealnew_input, log_path3, run_dir, "disrealnew",
+                   id=id, progress=progress, stall_timeout=stall_timeout,
+                   timeout=timeout, usage=usage)
+    print(f"[disrealnew] Completed in sandbox: {run_dir}")
+
+    # === finalize ===
+    finalize_sandbox(run_dir, results_dir, exclude, mode=finalize)
+
+    return results_dir
+
+
+def place_file(src: Path, dst: Path, mode: str = "move"):
+    '''Put `src` at `dst` without duplicating data when possible.
+
+    Args:
+        src: Existing file.
+        dst: Destination path (replaced if it exists).
+        mode: "move" renames `src` (it is gone afterwards), "link" hard-links
+            it (both names remain), "copy" always copies. "move" and "link"
+            fall back to a copy when `dst` is on another filesystem.
+    '''
+    if mode not in FINALIZE_MODES:
+        raise ValueError(f"Unknown finalize mode {mode!r}; use one of {FINALIZE_MODES}")
+    if os.path.lexists(dst):
+        if mode != "copy" and os.path.samefile(src, dst):
+            # already linked into place (e.g. by run_genpartnew)
+            if mode == "move":
+                os.unlink(src)
+            return
+        os.unlink(dst)
+    try:
+        if mode == "move":
+            os.replace(src, dst)
+            return
+        if mode == "link":
+            os.link(src, dst)
+            return
+    except OSError:
+        pass  # cross-device (or no hard links): copy below
+    shutil.copy2(src, dst)
+    if mode == "move":
+        os.unlink(src)
+
+
+def finalize_sandbox(run_dir: Path,
+                     results_dir: Path,
+                     exclude: Iterable[str] = (),
+                     mode: str = "move"):
+    '''Move a finished sandbox into `results_dir` and remove the sandbox.
+
+    Args:
+        run_dir: Per-run sandbox directory (source).
+        results_dir: Final results directory (destination).
+        exclude: Names in `run_dir` that are not mirrored.
+        mode: "move" (default) renames every file into `results_dir`, "link"
+            hard-links, "copy" copies. See `place_file`; across filesystems
+            every mode copies.
+    '''
+    exclude = set(exclude)
+    for item in run_dir.iterdir():
+        if item.name in exclude:
+            continue
+        dst = results_dir / item.name
+        if item.is_dir() and not item.is_symlink():
+            if mode == "move" and not dst.exists():
+                try:
+                    os.replace(item, dst)
+                    continue
+                except OSError:
+                    pass
+            shutil.copytree(item, dst, dirs_exist_ok=True)
+        else:
+            place_file(item, dst, mode)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    print(f"[finalize] Moved sandbox files ({mode}) to: {results_dir}")
+    print(f"[finalize] Removed sandbox: {run_dir}")
@@ -0,0 +1,225 @@
+'''Machine-readable run manifests and stage start/end hooks.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    Every `run_cemhyd3d` (and `aio.run_cemhyd3d_async`) run writes
+    `manifest.json` into its results folder (and, optionally, appends the
+    same record as one line to a campaign-wide JSON-lines sink). The
+    manifest holds:
+
+        - `id`, `status` ("ok" or "failed"), `error`, `started`/`finished`,
+          host and Python version,
+        - `stages`: one record per stage, in execution order, with the
+          rendered stdin payload (`input`), executable name and SHA-256,
+          `start`/`end` timestamps, `wall` seconds, child CPU seconds
+          (`cpu_user`, `cpu_system`), `max_rss` (bytes), `exit_code`,
+          `cached` (restored from the stage cache) and `error`,
+        - `outputs`: `{relative path: size in bytes}` of the results folder.
+
+    Hooks are callables receiving a `StageEvent` when a stage starts and
+    ends. They can be registered for the whole process (`register_hook`) or
+    passed to a single run (`run_cemhyd3d(..., hooks=[...])`).
+
+Notes:
+    - CPU time and max RSS are those of the stage's own child process, filled
+      in by the executor that ran it (`executors.run_*(..., usage=record)`):
+      it reaps the tool with `os.wait4` and samples its peak RSS from
+      `/proc/<pid>/status` (`progress.stream_process`), so concurrent stages
+      in one process do not mix. They are None for cached stages, for tools
+      run from the shared libraries, in asyncio runs (see `aio.py`) and on
+      Windows (no `os.wait4`).
+'''
+import json
+import os
+import platform
+import socket
+import subprocess
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .stagecache import file_hash
+
+MANIFEST_NAME = "manifest.json"
+
+# Process-wide hooks (see register_hook)
+_HOOKS = []
+
+# (path, dev, ino, size, mtime_ns) -> SHA-256 of already hashed executables
+_EXE_HASHES = {}
+
+
+@dataclass
+class StageEvent:
+    '''A stage of a run started or ended.
+
+    Attributes:
+        kind: "start" or "end".
+        id: Run identifier.
+        stage: Stage name ("staging", "genpartnew", "distrib3d",
+            "disrealnew").
+        record: The stage's manifest record (complete for "end" events).
+    '''
+    kind: str
+    id: str
+    stage: str
+    record: dict = field(default_factory=dict)
+
+
+def register_hook(hook):
+    '''Call `hook(StageEvent)` at every stage start/end of every run.
+
+    Returns:
+        The hook, so this can be used as a decorator.
+    '''
+    if hook not in _HOOKS:
+        _HOOKS.append(hook)
+    return hook
+
+
+def unregister_hook(hook):
+    '''Remove a hook added with `register_hook` (no-op if absent).'''
+    if hook in _HOOKS:
+        _HOOKS.remove(hook)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _exe_hash(exe: Path) -> str:
+    st = os.stat(exe)
+    key = (str(exe), st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    if key not in _EXE_HASHES:
+        _EXE_HASHES[key] = file_hash(exe)
+    return _EXE_HASHES[key]
+
+
+class RunManifest:
+    '''Collects the manifest of one run.
+
+    Args:
+        id: Run identifier.
+        hooks: Extra callables receiving this run's `StageEvent`s (called
+            after the process-wide hooks).
+    '''
+
+    def __init__(self, id: str, hooks=()):
+        self.id = id
+        self.hooks = list(hooks or ())
+        self.data = {
+            "id": id,
+            "status": "running",
+            "error": None,
+            "started": _now(),
+            "finished": None,
+            "host": socket.gethostname(),
+            "python": platform.python_version(),
+            "stages": [],
+            "outputs": {},
+        }
+
+    def _fire(self, kind: str, record: dict):
+        event = StageEvent(kind, self.id, record["stage"], record)
+        for hook in _HOOKS + self.hooks:
+            hook(event)
+
+    @contextmanager
+    def stage(self, name: str, stdin_text: str | None = None,
+              exe: Path | None = None):
+        '''Record one stage around the `with` block.
+
+        The block may set `record["cached"] = True` when it restored the
+        outputs instead of running the tool, and passes the record as
+        `usage=` to the executor so it fills `cpu_user`, `cpu_system` and
+        `max_rss`.
+
+        Yields:
+            dict: The stage record.
+        '''
+        record = {
+            "stage": name,
+            "input": stdin_text,
+            "exe": Path(exe).name if exe is not None else None,
+            "exe_sha256": _exe_hash(exe) if exe is not None else None,
+            "start": _now(),
+            "end": None,
+            "wall": None,
+            "cpu_user": None,
+            "cpu_system": None,
+            "max_rss": None,
+            "exit_code": None,
+            "cached": False,
+            "error": None,
+        }
+        self.data["stages"].append(record)
+        self._fire("start", record)
+        start = time.perf_counter()
+        try:
+            yield record
+            if exe is not None and not record["cached"]:
+                record["exit_code"] = 0
+        except subprocess.CalledProcessError as exc:
+            record["exit_code"] = exc.returncode
+            record["error"] = repr(exc)
+            raise
+        except BaseException as exc:
+            record["error"] = repr(exc)
+            raise
+        finally:
+            record["wall"] = time.perf_counter() - start
+            record["end"] = _now()
+            self._fire("end", record)
+
+    def finish(self, results_dir: Path, error: BaseException | None = None,
+               sink: str | Path | None = None) -> Path:
+        '''Complete the manifest and write it into `results_dir`.
+
+        Args:
+            results_dir: The run's results folder.
+            error: The exception that aborted the run, if any.
+            sink: Optional JSON-lines file the manifest is appended to.
+
+        Returns:
+            pathlib.Path: The written `manifest.json`.
+        '''
+        results_dir = Path(results_dir)
+        self.data["status"] = "ok" if error is None else "failed"
+        self.data["error"] = None if error is None else repr(error)
+        self.data["finished"] = _now()
+        self.data["outputs"] = {
+            p.relative_to(results_dir).as_posix(): p.stat().st_size
+            for p in sorted(results_dir.rglob("*"))
+            if p.is_file() and p.name != MANIFEST_NAME
+        }
+        path = results_dir / MANIFEST_NAME
+        path.write_text(json.dumps(self.data, indent=2), encoding="utf-8")
+        if sink is not None:
+            append_manifest(self.data, sink)
+        return path
+
+
+def append_manifest(data: dict, sink: str | Path):
+    '''Append one manifest as a single JSON line to `sink`.
+
+    The line is written with one `write` on a file opened in append mode,
+    so concurrent batch workers do not interleave their records.
+    '''
+    sink = Path(sink)
+    sink.parent.mkdir(parents=True, exist_ok=True)
+    line = (json.dumps(data, separators=(",", ":")) + "\n").encode("utf-8")
+    fd = os.open(sink, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def read_manifests(sink: str | Path) -> list[dict]:
+    '''Read all manifests of a JSON-lines sink, in the order written.'''
+    with open(sink, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,442 @@
+'''Vectorized particle placement: a NumPy backend for the genpartnew stage.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    genpartnew places every sphere by random trial: it draws a centre and
+    checks the digitized sphere voxel by voxel (`chksph`), up to `MAXTRIES`
+    times, then flocculates the particles by moving whole clusters one voxel
+    at a time (`makefloc`). With thousands of small spheres in a dense box
+    most trials fail, and a run can give up ("Could not place sphere").
+
+    `place_particles(cfg)` follows the same model with an occupancy grid of
+    *blocked centres* instead of trials:
+
+        - every placed sphere blocks the centres whose sphere (plus the
+          dispersion distance) would overlap it: a fixed stencil per pair of
+          radii (their Minkowski sum), marked in a flat bool grid when a
+          size class starts and after each placement,
+        - candidate centres are drawn in batches and tested by a lookup in
+          that grid,
+        - when a batch holds no free centre, the centre is drawn directly
+          from the remaining free ones; when none is left, the dispersion
+          distance is lowered (as genpartnew does after `MAXTRIES`), and
+          placement only fails when no centre is left without it.
+
+    Sulfate forms (gypsum, hemihydrate, anhydrite) are assigned to cement
+    spheres with genpartnew's rules and targets, and `_flocculate` runs
+    makefloc's cluster walk on flat voxel indices (a neighbour table moves
+    a whole cluster in one gather; the clusters that touch are merged by
+    vectorized connected components). The result uses
+    genpartnew's formats: the phase image and the particle-ID image
+    (particles numbered from 100, 0 for porosity), in the file order of
+    `io.py`, so distrib3d and disrealnew read it unchanged.
+
+    `run_cemhyd3d(...)` uses this backend when the genpartnew config has
+    `"backend": "numpy"`; `genpartnew(id, cfg, cwd)` mirrors
+    `engine.genpartnew` (log file written, arrays returned).
+
+Notes:
+    - The random stream is NumPy's (seeded from `cfg["seed"]`), so the
+      microstructure is a different realization of the same statistics,
+      not a copy of genpartnew's.
+    - Supports the menu sequence written by
+      `builders._build_genpartnew_from_dict` (place, report, flocculate,
+      output, exit); aggregates are not supported.
+    - Requires NumPy (`pip install pycemhyd3d[numpy]`).
+'''
+import functools
+from pathlib import Path
+
+import numpy as np
+
+from .utils import DEFAULT_SYSTEM_SIZE
+
+# Phase identifiers (genpartnew.c)
+POROSITY = 0
+CEMID = 1
+C2SID = 2
+GYPID = 5
+HEMIHYDRATE = 6
+ANHYDRITE = 7
+POZZID = 8
+INERTID = 9
+SLAGID = 10
+CACO3 = 26
+FLYASH = 30
+PHASES = (CEMID, C2SID, GYPID, HEMIHYDRATE, ANHYDRITE, POZZID, INERTID,
+          SLAGID, CACO3, FLYASH)
+PHASE_LABELS = {POROSITY: "Porosity", CEMID: "Cement", C2SID: "C2S",
+                GYPID: "Gypsum", ANHYDRITE: "Anhydrite",
+                HEMIHYDRATE: "Hemihydrate", POZZID: "Pozzolan",
+                INERTID: "Inert", SLAGID: "Slag", CACO3: "CaCO3",
+                FLYASH: "Fly Ash"}
+# Particle ids start at CEM (genpartnew numbers particle k as k + CEM - 1)
+CEM = 100
+# Maximum number of particles (disrealnew keeps ids in a short int)
+NPARTC = 30000
+# Candidate centres tested per batch
+BATCH = 256
+
+
+def sphere_offsets(radius: int) -> np.ndarray:
+    '''`(n, 3)` offsets of genpartnew's digitized sphere of `radius`
+    (voxels whose centre lies within `radius + 0.5`).'''
+    r = np.arange(-radius, radius + 1)
+    d2 = r[:, None, None] ** 2 + r[None, :, None] ** 2 + r[None, None, :] ** 2
+    return np.argwhere(d2 <= radius * radius + radius) - radius
+
+
+def _flat(coords: np.ndarray, size: int) -> np.ndarray:
+    '''Flat indices of periodic `(x, y, z)` voxel coordinates.'''
+    coords = coords % size
+    return (coords[..., 0] * size + coords[..., 1]) * size + coords[..., 2]
+
+
+def _fast_len(n: int) -> int:
+    '''Smallest 5-smooth integer >= `n` (a fast FFT length).'''
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return n
+        n += 1
+
+
+@functools.lru_cache(maxsize=None)
+def _exclusion_stencil(radius: int, check_radius: int) -> np.ndarray:
+    '''Offsets of the centres blocked by a sphere of `radius` for spheres
+    checked with `check_radius` (Minkowski sum of the two spheres, by a
+    linear FFT convolution).'''
+    reach = radius + check_radius
+    shape = (_fast_len(2 * reach + 1),) * 3
+    a = np.zeros(shape, dtype=np.float32)
+    b = np.zeros(shape, dtype=np.float32)
+    a[tuple((sphere_offsets(radius) + radius).T)] = 1.0
+    b[tuple((sphere_offsets(check_radius) + check_radius).T)] = 1.0
+    summed = np.fft.irfftn(np.fft.rfftn(a) * np.fft.rfftn(b), s=shape)
+    return np.argwhere(summed > 0.5) - reach
+
+
+def _parse(cfg: dict) -> dict:
+    '''Placement settings of a genpartnew dict config.
+
+    Raises:
+        ValueError: for menu sequences or values genpartnew would not
+            accept, or that this backend does not support.
+    '''
+    menus = {"place_menu": (2, 2), "report_phase_counts_menu": (4, 4),
+             "flocculate_menu": (3, 3), "output_menu": (8, 8),
+             "exit_menu": (1, 1)}
+    for key, (default, expected) in menus.items():
+        if int(cfg.get(key, default)) != expected:
+            raise ValueError(f"genpartnew backend 'numpy' only supports "
+                             f"{key}={expected}, got {cfg.get(key)!r}")
+    split = cfg["calcium_sulfate_split"]
+    if isinstance(split, str):
+        split = split.split()
+    prob_hem, prob_anh = (float(v) for v in split)
+    settings = {
+        "seed": int(cfg["seed"]),
+        "dispersion": int(cfg.get("dispersion_px", 0)),
+        "prob_gyp": float(cfg["calcium_sulfate_vf"]),
+        "prob_hem": prob_hem,
+        "prob_anh": prob_anh,
+        "classes": [(int(c), int(r), int(p)) for c, r, p in cfg["size_classes"]],
+        "n_flocs": int(cfg.get("n_flocs", 1)),
+    }
+    if int(cfg["n_size_classes"]) != len(settings["classes"]):
+        raise ValueError(f"n_size_classes={cfg['n_size_classes']} but "
+                         f"{len(settings['classes'])} size classes given")
+    if not 0 <= settings["dispersion"] <= 2:
+        raise ValueError("dispersion_px must be 0, 1 or 2")
+    if not (0.0 <= settings["prob_gyp"] <= 1.0 and 0.0 <= prob_hem <= 1.0
+            and 0.0 <= prob_anh <= 1.0 and prob_hem + prob_anh <= 1.001):
+        raise ValueError("calcium sulfate fractions must lie in [0, 1]")
+    for count, radius, phase in settings["classes"]:
+        if phase not in PHASES:
+            raise ValueError(f"Unknown particle phase {phase}; choose from {PHASES}")
+        if radius < 1:
+            raise ValueError(f"Particle radius must be at least 1, got {radius}")
+        if count < 0:
+            raise ValueError(f"Negative particle count {count}")
+    if settings["n_flocs"] <= 0:
+        raise ValueError("n_flocs must be positive")
+    return settings
+
+
+class _Sulfate:
+    '''genpartnew's bookkeeping for the calcium sulfate forms placed in
+    place of cement particles (`gsphere`).'''
+
+    def __init__(self, prob_gyp, prob_hem, prob_anh, target_total):
+        self.prob_gyp, self.prob_hem, self.prob_anh = prob_gyp, prob_hem, prob_anh
+        self.target_total = target_total
+        self.target_sulfate = int(target_total * prob_gyp)
+        self.target_anh = int(target_total * prob_gyp * prob_anh)
+        self.target_hem = int(target_total * prob_gyp * prob_hem)
+        self.n_total = self.n_sulfate = self.n_anh = self.n_hem = 0
+
+    def phase(self, vol: int, class_count: int, rng) -> int:
+        '''Phase of the next cement sphere of `vol` voxels.'''
+        test = rng.random()
+        cement = ((test > self.prob_gyp
+                   and self.target_sulfate - self.n_sulfate < self.target_total - self.n_total)
+                  or self.n_sulfate > self.target_sulfate
+                  or vol > self.target_sulfate - self.n_sulfate
+                  or class_count <= 2)
+        self.n_total += vol
+        if cement:
+            return CEMID
+        kind = rng.random()
+        self.n_sulfate += vol
+        if self.prob_anh >= 1.0 or (kind < self.prob_anh and self.n_anh < self.target_anh
+                                    and vol <= self.target_anh - self.n_anh):
+            self.n_anh += vol
+            return ANHYDRITE
+        if (self.prob_anh + self.prob_hem >= 1.0
+                or (kind < self.prob_anh + self.prob_hem and self.n_hem < self.target_hem
+                    and vol <= self.target_hem - self.n_hem)):
+            self.n_hem += vol
+            return HEMIHYDRATE
+        return GYPID
+
+
+def _blocked(centres: list, check_radius: int, size: int) -> np.ndarray:
+    '''Flat bool grid of the centres where a sphere of `check_radius` would
+    overlap one of the placed `(centre, radius)` spheres.'''
+    blocked = np.zeros(size ** 3, dtype=bool)
+    for centre, radius in centres:
+        blocked[_flat(centre + _exclusion_stencil(radius, check_radius), size)] = True
+    return blocked
+
+
+def _place(settings: dict, size: int, rng):
+    '''Place every size class; return `(ids, phases, particles)` with flat
+    id/phase grids and the `(label, voxels, phase)` of each particle.'''
+    ids = np.zeros(size ** 3, dtype=np.int32)
+    phases = np.zeros(size ** 3, dtype=np.uint8)
+    disp = settings["dispersion"]
+    target_total = sum(count * len(sphere_offsets(radius))
+                       for count, radius, phase in settings["classes"]
+                       if phase == CEMID)
+    sulfate = _Sulfate(settings["prob_gyp"], settings["prob_hem"],
+                       settings["prob_anh"], target_total)
+    particles = []
+    centres = []
+    for count, radius, phase in settings["classes"]:
+        if count == 0:
+            continue
+        if 2 * radius + 1 > size:
+            raise ValueError(f"Particle radius {radius} does not fit into "
+                             f"system_size={size}")
+        if len(particles) + count >= NPARTC:
+            raise ValueError(f"Too many particles (limit {NPARTC - 1})")
+        sphere = sphere_offsets(radius)
+        blocked = _blocked(centres, radius + disp, size)
+        stencil = _exclusion_stencil(radius, radius + disp)
+        pool = np.empty(0, dtype=np.int64)
+        for _ in range(count):
+            pool = pool[~blocked[pool]]
+            if not pool.size:
+                pool = rng.integers(0, size ** 3, BATCH)
+                pool = pool[~blocked[pool]]
+            while not pool.size:
+                free = np.flatnonzero(~blocked)
+                if free.size:
+                    pool = rng.choice(free, size=min(BATCH, free.size), replace=False)
+                elif disp > 0:
+                    # as genpartnew, give up the dispersion distance rather than fail
+                    disp -= 1
+                    print(f"[genpartnew] No room for particle {len(particles) + 1} "
+                          f"(radius {radius}); dispersion distance lowered to {disp}")
+                    blocked = _blocked(centres, radius + disp, size)
+                    stencil = _exclusion_stencil(radius, radius + disp)
+                else:
+                    raise RuntimeError(
+                        f"No room left for particle {len(particles) + 1} "
+                        f"(radius {radius}) in a {size}^3 system")
+            centre = np.array(np.unravel_index(pool[0], (size,) * 3))
+            pool = pool[1:]
+
+            label = len(particles) + CEM
+            sphase = sulfate.phase(len(sphere), count, rng) if phase == CEMID else phase
+            voxels = _flat(centre + sphere, size)
+            ids[voxels] = label
+            phases[voxels] = sphase
+            blocked[_flat(centre + stencil, size)] = True
+            centres.append((centre, radius))
+            particles.append((label, voxels, sphase))
+    return ids, phases, particles
+
+
+def _neighbours(size: int) -> np.ndarray:
+    '''Flat `(6 * S**3,)` table of the periodic neighbour of every flat voxel
+    index along the principal directions: entry `d * S**3 + v` is the
+    neighbour of `v` in direction `d` (0: +x, 1: -x, 2: +y, 3: -y, 4: +z,
+    5: -z).'''
+    grid = np.arange(size ** 3, dtype=np.int32).reshape((size,) * 3)
+    return np.concatenate([np.roll(grid, -step, axis=axis).ravel()
+                           for axis in range(3) for step in (1, -1)])
+
+
+def _components(a: np.ndarray, b: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''Connected components of the graph with edges `(a[i], b[i])`.
+
+    Returns:
+        tuple: `(nodes, roots)`, the distinct nodes and the smallest node of
+        the component of each (min-label propagation with pointer jumping).
+    '''
+    nodes, inv = np.unique(np.concatenate([a, b]), return_inverse=True)
+    ia, ib = inv[:a.size], inv[a.size:]
+    label = np.arange(nodes.size)
+    while True:
+        low = np.minimum(label[ia], label[ib])
+        np.minimum.at(label, ia, low)
+        np.minimum.at(label, ib, low)
+        label = label[label]
+        if (label[ia] == label[ib]).all():
+            return nodes, nodes[label]
+
+
+def _flocculate(ids: np.ndarray, phases: np.ndarray, particles: list,
+                n_flocs: int, size: int, rng) -> int:
+    '''makefloc: move every cluster one voxel in a random direction per
+    sweep; clusters that would hit another cluster stay and merge with it,
+    until at most `n_flocs` clusters are left. Returns the number of
+    clusters.
+
+    A sweep moves all clusters at once: hits are tested against the grid
+    before the sweep, and clusters stepping onto the same empty voxel count
+    as hitting each other. The merges of a sweep are applied together,
+    except in the sweep that would leave fewer than `n_flocs` clusters,
+    where they are applied one by one in random order and stop at
+    `n_flocs`.
+    '''
+    n = len(particles)
+    s3 = size ** 3
+    # cluster of every particle label (-1 for porosity)
+    owner = np.full(n + CEM, -1, dtype=np.int32)
+    owner[CEM:] = np.arange(n)
+    vox = np.concatenate([v for _, v, _ in particles]).astype(np.int32)
+    vlabel = ids.take(vox)
+    vphase = phases.take(vox)
+    neighbours = _neighbours(size)
+    # cluster stepping onto each voxel in the current sweep (-1: none)
+    claim = np.full(s3, -1, dtype=np.int32)
+    alive = n
+    while alive > n_flocs:
+        cluster = owner.take(vlabel)
+        step = rng.integers(0, 6, n).take(cluster)
+        new = neighbours.take(step * s3 + vox)
+        hit = owner.take(ids.take(new))
+        collide = (hit >= 0) & (hit != cluster)
+        pairs = [cluster[collide], hit[collide]]
+        stays = np.zeros(n, dtype=bool)
+        stays[pairs[0]] = True
+        # clusters that would step onto the same empty voxel
+        movers = np.flatnonzero(~stays.take(cluster))
+        target, mover = new.take(movers), cluster.take(movers)
+        claim[target] = mover
+        other = claim.take(target)
+        claim[target] = -1
+        same = other != mover
+        if same.any():
+            pairs += [mover[same], other[same]]
+            stays[mover[same]] = stays[other[same]] = True
+            keep = ~stays.take(mover)
+            movers, target = movers[keep], target[keep]
+        old = vox.take(movers)
+        ids[old] = 0
+        phases[old] = POROSITY
+        ids[target] = vlabel.take(movers)
+        phases[target] = vphase.take(movers)
+        vox[movers] = target
+
+        a = np.concatenate(pairs[0::2])
+        if not a.size:
+            continue
+        b = np.concatenate(pairs[1::2])
+        shuffle = rng.permutation(a.size)
+        nodes, roots = _components(a, b)
+        merged = nodes.size - np.unique(roots).size
+        parent = np.arange(n, dtype=np.int32)
+        if alive - merged >= n_flocs:
+            parent[nodes] = roots
+            alive -= merged
+        else:
+            # last sweep: merge in random order until n_flocs are left
+            for x, y in zip(a[shuffle].tolist(), b[shuffle].tolist()):
+                while parent[x] != x:
+                    x = parent[x]
+                while parent[y] != y:
+                    y = parent[y]
+                if x != y:
+                    parent[y] = x
+                    alive -= 1
+                    if alive <= n_flocs:
+                        break
+            while True:
+                root = parent[parent]
+                if (root == parent).all():
+                    break
+                parent = root
+        owner[CEM:] = parent.take(owner[CEM:])
+    return alive
+
+
+def place_particles(cfg: dict,
+                    system_size: int = DEFAULT_SYSTEM_SIZE) -> tuple[np.ndarray, np.ndarray, dict]:
+    '''Build genpartnew's microstructure from its dict config.
+
+    Args:
+        cfg: genpartnew config (see `builders._build_genpartnew_from_dict`).
+        system_size: Lattice edge length in pixels.
+
+    Returns:
+        tuple: `(image, particle_ids, info)`: the phase and particle-ID
+        images (shape `(S, S, S)`, file order of `io.py`) and a dict with
+        `particles`, `clusters` and the voxel count of every phase.
+
+    Raises:
+        ValueError: for unsupported or invalid configs.
+        RuntimeError: if a size class does not fit into the system.
+    '''
+    settings = _parse(cfg)
+    size = int(system_size)
+    rng = np.random.default_rng(abs(settings["seed"]))
+    ids, phases, particles = _place(settings, size, rng)
+    clusters = len(particles)
+    if particles:
+        clusters = _flocculate(ids, phases, particles,
+                               settings["n_flocs"], size, rng)
+    # internal (x, y, z) -> file order (z, y, x), as genpartnew's outmic
+    shape = (size,) * 3
+    image = phases.reshape(shape).transpose(2, 1, 0).copy()
+    particle_ids = ids.reshape(shape).transpose(2, 1, 0).copy()
+    counts = np.bincount(phases, minlength=max(PHASES) + 1)
+    info = {"particles": len(particles), "clusters": clusters,
+            "counts": {PHASE_LABELS[p]: int(counts[p]) for p in PHASE_LABELS}}
+    return image, particle_ids, info
+
+
+def genpartnew(id: str, cfg: dict, cwd: str | Path,
+               system_size: int = DEFAULT_SYSTEM_SIZE) -> tuple[np.ndarray, np.ndarray]:
+    '''Place the particles like `engine.genpartnew`; return `(image,
+    particle_ids)` arrays.
+
+    The log goes to `<cwd>/genpartnew_<id>.out`; the two images are not
+    written to disk.
+    '''
+    image, particle_ids, info = place_particles(cfg, system_size)
+    lines = [f"genpartnew (backend numpy), system size {system_size}",
+             f"Placed {info['particles']} particles in "
+             f"{len(cfg['size_classes'])} size classes",
+             f"Number of clusters is {info['clusters']}",
+             "", " Phase counts are: "]
+    lines += [f"{label}= {count} " for label, count in info["counts"].items()]
+    (Path(cwd) / f"genpartnew_{id}.out").write_text("\n".join(lines) + "\n")
+    return image, particle_ids
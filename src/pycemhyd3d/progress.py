@@ -0,0 +1,387 @@
+'''Live progress streaming and stall watchdog for the native tools.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    `stream_process(...)` starts a tool, copies its stdout line by line into
+    the `<tool>_<id>.out` log and turns recognized lines into
+    `ProgressEvent`s:
+
+        - disrealnew: `Cycle N` (with total cycles, rate and ETA once the echoed
+          "Enter number of cycles to execute" answer has been seen), and
+          `Number dissolved this pass- D total diffusing- T`,
+        - distrib3d: `Cycle: N` of the sintering loop and the start of each
+          correlation filtering (`Number of points in correlation file`),
+        - genpartnew: every output line (menu answers, phase counts).
+
+    A watchdog thread kills the child when no progress event arrives for
+    `stall_timeout` seconds, when the whole run exceeds `timeout` seconds,
+    or when a line matches one of the fatal patterns (e.g. genpartnew's
+    "Could not place sphere"). The executor then raises `StallError`.
+
+    `iter_progress(fn, ...)` runs any pipeline function that accepts a
+    `progress=` callback in a background thread and yields its events, for
+    callers who prefer an iterator to a callback.
+
+Notes:
+    - On Linux, the child is started under `stdbuf -oL` when available, so
+      lines arrive as they are printed instead of in 4 KiB blocks.
+    - `stream_process(..., usage=d)` fills `d` with the CPU time and peak
+      RSS of that one child: it is reaped with `os.wait4`, and the peak is
+      sampled from its own `/proc/<pid>/status` while it runs, because on
+      Linux a child's `ru_maxrss` starts from the high-water mark of the
+      Python process it was forked from.
+'''
+import inspect
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .utils import caller_results_root, is_windows
+
+# Seconds between watchdog checks
+_WATCHDOG_TICK = 1.0
+# Longest pause between two peak-RSS samples of a running child
+_HWM_TICK = 0.05
+
+_RE_DR_CYCLE = re.compile(r"^Cycle (\d+)\s*$")
+_RE_DR_DISSOLVED = re.compile(
+    r"^Number dissolved this pass-\s*(\d+)\s+total diffusing-\s*(\d+)")
+_RE_D3_CYCLE = re.compile(r"^Cycle: (\d+)")
+_RE_D3_FILTER = re.compile(r"^Number of points in correlation file is (\d+)")
+_RE_INT = re.compile(r"^\s*(-?\d+)\s*$")
+
+# Lines after which the tool will never make progress again
+FATAL_PATTERNS = {
+    "genpartnew": (re.compile(r"Could not place sphere"),
+                   re.compile(r"Too many spheres being generated")),
+}
+
+
+class StallError(RuntimeError):
+    '''Raised when the watchdog killed a tool that stopped making progress.'''
+
+
+@dataclass
+class ProgressEvent:
+    '''One parsed progress update of a running tool.
+
+    Attributes:
+        stage: Tool name ("genpartnew", "distrib3d" or "disrealnew").
+        id: Run identifier (lets one callback follow many runs).
+        kind: "cycle", "dissolved", "filter", "sinter" or "line".
+        elapsed: Seconds since the tool was started.
+        cycle: Current cycle (disrealnew/distrib3d cycle events).
+        total: Total number of cycles, when known.
+        eta: Estimated seconds until the tool finishes, when known.
+        data: Extra parsed values (e.g. `dissolved`, `diffusing`).
+        line: The raw output line.
+    '''
+    stage: str
+    id: str
+    kind: str
+    elapsed: float
+    cycle: int | None = None
+    total: int | None = None
+    eta: float | None = None
+    data: dict = field(default_factory=dict)
+    line: str = ""
+
+    @property
+    def fraction(self) -> float | None:
+        '''Completed fraction of the cycles, when the total is known.'''
+        if self.cycle is None or not self.total:
+            return None
+        return min(1.0, self.cycle / self.total)
+
+
+class _Parser:
+    '''Stateful line parser producing `ProgressEvent`s for one tool.'''
+
+    def __init__(self, stage: str, id: str, start: float):
+        self.stage = stage
+        self.id = id
+        self.start = start
+        self.total = None
+        self.filters = 0
+        self._prev = ""
+
+    def feed(self, line: str) -> ProgressEvent | None:
+        prev, self._prev = self._prev, line
+        elapsed = time.monotonic() - self.start
+        if self.stage == "disrealnew":
+            if prev.startswith("Enter number of cycles to execute"):
+                m = _RE_INT.match(line)
+                if m:
+                    self.total = int(m.group(1))
+                return None
+            m = _RE_DR_CYCLE.match(line)
+            if m:
+                cycle = int(m.group(1))
+                eta = None
+                if self.total and cycle > 0:
+                    eta = elapsed / cycle * max(0, self.total - cycle)
+                return ProgressEvent(self.stage, self.id, "cycle", elapsed, cycle,
+                                     self.total, eta, line=line)
+            m = _RE_DR_DISSOLVED.match(line)
+            if m:
+                return ProgressEvent(self.stage, self.id, "dissolved", elapsed,
+                                     total=self.total,
+                                     data={"dissolved": int(m.group(1)),
+                                           "diffusing": int(m.group(2))},
+                                     line=line)
+            return None
+        if self.stage == "distrib3d":
+            m = _RE_D3_CYCLE.match(line)
+            if m:
+                return ProgressEvent(self.stage, self.id, "sinter", elapsed,
+                                     int(m.group(1)),
+                                     data={"filter": self.filters}, line=line)
+            m = _RE_D3_FILTER.match(line)
+            if m:
+                self.filters += 1
+                return ProgressEvent(self.stage, self.id, "filter", elapsed,
+                                     data={"filter": self.filters,
+                                           "points": int(m.group(1))},
+                                     line=line)
+            return None
+        return ProgressEvent(self.stage, self.id, "line", elapsed, line=line)
+
+
+def read_hwm(pid: int) -> int | None:
+    '''Peak RSS (`VmHWM`, bytes) of a running process, where /proc has it.'''
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def wait_measured(pid: int, stop: threading.Event | None = None) -> tuple:
+    '''Reap `pid`, returning `(status, rusage, peak_rss)`.
+
+    The peak is sampled from the child's own `VmHWM` while it runs (see the
+    module notes); `peak_rss` is None where /proc is not available. With a
+    `stop` event, only samples until the event is set and returns
+    `(None, None, peak_rss)` without reaping.
+    '''
+    hwm, delay = None, 0.001
+    while True:
+        if stop is None:
+            done, status, usage = os.wait4(pid, os.WNOHANG)
+            if done:
+                return status, usage, hwm
+        elif stop.is_set():
+            return None, None, hwm
+        sample = read_hwm(pid)
+        if sample is not None:
+            hwm = max(hwm or 0, sample)
+        if stop is None:
+            time.sleep(delay)
+        else:
+            stop.wait(delay)
+        delay = min(_HWM_TICK, delay * 2)
+
+
+def child_usage(usage, peak_rss: int | None) -> dict:
+    '''`cpu_user`, `cpu_system` (seconds) and `max_rss` (bytes) of one child
+    from its `os.wait4` rusage and sampled peak (used when not sampled).'''
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {"cpu_user": usage.ru_utime, "cpu_system": usage.ru_stime,
+            "max_rss": peak_rss if peak_rss is not None else usage.ru_maxrss * scale}
+
+
+def _command(exe: Path, line_buffered: bool) -> list[str]:
+    cmd = [str(exe)]
+    if line_buffered and not is_windows():
+        stdbuf = shutil.which("stdbuf")
+        if stdbuf:
+            cmd = [stdbuf, "-oL"] + cmd
+    return cmd
+
+
+def stream_process(exe: Path,
+                   stdin_text: str,
+                   log_path: Path,
+                   cwd: Path,
+                   stage: str,
+                   id: str = "",
+                   progress=None,
+                   stall_timeout: float | None = None,
+                   timeout: float | None = None,
+                   line_buffered: bool = True,
+                   usage: dict | None = None):
+    '''Run one tool, logging and parsing its output as it is produced.
+
+    Args:
+        exe: Executable to start.
+        stdin_text: Payload written into the tool's stdin pipe.
+        log_path: Combined stdout+stderr log.
+        cwd: Working directory.
+        stage: Tool name, selects the parser and fatal patterns.
+        id: Run identifier copied into every event.
+        progress: Optional callable receiving each `ProgressEvent`.
+        stall_timeout: Kill the tool after this many seconds without a
+            progress event (None: never).
+        timeout: Kill the tool after this many seconds in total (None: never).
+        line_buffered: Request line-buffered stdout from the child.
+        usage: Optional dict updated with the child's `cpu_user`,
+            `cpu_system` (seconds) and `max_rss` (bytes) once it has exited
+            (left untouched where `os.wait4` is not available).
+
+    Raises:
+        StallError: if the watchdog killed the tool.
+        subprocess.CalledProcessError: if the tool returned non-zero.
+    '''
+    start = time.monotonic()
+    parser = _Parser(stage, id, start)
+    fatal = FATAL_PATTERNS.get(stage, ())
+    state = {"last": start, "reason": None}
+    cmd = _command(exe, line_buffered)
+
+    with open(log_path, "wb") as flog:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, cwd=cwd)
+        done = threading.Event()
+
+        def _feed():
+            # own thread: a payload larger than the pipe buffer must not
+            # block us from draining stdout
+            try:
+                proc.stdin.write(stdin_text.encode("utf-8"))
+                proc.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass  # tool exited early; its exit status tells why
+
+        feeder = threading.Thread(target=_feed, daemon=True)
+        feeder.start()
+
+        def _watchdog():
+            while not done.wait(_WATCHDOG_TICK):
+                now = time.monotonic()
+                if stall_timeout is not None and now - state["last"] > stall_timeout:
+                    state["reason"] = f"no progress for {stall_timeout:g} s"
+                elif timeout is not None and now - start > timeout:
+                    state["reason"] = f"exceeded timeout of {timeout:g} s"
+                if state["reason"]:
+                    proc.kill()
+                    return
+
+        watchdog = None
+        if stall_timeout is not None or timeout is not None:
+            watchdog = threading.Thread(target=_watchdog, daemon=True)
+            watchdog.start()
+        measured = usage is not None and hasattr(os, "wait4")
+        sampled, stop_sampling = {}, threading.Event()
+        if measured:
+            sampler = threading.Thread(
+                target=lambda: sampled.update(
+                    hwm=wait_measured(proc.pid, stop_sampling)[2]),
+                daemon=True)
+            sampler.start()
+        try:
+            for raw in proc.stdout:
+                flog.write(raw)
+                line = raw.decode("utf-8", "replace").rstrip("\r\n")
+                if any(p.search(line) for p in fatal):
+                    state["reason"] = f"fatal output: {line.strip()}"
+                    proc.kill()
+                    continue
+                event = parser.feed(line)
+                if event is not None:
+                    state["last"] = time.monotonic()
+                    if progress is not None:
+                        progress(event)
+            if measured:
+                # stdout is closed: the child is exiting. Take the samples
+                # so far, then reap it ourselves for its own rusage
+                stop_sampling.set()
+                sampler.join()
+                try:
+                    status, rusage, hwm = wait_measured(proc.pid)
+                except ChildProcessError:
+                    pass  # already reaped by Popen (e.g. when killed)
+                else:
+                    proc.returncode = os.waitstatus_to_exitcode(status)
+                    usage.update(child_usage(rusage, _max(sampled.get("hwm"), hwm)))
+            returncode = proc.wait()
+        finally:
+            done.set()
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            if watchdog is not None:
+                watchdog.join()
+            if measured:
+                stop_sampling.set()
+                sampler.join()
+            feeder.join()
+
+    if state["reason"]:
+        raise StallError(f"[{stage}] killed by watchdog: {state['reason']}")
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def _max(a, b):
+    '''Larger of two optional numbers.'''
+    if a is None or b is None:
+        return b if a is None else a
+    return max(a, b)
+
+
+def iter_progress(fn, *args, **kwargs):
+    '''Run `fn(*args, progress=..., **kwargs)` in a thread, yielding events.
+
+    Example:
+        for ev in iter_progress(cem.run_cemhyd3d, "01", gp, d3, dr):
+            if ev.kind == "cycle":
+                print(ev.cycle, ev.total, ev.eta)
+
+    Yields:
+        ProgressEvent: Events in the order the tools produced them.
+
+    Returns:
+        The return value of `fn` (as the generator's `StopIteration.value`).
+
+    Raises:
+        Exception: whatever `fn` raised, re-raised in the caller.
+    '''
+    if "results_root" in inspect.signature(fn).parameters:
+        # resolve the default next to *our* caller, not the worker thread
+        kwargs.setdefault("results_root", caller_results_root())
+    events = queue.Queue()
+    result = {}
+    sentinel = object()
+
+    def _target():
+        try:
+            result["value"] = fn(*args, progress=events.put, **kwargs)
+        except BaseException as exc:
+            result["error"] = exc
+        finally:
+            events.put(sentinel)
+
+    thread = threading.Thread(target=_target, daemon=True)
+    thread.start()
+    while True:
+        event = events.get()
+        if event is sentinel:
+            break
+        yield event
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result.get("value")
@@ -0,0 +1,210 @@
+'''Per-run sandbox helpers and the shared runtime cache for pycemhyd3d.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    Every pipeline run executes inside its own sandbox directory. All three
+    native tools are started with `cwd=<sandbox>`, so every relative file they
+    read (correlation filters, `alkalichar.dat`, `slagchar.dat`, ...) or write
+    (`disprob.out`, `.img`/`.ima` snapshots, time series) resolves inside that
+    one folder. Concurrent runs therefore never touch each other's files.
+
+    The executables and runtime data files shipped in `cempy3d/` are staged
+    once per machine into a read-only runtime cache,
+    `<cache_root>/runtime/<hash>/`, keyed by a SHA-256 over their names and
+    contents. Sandboxes only link to that cache (hardlinks, else symlinks,
+    else copies). C sources, objects and the upstream tarball are not needed
+    at run time and are never staged.
+
+Notes:
+    - The cache entry is built in a temporary folder and published with an
+      atomic rename, so concurrent first runs cannot observe a half-staged
+      entry; a loser of the race simply discards its copy.
+    - Rebuilding the executables changes the hash, so stale entries are never
+      reused. Old entries can be removed with `rm -r <cache_root>/runtime`.
+'''
+import hashlib
+import os
+import shutil
+import stat
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+
+from .utils import default_cache_root, is_windows
+
+# Files in `cempy3d/` that are only needed to build the executables
+_BUILD_ONLY_SUFFIXES = {".c", ".h", ".o", ".bz2"}
+
+# Temporary staging folders older than this are debris from killed runs
+_STALE_TMP_SECONDS = 3600
+
+
+def runtime_files(src_dir: Path) -> list[Path]:
+    '''List the files of `src_dir` that a run needs in its working directory.
+
+    Args:
+        src_dir: The package-shipped `cempy3d/` folder.
+
+    Returns:
+        list[pathlib.Path]: Executables and data files, sorted by name.
+    '''
+    return sorted(p for p in Path(src_dir).iterdir()
+                  if p.is_file() and p.suffix not in _BUILD_ONLY_SUFFIXES)
+
+
+@lru_cache(maxsize=None)
+def _hash_files(entries: tuple) -> str:
+    h = hashlib.sha256()
+    for name, path, _size, _mtime in entries:
+        h.update(name.encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def runtime_hash(src_dir: Path) -> str:
+    '''Return the content hash identifying the runtime files of `src_dir`.
+
+    The result is memoized per process on (name, size, mtime) of every file,
+    so repeated calls do not re-read unchanged executables.
+
+    Args:
+        src_dir: The package-shipped `cempy3d/` folder.
+
+    Returns:
+        str: Hex SHA-256 digest over the names and contents of the files
+        returned by `runtime_files`.
+    '''
+    entries = []
+    for p in runtime_files(src_dir):
+        st = p.stat()
+        entries.append((p.name, str(p), st.st_size, st.st_mtime_ns))
+    return _hash_files(tuple(entries))
+
+
+def _remove_stale_tmp(runtime_root: Path):
+    '''Delete temporary staging folders left behind by killed processes.'''
+    now = time.time()
+    for p in runtime_root.glob(".tmp-*"):
+        try:
+            if now - p.stat().st_mtime > _STALE_TMP_SECONDS:
+                shutil.rmtree(p, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def ensure_runtime_cache(src_dir: Path, cache_root: Path | None = None) -> Path:
+    '''Return the read-only cache entry for `src_dir`, staging it if missing.
+
+    Args:
+        src_dir: The package-shipped `cempy3d/` folder.
+        cache_root: Cache folder (default: `utils.default_cache_root()`).
+
+    Returns:
+        pathlib.Path: `<cache_root>/runtime/<hash[:16]>/` (absolute, also for
+        a relative `cache_root`), containing the executables and data files.
+    '''
+    cache_root = default_cache_root() if cache_root is None else Path(cache_root)
+    # absolute, so that symlinks staged into a sandbox do not dangle
+    runtime_root = cache_root.resolve() / "runtime"
+    entry = runtime_root / runtime_hash(src_dir)[:16]
+    if (entry / ".ready").exists():
+        return entry
+
+    runtime_root.mkdir(parents=True, exist_ok=True)
+    _remove_stale_tmp(runtime_root)
+    tmp_dir = runtime_root / f".tmp-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    tmp_dir.mkdir()
+    try:
+        for src in runtime_files(src_dir):
+            dst = tmp_dir / src.name
+            shutil.copy2(src, dst)
+            # read-only, keep the execute bits of the executables (Windows
+            # cannot unlink read-only hardlinks, so leave modes alone there)
+            if not is_windows():
+                mode = stat.S_IMODE(dst.stat().st_mode)
+                dst.chmod(mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+        (tmp_dir / ".ready").write_text("ok", encoding="utf-8")
+        try:
+            os.rename(tmp_dir, entry)
+        except OSError:
+            # another process published the same entry first
+            if not (entry / ".ready").exists():
+                raise
+    finally:
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return entry
+
+
+def create_sandbox(root: Path, id: str) -> Path:
+    '''Create a fresh, uniquely named sandbox directory below `root`.
+
+    Args:
+        root: Parent folder for sandboxes (created if missing).
+        id: Run identifier, embedded in the folder name for readability.
+
+    Returns:
+        pathlib.Path: The new (empty) sandbox directory.
+    '''
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    run_dir = root / f".sandbox-{id}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    run_dir.mkdir(parents=False, exist_ok=False)
+    return run_dir
+
+
+def _link(src: Path, dst: Path, link: str):
+    '''Place `src` at `dst` using the requested link strategy.'''
+    if link in ("auto", "hardlink"):
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            if link == "hardlink":
+                raise
+    if link in ("auto", "symlink"):
+        try:
+            os.symlink(src, dst)
+            return
+        except OSError:
+            if link == "symlink":
+                raise
+    shutil.copy2(src, dst)
+
+
+def stage_runtime(run_dir: Path,
+                  src_dir: Path,
+                  cache_root: Path | None = None,
+                  link: str = "auto") -> set[str]:
+    '''Link the cached executables and runtime data files into `run_dir`.
+
+    Args:
+        run_dir: Sandbox directory (working directory of all tools).
+        src_dir: The package-shipped `cempy3d/` folder.
+        cache_root: Cache folder (default: `utils.default_cache_root()`).
+        link: "auto" (hardlink, falling back to symlink, then copy),
+            "hardlink", "symlink" or "copy".
+
+    Returns:
+        set[str]: Names of the staged files, so they can be left out when the
+        sandbox is mirrored into the results folder.
+
+    Raises:
+        ValueError: if `link` is not one of the supported strategies.
+    '''
+    if link not in ("auto", "hardlink", "symlink", "copy"):
+        raise ValueError(f"Unknown link strategy: {link!r}")
+    entry = ensure_runtime_cache(src_dir, cache_root)
+    staged = set()
+    for src in entry.iterdir():
+        if src.name.startswith("."):
+            continue
+        _link(src, run_dir / src.name, link)
+        staged.add(src.name)
+    return staged
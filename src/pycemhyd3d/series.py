@@ -0,0 +1,344 @@
+'''Loader and campaign cache for disrealnew time-series outputs.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    disrealnew writes its time series as space-separated text, one file per
+    quantity, named `<root>.<ext>.<ncyc>.<T>.<flags>` (`flags` = the
+    `csh2flag`, `adiaflag` and `sealed` digits):
+
+        - `.heat`  cycle, time, degree of hydration, heat release,
+        - `.chs`   chemical shrinkage,
+        - `.pha`   pixel count of every phase,
+        - `.adi`   temperature / rate history,
+        - `.pps`   pore-space percolation, `.pts` solids percolation,
+        - `.phv`   pore-solution chemistry (pH, ions),
+
+    plus `disprob.out` (dissolution probability of every phase per cycle).
+
+    `find_series(folder)` discovers them, `read_series(path)` parses one file
+    into a NumPy structured array (one field per column) and
+    `load_results(folder)` returns all of a run.
+
+    `SeriesCache(path)` keeps every series of a whole campaign columnar in a
+    single `.npz` file. `update(results_root)` only parses files that are new
+    or changed since the last update; `query(...)` reads just the requested
+    columns:
+
+        cache = SeriesCache("campaign.npz")
+        cache.update("results")
+        heat = cache.query("heat", temp=20, columns=["time_h", "heat4_kJ_kg_solid"])
+        # -> structured array with fields run, temp, time_h, heat4_kJ_kg_solid
+
+Notes:
+    - Field names are the file headers made identifier-safe (`time(h)` ->
+      `time_h`, `[Na+]` -> `Na`). `Cycle` is int64, every other field float64.
+    - Requires NumPy (`pip install pycemhyd3d[numpy]`); `as_frame=True`
+      additionally requires pandas.
+'''
+import os
+import re
+import uuid
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+# Time-series extensions written by disrealnew
+SERIES_EXTS = ("heat", "chs", "pha", "adi", "pps", "pts", "phv")
+
+# Phase ids 0..45 of the CEMHYD3D microstructure (disprob.out columns)
+PHASE_NAMES = (
+    "POROSITY", "C3S", "C2S", "C3A", "C4AF", "GYPSUM", "HEMIHYD", "ANHYDRITE",
+    "POZZ", "INERT", "SLAG", "ASG", "CAS2", "CH", "CSH", "C3AH6", "ETTR",
+    "ETTRC4AF", "AFM", "FH3", "POZZCSH", "SLAGCSH", "CACL2", "FREIDEL",
+    "STRAT", "GYPSUMS", "CACO3", "AFMC", "INERTAGG", "ABSGYP", "DIFFCSH",
+    "DIFFCH", "DIFFGYP", "DIFFC3A", "DIFFC4A", "DIFFFH3", "DIFFETTR",
+    "DIFFCACO3", "DIFFAS", "DIFFANH", "DIFFHEM", "DIFFCAS2", "DIFFCACL2",
+    "PHASE43", "PHASE44", "EMPTYP",
+)
+
+DISPROB_NAME = "disprob.out"
+
+_RE_NAME = re.compile(
+    r"^(?P<root>.+)\.(?P<ext>" + "|".join(SERIES_EXTS) + r")\."
+    r"(?P<ncyc>\d+)\.(?P<temp>-?\d+)\.(?P<flags>\d{3})$")
+_RE_UNSAFE = re.compile(r"\W+")
+
+# Cache file layout version (bump when the layout changes)
+_CACHE_VERSION = 1
+
+
+def parse_name(path: str | Path) -> dict | None:
+    '''Decode a disrealnew time-series filename.
+
+    Returns:
+        dict | None: `root`, `ext`, `ncyc`, `temp`, `flags` (or None if the
+        name is not a time series; `disprob.out` gets `ext="disprob"` and
+        -1 for the values it does not encode).
+    '''
+    name = Path(path).name
+    if name == DISPROB_NAME:
+        return {"root": "", "ext": "disprob", "ncyc": -1, "temp": -1, "flags": ""}
+    m = _RE_NAME.match(name)
+    if not m:
+        return None
+    info = m.groupdict()
+    info["ncyc"] = int(info["ncyc"])
+    info["temp"] = int(info["temp"])
+    return info
+
+
+def find_series(folder: str | Path) -> list[tuple[Path, dict]]:
+    '''List `(path, parse_name(path))` for every time series in a folder.
+
+    `disprob.out` inherits `ncyc` and `temp` from the run's other series.
+    '''
+    found = []
+    for path in sorted(Path(folder).iterdir()):
+        info = parse_name(path) if path.is_file() else None
+        if info is not None:
+            found.append((path, info))
+    named = [info for _, info in found if info["ext"] != "disprob"]
+    for _, info in found:
+        if info["ext"] == "disprob" and named:
+            info.update(ncyc=named[0]["ncyc"], temp=named[0]["temp"],
+                        flags=named[0]["flags"])
+    return found
+
+
+def _field_names(header: list[str], ncols: int) -> list[str]:
+    if len(header) > ncols:
+        # multi-word last column, e.g. "Chemical shrinkage (ml/g cement)"
+        header = header[:ncols - 1] + [" ".join(header[ncols - 1:])]
+    names = []
+    for i in range(ncols):
+        name = _RE_UNSAFE.sub("_", header[i]).strip("_") if i < len(header) else ""
+        name = name or f"col{i}"
+        while name in names:
+            name += "_"
+        names.append(name)
+    return names
+
+
+def read_series(path: str | Path, as_frame: bool = False):
+    '''Parse one time-series file.
+
+    Args:
+        path: A `.heat/.chs/.pha/.adi/.pps/.pts/.phv` file or `disprob.out`.
+        as_frame: Return a `pandas.DataFrame` instead.
+
+    Returns:
+        numpy.ndarray | pandas.DataFrame: One record per output line.
+    '''
+    path = Path(path)
+    with open(path) as f:
+        header = [] if path.name == DISPROB_NAME else f.readline().split()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # header-only file
+            values = np.loadtxt(f, dtype=np.float64, ndmin=2)
+    ncols = values.shape[1] if values.size else len(header)
+    if path.name == DISPROB_NAME:
+        header = ["Cycle"] + list(PHASE_NAMES)
+    names = _field_names(header, ncols)
+    dtype = [(n, np.int64 if n == "Cycle" else np.float64) for n in names]
+    arr = np.empty(values.shape[0], dtype=dtype)
+    for i, n in enumerate(names):
+        arr[n] = values[:, i]
+    return _as_frame(arr) if as_frame else arr
+
+
+def load_results(folder: str | Path, as_frame: bool = False) -> dict:
+    '''Parse every time series of one results folder.
+
+    Returns:
+        dict: `{ext: array}` (e.g. `"heat"`, `"pha"`, `"disprob"`).
+    '''
+    return {info["ext"]: read_series(path, as_frame)
+            for path, info in find_series(folder)}
+
+
+def _as_frame(arr: np.ndarray):
+    import pandas as pd
+    return pd.DataFrame(arr)
+
+
+class SeriesCache:
+    '''Columnar cache of all time series of a campaign in one `.npz` file.
+
+    Layout (members of the `.npz`):
+        files:<field>   one entry per source file: path (relative to the
+                        campaign root), run, ext, ncyc, temp, flags, size,
+                        mtime_ns
+        <ext>:__file    for every row, the index of its source file
+        <ext>:<column>  the column values of all files of that extension
+
+    Args:
+        path: Cache file (created by the first `update`).
+    '''
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    def _load(self) -> dict:
+        if not self.path.exists():
+            return {}
+        with np.load(self.path) as data:
+            if int(data["version"]) != _CACHE_VERSION:
+                return {}
+            return {k: data[k] for k in data.files}
+
+    def files(self) -> np.ndarray:
+        '''Return the table of cached source files (structured array).'''
+        if not self.path.exists():
+            return np.empty(0, dtype=_FILE_DTYPE)
+        with np.load(self.path) as data:
+            return _files_table(data)
+
+    def update(self, results_root: str | Path, pattern: str = "result_*") -> int:
+        '''Bring the cache in line with the result folders on disk.
+
+        Only new or modified files (by size and mtime) are parsed; entries of
+        deleted files are dropped. The cache file is replaced atomically.
+
+        Args:
+            results_root: Campaign folder holding the result folders.
+            pattern: Glob selecting the result folders.
+
+        Returns:
+            int: Number of files parsed.
+        '''
+        root = Path(results_root)
+        old = self._load()
+        old_files = _files_table(old) if old else np.empty(0, dtype=_FILE_DTYPE)
+        old_index = {p: i for i, p in enumerate(old_files["path"].tolist())}
+
+        files, per_ext, parsed = [], {}, 0
+        for folder in sorted(p for p in root.glob(pattern) if p.is_dir()):
+            for path, info in find_series(folder):
+                st = path.stat()
+                rel = path.relative_to(root).as_posix()
+                record = (rel, folder.name, info["ext"], info["ncyc"],
+                          info["temp"], info["flags"], st.st_size, st.st_mtime_ns)
+                i = old_index.get(rel)
+                if (i is not None and old_files["size"][i] == st.st_size
+                        and old_files["mtime_ns"][i] == st.st_mtime_ns):
+                    arr = _rows(old, info["ext"], i)
+                else:
+                    arr = read_series(path)
+                    parsed += 1
+                per_ext.setdefault(info["ext"], []).append((len(files), arr))
+                files.append(record)
+
+        out = {"version": np.array(_CACHE_VERSION)}
+        table = np.array(files, dtype=_FILE_DTYPE)
+        for name in table.dtype.names:
+            col = table[name]
+            out[f"files:{name}"] = col.astype(str) if col.dtype == object else col
+        for ext, chunks in per_ext.items():
+            columns = []
+            for _, arr in chunks:
+                columns += [n for n in arr.dtype.names if n not in columns]
+            out[f"{ext}:__file"] = np.concatenate(
+                [np.full(len(arr), fi, dtype=np.int32) for fi, arr in chunks])
+            for col in columns:
+                out[f"{ext}:{col}"] = np.concatenate(
+                    [_column(arr, col) for _, arr in chunks])
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex[:6]}.npz")
+        try:
+            np.savez(tmp, **out)
+            os.replace(tmp, self.path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return parsed
+
+    def query(self,
+              ext: str,
+              columns=None,
+              temp: int | None = None,
+              runs=None,
+              as_frame: bool = False):
+        '''Read one series for many runs, loading only the needed columns.
+
+        Args:
+            ext: Series extension ("heat", "pha", ..., "disprob").
+            columns: Column names (default: all).
+            temp: Keep only runs at this temperature (the `<T>` of the name).
+            runs: Keep only these result folder names (e.g. `["result_01"]`).
+            as_frame: Return a `pandas.DataFrame` instead.
+
+        Returns:
+            numpy.ndarray | pandas.DataFrame: Fields `run`, `temp` and the
+            requested columns, rows grouped by run.
+
+        Raises:
+            KeyError: if `ext` or a column is not in the cache.
+        '''
+        with np.load(self.path) as data:
+            files = _files_table(data)
+            prefix = f"{ext}:"
+            available = [k[len(prefix):] for k in data.files
+                         if k.startswith(prefix) and k != f"{ext}:__file"]
+            if not available:
+                raise KeyError(f"No '{ext}' series in {self.path}")
+            columns = available if columns is None else list(columns)
+            missing = [c for c in columns if c not in available]
+            if missing:
+                raise KeyError(f"Unknown '{ext}' columns {missing}; have {available}")
+
+            file_idx = data[f"{ext}:__file"]
+            keep = np.ones(len(files), dtype=bool)
+            if temp is not None:
+                keep &= files["temp"] == temp
+            if runs is not None:
+                keep &= np.isin(files["run"], list(runs))
+            rows = keep[file_idx]
+
+            run_width = max(1, max((len(r) for r in files["run"]), default=1))
+            dtype = [("run", f"U{run_width}"), ("temp", np.int64)]
+            dtype += [(c, data[prefix + c].dtype) for c in columns]
+            out = np.empty(int(rows.sum()), dtype=dtype)
+            out["run"] = files["run"][file_idx[rows]]
+            out["temp"] = files["temp"][file_idx[rows]]
+            for c in columns:
+                out[c] = data[prefix + c][rows]
+        return _as_frame(out) if as_frame else out
+
+
+_FILE_DTYPE = np.dtype([
+    ("path", object), ("run", object), ("ext", object), ("ncyc", np.int64),
+    ("temp", np.int64), ("flags", object), ("size", np.int64),
+    ("mtime_ns", np.int64),
+])
+
+
+def _files_table(data) -> np.ndarray:
+    n = len(data["files:path"])
+    table = np.empty(n, dtype=_FILE_DTYPE)
+    for name in _FILE_DTYPE.names:
+        table[name] = data[f"files:{name}"]
+    return table
+
+
+def _rows(old: dict, ext: str, file_index: int) -> np.ndarray:
+    '''Rebuild the structured array of one cached file.'''
+    # rows are stored grouped by file, in ascending file order
+    file_idx = old[f"{ext}:__file"]
+    lo = np.searchsorted(file_idx, file_index, side="left")
+    hi = np.searchsorted(file_idx, file_index, side="right")
+    cols = [k.split(":", 1)[1] for k in old
+            if k.startswith(f"{ext}:") and k != f"{ext}:__file"]
+    arr = np.empty(hi - lo, dtype=[(c, old[f"{ext}:{c}"].dtype) for c in cols])
+    for c in cols:
+        arr[c] = old[f"{ext}:{c}"][lo:hi]
+    return arr
+
+
+def _column(arr: np.ndarray, col: str) -> np.ndarray:
+    if col in arr.dtype.names:
+        return arr[col]
+    dtype = np.int64 if col == "Cycle" else np.float64
+    return np.full(len(arr), -1 if col == "Cycle" else np.nan, dtype=dtype)
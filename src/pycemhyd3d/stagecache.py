@@ -0,0 +1,209 @@
+'''Content-addressed memoization of pipeline stages for pycemhyd3d.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    `genpartnew` and `distrib3d` are deterministic for a given stdin payload,
+    input files and executables. Sweeps that only vary `disrealnew`
+    parameters therefore keep regenerating the same microstructure. A
+    `StageCache` stores the outputs of a stage under a key derived from:
+
+        - the stage name,
+        - the rendered stdin (with the literal `{ID}` token in place of the
+          run id, so runs with different ids share entries),
+        - the SHA-256 of every input file,
+        - the runtime hash of the executables and data files
+          (`sandbox.runtime_hash`).
+
+    On a hit the stored files are hard-linked into the sandbox (copied when
+    the cache lives on another filesystem) and the stage is not run.
+
+Layout:
+    <root>/stages/<key[:2]>/<key>/
+        0, 1, ...     stored outputs, in the order given to `store`
+        .last_used    touched on every hit; its mtime drives LRU eviction
+
+Notes:
+    - Entries are written into a temporary folder and published with an
+      atomic rename; evicted entries are renamed away before deletion. Several
+      processes (or hosts on a shared scratch disk) can use one cache.
+    - Sandboxes hard-link to stored files, so they must never be modified in
+      place. The tools only read their input images (`fopen(..., "r")`), and
+      every stage writes to new names, so this holds for the pipeline.
+      Finalized result folders can share those inodes too (outputs are
+      renamed, not copied), so rewrite result images to new files rather
+      than editing them in place.
+'''
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+# Default size quota of a stage cache (bytes)
+DEFAULT_MAX_BYTES = 5 * 1024**3
+
+
+def file_hash(path: Path) -> str:
+    '''Return the hex SHA-256 digest of a file's contents.'''
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def stage_key(stage: str,
+              stdin_text: str,
+              input_files=(),
+              runtime_hash: str = "") -> str:
+    '''Build the cache key of one stage execution.
+
+    Args:
+        stage: Stage name (e.g. "genpartnew").
+        stdin_text: Rendered stdin payload, id-independent (see module doc).
+        input_files: Paths of the files the stage reads.
+        runtime_hash: Hash of the executables and data files.
+
+    Returns:
+        str: Hex SHA-256 key.
+    '''
+    h = hashlib.sha256()
+    for part in (stage, stdin_text, runtime_hash):
+        h.update(part.encode("utf-8") + b"\0")
+    for path in input_files:
+        h.update(file_hash(path).encode("ascii") + b"\0")
+    return h.hexdigest()
+
+
+def _entry_size(entry: Path) -> int:
+    return sum(p.stat().st_size for p in entry.iterdir() if p.is_file())
+
+
+class StageCache:
+    '''On-disk store of stage outputs with a size quota and LRU eviction.
+
+    Args:
+        root: Cache folder (created on first store).
+        max_bytes: Size quota; least recently used entries are evicted after
+            each store until the cache fits.
+    '''
+
+    def __init__(self, root: str | Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+
+    def _entry(self, key: str) -> Path:
+        return self.root / "stages" / key[:2] / key
+
+    def lookup(self, key: str, dests) -> bool:
+        '''Materialize the entry for `key` at `dests`, if present.
+
+        Args:
+            key: Key from `stage_key`.
+            dests: Destination paths, in the order the outputs were stored.
+
+        Returns:
+            bool: True on a hit (all files placed), False on a miss.
+        '''
+        entry = self._entry(key)
+        dests = [Path(d) for d in dests]
+        if not (entry / ".last_used").exists():
+            return False
+        placed = []
+        try:
+            for i, dst in enumerate(dests):
+                src = entry / str(i)
+                if dst.exists():
+                    dst.unlink()
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    if not src.exists():
+                        raise
+                    shutil.copy2(src, dst)
+                placed.append(dst)
+            os.utime(entry / ".last_used")
+        except OSError:
+            # evicted while we were linking: behave like a miss
+            for dst in placed:
+                dst.unlink(missing_ok=True)
+            return False
+        return True
+
+    def store(self, key: str, srcs):
+        '''Store copies of `srcs` under `key`, then enforce the quota.
+
+        Args:
+            key: Key from `stage_key`.
+            srcs: Output files of the stage, in a fixed order.
+        '''
+        entry = self._entry(key)
+        if (entry / ".last_used").exists():
+            return
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = entry.parent / f".tmp-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        tmp_dir.mkdir()
+        try:
+            for i, src in enumerate(srcs):
+                dst = tmp_dir / str(i)
+                shutil.copy2(src, dst)
+            (tmp_dir / ".last_used").touch()
+            try:
+                os.rename(tmp_dir, entry)
+            except OSError:
+                # another process stored the same key first
+                if not (entry / ".last_used").exists():
+                    raise
+        finally:
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def entries(self) -> list[tuple[float, int, Path]]:
+        '''List `(last_used, size_bytes, path)` for every complete entry.'''
+        out = []
+        for marker in self.root.glob("stages/*/*/.last_used"):
+            entry = marker.parent
+            if entry.name.startswith("."):
+                continue  # unpublished or half-evicted
+            try:
+                out.append((marker.stat().st_mtime, _entry_size(entry), entry))
+            except OSError:
+                continue
+        return out
+
+    def size(self) -> int:
+        '''Return the total size of all entries, in bytes.'''
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes: int | None = None) -> int:
+        '''Delete least recently used entries until the cache fits its quota.
+
+        Args:
+            max_bytes: Quota to enforce (default: `self.max_bytes`).
+
+        Returns:
+            int: Number of evicted entries.
+        '''
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, entry in entries:
+            if total <= limit:
+                break
+            trash = entry.parent / f".trash-{uuid.uuid4().hex[:6]}"
+            try:
+                os.rename(entry, trash)
+            except OSError:
+                continue
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= size
+            evicted += 1
+        return evicted
+
+    def clear(self):
+        '''Remove every entry.'''
+        self.evict(max_bytes=0)
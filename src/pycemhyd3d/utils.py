@@ -6,7 +6,28 @@ Author:
 Overview:
     Cross-platform helpers used by the pipeline and executors.
 '''
+import json
+import os
 import platform
+import sys
+import sysconfig
+from pathlib import Path
+
+# Folder of the installed package; frames from here are never "the caller"
+_PKG_DIR = Path(__file__).resolve().parent
+# Standard library frames (threading, asyncio, concurrent.futures) neither;
+# site-packages usually lives below the stdlib folder but is not skipped
+_STDLIB_DIR = Path(sysconfig.get_paths()["stdlib"]).resolve()
+_SITE_DIRS = {Path(sysconfig.get_paths()[k]).resolve() for k in ("purelib", "platlib")}
+
+# Edge length (pixels) of the lattice of tools built without -DSYSIZE
+DEFAULT_SYSTEM_SIZE = 100
+
+
+def _is_stdlib(path: Path) -> bool:
+    return (_STDLIB_DIR in path.parents
+            and not any(d == path or d in path.parents for d in _SITE_DIRS))
+
 
 def is_windows() -> bool:
     '''Return True if the current platform is Windows, else False.
@@ -16,3 +37,86 @@ def is_windows() -> bool:
         platform-specific behaviors during execution.
     '''
     return platform.system() == "Windows"
+
+
+def tool_name(tool: str, system_size: int = DEFAULT_SYSTEM_SIZE) -> str:
+    '''Return the file stem of `tool` built for a `system_size`^3 lattice.
+
+    The default size keeps the historical names ("genpartnew"); other
+    sizes, built with `python setup.py build_exe --sizes=...`, get a suffix
+    ("genpartnew_s50").
+
+    Raises:
+        ValueError: if `system_size` is not a positive integer.
+    '''
+    if isinstance(system_size, bool) or not isinstance(system_size, int) \
+            or system_size < 1:
+        raise ValueError(f"system_size must be a positive integer, got {system_size!r}")
+    if system_size == DEFAULT_SYSTEM_SIZE:
+        return tool
+    return f"{tool}_s{system_size}"
+
+
+def default_cache_root() -> Path:
+    '''Return the machine-wide cache folder used by pycemhyd3d.
+
+    Resolution order:
+        1) `$PYCEMHYD3D_CACHE` if set,
+        2) `%LOCALAPPDATA%\\pycemhyd3d` on Windows,
+        3) `$XDG_CACHE_HOME/pycemhyd3d`, else `~/.cache/pycemhyd3d`.
+
+    Uses:
+        Location of the shared runtime cache (executables + data files) that
+        per-run sandboxes link to.
+    '''
+    env = os.environ.get("PYCEMHYD3D_CACHE")
+    if env:
+        return Path(env).expanduser()
+    if is_windows() and os.environ.get("LOCALAPPDATA"):
+        return Path(os.environ["LOCALAPPDATA"]) / "pycemhyd3d"
+    xdg = os.environ.get("XDG_CACHE_HOME")
+    base = Path(xdg) if xdg else Path.home() / ".cache"
+    return base / "pycemhyd3d"
+
+
+def caller_results_root() -> Path:
+    '''Return `results/` next to the first calling script outside the package.
+
+    Walks the stack with `sys._getframe` (cheap, unlike `inspect.stack()`,
+    which reads the source of every frame) and skips pycemhyd3d's own
+    frames and standard-library frames, so wrappers such as the batch,
+    fan-out, progress and asyncio helpers resolve the same folder as a
+    direct `run_cemhyd3d` call.
+
+    Uses:
+        Default `results_root` of the pipeline entry points. Falls back to
+        `./results` when no script frame is found (e.g. interactive use).
+    '''
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith("<"):
+            path = Path(filename).resolve()
+            if path.parent != _PKG_DIR and not _is_stdlib(path):
+                return path.parent / "results"
+        frame = frame.f_back
+    return Path.cwd() / "results"
+
+
+def build_profile() -> dict:
+    '''Return the record written by `python setup.py build_exe`.
+
+    Keys: `profile` ("default", "debug", "release" or "pgo"), `flags`
+    (compiler flags per executable), `compiler`, `platform`, `verified`
+    (True if `--verify` confirmed byte-identical outputs) and `sizes` (the
+    lattice sizes the tools were built for).
+
+    Uses:
+        Reporting which native build produced a result (e.g. in benchmark
+        histories). Returns `{}` for executables not built by `build_exe`.
+    '''
+    path = _PKG_DIR / "cempy3d" / "build_profile.json"
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
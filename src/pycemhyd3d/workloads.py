@@ -0,0 +1,235 @@
+'''Reference workloads for building, verifying and timing the native tools.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    `example_workload(cycles)` returns the configuration of
+    `simulations/example.py` (fixed seeds; identical to the shipped
+    `genpartnew.dat`, `distrib3d.dat` and `disrealnew.dat` inputs), optionally
+    with fewer hydration cycles. `workload(name)` returns one of the
+    reference workloads of `WORKLOADS` ("small", "medium", "full", and
+    "sealed", a self-desiccating run that exercises `makeinert`) used by the
+    benchmark suite (`bench.py`).
+
+    `run_native(bin_dir, work_dir, ...)` runs genpartnew, distrib3d
+    and disrealnew from an arbitrary folder of executables on that workload,
+    without the sandbox/caching machinery of `cemhyd3d.py`. `setup.py` uses
+    it to train PGO builds and to check that optimized builds produce
+    byte-identical outputs (`compare_outputs`).
+
+Notes:
+    Only depends on the standard library, so it can be imported from
+    `setup.py` before the package is installed.
+'''
+import copy
+import filecmp
+import shutil
+import subprocess
+from pathlib import Path
+
+from .builders import (
+    _build_genpartnew_from_dict,
+    _build_distrib3d_from_dict,
+    _build_disrealnew_from_dict,
+)
+from .sandbox import runtime_files
+from .utils import DEFAULT_SYSTEM_SIZE, is_windows
+
+# Configuration of simulations/example.py (keep the two in sync)
+EXAMPLE_GENPARTNEW = {
+    "seed": -3034,
+    "place_menu": 2,
+    "n_size_classes": 16,
+    "dispersion_px": 0,
+    "calcium_sulfate_vf": "0.0604",
+    "calcium_sulfate_split": ["0.515", "0.041"],
+    "size_classes": [
+        (1, 17, 1), (1, 15, 1), (1, 14, 1), (1, 13, 1),
+        (2, 12, 1), (2, 11, 1), (4, 10, 1), (5,  9, 1),
+        (8,  8, 1), (13, 7, 1), (21, 6, 1), (38, 5, 1),
+        (73, 4, 1), (174, 3, 1), (450, 2, 1), (2674, 1, 1)
+    ],
+    "report_phase_counts_menu": 4,
+    "flocculate_menu": 3,
+    "n_flocs": 1,
+    "output_menu": 8,
+    "out_image":        "cem140w04floc_{ID}.img",
+    "out_particle_ids": "pcem140w04floc_{ID}.img",
+    "exit_menu": 1,
+}
+
+EXAMPLE_DISTRIB3D = {
+    "seed": -99,
+    "in_name":  "cem140w04floc_{ID}.img",
+    "filters_root": "cement140",
+    "out_name": "cement140w04flocf_{ID}.img",
+    "targets": ["0.7344", "0.6869", "0.0938", "0.1337",
+                "0.1311", "0.1386", "0.0407", "0.0408"],
+}
+
+EXAMPLE_DISREALNEW = {
+    "seed": -2794,
+    "phase_file": "cement140w04flocf_{ID}.img",
+    "part_file":  "pcem140w04floc_{ID}.img",
+    "phase_map": [1, 2, 3, 4, 5, 6, 7, 28, 26],
+    "c3a_fa": 35,
+    "one_px_pairs": [
+        ("44990", "1"), ("5850", "2"), ("8692", "3"),
+        ("2631", "4"),  ("1100", "5"), ("2062", "6"),
+        ("839", "7"),
+    ],
+    "one_px_extra": "0",
+    "cycles": "1000",
+    "sat_flag": "0",
+    "max_diff": "500",
+    "nuc_params": ["0.0001 9000.", "0.01 9000.", "0.00002 10000.", "0.002 2500."],
+    "freqs": ["50", "5", "5000", "100"],
+    "thermal": ["0.00", "20.0", "20.0", "0.0"],
+    "Ea": ["40.0", "83.14", "80.0"],
+    "cycle_to_time": "0.00035",
+    "agg_vf": "0.72",
+    "flags": ["0", "0", "1", "10", "1.0", "0", "0", "1"],
+}
+
+TOOLS = ("genpartnew", "distrib3d", "disrealnew")
+
+# Reference workloads of the benchmark suite: disrealnew cycles, snapshot
+# interval (`outfreq`), a scale factor on the particle counts of every
+# genpartnew size class and, for "sealed", the saturation flag
+WORKLOADS = {
+    "small":  {"cycles": 20,   "outfreq": 10,  "size_scale": 0.25},
+    "medium": {"cycles": 200,  "outfreq": 50,  "size_scale": 0.5},
+    "full":   {"cycles": 1000, "outfreq": 100, "size_scale": 1.0},
+    "sealed": {"cycles": 200,  "outfreq": 100, "size_scale": 1.0, "sat_flag": 1},
+}
+
+
+def example_workload(cycles: int | None = None,
+                     outfreq: int | None = None,
+                     size_scale: float = 1.0,
+                     system_size: int = DEFAULT_SYSTEM_SIZE,
+                     sat_flag: int | None = None) -> tuple[dict, dict, dict]:
+    '''Return `(gp_cfg, d3_cfg, dr_cfg)` of the example, as fresh copies.
+
+    Args:
+        cycles: Number of disrealnew cycles (default: the example's 1000).
+            Snapshot and percolation frequencies are clamped to it so a short
+            run still exercises every code path.
+        outfreq: Cycles between `.ima` snapshots (default: the example's).
+        size_scale: Factor applied to the particle count of every size class
+            (at least one particle per class is kept).
+        system_size: Lattice edge length the workload is meant for. Particle
+            counts are scaled with the volume, `(system_size / 100) ** 3`, so
+            the volume fractions are kept; size classes left without any
+            particle are dropped (for small lattices these are the largest
+            particles, which would not fit anyway). The one-pixel particles
+            disrealnew adds (`one_px_pairs`) are scaled the same way; pairs
+            left without any pixel are dropped, since a zero count ends the
+            list read by disrealnew.
+        sat_flag: disrealnew saturation flag (default: the example's 0,
+            saturated curing; 1 is sealed curing, where self-desiccation
+            empties pores through `makeinert` every cycle).
+    '''
+    gp = copy.deepcopy(EXAMPLE_GENPARTNEW)
+    d3 = copy.deepcopy(EXAMPLE_DISTRIB3D)
+    dr = copy.deepcopy(EXAMPLE_DISREALNEW)
+    if size_scale != 1.0:
+        gp["size_classes"] = [(max(1, round(n * size_scale)), r, ph)
+                              for n, r, ph in gp["size_classes"]]
+    if system_size != DEFAULT_SYSTEM_SIZE:
+        volume = (system_size / DEFAULT_SYSTEM_SIZE) ** 3
+        gp["size_classes"] = [(round(n * volume), r, ph)
+                              for n, r, ph in gp["size_classes"]
+                              if round(n * volume) > 0]
+        gp["n_size_classes"] = len(gp["size_classes"])
+        dr["one_px_pairs"] = [(str(round(int(n) * volume)), ph)
+                              for n, ph in dr["one_px_pairs"]
+                              if round(int(n) * volume) > 0]
+    if outfreq is not None:
+        dr["freqs"][3] = str(outfreq)
+    if sat_flag is not None:
+        dr["sat_flag"] = str(sat_flag)
+    if cycles is not None:
+        dr["cycles"] = str(cycles)
+        burn, setf, stats, out = (int(f) for f in dr["freqs"])
+        half = max(1, cycles // 2)
+        dr["freqs"] = [str(min(burn, half)), str(min(setf, half)),
+                       str(stats), str(min(out, half))]
+    return gp, d3, dr
+
+
+def workload(name: str) -> tuple[dict, dict, dict]:
+    '''Return `(gp_cfg, d3_cfg, dr_cfg)` of a reference workload.
+
+    Raises:
+        KeyError: if `name` is not in `WORKLOADS`.
+    '''
+    if name not in WORKLOADS:
+        raise KeyError(f"Unknown workload {name!r}; choose one of {list(WORKLOADS)}")
+    return example_workload(**WORKLOADS[name])
+
+
+def run_native(bin_dir: str | Path,
+               work_dir: str | Path,
+               cycles: int | None = None,
+               id: str = "01",
+               data_dir: str | Path | None = None,
+               tools=TOOLS) -> Path:
+    '''Run the example workload with the executables found in `bin_dir`.
+
+    Args:
+        bin_dir: Folder holding genpartnew, distrib3d and disrealnew.
+        work_dir: Empty (or new) working directory; receives all outputs and
+            the `<tool>_<id>.out` logs. The runtime data files are always
+            copied afresh, so stale copies from an earlier run are replaced.
+        cycles: disrealnew cycles (see `example_workload`).
+        id: Run identifier used in filenames.
+        data_dir: Folder with the runtime data files (default: `bin_dir`).
+        tools: Subset of `TOOLS` to run, in pipeline order (earlier outputs
+            must already be in `work_dir`).
+
+    Returns:
+        pathlib.Path: `work_dir`.
+
+    Raises:
+        subprocess.CalledProcessError: if a tool fails.
+    '''
+    bin_dir, work_dir = Path(bin_dir), Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    for src in runtime_files(data_dir or bin_dir):
+        if src.stem not in TOOLS:
+            shutil.copy2(src, work_dir / src.name)
+
+    gp, d3, dr = example_workload(cycles)
+    payloads = {
+        "genpartnew": _build_genpartnew_from_dict(id, gp).rstrip() + "\n",
+        "distrib3d": _build_distrib3d_from_dict(id, "", d3).rstrip() + "\n",
+        "disrealnew": _build_disrealnew_from_dict(id, "", dr),
+    }
+    suffix = ".exe" if is_windows() else ""
+    for tool in tools:
+        exe = bin_dir / f"{tool}{suffix}"
+        with open(work_dir / f"{tool}_{id}.out", "wb") as log:
+            subprocess.run([str(exe.resolve())], input=payloads[tool].encode(),
+                           stdout=log, stderr=subprocess.STDOUT, cwd=work_dir,
+                           check=True)
+    return work_dir
+
+
+def compare_outputs(dir_a: str | Path, dir_b: str | Path,
+                    ignore=()) -> list[str]:
+    '''Return the names of files that differ (or exist once) in two runs.
+
+    Args:
+        dir_a, dir_b: Working directories of two `run_native` calls.
+        ignore: File names to skip (e.g. the executables themselves).
+    '''
+    names_a = {p.name for p in Path(dir_a).iterdir() if p.is_file()}
+    names_b = {p.name for p in Path(dir_b).iterdir() if p.is_file()}
+    ignore = set(ignore)
+    differ = sorted((names_a ^ names_b) - ignore)
+    for name in sorted((names_a & names_b) - ignore):
+        if not filecmp.cmp(Path(dir_a) / name, Path(dir_b) / name, shallow=False):
+            differ.append(name)
+    return differ
@@ -0,0 +1,626 @@
+'''Distributed execution: a coordinator with a job queue and pull workers.
+
+Author:
+    Omid Jahromi <omid.esmaeelipoor@gmail.com>
+
+Overview:
+    `run_coordinator(jobs, queue)` holds a queue of `run_cemhyd3d` jobs.
+    Workers started on any host with
+
+        pycemhyd3d worker <queue>        (or python -m pycemhyd3d.workqueue worker <queue>)
+
+    pull one job at a time, run it with `run_cemhyd3d` in their own scratch
+    folder and sandbox, and push back the run's manifest and a `.tar.gz`
+    archive of its results folder. The coordinator unpacks every archive
+    into `<results_root>/result_<id>/`, so the results look exactly as if
+    the jobs had run locally. `queue` is either
+
+        - a shared directory (e.g. on NFS): jobs are JSON files in
+          `pending/`, claimed by an atomic rename into `claimed/`, and
+          completed by writing the archive and a record into `done/`;
+          workers keep their claim alive by touching it, and claims older
+          than `lease_timeout` are put back in `pending/`, or
+        - `tcp://host:port`: the coordinator listens on that address (port 0
+          picks a free one) and workers keep one connection each; the jobs
+          leased to a worker whose connection drops are queued again.
+
+    No broker is involved. `local_workers=n` starts n worker processes on
+    the coordinator's machine, e.g. to test a campaign before spreading it
+    over a cluster:
+
+        run_coordinator(jobs, "tcp://0.0.0.0:0", local_workers=4)
+
+Notes:
+    - Jobs are dicts with the keyword arguments of `run_cemhyd3d` (or
+      `(id, gp_cfg, d3_cfg, dr_cfg)` tuples) and must be JSON-serializable;
+      `results_root` is set by the worker. Worker-local settings
+      (`cache_root`, `stage_cache`, `engine`, watchdog) are worker options.
+    - A job whose lease expires may end up running twice; the first result
+      to arrive wins.
+    - The TCP protocol is unauthenticated: only use it on a trusted network.
+    - Only depends on the standard library.
+'''
+import argparse
+import json
+import os
+import shutil
+import socket
+import socketserver
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from queue import Empty, Queue
+
+from .cemhyd3d import run_cemhyd3d
+from .manifest import MANIFEST_NAME, append_manifest
+from .utils import caller_results_root
+
+TCP_SCHEME = "tcp://"
+ARCHIVE_SUFFIX = ".tar.gz"
+# Seconds between queue polls / claim heartbeats of a worker
+DEFAULT_POLL = 1.0
+# Seconds after which a claim that was not touched is queued again
+DEFAULT_LEASE_TIMEOUT = 300.0
+
+# Shared-directory layout
+_PENDING, _CLAIMED, _DONE = "pending", "claimed", "done"
+_STOP_NAME = "STOP"
+
+
+def _normalize_jobs(jobs) -> list[dict]:
+    '''Job dicts of `jobs` (dicts or `(id, gp, d3, dr)` tuples), as JSON.'''
+    job_list = []
+    for job in jobs:
+        if not isinstance(job, dict):
+            id_, gp, d3, dr = job
+            job = {"id": id_, "genpartnew_input": gp,
+                   "distrib3d_input": d3, "disrealnew_input": dr}
+        if "results_root" in job:
+            raise ValueError(f"Job {job['id']!r}: results_root is set by the worker")
+        try:
+            job_list.append(json.loads(json.dumps(job)))
+        except TypeError as exc:
+            raise ValueError(f"Job {job.get('id')!r} is not JSON-serializable: {exc}") from None
+    ids = [job["id"] for job in job_list]
+    dupes = sorted({i for i in ids if ids.count(i) > 1})
+    if dupes:
+        raise ValueError(f"Duplicate job ids in queue: {dupes}")
+    return job_list
+
+
+def _write_json(path: Path, data: dict):
+    '''Write `data` to `path` atomically.'''
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _pack(results_dir: Path, archive: Path):
+    '''Archive the contents of a results folder.'''
+    with tarfile.open(archive, "w:gz") as tar:
+        for path in sorted(results_dir.iterdir()):
+            tar.add(path, arcname=path.name)
+
+
+def _unpack(archive: Path, dest: Path):
+    '''Replace `dest` with the contents of an archive written by `_pack`.'''
+    if dest.exists():
+        shutil.rmtree(dest)
+    dest.mkdir(parents=True)
+    with tarfile.open(archive, "r:gz") as tar:
+        if hasattr(tarfile, "data_filter"):
+            tar.extractall(dest, filter="data")
+        else:
+            tar.extractall(dest)
+
+
+def _worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class DirQueue:
+    '''Job queue in a shared directory (both coordinator and worker side).
+
+    Args:
+        root: Queue directory, visible to every host.
+        lease_timeout: Seconds after which an untouched claim is requeued.
+    '''
+
+    def __init__(self, root: str | Path, lease_timeout: float = DEFAULT_LEASE_TIMEOUT):
+        self.root = Path(root).resolve()
+        self.lease_timeout = lease_timeout
+        for sub in (_PENDING, _CLAIMED, _DONE):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+
+    # --- coordinator side ---
+    def submit(self, job: dict):
+        '''Queue one job.'''
+        _write_json(self.root / _PENDING / f"{job['id']}.json", job)
+
+    def completions(self, timeout: float) -> list[tuple[dict, Path | None]]:
+        '''Return `(record, archive)` of the jobs completed so far (waiting
+        up to `timeout` seconds for the first) and requeue stale claims.'''
+        deadline = time.monotonic() + timeout
+        while True:
+            found = []
+            for path in sorted((self.root / _DONE).glob("*.json")):
+                record = json.loads(path.read_text(encoding="utf-8"))
+                path.unlink()
+                archive = self.root / _DONE / f"{path.stem}{ARCHIVE_SUFFIX}"
+                found.append((record, archive if archive.is_file() else None))
+            self._requeue_stale()
+            if found or time.monotonic() >= deadline:
+                return found
+            time.sleep(min(DEFAULT_POLL, max(0.0, deadline - time.monotonic())))
+
+    def _requeue_stale(self):
+        now = time.time()
+        for path in (self.root / _CLAIMED).glob("*.json"):
+            try:
+                if now - path.stat().st_mtime > self.lease_timeout:
+                    job_id = path.stem.rpartition("@")[0]
+                    os.rename(path, self.root / _PENDING / f"{job_id}.json")
+                    print(f"[queue] Claim {path.stem} expired; job requeued")
+            except FileNotFoundError:
+                continue  # completed or requeued meanwhile
+
+    def stop(self):
+        '''Tell the workers to exit once the queue is empty.'''
+        (self.root / _STOP_NAME).touch()
+
+    # --- worker side ---
+    def get(self, worker: str) -> tuple[dict | None, bool]:
+        '''Claim a job; return `(job or None, stop)`.'''
+        for path in sorted((self.root / _PENDING).glob("*.json")):
+            claimed = self.root / _CLAIMED / f"{path.stem}@{worker}.json"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # claimed by another worker
+            os.utime(claimed)
+            return json.loads(claimed.read_text(encoding="utf-8")), False
+        return None, (self.root / _STOP_NAME).exists()
+
+    def heartbeat(self, job_id: str, worker: str):
+        '''Keep the claim of a running job alive.'''
+        try:
+            os.utime(self.root / _CLAIMED / f"{job_id}@{worker}.json")
+        except FileNotFoundError:
+            pass  # requeued after a lease timeout
+
+    def put(self, record: dict, archive: Path | None, worker: str):
+        '''Hand a finished job (record and results archive) back.'''
+        job_id = record["id"]
+        if archive is not None:
+            tmp = self.root / _DONE / f".{job_id}{ARCHIVE_SUFFIX}.{worker}.tmp"
+            shutil.copyfile(archive, tmp)
+            os.replace(tmp, self.root / _DONE / f"{job_id}{ARCHIVE_SUFFIX}")
+        _write_json(self.root / _DONE / f"{job_id}.json", record)
+        try:
+            (self.root / _CLAIMED / f"{job_id}@{worker}.json").unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        pass
+
+
+def _send(wfile, msg: dict):
+    wfile.write(json.dumps(msg).encode("utf-8") + b"\n")
+    wfile.flush()
+
+
+def _recv(rfile) -> dict | None:
+    line = rfile.readline()
+    return json.loads(line) if line else None
+
+
+def _copy_exact(src, dst, size: int):
+    '''Copy exactly `size` bytes between file objects.'''
+    while size:
+        chunk = src.read(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed during transfer")
+        dst.write(chunk)
+        size -= len(chunk)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    '''One worker connection: serves `get` and `put` requests.'''
+
+    def handle(self):
+        queue = self.server.queue
+        leased = set()
+        try:
+            while True:
+                msg = _recv(self.rfile)
+                if msg is None:
+                    break
+                if msg["op"] == "get":
+                    job, stop = queue.lease()
+                    if job is not None:
+                        leased.add(job["id"])
+                    _send(self.wfile, {"job": job, "stop": stop})
+                elif msg["op"] == "put":
+                    record, archive = msg["record"], None
+                    if msg["size"] is not None:
+                        fd, name = tempfile.mkstemp(suffix=ARCHIVE_SUFFIX, dir=queue.spool)
+                        with os.fdopen(fd, "wb") as f:
+                            _copy_exact(self.rfile, f, msg["size"])
+                        archive = Path(name)
+                    leased.discard(record["id"])
+                    queue.complete(record, archive)
+                    _send(self.wfile, {"ok": True})
+        except (ConnectionError, OSError, ValueError) as exc:
+            print(f"[queue] Worker connection lost: {exc!r}")
+        finally:
+            for job_id in leased:
+                queue.requeue(job_id)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class TCPQueue:
+    '''Coordinator side of the TCP queue: an in-memory queue served on
+    `address` (`host:port`, port 0 for a free one).'''
+
+    def __init__(self, address: str):
+        host, _, port = address.rpartition(":")
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._leased = {}
+        self._done = Queue()
+        self._stop = False
+        self.spool = Path(tempfile.mkdtemp(prefix="pycemhyd3d-queue-"))
+        self._server = _Server((host or "0.0.0.0", int(port)), _Handler)
+        self._server.queue = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def address(self, local: bool = False) -> str:
+        '''`tcp://host:port` the workers connect to (from this machine if
+        `local`).'''
+        host, port = self._server.server_address[:2]
+        if host in ("0.0.0.0", ""):
+            host = "127.0.0.1" if local else socket.gethostname()
+        return f"{TCP_SCHEME}{host}:{port}"
+
+    def submit(self, job: dict):
+        with self._lock:
+            self._pending.append(job)
+
+    def lease(self) -> tuple[dict | None, bool]:
+        with self._lock:
+            if self._pending:
+                job = self._pending.popleft()
+                self._leased[job["id"]] = job
+                return job, False
+            return None, self._stop
+
+    def requeue(self, job_id: str):
+        with self._lock:
+            job = self._leased.pop(job_id, None)
+            if job is not None:
+                self._pending.appendleft(job)
+                print(f"[queue] Job {job_id} requeued")
+
+    def complete(self, record: dict, archive: Path | None):
+        with self._lock:
+            self._leased.pop(record["id"], None)
+        self._done.put((record, archive))
+
+    def completions(self, timeout: float) -> list[tuple[dict, Path | None]]:
+        try:
+            found = [self._done.get(timeout=timeout)]
+        except Empty:
+            return []
+        while True:
+            try:
+                found.append(self._done.get_nowait())
+            except Empty:
+                return found
+
+    def stop(self):
+        '''Tell the workers to exit and stop accepting connections (open
+        ones are closed when this process exits).'''
+        with self._lock:
+            self._stop = True
+        self._server.shutdown()
+        self._server.server_close()
+        shutil.rmtree(self.spool, ignore_errors=True)
+
+
+class _TCPClient:
+    '''Worker side of the TCP queue.'''
+
+    def __init__(self, address: str):
+        host, _, port = address.rpartition(":")
+        self._sock = socket.create_connection((host, int(port)))
+        self._rfile = self._sock.makefile("rb")
+        self._wfile = self._sock.makefile("wb")
+
+    def get(self, worker: str) -> tuple[dict | None, bool]:
+        _send(self._wfile, {"op": "get", "worker": worker})
+        reply = _recv(self._rfile)
+        if reply is None:
+            return None, True  # coordinator is gone
+        return reply["job"], reply["stop"]
+
+    def heartbeat(self, job_id: str, worker: str):
+        pass  # the open connection is the lease
+
+    def put(self, record: dict, archive: Path | None, worker: str):
+        size = archive.stat().st_size if archive is not None else None
+        _send(self._wfile, {"op": "put", "record": record, "size": size})
+        if archive is not None:
+            with open(archive, "rb") as f:
+                shutil.copyfileobj(f, self._wfile)
+            self._wfile.flush()
+        if _recv(self._rfile) is None:
+            raise ConnectionError("Coordinator closed the connection")
+
+    def close(self):
+        self._sock.close()
+
+
+def _client(queue: str | Path):
+    if str(queue).startswith(TCP_SCHEME):
+        return _TCPClient(str(queue)[len(TCP_SCHEME):])
+    return DirQueue(queue)
+
+
+def run_coordinator(jobs,
+                    queue: str | Path,
+                    results_root: str | Path | None = None,
+                    manifest_sink: str | Path | None = None,
+                    local_workers: int = 0,
+                    worker_args=(),
+                    lease_timeout: float = DEFAULT_LEASE_TIMEOUT) -> dict:
+    '''Queue `jobs`, wait for the workers and collect their results.
+
+    Args:
+        jobs: Iterable of job dicts (keyword arguments of `run_cemhyd3d`) or
+            `(id, gp_cfg, d3_cfg, dr_cfg)` tuples, JSON-serializable.
+        queue: Shared queue directory or `tcp://host:port` to listen on.
+        results_root: Folder receiving every `result_<id>/`. Defaults to
+            `results/` next to the caller script.
+        manifest_sink: Optional JSON-lines file receiving the manifest of
+            every job.
+        local_workers: Number of worker processes to start on this machine.
+        worker_args: Extra command line arguments of the local workers
+            (e.g. `["--engine", "lib"]`).
+        lease_timeout: Shared-directory queue only: seconds after which a
+            claim whose worker stopped touching it is queued again.
+
+    Side effects:
+        - Creates `<results_root>/result_<id>/` for every job, replacing an
+          existing folder of the same id.
+        - A shared queue directory is left with a `STOP` marker, which
+          makes its workers exit; remove it (or use a new directory) to
+          reuse the queue.
+
+    Returns:
+        dict[str, pathlib.Path]: Results directory of every job.
+
+    Raises:
+        ValueError: if jobs are not JSON-serializable or share an id.
+        RuntimeError: if any job failed, after all jobs have finished (its
+            results folder still holds the manifest and logs), or if every
+            local worker exited while jobs were outstanding.
+    '''
+    job_list = _normalize_jobs(jobs)
+    if results_root is None:
+        results_root = caller_results_root()
+    results_root = Path(results_root).resolve()
+    results_root.mkdir(parents=True, exist_ok=True)
+
+    if str(queue).startswith(TCP_SCHEME):
+        backend = TCPQueue(str(queue)[len(TCP_SCHEME):])
+        address, local_address = backend.address(), backend.address(local=True)
+    else:
+        backend = DirQueue(queue, lease_timeout)
+        (backend.root / _STOP_NAME).unlink(missing_ok=True)
+        address = local_address = str(backend.root)
+    for job in job_list:
+        backend.submit(job)
+    print(f"[queue] {len(job_list)} jobs queued on {address}")
+
+    procs = []
+    for _ in range(local_workers):
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "pycemhyd3d.workqueue", "worker", local_address,
+             *map(str, worker_args)]))
+
+    outstanding = {job["id"] for job in job_list}
+    results, failures = {}, []
+    try:
+        while outstanding:
+            for record, archive in backend.completions(DEFAULT_POLL):
+                job_id = record["id"]
+                if job_id not in outstanding:
+                    # duplicate of a requeued job: drop its archive too
+                    if archive is not None:
+                        archive.unlink(missing_ok=True)
+                    continue
+                outstanding.discard(job_id)
+                results_dir = results_root / f"result_{job_id}"
+                if archive is not None:
+                    _unpack(archive, results_dir)
+                    archive.unlink()
+                if manifest_sink is not None and record.get("manifest"):
+                    append_manifest(record["manifest"], manifest_sink)
+                results[job_id] = results_dir
+                if record["error"] is None:
+                    print(f"[queue] Job {job_id} done on {record['worker']} "
+                          f"({len(job_list) - len(outstanding)}/{len(job_list)})")
+                else:
+                    failures.append((job_id, record["error"]))
+                    print(f"❌ [queue] Job {job_id} failed on {record['worker']}: "
+                          f"{record['error']}")
+            if procs and outstanding and all(p.poll() is not None for p in procs):
+                raise RuntimeError(f"All local workers exited with "
+                                   f"{len(outstanding)} jobs outstanding")
+    finally:
+        backend.stop()
+        for proc in procs:
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    if failures:
+        failed = ", ".join(str(job_id) for job_id, _ in failures)
+        raise RuntimeError(
+            f"{len(failures)} of {len(job_list)} jobs failed: {failed} "
+            f"(first error: {failures[0][1]})")
+    print(f"✅ Queue completed: {len(job_list)} jobs in {results_root}")
+    return {job["id"]: results[job["id"]] for job in job_list}
+
+
+def _heartbeat(client, job_id: str, worker: str, stop: threading.Event, poll: float):
+    while not stop.wait(poll):
+        client.heartbeat(job_id, worker)
+
+
+def run_worker(queue: str | Path,
+               name: str | None = None,
+               scratch: str | Path | None = None,
+               poll: float = DEFAULT_POLL,
+               max_jobs: int | None = None,
+               **run_kwargs) -> int:
+    '''Pull jobs from a queue and run them until the coordinator stops it.
+
+    Args:
+        queue: Shared queue directory or `tcp://host:port` of the
+            coordinator.
+        name: Worker name recorded with the results (default:
+            `<hostname>-<pid>`).
+        scratch: Local folder for the results and sandboxes of running jobs
+            (default: a new temporary folder, removed at exit).
+        poll: Seconds between polls of an empty queue (and between claim
+            heartbeats).
+        max_jobs: Exit after this many jobs.
+        **run_kwargs: Forwarded to every `run_cemhyd3d` call (e.g.
+            `cache_root`, `stage_cache`, `engine`, `stall_timeout`); the
+            job's own arguments take precedence.
+
+    Returns:
+        int: Number of jobs run.
+    '''
+    name = name or _worker_name()
+    client = _client(queue)
+    own_scratch = scratch is None
+    scratch = Path(tempfile.mkdtemp(prefix="pycemhyd3d-worker-") if own_scratch
+                   else scratch).resolve()
+    results_root = scratch / "results"
+    done = 0
+    print(f"[worker {name}] Serving {queue}")
+    try:
+        while max_jobs is None or done < max_jobs:
+            job, stop = client.get(name)
+            if job is None:
+                if stop:
+                    break
+                time.sleep(poll)
+                continue
+
+            job_id = job["id"]
+            beat = threading.Event()
+            thread = threading.Thread(target=_heartbeat,
+                                      args=(client, job_id, name, beat, poll),
+                                      daemon=True)
+            thread.start()
+            error = None
+            try:
+                results_dir = run_cemhyd3d(**{**run_kwargs, **job,
+                                              "results_root": results_root})
+            except Exception as exc:
+                error = repr(exc)
+                results_dir = results_root / f"result_{job_id}"
+            finally:
+                beat.set()
+                thread.join()
+
+            manifest, archive = None, None
+            if results_dir.is_dir():
+                manifest_path = results_dir / MANIFEST_NAME
+                if manifest_path.is_file():
+                    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+                archive = scratch / f"{job_id}{ARCHIVE_SUFFIX}"
+                _pack(results_dir, archive)
+            record = {"id": job_id, "worker": name, "error": error,
+                      "manifest": manifest}
+            try:
+                client.put(record, archive, name)
+            finally:
+                shutil.rmtree(results_dir, ignore_errors=True)
+                if archive is not None:
+                    archive.unlink(missing_ok=True)
+            done += 1
+    finally:
+        client.close()
+        if own_scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+    print(f"[worker {name}] Exiting after {done} jobs")
+    return done
+
+
+def main(argv=None) -> int:
+    '''Command line entry point (`pycemhyd3d`, `python -m pycemhyd3d.workqueue`).'''
+    parser = argparse.ArgumentParser(
+        prog="pycemhyd3d",
+        description="Run pycemhyd3d pipelines on a queue shared by many hosts.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    w = sub.add_parser("worker", help="pull and run jobs from a queue")
+    w.add_argument("queue", help="shared queue directory or tcp://host:port")
+    w.add_argument("--name", default=None)
+    w.add_argument("--scratch", default=None,
+                   help="local folder for running jobs (default: a temporary one)")
+    w.add_argument("--max-jobs", type=int, default=None)
+    w.add_argument("--poll", type=float, default=DEFAULT_POLL)
+    w.add_argument("--cache-root", default=None)
+    w.add_argument("--stage-cache", default=None)
+    w.add_argument("--engine", default="exe")
+    w.add_argument("--stall-timeout", type=float, default=None)
+    w.add_argument("--timeout", type=float, default=None)
+
+    c = sub.add_parser("coordinator", help="queue jobs and collect their results")
+    c.add_argument("jobs", help="JSON file with a list of job dicts")
+    c.add_argument("queue", help="shared queue directory or tcp://host:port to listen on")
+    c.add_argument("--results-root", default="results")
+    c.add_argument("--manifest-sink", default=None)
+    c.add_argument("--local-workers", type=int, default=0)
+    c.add_argument("--lease-timeout", type=float, default=DEFAULT_LEASE_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        run_worker(args.queue, name=args.name, scratch=args.scratch,
+                   poll=args.poll, max_jobs=args.max_jobs,
+                   cache_root=args.cache_root, stage_cache=args.stage_cache,
+                   engine=args.engine, stall_timeout=args.stall_timeout,
+                   timeout=args.timeout)
+        return 0
+    jobs = json.loads(Path(args.jobs).read_text(encoding="utf-8"))
+    try:
+        run_coordinator(jobs, args.queue, results_root=args.results_root,
+                        manifest_sink=args.manifest_sink,
+                        local_workers=args.local_workers,
+                        lease_timeout=args.lease_timeout)
+    except RuntimeError as exc:
+        print(f"❌ {exc}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())